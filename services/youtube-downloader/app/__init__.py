@@ -16,8 +16,6 @@ __version__ = "1.0.0"
 __author__ = "Video Carrier Platform Team"
 __email__ = "dev@videocarrier.com"
 
-from .main import app
-from .downloader import YouTubeDownloader
 from .celery_app import celery_app
 from .models import (
     DownloadRequest,
@@ -28,6 +26,24 @@ from .models import (
     HealthCheck,
 )
 
+# FastAPI应用和下载器按需加载：Worker不需要FastAPI，API启动时不需要yt-dlp
+_LAZY_ATTRS = {
+    "app": (".main", "app"),
+    "YouTubeDownloader": (".downloader", "YouTubeDownloader"),
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        import importlib
+
+        module_name, attr = _LAZY_ATTRS[name]
+        value = getattr(importlib.import_module(module_name, __name__), attr)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 __all__ = [
     "app",
     "YouTubeDownloader",
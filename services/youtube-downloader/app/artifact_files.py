@@ -0,0 +1,60 @@
+"""/downloads 静态文件服务
+
+在StaticFiles的基础上通过 StorageLayout 解析文件名，使分片布局下的产物
+仍然以 ``/downloads/<文件名>`` 的稳定URL对外提供。成功提供文件时记录一次访问，
+供缓存淘汰按最近访问时间排序；清单中记录了SHA-256的文件以其作为ETag。
+"""
+
+import os
+import typing
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, PathLike, StaticFiles
+from starlette.types import Scope
+
+from .checksums import lookup_entry
+from .storage_layout import StorageLayout, video_id_from_filename
+
+
+class ArtifactFiles(StaticFiles):
+    """按存储布局解析路径的静态文件应用"""
+
+    def __init__(self, layout: StorageLayout, cache_index=None, **kwargs: typing.Any):
+        super().__init__(directory=str(layout.root), **kwargs)
+        self.layout = layout
+        self.cache_index = cache_index
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        if self.cache_index is not None and response.status_code in (200, 206, 304):
+            await self.cache_index.touch_async(video_id_from_filename(os.path.basename(path)))
+        return response
+
+    def lookup_path(
+        self, path: str
+    ) -> typing.Tuple[str, typing.Optional[os.stat_result]]:
+        resolved = self.layout.resolve(path)
+        if resolved is None:
+            return "", None
+        try:
+            return str(resolved), os.stat(resolved)
+        except (FileNotFoundError, NotADirectoryError):
+            return "", None
+
+    def file_response(
+        self,
+        full_path: PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, method=scope["method"]
+        )
+        entry = lookup_entry(full_path, stat_result)
+        if entry and entry.get("sha256"):
+            response.headers["etag"] = f'"{entry["sha256"]}"'
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,141 @@
+"""下载产物索引
+
+/artifacts 列表查询由元数据库的 ``artifacts`` 表提供（见 metadata_store），不遍历下载目录。
+任务完成时把产物条目随元数据记录推入待写队列批量入库；缓存淘汰删除对应条目；
+其余途径删除的文件在列表查询时发现后从索引中移除。
+
+已有下载目录首次启用时重建索引：
+
+    python -m app.artifact_index reindex --root downloads
+"""
+
+import argparse
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from .checksums import MANIFEST_SUFFIX
+from .metadata_store import METADATA_DB_URL, MetadataStore, record_from_info
+from .storage_layout import StorageLayout, video_id_from_filename
+from .subtitles import SEGMENTS_SUFFIX
+
+# 可按类型过滤的产物类别
+ARTIFACT_KINDS = ("video", "audio", "subtitle", "subtitle_segments", "thumbnail", "description", "manifest", "other")
+
+_VIDEO_EXTS = {"mp4", "webm", "mkv", "mov", "flv"}
+_AUDIO_EXTS = {"m4a", "mp3", "opus", "ogg", "aac", "wav", "flac"}
+_SUBTITLE_EXTS = {"vtt", "srt", "ass", "ttml", "srv1", "srv2", "srv3", "json3"}
+_THUMBNAIL_EXTS = {"jpg", "jpeg", "png", "webp"}
+
+REINDEX_BATCH_SIZE = 500
+
+
+def classify(filename: str) -> Tuple[str, Optional[str]]:
+    """按文件名判断产物类别，字幕类返回语言：<id>.<lang>.vtt -> ("subtitle", lang)"""
+    if filename.endswith(MANIFEST_SUFFIX):
+        return "manifest", None
+    if filename.endswith(SEGMENTS_SUFFIX):
+        parts = filename[: -len(SEGMENTS_SUFFIX)].split(".", 1)
+        return "subtitle_segments", parts[1] if len(parts) == 2 else None
+    if filename.endswith(".description"):
+        return "description", None
+
+    parts = filename.split(".")
+    ext = parts[-1].lower() if len(parts) > 1 else ""
+    if ext in _SUBTITLE_EXTS:
+        return "subtitle", ".".join(parts[1:-1]) or None
+    if ext in _VIDEO_EXTS:
+        return "video", None
+    if ext in _AUDIO_EXTS:
+        return "audio", None
+    if ext in _THUMBNAIL_EXTS:
+        return "thumbnail", None
+    return "other", None
+
+
+def artifact_record(path: str, sha256: Optional[str] = None, stat: Optional[os.stat_result] = None) -> Dict[str, Any]:
+    """产物文件对应的索引条目"""
+    name = os.path.basename(path)
+    stat = stat or os.stat(path)
+    kind, lang = classify(name)
+    return {
+        "name": name,
+        "youtube_id": video_id_from_filename(name),
+        "kind": kind,
+        "lang": lang,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": sha256,
+    }
+
+
+def artifact_records(
+    paths: Iterable[Optional[str]], file_checksums: Optional[Dict[str, Dict[str, Any]]] = None
+) -> List[Dict[str, Any]]:
+    """一组产物路径的索引条目（附带已计算的SHA-256），不存在的文件跳过"""
+    file_checksums = file_checksums or {}
+    records = []
+    for path in paths:
+        if not path:
+            continue
+        try:
+            name = os.path.basename(path)
+            records.append(artifact_record(path, (file_checksums.get(name) or {}).get("sha256")))
+        except OSError:
+            continue
+    return records
+
+
+def flatten_paths(tree: Dict[str, Any]) -> List[str]:
+    """任务结果中的产物路径树（可能嵌套字幕语言）展开为路径列表"""
+    paths = []
+    for value in tree.values():
+        if isinstance(value, dict):
+            paths.extend(flatten_paths(value))
+        elif value:
+            paths.append(value)
+    return paths
+
+
+def reindex(layout: StorageLayout, store: MetadataStore, batch_size: int = REINDEX_BATCH_SIZE) -> int:
+    """遍历下载目录重建产物索引，返回写入的条目数"""
+    total = 0
+    batch: List[Dict[str, Any]] = []
+    for path in layout.iter_files():
+        try:
+            batch.append(artifact_record(str(path)))
+        except OSError:
+            continue
+        if len(batch) >= batch_size:
+            store.upsert_many([record_from_info(None, artifacts=batch)])
+            total += len(batch)
+            batch = []
+    if batch:
+        store.upsert_many([record_from_info(None, artifacts=batch)])
+        total += len(batch)
+    return total
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild the download artifact index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("reindex", help="index every artifact under the download root")
+    rebuild.add_argument("--root", default="downloads")
+    rebuild.add_argument("--db-url", default=METADATA_DB_URL)
+    args = parser.parse_args(argv)
+
+    if not args.db_url:
+        logger.error("METADATA_DB_URL is not configured")
+        return 1
+    store = MetadataStore(args.db_url)
+    try:
+        indexed = reindex(StorageLayout(args.root), store)
+    finally:
+        store.close()
+    logger.info(f"Indexed {indexed} artifacts under {args.root}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,215 @@
+"""ASR音频流式供给
+
+不落盘下载完整文件：解析出最小的可用音频流地址，由ffmpeg边拉流边解码为
+16kHz单声道PCM，按固定时长切块，每块就绪后立即发布到Redis Stream，
+ASR服务可以在下载结束前开始识别。
+
+流键为 ``asr:chunks:<task_id>``，每条消息字段：
+
+- ``seq``          块序号（从0开始）
+- ``start`` / ``duration``  块在音频中的起止时间（秒）
+- ``format``       ``pcm``（s16le）或 ``flac``
+- ``sample_rate``  采样率
+- ``data``         音频数据
+
+最后一条消息带 ``eof=1`` 及汇总信息；下载失败时为 ``eof=1`` 加 ``error``。
+
+30秒的PCM块约940KB，流在Redis中最多保留 ASR_STREAM_MAXLEN 条，内存占用约为
+块大小×MAXLEN；默认发布FLAC（语音约为PCM的一半）并只保留最近约2小时的音频。
+"""
+
+import os
+import subprocess
+import time
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from loguru import logger
+
+from .live_recording import drain_stderr
+from .redis_client import get_redis
+
+# ASR供给配置
+ASR_SAMPLE_RATE = int(os.getenv("ASR_SAMPLE_RATE", "16000"))
+ASR_CHUNK_SECONDS = float(os.getenv("ASR_CHUNK_SECONDS", "30"))
+ASR_CHUNK_FORMAT = os.getenv("ASR_CHUNK_FORMAT", "flac")
+# 码率不低于ASR_MIN_ABR的音频流中最小的一个；没有码率信息时退回最差/最好音频
+ASR_MIN_ABR = int(os.getenv("ASR_MIN_ABR", "32"))
+ASR_AUDIO_SELECTOR = os.getenv(
+    "ASR_AUDIO_SELECTOR", f"wa[abr>={ASR_MIN_ABR}]/wa/ba/w"
+)
+ASR_STREAM_PREFIX = os.getenv("ASR_STREAM_PREFIX", "asr:chunks:")
+ASR_STREAM_TTL = int(os.getenv("ASR_STREAM_TTL", "3600"))
+ASR_STREAM_MAXLEN = int(os.getenv("ASR_STREAM_MAXLEN", "240"))
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+
+CHUNK_FORMATS = ("pcm", "flac")
+BYTES_PER_SAMPLE = 2  # s16le 单声道
+
+
+class AudioChunk(NamedTuple):
+    """一个音频块"""
+
+    seq: int
+    start: float
+    duration: float
+    data: bytes
+
+
+def stream_key(task_id: str) -> str:
+    return f"{ASR_STREAM_PREFIX}{task_id}"
+
+
+def decode_command(stream: Dict[str, Any], sample_rate: int = ASR_SAMPLE_RATE) -> List[str]:
+    """ffmpeg拉流并解码为原始PCM输出到stdout"""
+    args = [FFMPEG_BIN, "-hide_banner", "-nostdin", "-loglevel", "error"]
+    headers = stream.get("http_headers") or {}
+    if stream["url"].startswith("http"):
+        if headers:
+            args += ["-headers", "".join(f"{k}: {v}\r\n" for k, v in headers.items())]
+        if stream.get("proxy"):
+            # 直连地址与解析时的出口绑定，拉流走同一个代理
+            args += ["-http_proxy", stream["proxy"]]
+        if stream.get("protocol") in (None, "http", "https"):
+            # progressive直连断流时自动重连
+            args += ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5"]
+    args += [
+        "-i", stream["url"],
+        "-vn", "-sn", "-dn",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "-f", "s16le",
+        "pipe:1",
+    ]
+    return args
+
+
+def encode_flac(pcm: bytes, sample_rate: int = ASR_SAMPLE_RATE) -> bytes:
+    """把一个PCM块编码为FLAC"""
+    proc = subprocess.run(
+        [
+            FFMPEG_BIN, "-hide_banner", "-nostdin", "-loglevel", "error",
+            "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-i", "pipe:0",
+            "-f", "flac", "pipe:1",
+        ],
+        input=pcm,
+        capture_output=True,
+        timeout=60,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"FLAC encoding failed: {proc.stderr.decode(errors='replace')[-500:]}")
+    return proc.stdout
+
+
+def _read_exactly(pipe, size: int) -> bytes:
+    """从管道读满size字节，EOF时返回已读到的部分"""
+    buffer = bytearray()
+    while len(buffer) < size:
+        data = pipe.read(size - len(buffer))
+        if not data:
+            break
+        buffer += data
+    return bytes(buffer)
+
+
+def iter_chunks(
+    stream: Dict[str, Any],
+    chunk_seconds: float = ASR_CHUNK_SECONDS,
+    sample_rate: int = ASR_SAMPLE_RATE,
+) -> Iterator[AudioChunk]:
+    """启动ffmpeg并按时长切出PCM块，读满一块即产出"""
+    chunk_bytes = int(chunk_seconds * sample_rate) * BYTES_PER_SAMPLE
+    bytes_per_second = sample_rate * BYTES_PER_SAMPLE
+    proc = subprocess.Popen(
+        decode_command(stream, sample_rate), stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    # 拉流期间的警告和重连日志会写满stderr管道阻塞ffmpeg，与stdout并行读取
+    drain, stderr_tail = drain_stderr(proc)
+    seq = 0
+    offset = 0
+    try:
+        while True:
+            data = _read_exactly(proc.stdout, chunk_bytes)
+            # 保证样本边界
+            data = data[: len(data) - len(data) % BYTES_PER_SAMPLE]
+            if not data:
+                break
+            yield AudioChunk(seq, offset / bytes_per_second, len(data) / bytes_per_second, data)
+            seq += 1
+            offset += len(data)
+        returncode = proc.wait()
+        drain.join(timeout=5)
+        if returncode != 0:
+            stderr = b"".join(stderr_tail).decode(errors="replace").strip()[-500:]
+            raise RuntimeError(f"ffmpeg exited with {returncode}: {stderr}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
+class RedisStreamPublisher:
+    """把音频块发布到Redis Stream"""
+
+    def __init__(self, key: str, redis_factory=get_redis, maxlen: int = ASR_STREAM_MAXLEN):
+        self.key = key
+        self._redis = redis_factory()
+        self.maxlen = maxlen
+
+    def publish(self, fields: Dict[str, Any]) -> None:
+        self._redis.xadd(self.key, fields, maxlen=self.maxlen, approximate=True)
+        self._redis.expire(self.key, ASR_STREAM_TTL)
+
+
+def run_feed(
+    stream: Dict[str, Any],
+    publisher: RedisStreamPublisher,
+    chunk_seconds: float = ASR_CHUNK_SECONDS,
+    chunk_format: str = ASR_CHUNK_FORMAT,
+    sample_rate: int = ASR_SAMPLE_RATE,
+    on_chunk: Optional[Callable[[AudioChunk], None]] = None,
+) -> Dict[str, Any]:
+    """拉流解码并逐块发布，返回汇总"""
+    if chunk_format not in CHUNK_FORMATS:
+        raise ValueError(f"Unsupported chunk format: {chunk_format}")
+
+    started = time.perf_counter()
+    first_chunk_latency = None
+    chunks = 0
+    audio_seconds = 0.0
+    published_bytes = 0
+    try:
+        for chunk in iter_chunks(stream, chunk_seconds, sample_rate):
+            data = chunk.data if chunk_format == "pcm" else encode_flac(chunk.data, sample_rate)
+            publisher.publish(
+                {
+                    "seq": chunk.seq,
+                    "start": round(chunk.start, 3),
+                    "duration": round(chunk.duration, 3),
+                    "format": chunk_format,
+                    "sample_rate": sample_rate,
+                    "data": data,
+                }
+            )
+            if first_chunk_latency is None:
+                first_chunk_latency = time.perf_counter() - started
+            chunks += 1
+            audio_seconds = chunk.start + chunk.duration
+            published_bytes += len(data)
+            if on_chunk is not None:
+                on_chunk(chunk)
+    except Exception as e:
+        logger.error(f"ASR feed for {stream.get('id')} failed after {chunks} chunks: {str(e)}")
+        publisher.publish({"eof": 1, "chunks": chunks, "error": str(e)})
+        raise
+
+    summary = {
+        "chunks": chunks,
+        "audio_seconds": round(audio_seconds, 3),
+        "published_bytes": published_bytes,
+        "format": chunk_format,
+        "sample_rate": sample_rate,
+        "first_chunk_seconds": round(first_chunk_latency, 3) if first_chunk_latency else None,
+        "wall_seconds": round(time.perf_counter() - started, 3),
+    }
+    publisher.publish({"eof": 1, "chunks": chunks, "audio_seconds": summary["audio_seconds"]})
+    return summary
@@ -0,0 +1,254 @@
+"""下载带宽管理
+
+每个节点（BANDWIDTH_NODE，默认主机名）一个总带宽上限，每个任务一个单任务上限，0为不限制。
+同一节点上正在下载的任务登记在Redis哈希 ``bandwidth:<节点>`` 中，各任务在进度回调里每
+BANDWIDTH_REBALANCE_SECONDS 秒重新计算一次自己的份额，并直接修改 yt-dlp 的 ``ratelimit`` 参数
+（下载器每个数据块都会读取该参数），任务开始和结束后几秒内各任务的份额就会随之调整。
+
+份额按max-min公平分配（注水法）：实际速度明显低于分到份额的任务（受源站或网络限制）只按
+实际速度加余量占用，剩余带宽平分给其他任务，大文件不会挤占小任务，空闲份额也不会浪费。
+
+BANDWIDTH_OFFPEAK_HOURS（如 ``22-06``，本地时间）内改用 BANDWIDTH_OFFPEAK_* 上限，夜间可以放宽。
+Redis不可用时只按单任务上限限速（fail open）。
+"""
+
+import json
+import os
+import socket
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import redis
+from loguru import logger
+
+from .redis_client import get_redis
+
+# 带宽配置（Mbit/s，0为不限制）
+BANDWIDTH_NODE_LIMIT_MBPS = float(os.getenv("BANDWIDTH_NODE_LIMIT_MBPS", "0"))
+BANDWIDTH_TASK_LIMIT_MBPS = float(os.getenv("BANDWIDTH_TASK_LIMIT_MBPS", "0"))
+# 夜间时段及其上限，时段留空则不启用
+BANDWIDTH_OFFPEAK_HOURS = os.getenv("BANDWIDTH_OFFPEAK_HOURS", "")
+BANDWIDTH_OFFPEAK_NODE_LIMIT_MBPS = float(os.getenv("BANDWIDTH_OFFPEAK_NODE_LIMIT_MBPS", "0"))
+BANDWIDTH_OFFPEAK_TASK_LIMIT_MBPS = float(os.getenv("BANDWIDTH_OFFPEAK_TASK_LIMIT_MBPS", "0"))
+BANDWIDTH_NODE = os.getenv("BANDWIDTH_NODE", "") or socket.gethostname()
+BANDWIDTH_KEY_PREFIX = os.getenv("BANDWIDTH_KEY_PREFIX", "bandwidth:")
+BANDWIDTH_REBALANCE_SECONDS = float(os.getenv("BANDWIDTH_REBALANCE_SECONDS", "2"))
+# 超过该时间未刷新的登记视为已退出的任务
+BANDWIDTH_STALE_SECONDS = float(os.getenv("BANDWIDTH_STALE_SECONDS", "30"))
+
+# 实际速度低于份额的该比例时，认为任务不受限速约束
+UNDERUSE_RATIO = 0.8
+# 不受限速约束的任务按实际速度加这部分余量占用带宽，便于其提速
+DEMAND_HEADROOM = 1.25
+
+
+def mbps_to_bytes(mbps: float) -> Optional[float]:
+    """Mbit/s 转为 yt-dlp 使用的字节/秒，0或负数表示不限制"""
+    return mbps * 1_000_000 / 8 if mbps > 0 else None
+
+
+def in_hours(spec: str, hour: int) -> bool:
+    """hour 是否落在 ``起-止`` 时段内（止不含，可跨午夜，如 22-06）"""
+    if not spec:
+        return False
+    start, _, end = spec.partition("-")
+    start_hour, end_hour = int(start), int(end)
+    if start_hour <= end_hour:
+        return start_hour <= hour < end_hour
+    return hour >= start_hour or hour < end_hour
+
+
+def current_limits(now: Optional[datetime] = None) -> Tuple[Optional[float], Optional[float]]:
+    """当前时段的 (节点上限, 单任务上限)，单位字节/秒，None为不限制"""
+    now = now or datetime.now()
+    if in_hours(BANDWIDTH_OFFPEAK_HOURS, now.hour):
+        return mbps_to_bytes(BANDWIDTH_OFFPEAK_NODE_LIMIT_MBPS), mbps_to_bytes(BANDWIDTH_OFFPEAK_TASK_LIMIT_MBPS)
+    return mbps_to_bytes(BANDWIDTH_NODE_LIMIT_MBPS), mbps_to_bytes(BANDWIDTH_TASK_LIMIT_MBPS)
+
+
+def allocate(
+    capacity: Optional[float], demands: Dict[str, Optional[float]], task_cap: Optional[float] = None
+) -> Dict[str, Optional[float]]:
+    """max-min公平分配
+
+    demands 为 {任务ID: 需求字节/秒}，None表示能用多少用多少；每个任务的份额不超过 task_cap。
+    """
+    if capacity is None:
+        return {task_id: task_cap for task_id in demands}
+
+    def _need(task_id: str) -> float:
+        demand = demands[task_id]
+        limits = [value for value in (demand, task_cap) if value is not None]
+        return min(limits) if limits else float("inf")
+
+    shares: Dict[str, Optional[float]] = {}
+    remaining = float(capacity)
+    pending = sorted(demands, key=_need)
+    while pending:
+        fair = remaining / len(pending)
+        task_id = pending[0]
+        need = _need(task_id)
+        if need <= fair:
+            # 需求小于平均份额的任务先满足，余下的再平分
+            shares[task_id] = need
+            remaining -= need
+            pending.pop(0)
+        else:
+            for other in pending:
+                shares[other] = fair
+            return shares
+
+    # 全部任务都受需求限制时，余下的带宽仍平分出去，任务可以继续提速
+    if shares and remaining > 0:
+        bonus = remaining / len(shares)
+        for task_id, share in shares.items():
+            shares[task_id] = min(share + bonus, task_cap) if task_cap is not None else share + bonus
+    return shares
+
+
+class BandwidthPool:
+    """Redis中登记的节点活动下载：{任务ID: {"demand": 字节/秒或null, "ts": 刷新时间}}"""
+
+    def __init__(
+        self,
+        node: str = BANDWIDTH_NODE,
+        redis_factory=get_redis,
+        prefix: str = BANDWIDTH_KEY_PREFIX,
+        stale_seconds: float = BANDWIDTH_STALE_SECONDS,
+    ):
+        self.key = f"{prefix}{node}"
+        self._redis_factory = redis_factory
+        self.stale_seconds = stale_seconds
+
+    def update(self, task_id: str, demand: Optional[float], now: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """刷新本任务的登记并返回节点上全部活动任务的需求，同时清理过期登记"""
+        now = time.time() if now is None else now
+        client = self._redis_factory()
+        pipe = client.pipeline(transaction=False)
+        pipe.hset(self.key, task_id, json.dumps({"demand": demand, "ts": now}))
+        pipe.expire(self.key, int(self.stale_seconds * 4))
+        pipe.hgetall(self.key)
+        entries = pipe.execute()[-1]
+
+        demands: Dict[str, Optional[float]] = {}
+        stale = []
+        for field, raw in entries.items():
+            name = field.decode("utf-8") if isinstance(field, bytes) else field
+            entry = json.loads(raw)
+            if now - entry["ts"] > self.stale_seconds:
+                stale.append(name)
+            else:
+                demands[name] = entry["demand"]
+        if stale:
+            client.hdel(self.key, *stale)
+        return demands
+
+    def remove(self, task_id: str) -> None:
+        self._redis_factory().hdel(self.key, task_id)
+
+
+class TaskShaper:
+    """单个下载任务的限速
+
+    attach(params) 在创建 YoutubeDL 后调用，保存 ydl.params 的引用并设置初始限速；
+    progress_hook 定期上报实际速度、重新计算份额并更新 ``ratelimit``；release 在任务结束时注销。
+    并行下载分离的音视频流时共用同一份 params，由 set_streams 让各路流平分本任务的份额。
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        pool: Optional[BandwidthPool] = None,
+        interval: float = BANDWIDTH_REBALANCE_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.task_id = task_id
+        self.pool = pool
+        self.interval = interval
+        self._clock = clock
+        self.share: Optional[float] = None
+        self.streams = 1
+        self.speed = 0.0
+        self._params: Optional[Dict[str, Any]] = None
+        self._next_at = 0.0
+        self._pool_failed = False
+
+    def attach(self, params: Dict[str, Any]) -> None:
+        self._params = params
+        self.rebalance()
+
+    def set_streams(self, streams: int) -> None:
+        """同时传输的流数变化时立即按新流数下发限速"""
+        self.streams = max(streams, 1)
+        self._apply()
+
+    def _demand(self) -> Optional[float]:
+        """实际速度明显低于份额时按实际速度加余量，否则视为能用多少用多少"""
+        if self.share is None or not self.speed:
+            return None
+        if self.speed < self.share * UNDERUSE_RATIO:
+            return self.speed * DEMAND_HEADROOM
+        return None
+
+    def _apply(self) -> None:
+        if self._params is not None:
+            self._params["ratelimit"] = int(self.share / self.streams) if self.share is not None else None
+
+    def rebalance(self, now: Optional[float] = None) -> Optional[float]:
+        """重新计算本任务的份额并写入 ratelimit"""
+        now = self._clock() if now is None else now
+        self._next_at = now + self.interval
+        node_cap, task_cap = current_limits()
+        share = task_cap
+        if node_cap is not None and self.pool is not None:
+            try:
+                demands = self.pool.update(self.task_id, self._demand())
+                share = allocate(node_cap, demands, task_cap).get(self.task_id, task_cap)
+                self._pool_failed = False
+            except redis.RedisError as e:
+                if not self._pool_failed:
+                    logger.warning(f"Bandwidth pool unavailable, using per-task limit only: {str(e)}")
+                self._pool_failed = True
+        if share != self.share:
+            logger.debug(f"Task {self.task_id}: bandwidth share {share} B/s")
+        self.share = share
+        self._apply()
+        return share
+
+    def progress_hook(self, d: Dict[str, Any]) -> None:
+        if self._params is None or d.get("status") != "downloading":
+            return
+        if d.get("speed"):
+            self.speed = d["speed"]
+        now = self._clock()
+        if now >= self._next_at:
+            self.rebalance(now)
+
+    def release(self) -> None:
+        if self.pool is None:
+            return
+        try:
+            self.pool.remove(self.task_id)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to release bandwidth share for {self.task_id}: {str(e)}")
+
+
+def bandwidth_enabled() -> bool:
+    """是否配置了任何带宽上限"""
+    return any(
+        value > 0
+        for value in (
+            BANDWIDTH_NODE_LIMIT_MBPS,
+            BANDWIDTH_TASK_LIMIT_MBPS,
+            BANDWIDTH_OFFPEAK_NODE_LIMIT_MBPS if BANDWIDTH_OFFPEAK_HOURS else 0,
+            BANDWIDTH_OFFPEAK_TASK_LIMIT_MBPS if BANDWIDTH_OFFPEAK_HOURS else 0,
+        )
+    )
+
+
+def task_shaper(task_id: str) -> Optional[TaskShaper]:
+    """按配置创建任务的限速器，未配置任何上限时返回None"""
+    if not bandwidth_enabled():
+        return None
+    return TaskShaper(task_id, BandwidthPool())
@@ -0,0 +1,223 @@
+"""下载缓存的按容量LRU淘汰
+
+以视频为单位（同一视频的所有产物一起）管理下载目录：
+
+- 访问记录：/downloads 提供文件、下载任务完成（包括yt-dlp直接复用已有产物）时，
+  在Redis有序集合 CACHE_ACCESS_KEY 中记录 {视频ID: 最近访问时间}
+- 固定：进行中的任务在Redis中固定所涉及的视频，淘汰时跳过；固定带过期时间，
+  Worker异常退出不会永久占用
+- 水位：目录总大小超过 CACHE_MAX_GB × 高水位时，按最近访问时间从旧到新删除，
+  直到降到低水位；没有访问记录的视频按文件修改时间计
+
+淘汰任务由beat每 CACHE_EVICTION_INTERVAL 秒调度一次，空间未超过高水位时只做一次目录扫描。
+"""
+
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from loguru import logger
+
+from .redis_client import get_async_redis, get_redis
+from .storage_layout import StorageLayout, video_id_from_filename
+
+# 缓存淘汰配置
+CACHE_EVICTION_ENABLED = os.getenv("CACHE_EVICTION_ENABLED", "true").lower() == "true"
+CACHE_MAX_GB = float(os.getenv("CACHE_MAX_GB", "50"))
+CACHE_HIGH_WATERMARK = float(os.getenv("CACHE_HIGH_WATERMARK", "0.9"))
+CACHE_LOW_WATERMARK = float(os.getenv("CACHE_LOW_WATERMARK", "0.75"))
+CACHE_EVICTION_INTERVAL = float(os.getenv("CACHE_EVICTION_INTERVAL", "60"))
+CACHE_ACCESS_KEY = os.getenv("CACHE_ACCESS_KEY", "cache:access")
+CACHE_PINS_KEY = os.getenv("CACHE_PINS_KEY", "cache:pins")
+CACHE_PIN_TTL = int(os.getenv("CACHE_PIN_TTL", str(6 * 3600)))
+# 最近这段时间内有写入的视频不淘汰（覆盖固定之前、任务交接之间的窗口）
+CACHE_GRACE_SECONDS = int(os.getenv("CACHE_GRACE_SECONDS", "600"))
+# 同一进程内对同一视频的访问记录最多每隔这么久写一次Redis
+CACHE_TOUCH_INTERVAL = float(os.getenv("CACHE_TOUCH_INTERVAL", "60"))
+
+
+class CachedVideo(NamedTuple):
+    """下载目录中一个视频的全部产物"""
+
+    video_id: str
+    size: int
+    mtime: float
+    files: List[Path]
+
+
+def scan(layout: StorageLayout) -> Dict[str, CachedVideo]:
+    """按视频ID汇总下载目录（含临时文件，异常退出遗留的临时文件同样占用空间）"""
+    sizes: Dict[str, int] = {}
+    mtimes: Dict[str, float] = {}
+    files: Dict[str, List[Path]] = {}
+    for directory, _dirs, names in os.walk(layout.root):
+        for name in names:
+            path = Path(directory) / name
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            video_id = video_id_from_filename(name)
+            sizes[video_id] = sizes.get(video_id, 0) + stat.st_size
+            mtimes[video_id] = max(mtimes.get(video_id, 0.0), stat.st_mtime)
+            files.setdefault(video_id, []).append(path)
+    return {
+        video_id: CachedVideo(video_id, sizes[video_id], mtimes[video_id], files[video_id])
+        for video_id in files
+    }
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class CacheIndex:
+    """Redis中的访问时间与固定记录"""
+
+    def __init__(
+        self,
+        redis_factory=get_redis,
+        async_redis_factory=get_async_redis,
+        access_key: str = CACHE_ACCESS_KEY,
+        pins_key: str = CACHE_PINS_KEY,
+        touch_interval: float = CACHE_TOUCH_INTERVAL,
+    ):
+        self._redis_factory = redis_factory
+        self._async_redis_factory = async_redis_factory
+        self.access_key = access_key
+        self.pins_key = pins_key
+        self.touch_interval = touch_interval
+        self._last_touch: Dict[str, float] = {}
+
+    def _should_touch(self, video_id: str, now: float) -> bool:
+        if not video_id or now - self._last_touch.get(video_id, 0.0) < self.touch_interval:
+            return False
+        self._last_touch[video_id] = now
+        if len(self._last_touch) > 10000:
+            self._last_touch.clear()
+        return True
+
+    def touch(self, video_id: str) -> None:
+        """记录一次访问（失败只记日志）"""
+        now = time.time()
+        if not self._should_touch(video_id, now):
+            return
+        try:
+            self._redis_factory().zadd(self.access_key, {video_id: now})
+        except Exception as e:
+            logger.warning(f"Failed to record cache access for {video_id}: {str(e)}")
+
+    async def touch_async(self, video_id: str) -> None:
+        now = time.time()
+        if not self._should_touch(video_id, now):
+            return
+        try:
+            await self._async_redis_factory().zadd(self.access_key, {video_id: now})
+        except Exception as e:
+            logger.warning(f"Failed to record cache access for {video_id}: {str(e)}")
+
+    def last_access(self, video_ids: Iterable[str]) -> Dict[str, Optional[float]]:
+        ids = list(video_ids)
+        if not ids:
+            return {}
+        pipe = self._redis_factory().pipeline(transaction=False)
+        for video_id in ids:
+            pipe.zscore(self.access_key, video_id)
+        return dict(zip(ids, pipe.execute()))
+
+    def forget(self, video_id: str) -> None:
+        self._redis_factory().zrem(self.access_key, video_id)
+
+    def pin(self, video_id: str, owner: str, ttl: int = CACHE_PIN_TTL) -> None:
+        """进行中的任务固定视频，淘汰时跳过（失败只记日志，宽限期仍会保护刚写入的产物）"""
+        try:
+            self._redis_factory().zadd(self.pins_key, {f"{video_id}|{owner}": time.time() + ttl})
+        except Exception as e:
+            logger.warning(f"Failed to pin {video_id}: {str(e)}")
+
+    def unpin(self, video_id: str, owner: str) -> None:
+        try:
+            self._redis_factory().zrem(self.pins_key, f"{video_id}|{owner}")
+        except Exception as e:
+            logger.warning(f"Failed to unpin {video_id}: {str(e)}")
+
+    def pinned(self) -> Set[str]:
+        """当前被固定的视频ID（顺带清理过期的固定）"""
+        client = self._redis_factory()
+        now = time.time()
+        client.zremrangebyscore(self.pins_key, "-inf", now)
+        members = client.zrangebyscore(self.pins_key, now, "+inf")
+        return {_decode(member).split("|", 1)[0] for member in members}
+
+
+def _delete(layout: StorageLayout, video: CachedVideo) -> int:
+    freed = 0
+    for path in video.files:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+            freed += size
+        except FileNotFoundError:
+            continue
+    if layout.sharded:
+        layout.prune_empty_dirs(layout.video_dir(video.video_id))
+    return freed
+
+
+def evict(
+    layout: StorageLayout,
+    index: CacheIndex,
+    max_bytes: int,
+    high_watermark: float = CACHE_HIGH_WATERMARK,
+    low_watermark: float = CACHE_LOW_WATERMARK,
+    grace_seconds: int = CACHE_GRACE_SECONDS,
+) -> Dict[str, Any]:
+    """目录超过高水位时按最近访问时间淘汰到低水位"""
+    videos = scan(layout)
+    total = sum(video.size for video in videos.values())
+    summary = {
+        "total_bytes": total,
+        "max_bytes": max_bytes,
+        "evicted_videos": 0,
+        "freed_bytes": 0,
+        "skipped_pinned": 0,
+        "evicted_ids": [],
+    }
+    if total <= max_bytes * high_watermark:
+        return summary
+
+    target = max_bytes * low_watermark
+    now = time.time()
+    pinned = index.pinned()
+    accessed = index.last_access(videos)
+    candidates = sorted(
+        videos.values(),
+        key=lambda video: accessed.get(video.video_id) or video.mtime,
+    )
+
+    for video in candidates:
+        if total <= target:
+            break
+        if video.video_id in pinned or now - video.mtime < grace_seconds:
+            summary["skipped_pinned"] += 1
+            continue
+        # 扫描之后可能有新任务固定了该视频，删除前再确认一次
+        if video.video_id in index.pinned():
+            summary["skipped_pinned"] += 1
+            continue
+        freed = _delete(layout, video)
+        index.forget(video.video_id)
+        total -= freed
+        summary["evicted_videos"] += 1
+        summary["freed_bytes"] += freed
+        summary["evicted_ids"].append(video.video_id)
+        logger.info(f"Evicted {video.video_id} ({freed} bytes)")
+
+    summary["total_bytes"] = total
+    if total > target:
+        logger.warning(
+            f"Cache still above low watermark after eviction: {total} bytes, "
+            f"{summary['skipped_pinned']} videos pinned or recently written"
+        )
+    return summary
@@ -1,13 +1,23 @@
 from celery import Celery
+from celery.schedules import crontab
+from celery.signals import worker_init
 import os
 from kombu import Queue
 
+from .cache_eviction import CACHE_EVICTION_ENABLED, CACHE_EVICTION_INTERVAL
+from .channels import CHANNELS_ENABLED, CHANNEL_TICK_SECONDS
+from .metadata_store import METADATA_FLUSH_INTERVAL
+from .tracing import install_celery_signals
+from .worker_memory import WORKER_MAX_MEMORY_MB, WORKER_MAX_TASKS_PER_CHILD
+from .workflow import WORKFLOW_QUEUES
+
 # Redis配置
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
 # 创建Celery应用
+# 任务模块通过include在Worker启动时导入；API进程只按名称提交任务，不加载任务代码
 celery_app = Celery(
-    "app", broker=REDIS_URL, backend=REDIS_URL
+    "app", broker=REDIS_URL, backend=REDIS_URL, include=["app.tasks"]
 )
 
 # 检查是否为测试模式
@@ -43,6 +53,9 @@ else:
         "worker_pool": 'solo',
         "worker_prefetch_multiplier": 1,
         "task_acks_late": True,
+        # prefork pool 下由Celery回收子进程（solo pool 由 worker_memory 在任务之间回收）
+        "worker_max_tasks_per_child": WORKER_MAX_TASKS_PER_CHILD or None,
+        "worker_max_memory_per_child": WORKER_MAX_MEMORY_MB * 1024 or None,
     })
 
 celery_app.conf.update(config_dict)
@@ -54,7 +67,14 @@ if not (TESTING or CELERY_TASK_ALWAYS_EAGER):
         task_routes={
             'app.tasks.download_video_task': {'queue': 'download'},
             'app.tasks.get_video_info_task': {'queue': 'download'},
+            'app.tasks.asr_feed_task': {'queue': 'download'},
+            # 直播录制会持续到直播结束或达到时长上限，单独的队列由专用 Worker（-Q live）消费，避免阻塞点播下载
+            'app.tasks.live_record_task': {'queue': 'live'},
+            'app.tasks.transcode_task': {'queue': 'transcode'},
             'app.tasks.cleanup_task': {'queue': 'maintenance'},
+            'app.tasks.evict_cache_task': {'queue': 'maintenance'},
+            'app.tasks.flush_metadata_task': {'queue': 'maintenance'},
+            'app.tasks.poll_channels_task': {'queue': 'maintenance'},
             'app.tasks.health_check_task': {'queue': 'default'},
         },
         # 队列配置
@@ -70,19 +90,103 @@ if not (TESTING or CELERY_TASK_ALWAYS_EAGER):
                 'exchange_type': 'direct',
                 'routing_key': 'download'
             },
+            'live': {
+                'exchange': 'live',
+                'exchange_type': 'direct',
+                'routing_key': 'live'
+            },
+            'transcode': {
+                'exchange': 'transcode',
+                'exchange_type': 'direct',
+                'routing_key': 'transcode'
+            },
             'maintenance': {
                 'exchange': 'maintenance',
                 'exchange_type': 'direct',
                 'routing_key': 'maintenance'
-            }
+            },
+            # 流水线各阶段的队列（asr/translate/tts/upload等），阶段签名上指定
+            **{
+                queue: {'exchange': queue, 'exchange_type': 'direct', 'routing_key': queue}
+                for queue in WORKFLOW_QUEUES
+            },
         },
     )
 
-# 任务发现
-celery_app.autodiscover_tasks(["app"])
+# 提交时注入 traceparent、执行时创建任务span（未开启追踪时信号处理直接返回）
+install_celery_signals()
+
+
+# 定期任务配置
+celery_app.conf.beat_schedule = {
+    # 每5分钟进行健康检查
+    "health-check": {
+        "task": "app.tasks.health_check_task",
+        "schedule": crontab(minute="*/5"),
+    },
+    # 批量写入视频元数据
+    "flush-metadata": {
+        "task": "app.tasks.flush_metadata_task",
+        "schedule": METADATA_FLUSH_INTERVAL,
+    },
+}
+
+if CHANNELS_ENABLED:
+    # 抓取到期的订阅频道，各频道的实际间隔由抓取计划决定
+    celery_app.conf.beat_schedule["poll-channels"] = {
+        "task": "app.tasks.poll_channels_task",
+        "schedule": CHANNEL_TICK_SECONDS,
+    }
+
+if CACHE_EVICTION_ENABLED:
+    # 按容量和最近访问时间持续淘汰下载缓存
+    celery_app.conf.beat_schedule["evict-cache"] = {
+        "task": "app.tasks.evict_cache_task",
+        "schedule": CACHE_EVICTION_INTERVAL,
+    }
+else:
+    # 每天凌晨2点清理旧文件
+    celery_app.conf.beat_schedule["cleanup-old-files"] = {
+        "task": "app.tasks.cleanup_task",
+        "schedule": crontab(hour="2", minute="0"),
+        "args": (24,),  # 清理24小时前的文件
+    }
+
+
+@worker_init.connect
+def configure_worker_logging(**kwargs):
+    """Worker启动时按 LOG_LEVEL / LOG_FORMAT 配置日志输出"""
+    from .logging_config import configure_logging
+
+    configure_logging()
+
+
+@worker_init.connect
+def configure_worker_tracing(**kwargs):
+    """Worker启动时按 TRACING_ENABLED / TRACING_EXPORTER 开启追踪导出
+
+    在主进程中创建导出器，prefork子进程继承后在首次导出时启动各自的发送线程。
+    """
+    from .tracing import configure
+
+    configure()
+
+
+@worker_init.connect
+def install_memory_accounting(**kwargs):
+    """Worker启动时开启逐任务内存记账和按上限回收"""
+    from .worker_memory import install
+
+    install()
+
+
+@worker_init.connect
+def start_metrics_exporter(**kwargs):
+    """Worker启动时开启Prometheus指标导出端口"""
+    from .metrics import start_worker_exporter
+    from .tasks import downloader
 
-# 显式导入任务模块确保注册
-from . import tasks
+    start_worker_exporter(str(downloader.download_path))
 
 
 @celery_app.task(bind=True)
@@ -0,0 +1,326 @@
+"""频道订阅与增量抓取
+
+订阅保存在Redis：``CHANNEL_SUBS_KEY`` 哈希存每个频道的下载选项和抓取状态，
+``CHANNEL_DUE_KEY`` 有序集合按下次抓取时间排序。beat定期调度 poll_channels_task，
+每次只取出已到期的频道：
+
+- 优先读取频道的RSS（``/feeds/videos.xml``，一次请求返回最近15个视频，带ETag/Last-Modified，
+  未更新时服务端返回304）；RSS不可用时回退到yt-dlp的平铺列表（只列出视频ID，不解析每个视频）。
+- 与保存的游标（最新发布时间和最近见过的视频ID）比较，只为新视频提交下载任务。
+  首次抓取只记录游标，不下载已有视频（订阅时指定 backfill 除外）。
+- 抓取间隔随上传频率调整：发布间隔的指数加权平均除以 CHANNEL_POLLS_PER_UPLOAD，
+  长时间没有新视频时按 CHANNEL_IDLE_BACKOFF 倍逐步放宽，限制在最小/最大间隔之间。
+"""
+
+import json
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+from loguru import logger
+
+from .redis_client import get_redis
+
+# 频道订阅配置
+CHANNELS_ENABLED = os.getenv("CHANNELS_ENABLED", "true").lower() == "true"
+CHANNEL_SUBS_KEY = os.getenv("CHANNEL_SUBS_KEY", "channels:subs")
+CHANNEL_DUE_KEY = os.getenv("CHANNEL_DUE_KEY", "channels:due")
+CHANNEL_TICK_SECONDS = float(os.getenv("CHANNEL_TICK_SECONDS", "60"))
+CHANNEL_POLL_BATCH = int(os.getenv("CHANNEL_POLL_BATCH", "50"))
+CHANNEL_MIN_INTERVAL = float(os.getenv("CHANNEL_MIN_INTERVAL", "900"))
+CHANNEL_MAX_INTERVAL = float(os.getenv("CHANNEL_MAX_INTERVAL", "86400"))
+CHANNEL_DEFAULT_INTERVAL = float(os.getenv("CHANNEL_DEFAULT_INTERVAL", "3600"))
+CHANNEL_EWMA_ALPHA = float(os.getenv("CHANNEL_EWMA_ALPHA", "0.3"))
+CHANNEL_POLLS_PER_UPLOAD = float(os.getenv("CHANNEL_POLLS_PER_UPLOAD", "4"))
+CHANNEL_IDLE_BACKOFF = float(os.getenv("CHANNEL_IDLE_BACKOFF", "1.5"))
+CHANNEL_FEED_TIMEOUT = float(os.getenv("CHANNEL_FEED_TIMEOUT", "15"))
+# 单个频道抓取的互斥时长，防止上一轮未结束时重复抓取
+CHANNEL_LOCK_SECONDS = int(os.getenv("CHANNEL_LOCK_SECONDS", "300"))
+# 记住的最近视频ID数量（RSS只返回最近15个）
+CHANNEL_SEEN_LIMIT = 50
+CHANNEL_FLAT_LIMIT = 15
+
+# 抓取写回的字段，其余字段（下载选项等）以Redis中的最新值为准
+_POLL_FIELDS = (
+    "etag", "last_modified", "seen", "initialized", "last_published",
+    "gap_ewma", "interval", "last_polled", "next_poll",
+)
+
+FEED_URL = "https://www.youtube.com/feeds/videos.xml?channel_id={channel_id}"
+CHANNEL_ID_RE = re.compile(r"^UC[\w-]{22}$")
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+_YT = "{http://www.youtube.com/xml/schemas/2015}"
+
+
+class FeedEntry(NamedTuple):
+    video_id: str
+    published: Optional[float]
+    title: Optional[str] = None
+
+
+class FeedUnavailable(Exception):
+    """频道列表获取失败"""
+
+
+def parse_feed(content: bytes) -> List[FeedEntry]:
+    """解析频道RSS（Atom），按发布时间从新到旧返回"""
+    root = ET.fromstring(content)
+    entries = []
+    for entry in root.iter(f"{_ATOM}entry"):
+        video_id = entry.findtext(f"{_YT}videoId")
+        if not video_id:
+            continue
+        published = entry.findtext(f"{_ATOM}published")
+        entries.append(
+            FeedEntry(
+                video_id=video_id,
+                published=datetime.fromisoformat(published).timestamp() if published else None,
+                title=entry.findtext(f"{_ATOM}title"),
+            )
+        )
+    return entries
+
+
+def fetch_feed(
+    channel_id: str,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    client: Optional[httpx.Client] = None,
+) -> Tuple[Optional[List[FeedEntry]], Dict[str, Optional[str]]]:
+    """条件请求频道RSS；未更新时返回 (None, 校验头)"""
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    http = client or httpx.Client(timeout=CHANNEL_FEED_TIMEOUT, follow_redirects=True)
+    try:
+        response = http.get(FEED_URL.format(channel_id=channel_id), headers=headers)
+    except httpx.HTTPError as e:
+        raise FeedUnavailable(str(e)) from e
+    finally:
+        if client is None:
+            http.close()
+    validators = {"etag": response.headers.get("etag"), "last_modified": response.headers.get("last-modified")}
+    if response.status_code == 304:
+        return None, {"etag": etag, "last_modified": last_modified}
+    if response.status_code != 200:
+        raise FeedUnavailable(f"Feed returned HTTP {response.status_code}")
+    try:
+        return parse_feed(response.content), validators
+    except ET.ParseError as e:
+        raise FeedUnavailable(f"Malformed feed: {str(e)}") from e
+
+
+def list_uploads_flat(channel_id: str, limit: int = CHANNEL_FLAT_LIMIT) -> List[FeedEntry]:
+    """yt-dlp平铺列出频道最近上传（不解析单个视频，没有发布时间）"""
+    import yt_dlp
+
+    opts = {"quiet": True, "no_warnings": True, "extract_flat": True, "playlistend": limit}
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(f"https://www.youtube.com/channel/{channel_id}/videos", download=False)
+    return [
+        FeedEntry(video_id=entry["id"], published=None, title=entry.get("title"))
+        for entry in (info or {}).get("entries") or []
+        if entry and entry.get("id")
+    ]
+
+
+def next_interval(sub: Dict[str, Any], new_published: List[float], now: float) -> float:
+    """根据发布间隔的指数加权平均计算下次抓取间隔（同时推进 gap_ewma 和 last_published）"""
+    ewma = sub.get("gap_ewma")
+    last = sub.get("last_published")
+    for published in sorted(new_published):
+        if last is not None and published > last:
+            gap = published - last
+            ewma = gap if ewma is None else CHANNEL_EWMA_ALPHA * gap + (1 - CHANNEL_EWMA_ALPHA) * ewma
+        last = published if last is None else max(last, published)
+    sub["gap_ewma"] = ewma
+    sub["last_published"] = last
+
+    interval = ewma / CHANNEL_POLLS_PER_UPLOAD if ewma else CHANNEL_DEFAULT_INTERVAL
+    if not new_published and ewma and last is not None and now - last > ewma:
+        # 超过平均发布间隔仍没有新视频，逐步放宽
+        interval = max(interval, (sub.get("interval") or interval) * CHANNEL_IDLE_BACKOFF)
+    return min(max(interval, CHANNEL_MIN_INTERVAL), CHANNEL_MAX_INTERVAL)
+
+
+class ChannelRegistry:
+    """Redis中的频道订阅与抓取计划"""
+
+    def __init__(
+        self,
+        redis_factory: Callable = get_redis,
+        subs_key: str = CHANNEL_SUBS_KEY,
+        due_key: str = CHANNEL_DUE_KEY,
+    ):
+        self._redis_factory = redis_factory
+        self.subs_key = subs_key
+        self.due_key = due_key
+
+    def subscribe(
+        self, channel_id: str, options: Optional[Dict[str, Any]] = None, backfill: bool = False
+    ) -> Dict[str, Any]:
+        """订阅频道（已订阅时更新下载选项，保留抓取状态），并安排立即抓取"""
+        sub = self.get(channel_id) or {
+            "channel_id": channel_id,
+            "created_at": time.time(),
+            "last_published": None,
+            "seen": [],
+            "gap_ewma": None,
+            "interval": CHANNEL_DEFAULT_INTERVAL,
+            "etag": None,
+            "last_modified": None,
+            "initialized": backfill,
+        }
+        sub["options"] = options or {}
+        sub["next_poll"] = time.time()
+        self.save(sub)
+        return sub
+
+    def unsubscribe(self, channel_id: str) -> bool:
+        client = self._redis_factory()
+        pipe = client.pipeline(transaction=True)
+        pipe.hdel(self.subs_key, channel_id)
+        pipe.zrem(self.due_key, channel_id)
+        removed, _ = pipe.execute()
+        return bool(removed)
+
+    def get(self, channel_id: str) -> Optional[Dict[str, Any]]:
+        raw = self._redis_factory().hget(self.subs_key, channel_id)
+        return json.loads(raw) if raw else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        raw = self._redis_factory().hvals(self.subs_key)
+        return sorted((json.loads(value) for value in raw), key=lambda sub: sub["channel_id"])
+
+    def save(self, sub: Dict[str, Any]) -> None:
+        pipe = self._redis_factory().pipeline(transaction=True)
+        pipe.hset(self.subs_key, sub["channel_id"], json.dumps(sub))
+        pipe.zadd(self.due_key, {sub["channel_id"]: sub["next_poll"]})
+        pipe.execute()
+
+    def save_poll_state(self, sub: Dict[str, Any]) -> bool:
+        """抓取结束后写回游标和抓取计划；抓取期间已退订（或退订后重新订阅）时不写回，返回是否写入"""
+        saved = False
+
+        def _save(pipe) -> None:
+            nonlocal saved
+            raw = pipe.hget(self.subs_key, sub["channel_id"])
+            current = json.loads(raw) if raw else None
+            saved = current is not None and current.get("created_at") == sub.get("created_at")
+            if not saved:
+                return
+            current.update({field: sub.get(field) for field in _POLL_FIELDS})
+            pipe.multi()
+            pipe.hset(self.subs_key, sub["channel_id"], json.dumps(current))
+            pipe.zadd(self.due_key, {sub["channel_id"]: current["next_poll"]})
+
+        # 抓取可能持续数秒，WATCH订阅哈希，期间有订阅变更时基于最新值重做
+        self._redis_factory().transaction(_save, self.subs_key)
+        return saved
+
+    def due(self, now: float, limit: int = CHANNEL_POLL_BATCH) -> List[str]:
+        """已到抓取时间的频道（最早到期的优先）"""
+        ids = self._redis_factory().zrangebyscore(self.due_key, "-inf", now, start=0, num=limit)
+        return [i.decode("utf-8") if isinstance(i, bytes) else i for i in ids]
+
+    def lock(self, channel_id: str, ttl: int = CHANNEL_LOCK_SECONDS) -> bool:
+        return bool(self._redis_factory().set(f"{self.subs_key}:lock:{channel_id}", 1, nx=True, ex=ttl))
+
+    def unlock(self, channel_id: str) -> None:
+        self._redis_factory().delete(f"{self.subs_key}:lock:{channel_id}")
+
+
+def new_entries(sub: Dict[str, Any], entries: List[FeedEntry]) -> List[FeedEntry]:
+    """相对游标的新视频，按发布时间从旧到新"""
+    seen = set(sub.get("seen") or [])
+    last = sub.get("last_published")
+    fresh = [
+        entry for entry in entries
+        if entry.video_id not in seen and (entry.published is None or last is None or entry.published > last)
+    ]
+    return list(reversed(fresh))
+
+
+def poll_channel(
+    registry: ChannelRegistry,
+    channel_id: str,
+    submit: Callable[[str, Dict[str, Any]], Any],
+    now: Optional[float] = None,
+    fetch: Callable = fetch_feed,
+    fallback: Callable = list_uploads_flat,
+) -> Dict[str, Any]:
+    """抓取一个频道，为新视频调用 submit(视频URL, 下载选项)，更新游标和下次抓取时间"""
+    now = time.time() if now is None else now
+    sub = registry.get(channel_id)
+    if sub is None:
+        return {"channel_id": channel_id, "status": "unsubscribed", "new": 0}
+
+    status = "ok"
+    try:
+        entries, validators = fetch(channel_id, sub.get("etag"), sub.get("last_modified"))
+    except FeedUnavailable as e:
+        logger.warning(f"Feed unavailable for channel {channel_id}, using flat listing: {str(e)}")
+        try:
+            entries, validators = fallback(channel_id), {"etag": None, "last_modified": None}
+            status = "fallback"
+        except Exception as e:
+            logger.error(f"Failed to list channel {channel_id}: {str(e)}")
+            entries, validators, status = None, {}, "error"
+
+    fresh: List[FeedEntry] = []
+    if entries is None:
+        if status == "ok":
+            status = "not_modified"
+    else:
+        sub.update(validators)
+        fresh = new_entries(sub, entries)
+        if sub.get("initialized"):
+            for entry in fresh:
+                submit(f"https://www.youtube.com/watch?v={entry.video_id}", sub.get("options") or {})
+        sub["initialized"] = True
+        sub["seen"] = ([entry.video_id for entry in reversed(fresh)] + (sub.get("seen") or []))[:CHANNEL_SEEN_LIMIT]
+
+    published = [entry.published for entry in fresh if entry.published is not None]
+    if status != "error":
+        sub["interval"] = next_interval(sub, published, now)
+    sub["last_polled"] = now
+    sub["next_poll"] = now + sub["interval"]
+    if not registry.save_poll_state(sub):
+        return {"channel_id": channel_id, "status": "unsubscribed", "new": len(fresh)}
+    return {"channel_id": channel_id, "status": status, "new": len(fresh), "interval": sub["interval"]}
+
+
+def poll_due(
+    registry: ChannelRegistry,
+    submit: Callable[[str, Dict[str, Any]], Any],
+    now: Optional[float] = None,
+    limit: int = CHANNEL_POLL_BATCH,
+    **kwargs,
+) -> Dict[str, Any]:
+    """抓取所有已到期的频道"""
+    now = time.time() if now is None else now
+    summary = {"polled": 0, "not_modified": 0, "errors": 0, "new_videos": 0}
+    for channel_id in registry.due(now, limit):
+        if not registry.lock(channel_id):
+            continue
+        try:
+            result = poll_channel(registry, channel_id, submit, now=now, **kwargs)
+        except Exception as e:
+            # 单个频道出错不影响同批其余频道
+            logger.error(f"Failed to poll channel {channel_id}: {str(e)}")
+            summary["errors"] += 1
+            continue
+        finally:
+            registry.unlock(channel_id)
+        summary["polled"] += 1
+        summary["new_videos"] += result["new"]
+        summary["not_modified"] += result["status"] == "not_modified"
+        summary["errors"] += result["status"] == "error"
+    return summary
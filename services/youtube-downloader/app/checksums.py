@@ -0,0 +1,351 @@
+"""下载产物的校验和与清单
+
+下载过程中跟随正在写入的文件增量计算SHA-256（以及一个快速的非加密哈希：安装了xxhash时
+为xxh3_64，否则为CRC32），下载结束后无需重新读取多GB的文件。合并、转码等后处理替换过的
+文件以及字幕、缩略图等小文件在任务结束时补算。结果写入视频目录下的清单文件：
+
+    <id>.manifest.json = {"version": 1, "video_id": ..., "task_id": ..., "created_at": ...,
+                          "files": {"<文件名>": {"kind", "size", "mtime_ns", "sha256", "crc32"}}}
+
+/downloads 据此以SHA-256作为ETag。校验已存储的文件（并行、内存映射读取）：
+
+    python -m app.checksums verify --root downloads [--workers 4]
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+try:
+    import xxhash
+except ImportError:  # 可选依赖
+    xxhash = None
+
+# 校验和配置
+CHECKSUM_ENABLED = os.getenv("CHECKSUM_ENABLED", "true").lower() == "true"
+CHECKSUM_FAST_HASH = os.getenv("CHECKSUM_FAST_HASH", "xxh3" if xxhash else "crc32").lower()
+CHECKSUM_CHUNK_SIZE = int(os.getenv("CHECKSUM_CHUNK_SIZE", str(8 * 1024 * 1024)))
+CHECKSUM_POLL_INTERVAL = float(os.getenv("CHECKSUM_POLL_INTERVAL", "0.5"))
+CHECKSUM_VERIFY_WORKERS = int(os.getenv("CHECKSUM_VERIFY_WORKERS", str(os.cpu_count() or 1)))
+
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+
+
+class ChecksumError(Exception):
+    """校验和计算失败"""
+
+
+class Digest:
+    """SHA-256与可选快速哈希的增量计算"""
+
+    def __init__(self, fast_hash: str = CHECKSUM_FAST_HASH):
+        self._sha256 = hashlib.sha256()
+        self.fast_hash = fast_hash
+        if fast_hash == "xxh3":
+            if xxhash is None:
+                raise ChecksumError("xxh3 requires the xxhash package")
+            self._xxh3 = xxhash.xxh3_64()
+        elif fast_hash not in ("crc32", "", "none"):
+            raise ChecksumError(f"Unknown fast hash: {fast_hash}")
+        self._crc32 = 0
+        self.size = 0
+
+    def update(self, data) -> None:
+        self._sha256.update(data)
+        if self.fast_hash == "xxh3":
+            self._xxh3.update(data)
+        elif self.fast_hash == "crc32":
+            self._crc32 = zlib.crc32(data, self._crc32)
+        self.size += len(data)
+
+    def result(self) -> Dict[str, Any]:
+        digests: Dict[str, Any] = {"size": self.size, "sha256": self._sha256.hexdigest()}
+        if self.fast_hash == "xxh3":
+            digests["xxh3"] = self._xxh3.hexdigest()
+        elif self.fast_hash == "crc32":
+            digests["crc32"] = f"{self._crc32:08x}"
+        return digests
+
+
+def hash_file(path: str, chunk_size: int = CHECKSUM_CHUNK_SIZE, fast_hash: str = CHECKSUM_FAST_HASH) -> Dict[str, Any]:
+    """内存映射读取整个文件计算校验和"""
+    digest = Digest(fast_hash)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return digest.result()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, len(view), chunk_size):
+                    digest.update(view[offset : offset + chunk_size])
+            finally:
+                view.release()
+    return digest.result()
+
+
+class StreamingHasher:
+    """跟随文件增长增量计算校验和
+
+    后台线程读取新写入的数据；调用 finish() 后读到文件末尾并返回结果。
+    文件被截断（下载从头重来）时放弃，由调用方在下载完成后整体计算。
+    """
+
+    def __init__(
+        self,
+        poll_interval: float = CHECKSUM_POLL_INTERVAL,
+        chunk_size: int = CHECKSUM_CHUNK_SIZE,
+        fast_hash: str = CHECKSUM_FAST_HASH,
+    ):
+        self.poll_interval = poll_interval
+        self.chunk_size = chunk_size
+        self.digest = Digest(fast_hash)
+        self.source_inode: Optional[int] = None
+        self._finished = threading.Event()
+        self._aborted = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+
+    def start(self, path: str) -> "StreamingHasher":
+        self.source_inode = os.stat(path).st_ino
+        self._thread = threading.Thread(
+            target=self._run, args=(path,), name=f"checksum-{Path(path).name}", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _run(self, path: str) -> None:
+        offset = 0
+        try:
+            with open(path, "rb") as f:
+                while not self._aborted.is_set():
+                    finished = self._finished.is_set()
+                    size = os.fstat(f.fileno()).st_size
+                    if size < offset:
+                        raise ChecksumError(f"{path} was truncated while hashing")
+                    if size > offset:
+                        data = f.read(min(size - offset, self.chunk_size))
+                        self.digest.update(data)
+                        offset += len(data)
+                        continue
+                    if finished:
+                        break
+                    time.sleep(self.poll_interval)
+        except BaseException as e:  # 在finish()中统一抛出
+            self._error = e
+
+    def mark_finished(self) -> None:
+        self._finished.set()
+
+    def matches(self, path: str) -> bool:
+        """计算的内容是否就是 path 的当前内容"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_ino == self.source_inode and stat.st_size == self.digest.size
+
+    def finish(self) -> Dict[str, Any]:
+        self._finished.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.digest.result()
+
+    def abort(self) -> None:
+        self._aborted.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+
+class ChecksumTracker:
+    """下载任务的校验和计算
+
+    作为yt-dlp进度回调接入时，对无需合并的单文件下载边下边算；
+    checksum_artifacts() 补算其余产物并返回 {文件名: 校验和}。
+    """
+
+    def __init__(self):
+        self._streaming: Dict[str, StreamingHasher] = {}
+
+    def progress_hook(self, d: Dict[str, Any]) -> None:
+        if d.get("status") == "finished" and d.get("filename") in self._streaming:
+            self._streaming[d["filename"]].mark_finished()
+            return
+        if d.get("status") != "downloading":
+            return
+        info = d.get("info_dict") or {}
+        filename = d.get("filename")
+        tmpfilename = d.get("tmpfilename")
+        # 需要合并的多流下载，最终文件在合并后才产生
+        if not filename or not tmpfilename or info.get("requested_formats"):
+            return
+        if filename in self._streaming or not os.path.exists(tmpfilename):
+            return
+        try:
+            self._streaming[filename] = StreamingHasher().start(tmpfilename)
+        except Exception as e:
+            logger.warning(f"Streaming checksum for {filename} not started: {str(e)}")
+
+    def _checksum_one(self, path: str) -> Dict[str, Any]:
+        streaming = self._streaming.pop(path, None)
+        if streaming is not None:
+            try:
+                digests = streaming.finish()
+                if streaming.matches(path):
+                    return digests
+                logger.info(f"{path} changed after streaming checksum, hashing again")
+            except Exception as e:
+                logger.warning(f"Streaming checksum of {path} failed, hashing whole file: {str(e)}")
+        return hash_file(path)
+
+    def checksum_artifacts(self, paths: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """计算全部产物的校验和
+
+        paths 为 {产物类型: 路径}，值也可以是 {语言: 路径}（字幕）；返回 {文件名: 校验和与类型}。
+        """
+        checksums: Dict[str, Dict[str, Any]] = {}
+
+        def _walk(tree: Dict[str, Any], kind_prefix: str = "") -> None:
+            for kind, path in tree.items():
+                if isinstance(path, dict):
+                    _walk(path, f"{kind_prefix}{kind}.")
+                elif path and os.path.exists(path):
+                    entry = {"kind": f"{kind_prefix}{kind}", **self._checksum_one(path)}
+                    entry["mtime_ns"] = os.stat(path).st_mtime_ns
+                    checksums[Path(path).name] = entry
+
+        try:
+            _walk(paths)
+        finally:
+            self.close()
+        return checksums
+
+    def close(self) -> None:
+        for leftover in self._streaming.values():
+            leftover.abort()
+        self._streaming.clear()
+
+
+def manifest_path(directory: Path, video_id: str) -> Path:
+    return Path(directory) / f"{video_id}{MANIFEST_SUFFIX}"
+
+
+def write_manifest(path: Path, video_id: str, task_id: str, files: Dict[str, Dict[str, Any]]) -> str:
+    """写入（合并）清单文件，已有条目按文件名覆盖"""
+    path = Path(path)
+    existing = load_manifest(str(path)) if path.exists() else {}
+    document = {
+        "version": MANIFEST_VERSION,
+        "video_id": video_id,
+        "task_id": task_id,
+        "created_at": time.time(),
+        "files": dict(existing.get("files") or {}, **files),
+    }
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return str(path)
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=1024)
+def _cached_manifest(path: str, mtime_ns: int) -> Dict[str, Any]:
+    return load_manifest(path)
+
+
+def lookup_entry(path: Path, stat: os.stat_result) -> Optional[Dict[str, Any]]:
+    """文件对应的清单条目；文件在记录之后被修改过时返回None"""
+    path = Path(path)
+    manifest = manifest_path(path.parent, path.name.split(".", 1)[0])
+    try:
+        document = _cached_manifest(str(manifest), manifest.stat().st_mtime_ns)
+    except (OSError, ValueError):
+        return None
+    entry = (document.get("files") or {}).get(path.name)
+    if not entry or entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return entry
+
+
+def verify_file(path: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+    """按清单条目校验单个文件"""
+    result = {"path": path, "ok": False}
+    try:
+        # 只校验SHA-256，快速哈希用于去重等场景
+        actual = hash_file(path, fast_hash="")
+    except FileNotFoundError:
+        return dict(result, error="missing")
+    if actual["size"] != entry.get("size"):
+        return dict(result, error=f"size {actual['size']} != {entry.get('size')}")
+    if actual["sha256"] != entry.get("sha256"):
+        return dict(result, error="sha256 mismatch")
+    return dict(result, ok=True, size=actual["size"])
+
+
+def verify_tree(root: str, workers: int = CHECKSUM_VERIFY_WORKERS) -> Dict[str, Any]:
+    """并行校验根目录下所有清单记录的文件"""
+    jobs = []
+    for directory, _dirs, names in os.walk(root):
+        for name in names:
+            if not name.endswith(MANIFEST_SUFFIX):
+                continue
+            try:
+                document = load_manifest(os.path.join(directory, name))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Unreadable manifest {name}: {str(e)}")
+                continue
+            for filename, entry in (document.get("files") or {}).items():
+                jobs.append((os.path.join(directory, filename), entry))
+
+    started = time.perf_counter()
+    # hashlib在计算大块数据时释放GIL，线程可以并行
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        results: List[Dict[str, Any]] = list(executor.map(lambda job: verify_file(*job), jobs))
+    failures = [r for r in results if not r["ok"]]
+    return {
+        "files": len(results),
+        "bytes": sum(r.get("size", 0) for r in results),
+        "failures": failures,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="下载产物校验工具")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    verify = subcommands.add_parser("verify", help="按清单校验已存储的文件")
+    verify.add_argument("--root", default=os.getenv("DOWNLOAD_PATH", "downloads"))
+    verify.add_argument("--workers", type=int, default=CHECKSUM_VERIFY_WORKERS)
+    args = parser.parse_args(argv)
+
+    summary = verify_tree(args.root, args.workers)
+    for failure in summary["failures"]:
+        logger.error(f"{failure['path']}: {failure['error']}")
+    logger.info(
+        f"Verified {summary['files']} files ({summary['bytes']} bytes) in {summary['seconds']}s, "
+        f"{len(summary['failures'])} failed"
+    )
+    return 1 if summary["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""下载前的磁盘空间预留
+
+Worker在开始传输前按提取到的 filesize / filesize_approx（加安全余量）预留空间，
+所有Worker共享Redis中记录的预留总量：
+
+    可用容量 = 磁盘剩余空间 - DISK_MIN_FREE_MB
+    未兑现预留 = Σ(各任务预留 - 已写入)
+
+新任务的预留放不进可用容量时抛出 InsufficientDiskSpace，由任务延后重试，而不是开始下载后
+因ENOSPC失败。下载过程中按已写入字节逐步扣减预留（剩余空间已经反映了这部分），任务结束时释放。
+Worker异常退出遗留的预留在 DISK_RESERVATION_TTL 后过期。Redis不可用时放行（fail open）。
+"""
+
+import os
+import shutil
+import time
+from typing import Any, Dict, Optional
+
+import redis
+from loguru import logger
+
+from .redis_client import get_redis
+
+# 磁盘预留配置
+DISK_BUDGET_ENABLED = os.getenv("DISK_BUDGET_ENABLED", "true").lower() == "true"
+DISK_BUDGET_KEY = os.getenv("DISK_BUDGET_KEY", "disk:reservations")
+DISK_MIN_FREE_MB = int(os.getenv("DISK_MIN_FREE_MB", "1024"))
+# 安全余量：按比例，且不少于 DISK_RESERVE_MIN_MB
+DISK_RESERVE_MARGIN = float(os.getenv("DISK_RESERVE_MARGIN", "0.1"))
+DISK_RESERVE_MIN_MB = int(os.getenv("DISK_RESERVE_MIN_MB", "50"))
+# 提取信息中没有大小也无法按码率估算时使用的默认值
+DISK_UNKNOWN_SIZE_MB = int(os.getenv("DISK_UNKNOWN_SIZE_MB", "500"))
+DISK_RESERVATION_TTL = int(os.getenv("DISK_RESERVATION_TTL", str(3 * 3600)))
+# 下载过程中每写入这么多字节同步一次预留扣减
+DISK_CONSUME_STEP_MB = int(os.getenv("DISK_CONSUME_STEP_MB", "64"))
+# 空间不足时任务延后的秒数与最多延后次数
+DISK_DEFER_COUNTDOWN = int(os.getenv("DISK_DEFER_COUNTDOWN", "120"))
+DISK_DEFER_MAX_RETRIES = int(os.getenv("DISK_DEFER_MAX_RETRIES", "30"))
+
+MB = 1024 * 1024
+
+
+class InsufficientDiskSpace(Exception):
+    """当前没有足够的磁盘空间开始下载"""
+
+
+def estimate_bytes(info: Dict[str, Any]) -> int:
+    """根据提取信息估算下载需要的磁盘空间（含余量）
+
+    分离流合并时中间文件与合并结果会同时存在，按两倍计算。
+    """
+    formats = info.get("requested_formats") or [info]
+    size = 0
+    for fmt in formats:
+        known = fmt.get("filesize") or fmt.get("filesize_approx")
+        if not known and fmt.get("tbr") and info.get("duration"):
+            # tbr单位为kbit/s
+            known = int(fmt["tbr"] * 1000 / 8 * info["duration"])
+        size += int(known or 0)
+    if size <= 0:
+        size = DISK_UNKNOWN_SIZE_MB * MB
+    if info.get("requested_formats"):
+        size *= 2
+    return size + max(int(size * DISK_RESERVE_MARGIN), DISK_RESERVE_MIN_MB * MB)
+
+
+class DiskBudget:
+    """Redis中共享的磁盘预留账本
+
+    哈希 DISK_BUDGET_KEY 记录 {任务ID: 未兑现字节}，<key>:deadlines 有序集合记录过期时间。
+    预留在WATCH事务中完成：清理过期项、求和、检查容量、写入，多个Worker并发时不会超额。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        redis_factory=get_redis,
+        key: str = DISK_BUDGET_KEY,
+        min_free_bytes: int = DISK_MIN_FREE_MB * MB,
+        ttl: int = DISK_RESERVATION_TTL,
+    ):
+        self.path = str(path)
+        self._redis_factory = redis_factory
+        self.key = key
+        self.deadlines_key = f"{key}:deadlines"
+        self.min_free_bytes = min_free_bytes
+        self.ttl = ttl
+
+    def capacity(self) -> int:
+        """可供新预留使用的字节数（未扣除已有预留）"""
+        return shutil.disk_usage(self.path).free - self.min_free_bytes
+
+    def reserved_bytes(self) -> int:
+        """当前未兑现的预留总量"""
+        values = self._redis_factory().hvals(self.key)
+        return sum(max(int(v), 0) for v in values)
+
+    def reserve(self, task_id: str, size: int) -> bool:
+        """尝试为任务预留 size 字节，放不下时返回False；同一任务重复预留时覆盖"""
+        client = self._redis_factory()
+        capacity = self.capacity()
+        granted = False
+
+        def _reserve(pipe):
+            nonlocal granted
+            now = time.time()
+            expired = pipe.zrangebyscore(self.deadlines_key, "-inf", now)
+            current = pipe.hgetall(self.key)
+            drop = {item.decode() if isinstance(item, bytes) else item for item in expired}
+            outstanding = 0
+            for field, value in current.items():
+                name = field.decode() if isinstance(field, bytes) else field
+                if name not in drop and name != task_id:
+                    outstanding += max(int(value), 0)
+
+            granted = outstanding + size <= capacity
+            pipe.multi()
+            if drop:
+                pipe.hdel(self.key, *drop)
+                pipe.zrem(self.deadlines_key, *drop)
+            if granted:
+                pipe.hset(self.key, task_id, size)
+                pipe.zadd(self.deadlines_key, {task_id: now + self.ttl})
+
+        client.transaction(_reserve, self.key, self.deadlines_key)
+        return granted
+
+    def consume(self, task_id: str, written: int) -> None:
+        """已写入磁盘的字节从预留中扣除"""
+        self._redis_factory().hincrby(self.key, task_id, -written)
+
+    def release(self, task_id: str) -> None:
+        client = self._redis_factory()
+        pipe = client.pipeline(transaction=False)
+        pipe.hdel(self.key, task_id)
+        pipe.zrem(self.deadlines_key, task_id)
+        pipe.execute()
+
+
+class Reservation:
+    """单个下载任务的预留
+
+    on_info 作为下载器的提取信息回调，在传输开始前预留；progress_hook 扣减已写入字节；
+    release 在任务结束时调用。
+    """
+
+    def __init__(self, budget: Optional[DiskBudget], task_id: str, step_bytes: int = DISK_CONSUME_STEP_MB * MB):
+        self.budget = budget
+        self.task_id = task_id
+        self.step_bytes = step_bytes
+        self.reserved = 0
+        self.active = False
+        self._seen: Dict[str, int] = {}
+        self._unsynced = 0
+
+    def on_info(self, info: Dict[str, Any]) -> None:
+        if self.budget is None or not isinstance(info, dict):
+            return
+        size = estimate_bytes(info)
+        try:
+            if not self.budget.reserve(self.task_id, size):
+                raise InsufficientDiskSpace(
+                    f"Need {size // MB} MB for {info.get('id')}, "
+                    f"{max(self.budget.capacity(), 0) // MB} MB free before reservations"
+                )
+        except redis.RedisError as e:
+            logger.warning(f"Disk budget unavailable, starting without reservation: {str(e)}")
+            return
+        self.reserved = size
+        self.active = True
+        logger.info(f"Task {self.task_id}: reserved {size // MB} MB of disk space")
+
+    def progress_hook(self, d: Dict[str, Any]) -> None:
+        if not self.active or d.get("status") not in ("downloading", "finished"):
+            return
+        filename = d.get("filename") or ""
+        downloaded = d.get("downloaded_bytes") or d.get("total_bytes") or 0
+        delta = downloaded - self._seen.get(filename, 0)
+        if delta <= 0:
+            return
+        self._seen[filename] = downloaded
+        self._unsynced += delta
+        if self._unsynced >= self.step_bytes or d.get("status") == "finished":
+            written, self._unsynced = self._unsynced, 0
+            try:
+                self.budget.consume(self.task_id, written)
+            except redis.RedisError as e:
+                logger.warning(f"Failed to update disk reservation: {str(e)}")
+
+    def release(self) -> None:
+        if not self.active:
+            return
+        self.active = False
+        try:
+            self.budget.release(self.task_id)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to release disk reservation: {str(e)}")
@@ -1,24 +1,72 @@
 import os
 import re
 import asyncio
+import contextvars
+import time
 from typing import Dict, Any, Optional, List
 from pathlib import Path
-import yt_dlp
 from loguru import logger
 
 from .models import VideoInfo, DownloadResult
+from . import metrics
+from . import tracing
+from . import proxy_pool
+from .storage_layout import StorageLayout, STORAGE_LAYOUT
+from .parallel_streams import keep_audio_stream, prefetch_streams
+
+# 分离音视频流合并下载的偏好：合并后的封装、优先的视频/音频编码
+PREFERRED_CONTAINER = os.getenv("PREFERRED_CONTAINER", "mp4")
+PREFERRED_VCODEC = os.getenv("PREFERRED_VCODEC", "h264")
+PREFERRED_ACODEC = os.getenv("PREFERRED_ACODEC", "aac")
+# 需要合并时是否并行下载各路流
+PARALLEL_STREAMS = os.getenv("PARALLEL_STREAMS", "true").lower() == "true"
+
+# 额外允许的URL正则（逗号分隔），用于基准测试或内部镜像源
+EXTRA_URL_PATTERNS = [
+    p.strip() for p in os.getenv("EXTRA_URL_PATTERNS", "").split(",") if p.strip()
+]
+
+# 提取信息中后续用到的字段（VideoInfo、交付格式）；formats、thumbnails、字幕URL、HTTP头等大对象不保留
+INFO_FIELDS = (
+    "id", "title", "description", "duration", "view_count", "like_count", "uploader", "uploader_id",
+    "upload_date", "thumbnail", "tags", "categories",
+    "width", "height", "format_id", "vcodec", "acodec", "ext",
+)
+
+
+def trim_info(info: Any) -> Any:
+    """把yt-dlp信息字典裁剪为用到的字段，避免在下载期间持有完整的格式和字幕列表"""
+    if not isinstance(info, dict):
+        return info
+    trimmed = {key: info[key] for key in INFO_FIELDS if key in info}
+    if info.get("requested_formats"):
+        trimmed["requested_formats"] = [
+            {"format_id": fmt.get("format_id")} for fmt in info["requested_formats"]
+        ]
+    if "formats" in info:
+        heights = {fmt.get("height") for fmt in info["formats"] or [] if fmt.get("height")}
+        trimmed["formats"] = [{"height": height} for height in sorted(heights)]
+    # 字幕只需要语言列表
+    for key in ("subtitles", "automatic_captions"):
+        if key in info:
+            trimmed[key] = dict.fromkeys(info[key] or {})
+    return trimmed
 
 
 class YouTubeDownloader:
     """YouTube视频下载器"""
 
-    def __init__(self, download_path: str = "/app/downloads"):
+    def __init__(self, download_path: str = "/app/downloads", layout: str = STORAGE_LAYOUT):
         self.download_path = Path(download_path)
         self.download_path.mkdir(parents=True, exist_ok=True)
+        self.layout = StorageLayout(str(self.download_path), layout)
+        # 出口代理池，未配置时直连
+        self.proxy_pool = proxy_pool.get_proxy_pool()
 
-        # yt-dlp基础配置
+        # yt-dlp基础配置（输出目录在提取到视频ID后按布局确定）
         self.base_opts = {
-            "outtmpl": str(self.download_path / "%(id)s.%(ext)s"),
+            "outtmpl": "%(id)s.%(ext)s",
+            "paths": {"home": str(self.download_path)},
             "writesubtitles": False,  # 默认不下载字幕，由参数控制
             "writeautomaticsub": False,  # 默认不下载自动字幕，由参数控制
             "writethumbnail": False,  # 默认不下载缩略图，由参数控制
@@ -62,17 +110,32 @@ class YouTubeDownloader:
             r"(?:https?://)?(?:www\.)?youtube\.com/embed/([\w-]+)",
             r"(?:https?://)?(?:www\.)?youtube\.com/v/([\w-]+)",
             r"(?:https?://)?(?:m\.)?youtube\.com/watch\?v=([\w-]+)",
-        ]
+            r"(?:https?://)?(?:www\.)?youtube\.com/live/([\w-]+)",
+        ] + EXTRA_URL_PATTERNS
 
         for pattern in youtube_patterns:
             if re.search(pattern, url):
                 return True
         return False
 
+    @staticmethod
+    def video_id_from_url(url: str) -> Optional[str]:
+        """从视频URL中取出视频ID（watch?v= / youtu.be / embed / v / shorts / live）"""
+        match = re.search(
+            r"(?:[?&]v=|youtu\.be/|/embed/|/v/|/shorts/|/live/)([\w-]{11})(?![\w-])", url
+        )
+        return match.group(1) if match else None
+
+    def proxy_lease(self, url: str, opts: Dict[str, Any]):
+        """按视频ID为一次yt-dlp操作分配出口代理（同一视频固定同一代理）"""
+        return proxy_pool.lease(self.proxy_pool, self.video_id_from_url(url) or url, opts)
+
     async def get_video_info(self, url: str) -> VideoInfo:
         """获取视频信息（异步）"""
 
         def _extract_info():
+            import yt_dlp
+
             opts = self.base_opts.copy()
             opts.update(
                 {
@@ -83,13 +146,22 @@ class YouTubeDownloader:
                 }
             )
 
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                return ydl.extract_info(url, download=False)
+            started = time.perf_counter()
+            with self.proxy_lease(url, opts) as lease, yt_dlp.YoutubeDL(opts) as ydl, tracing.span(
+                "ytdlp.extract", attributes={"url": url}
+            ):
+                info = ydl.extract_info(url, download=False)
+                if lease is not None:
+                    lease.observe_latency(time.perf_counter() - started)
+            metrics.EXTRACT_DURATION.labels(operation="info").observe(
+                time.perf_counter() - started
+            )
+            return trim_info(info)
 
         try:
             # 在线程池中运行阻塞操作
             loop = asyncio.get_event_loop()
-            info = await loop.run_in_executor(None, _extract_info)
+            info = await loop.run_in_executor(None, contextvars.copy_context().run, _extract_info)
 
             # 提取可用格式信息
             available_qualities = []
@@ -195,6 +267,92 @@ class YouTubeDownloader:
             logger.error(f"Error extracting video info: {str(e)}")
             raise
 
+    def resolve_stream(self, url: str, format_selector: str) -> Dict[str, Any]:
+        """解析格式选择器对应的直连流地址，不下载"""
+        import yt_dlp
+
+        opts = self.base_opts.copy()
+        opts.update(
+            {
+                "quiet": True,
+                "noplaylist": True,
+                "format": format_selector,
+                "geo_bypass": True,
+            }
+        )
+
+        started = time.perf_counter()
+        with self.proxy_lease(url, opts) as lease, yt_dlp.YoutubeDL(opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+            if lease is not None:
+                lease.observe_latency(time.perf_counter() - started)
+        metrics.EXTRACT_DURATION.labels(operation="stream").observe(
+            time.perf_counter() - started
+        )
+        if not info or not isinstance(info, dict):
+            raise ValueError(f"Could not extract stream info for {url}")
+
+        # 单一格式时字段直接在info上，多格式组合时在requested_formats中
+        selected = (info.get("requested_formats") or [info])[0]
+        if not selected.get("url"):
+            raise ValueError(f"No stream URL for format {format_selector}")
+        return {
+            "id": info.get("id"),
+            "title": info.get("title"),
+            "duration": info.get("duration"),
+            "url": selected["url"],
+            "http_headers": selected.get("http_headers") or {},
+            "protocol": selected.get("protocol"),
+            "format_id": selected.get("format_id"),
+            "acodec": selected.get("acodec"),
+            "abr": selected.get("abr"),
+            "filesize": selected.get("filesize") or selected.get("filesize_approx"),
+            "is_live": bool(info.get("is_live")),
+            # 直连地址可能与解析时的出口IP绑定，拉流时需要使用同一代理
+            "proxy": opts.get("proxy"),
+        }
+
+    @staticmethod
+    def format_selector(quality: str, audio_only: bool = False) -> str:
+        """质量选项对应的yt-dlp格式选择器"""
+        if audio_only:
+            return "bestaudio[ext=m4a]/bestaudio[ext=mp3]/bestaudio"
+        if quality == "worst":
+            return "wv*+wa/w"
+        if quality == "best":
+            return "bv*+ba/b"
+        # 解析质量设置 (如 "720p")，封装和编码偏好由 format_sort 决定，不在这里过滤
+        height = quality.replace("p", "")
+        return f"bv*[height<={height}]+ba/b[height<={height}]"
+
+    @staticmethod
+    def format_sort(quality: str) -> List[str]:
+        """格式排序：分辨率优先，同分辨率下按编码和封装偏好"""
+        res = "res" if quality in ("best", "worst") else f"res:{quality.replace('p', '')}"
+        return [res, f"vcodec:{PREFERRED_VCODEC}", f"acodec:{PREFERRED_ACODEC}", f"ext:{PREFERRED_CONTAINER}:m4a"]
+
+    @staticmethod
+    def delivered_format(info: Any, quality: str, audio_only: bool = False) -> Optional[Dict[str, Any]]:
+        """实际交付的格式与请求的质量对比"""
+        if not info or not isinstance(info, dict):
+            return None
+        height = info.get("height")
+        requested_height = None
+        if not audio_only and quality not in ("best", "worst"):
+            requested_height = int(str(quality).replace("p", ""))
+        return {
+            "requested": "audio" if audio_only else quality,
+            "delivered": f"{height}p" if height else ("audio" if audio_only else None),
+            "width": info.get("width"),
+            "height": height,
+            "format_id": info.get("format_id"),
+            "vcodec": info.get("vcodec"),
+            "acodec": info.get("acodec"),
+            "ext": info.get("ext"),
+            "merged": bool(info.get("requested_formats")),
+            "below_requested": bool(requested_height and height and height < requested_height),
+        }
+
     def download_video(
         self,
         url: str,
@@ -204,8 +362,18 @@ class YouTubeDownloader:
         progress_callback=None,
         download_thumbnail: bool = False,
         download_description: bool = False,
+        on_info=None,
+        rate_limiter=None,
+        keep_audio: bool = False,
+        on_audio=None,
     ) -> DownloadResult:
-        """下载视频"""
+        """下载视频
+
+        on_info 在提取信息之后、开始传输之前调用，可抛出异常阻止下载（如磁盘空间预留失败）。
+        rate_limiter（bandwidth.TaskShaper）在下载过程中动态调整 yt-dlp 的限速。
+        keep_audio 为真时保留并行预下载的音频流，作为结果中的 audio_path；保留后立即以其路径调用
+        on_audio（合并之前），下游可以提前开始处理音频。
+        """
 
         if subtitle_langs is None:
             subtitle_langs = ["zh-CN", "en"]
@@ -216,18 +384,12 @@ class YouTubeDownloader:
         # 防止下载整个播放列表，只下载当前视频
         opts["noplaylist"] = True
 
-        # 设置质量 - 使用更兼容的格式选择
-        if audio_only:
-            opts["format"] = "bestaudio[ext=m4a]/bestaudio[ext=mp3]/bestaudio"
-        elif quality == "best":
-            # 优先选择mp4格式，避免webm等可能被限制的格式
-            opts["format"] = "best[ext=mp4][height<=1080]/best[height<=1080]/best"
-        elif quality == "worst":
-            opts["format"] = "worst[ext=mp4]/worst"
-        else:
-            # 解析质量设置 (如 "720p")
-            height = quality.replace("p", "")
-            opts["format"] = f"best[ext=mp4][height<={height}]/best[height<={height}]"
+        # 设置质量：视频优先选择分离的最佳视频流+最佳音频流并合并，
+        # 同分辨率下按编码偏好排序，合并时只做流复制
+        opts["format"] = self.format_selector(quality, audio_only)
+        if not audio_only:
+            opts["format_sort"] = self.format_sort(quality)
+            opts["merge_output_format"] = PREFERRED_CONTAINER
 
         # 字幕设置
         if subtitle_langs:
@@ -247,71 +409,134 @@ class YouTubeDownloader:
         opts["geo_bypass"] = True
         opts["no_check_certificate"] = True
 
-        # 进度回调
+        # 进度回调（并行预下载的中间文件在正式下载时会以"已下载"再报告一次，需过滤）
+        prefetched: set = set()
         if progress_callback:
-            opts["progress_hooks"] = [progress_callback]
+            def _progress_hook(d):
+                if d.get("filename") in prefetched:
+                    return
+                progress_callback(d)
 
+            opts["progress_hooks"] = [_progress_hook]
+
+        kept_audio = None
         try:
-            logger.info(f"Download options: {opts}")
-            with yt_dlp.YoutubeDL(opts) as ydl:
+            import yt_dlp
+
+            # 选项只在DEBUG级别按需格式化
+            logger.opt(lazy=True).debug("Download options: {}", lambda: opts)
+            with self.proxy_lease(url, opts) as lease, yt_dlp.YoutubeDL(opts) as ydl:
+                if rate_limiter is not None:
+                    # 下载器每个数据块都读取 ydl.params 中的限速，份额变化即时生效
+                    rate_limiter.attach(ydl.params)
+
                 # 先获取信息
-                info = ydl.extract_info(url, download=False)
+                extract_started = time.perf_counter()
+                with tracing.span("ytdlp.extract", attributes={"url": url}) as extract_span:
+                    info = ydl.extract_info(url, download=False)
+                    extract_span.set_attribute("video.id", info.get("id") if isinstance(info, dict) else None)
+                metrics.EXTRACT_DURATION.labels(operation="download").observe(
+                    time.perf_counter() - extract_started
+                )
+                if lease is not None:
+                    lease.observe_latency(time.perf_counter() - extract_started)
+                    if info is None and lease.throttled:
+                        # 该出口已被限流，交由任务重试，下次会分配到其他代理
+                        raise proxy_pool.ProxyThrottled(f"Proxy {proxy_pool.redact(lease.proxy)} throttled for {url}")
                 video_id = info.get("id") if info and isinstance(info, dict) else ""
                 logger.info(f"Video ID: {video_id}")
 
-                # 执行下载
+                if on_info is not None:
+                    on_info(info)
+
+                # 按存储布局确定该视频所有产物的目录
+                artifact_dir = (
+                    self.layout.ensure_video_dir(video_id) if video_id else self.download_path
+                )
+                ydl.params["paths"] = {"home": str(artifact_dir)}
+
+                # 需要合并的格式：先并行下载各路流，正式下载时直接合并
+                if PARALLEL_STREAMS and info and isinstance(info, dict) and info.get("requested_formats"):
+                    if rate_limiter is not None:
+                        rate_limiter.set_streams(len(info["requested_formats"]))
+                    try:
+                        with tracing.span("ytdlp.prefetch_streams"):
+                            prefetched.update(prefetch_streams(ydl, info, progress_callback))
+                    finally:
+                        if rate_limiter is not None:
+                            rate_limiter.set_streams(1)
+                    if keep_audio:
+                        kept_audio = keep_audio_stream(ydl, info, list(prefetched))
+                        if kept_audio and on_audio is not None:
+                            on_audio(kept_audio)
+
+                # 执行下载：直接处理已提取的信息，ydl.download([url]) 会重新提取一次（多一轮请求）
                 logger.info(f"Starting download for URL: {url}")
-                ydl.download([url])
+                with tracing.span("ytdlp.transfer", attributes={"video.id": video_id}):
+                    ydl.process_ie_result(info, download=True)
                 logger.info(f"Download completed for video ID: {video_id}")
 
+                # 传输结束后只保留用到的字段，完整的格式和字幕列表不再跨越产物查找和结果构建
+                info = trim_info(info)
+
                 # 查找下载的文件
-                video_path = None
-                audio_path = None
-                subtitle_paths = {}
-                thumbnail_path = None
-                description_path = None
-
-                # 查找视频/音频文件
-                for ext in ["mp4", "webm", "mkv", "m4a", "mp3"]:
-                    file_path = self.download_path / f"{video_id}.{ext}"
-                    if file_path.exists():
-                        if ext in ["m4a", "mp3"]:
-                            audio_path = str(file_path)
-                        else:
-                            video_path = str(file_path)
-                        break
-
-                # 查找字幕文件
-                for lang in subtitle_langs:
-                    for ext in ["vtt", "srt"]:
-                        subtitle_file = self.download_path / f"{video_id}.{lang}.{ext}"
-                        if subtitle_file.exists():
-                            subtitle_paths[lang] = str(subtitle_file)
+                with tracing.span("files.discover", attributes={"video.id": video_id}):
+                    video_path = None
+                    audio_path = None
+                    subtitle_paths = {}
+                    thumbnail_path = None
+                    description_path = None
+
+                    # 查找视频/音频文件
+                    for ext in ["mp4", "webm", "mkv", "m4a", "mp3"]:
+                        file_path = artifact_dir / f"{video_id}.{ext}"
+                        if file_path.exists():
+                            if ext in ["m4a", "mp3"]:
+                                audio_path = str(file_path)
+                            else:
+                                video_path = str(file_path)
+                            break
+                    if audio_path is None and kept_audio and os.path.exists(kept_audio):
+                        audio_path = kept_audio
+
+                    # 查找字幕文件
+                    for lang in subtitle_langs:
+                        for ext in ["vtt", "srt"]:
+                            subtitle_file = artifact_dir / f"{video_id}.{lang}.{ext}"
+                            if subtitle_file.exists():
+                                subtitle_paths[lang] = str(subtitle_file)
+                                break
+
+                    # 查找缩略图
+                    for ext in ["jpg", "png", "webp"]:
+                        thumb_file = artifact_dir / f"{video_id}.{ext}"
+                        if thumb_file.exists():
+                            thumbnail_path = str(thumb_file)
                             break
 
-                # 查找缩略图
-                for ext in ["jpg", "png", "webp"]:
-                    thumb_file = self.download_path / f"{video_id}.{ext}"
-                    if thumb_file.exists():
-                        thumbnail_path = str(thumb_file)
-                        break
-
-                # 处理描述文件（如果需要下载描述）
-                if download_description and info and isinstance(info, dict) and info.get("description"):
-                    description_file = self.download_path / f"{video_id}.description"
-                    try:
-                        with open(description_file, 'w', encoding='utf-8') as f:
-                            f.write(info.get("description", ""))
-                        description_path = str(description_file)
-                    except Exception as e:
-                        logger.warning(f"Failed to save description file: {str(e)}")
-
-                # 计算文件大小
-                file_size = 0
-                if video_path and os.path.exists(video_path):
-                    file_size = os.path.getsize(video_path)
-                elif audio_path and os.path.exists(audio_path):
-                    file_size = os.path.getsize(audio_path)
+                    # 处理描述文件（如果需要下载描述）
+                    if download_description and info and isinstance(info, dict) and info.get("description"):
+                        description_file = artifact_dir / f"{video_id}.description"
+                        try:
+                            with open(description_file, 'w', encoding='utf-8') as f:
+                                f.write(info.get("description", ""))
+                            description_path = str(description_file)
+                        except Exception as e:
+                            logger.warning(f"Failed to save description file: {str(e)}")
+
+                    # 记录产物大小分布
+                    metrics.observe_file_size("video", video_path)
+                    metrics.observe_file_size("audio", audio_path)
+                    metrics.observe_file_size("thumbnail", thumbnail_path)
+                    for subtitle_path in subtitle_paths.values():
+                        metrics.observe_file_size("subtitle", subtitle_path)
+
+                    # 计算文件大小
+                    file_size = 0
+                    if video_path and os.path.exists(video_path):
+                        file_size = os.path.getsize(video_path)
+                    elif audio_path and os.path.exists(audio_path):
+                        file_size = os.path.getsize(audio_path)
 
                 # 构建视频信息
                 video_info = VideoInfo(
@@ -391,6 +616,7 @@ class YouTubeDownloader:
 
                 return DownloadResult(
                     video_path=video_path,
+                    format_info=self.delivered_format(info, quality, audio_only),
                     audio_path=audio_path,
                     subtitle_paths=subtitle_paths,
                     thumbnail_path=thumbnail_path,
@@ -410,25 +636,25 @@ class YouTubeDownloader:
 
         current_time = time.time()
 
-        for file_path in self.download_path.iterdir():
-            if file_path.is_file():
-                file_age = current_time - file_path.stat().st_mtime
-                if file_age > max_age_hours * 3600:
-                    try:
-                        file_path.unlink()
-                        logger.info(f"Cleaned up old file: {file_path}")
-                    except Exception as e:
-                        logger.error(f"Error cleaning up file {file_path}: {str(e)}")
+        for file_path in list(self.layout.iter_files()):
+            file_age = current_time - file_path.stat().st_mtime
+            if file_age > max_age_hours * 3600:
+                try:
+                    file_path.unlink()
+                    logger.info(f"Cleaned up old file: {file_path}")
+                    if self.layout.sharded:
+                        self.layout.prune_empty_dirs(file_path.parent)
+                except Exception as e:
+                    logger.error(f"Error cleaning up file {file_path}: {str(e)}")
 
     def get_download_stats(self) -> Dict[str, Any]:
         """获取下载统计信息"""
         total_files = 0
         total_size = 0
 
-        for file_path in self.download_path.iterdir():
-            if file_path.is_file():
-                total_files += 1
-                total_size += file_path.stat().st_size
+        for file_path in self.layout.iter_files():
+            total_files += 1
+            total_size += file_path.stat().st_size
 
         return {
             "total_files": total_files,
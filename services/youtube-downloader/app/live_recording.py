@@ -0,0 +1,212 @@
+"""直播分段录制
+
+直播没有结束时间，按点播处理会占用Worker直到直播结束，最后才产出一个巨大的文件。录制模式下
+ffmpeg以流复制方式拉取直播流，用segment muxer按 LIVE_SEGMENT_SECONDS 切成独立可播放的
+MPEG-TS分段，每写完一个分段就把它交给下游（发布到Redis Stream、上传对象存储），长时间的直播
+可以边录边处理。
+
+- 录制时长不超过 LIVE_MAX_DURATION 秒（ffmpeg ``-t``），到达上限后正常收尾；
+- 直播结束（播放列表出现ENDLIST）时ffmpeg读到流末尾自然退出；
+- 输入超过 LIVE_STALL_TIMEOUT 秒没有数据视为断流（``stalled``），其他异常退出为 ``interrupted``，
+  已录制的分段都保留。
+
+分段写入 ``<视频目录>/live/<任务ID>/<视频ID>.live.<任务ID>.00000.ts``：文件名以视频ID开头，
+缓存淘汰和产物索引按文件名归属视频，且不同录制任务的分段不会重名。ffmpeg把分段列表
+（CSV：文件名,开始,结束）写到stdout，每行在对应分段关闭后才输出，读到一行即表示该分段已完整落盘；
+stderr由后台线程持续读取，只保留末尾用于报错。
+
+流键为 ``live:segments:<task_id>``，每条消息字段：``seq``、``start`` / ``end``（秒）、``path``，
+上传对象存储时还有 ``object_key``；最后一条消息带 ``eof=1`` 和 ``stop_reason``。
+"""
+
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+# 直播录制配置
+LIVE_SEGMENT_SECONDS = float(os.getenv("LIVE_SEGMENT_SECONDS", "60"))
+LIVE_MAX_DURATION = int(os.getenv("LIVE_MAX_DURATION", str(4 * 3600)))
+LIVE_STALL_TIMEOUT = int(os.getenv("LIVE_STALL_TIMEOUT", "30"))
+LIVE_FORMAT_SELECTOR = os.getenv("LIVE_FORMAT_SELECTOR", "b[height<=1080]/b")
+LIVE_STREAM_PREFIX = os.getenv("LIVE_STREAM_PREFIX", "live:segments:")
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+
+# 保留的ffmpeg stderr末尾行数
+STDERR_TAIL_LINES = 20
+
+
+class NotLive(Exception):
+    """URL对应的不是正在进行的直播"""
+
+
+class Segment(NamedTuple):
+    """一个已完整写入的分段"""
+
+    seq: int
+    path: str
+    start: float
+    end: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def stream_key(task_id: str) -> str:
+    return f"{LIVE_STREAM_PREFIX}{task_id}"
+
+
+def segment_prefix(video_id: str, task_id: str) -> str:
+    """分段文件名前缀：<视频ID>.live.<任务ID>"""
+    return f"{video_id}.live.{task_id}"
+
+
+def record_command(
+    stream: Dict[str, Any],
+    output_dir: str,
+    segment_seconds: float = LIVE_SEGMENT_SECONDS,
+    max_duration: int = LIVE_MAX_DURATION,
+    name_prefix: Optional[str] = None,
+) -> List[str]:
+    """ffmpeg流复制录制并按时长分段，分段列表输出到stdout"""
+    # 未指定前缀时按目录约定 <视频目录>/live/<任务ID> 取任务ID
+    name_prefix = name_prefix or segment_prefix(stream.get("id") or "live", os.path.basename(output_dir))
+    args = [FFMPEG_BIN, "-hide_banner", "-nostdin", "-loglevel", "error"]
+    if stream["url"].startswith("http"):
+        headers = stream.get("http_headers") or {}
+        if headers:
+            args += ["-headers", "".join(f"{k}: {v}\r\n" for k, v in headers.items())]
+        if stream.get("proxy"):
+            # 直播地址与解析时的出口绑定，拉流走同一个代理
+            args += ["-http_proxy", stream["proxy"]]
+        args += ["-rw_timeout", str(LIVE_STALL_TIMEOUT * 1_000_000)]
+    args += [
+        "-i", stream["url"],
+        "-t", str(max_duration),
+        "-c", "copy",
+        "-f", "segment",
+        "-segment_time", str(segment_seconds),
+        "-segment_format", "mpegts",
+        "-reset_timestamps", "1",
+        "-segment_list", "pipe:1",
+        "-segment_list_type", "csv",
+        os.path.join(output_dir, f"{name_prefix}.%05d.ts"),
+    ]
+    return args
+
+
+def drain_stderr(proc: subprocess.Popen, lines: int = STDERR_TAIL_LINES) -> Tuple[threading.Thread, deque]:
+    """后台线程持续读取子进程stderr，只保留末尾lines行"""
+    tail: deque = deque(maxlen=lines)
+    drain = threading.Thread(target=tail.extend, args=(proc.stderr,), name="ffmpeg-stderr", daemon=True)
+    drain.start()
+    return drain, tail
+
+
+def iter_segments(
+    stream: Dict[str, Any],
+    output_dir: str,
+    segment_seconds: float = LIVE_SEGMENT_SECONDS,
+    max_duration: int = LIVE_MAX_DURATION,
+    name_prefix: Optional[str] = None,
+    outcome: Optional[Dict[str, Any]] = None,
+) -> Iterator[Segment]:
+    """启动ffmpeg录制，每完成一个分段即产出；中途断流时已产出的分段保留，之后不再抛出
+
+    outcome 不为空时写入ffmpeg的退出码（``returncode``）和stderr末尾（``stderr``）。
+    """
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    proc = subprocess.Popen(
+        record_command(stream, output_dir, segment_seconds, max_duration, name_prefix),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    # 长时间录制中stderr写满管道会阻塞ffmpeg，与stdout并行读取
+    drain, stderr_tail = drain_stderr(proc)
+    seq = 0
+    try:
+        for line in proc.stdout:
+            name, start, end = line.decode(errors="replace").strip().rsplit(",", 2)
+            yield Segment(seq, os.path.join(output_dir, name), float(start), float(end))
+            seq += 1
+        returncode = proc.wait()
+        drain.join(timeout=5)
+        stderr = b"".join(stderr_tail).decode(errors="replace").strip()[-500:]
+        if outcome is not None:
+            outcome.update(returncode=returncode, stderr=stderr)
+        if returncode != 0:
+            if not seq:
+                raise RuntimeError(f"ffmpeg exited with {returncode}: {stderr}")
+            logger.warning(f"Live recording interrupted after {seq} segments: {stderr}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
+def stop_reason_for(recorded: float, max_duration: int, segment_seconds: float, outcome: Dict[str, Any]) -> str:
+    """录制停止原因：max_duration / stream_end / stalled（输入超时） / interrupted（其他异常退出）"""
+    # 最后一个分段可能因 -t 截断而略短于分段时长
+    if recorded >= max_duration - segment_seconds / 2:
+        return "max_duration"
+    if not outcome.get("returncode"):
+        return "stream_end"
+    return "stalled" if "timed out" in outcome.get("stderr", "").lower() else "interrupted"
+
+
+def run_recording(
+    stream: Dict[str, Any],
+    output_dir: str,
+    publisher,
+    segment_seconds: float = LIVE_SEGMENT_SECONDS,
+    max_duration: int = LIVE_MAX_DURATION,
+    on_segment: Optional[Callable[[Segment], Optional[Dict[str, Any]]]] = None,
+    name_prefix: Optional[str] = None,
+) -> Dict[str, Any]:
+    """录制并逐段交给下游，返回汇总
+
+    on_segment 在分段写完后调用（如上传对象存储），返回的字段并入该分段的消息。
+    """
+    started = time.perf_counter()
+    segments = 0
+    recorded = 0.0
+    recorded_bytes = 0
+    outcome: Dict[str, Any] = {}
+    try:
+        for segment in iter_segments(stream, output_dir, segment_seconds, max_duration, name_prefix, outcome):
+            extra = (on_segment(segment) if on_segment is not None else None) or {}
+            publisher.publish(
+                {
+                    "seq": segment.seq,
+                    "start": round(segment.start, 3),
+                    "end": round(segment.end, 3),
+                    "path": segment.path,
+                    **extra,
+                }
+            )
+            segments += 1
+            recorded = segment.end
+            recorded_bytes += os.path.getsize(segment.path) if os.path.exists(segment.path) else 0
+    except Exception as e:
+        logger.error(f"Live recording of {stream.get('id')} failed after {segments} segments: {str(e)}")
+        publisher.publish({"eof": 1, "segments": segments, "error": str(e)})
+        raise
+
+    stop_reason = stop_reason_for(recorded, max_duration, segment_seconds, outcome)
+    summary = {
+        "segments": segments,
+        "recorded_seconds": round(recorded, 3),
+        "recorded_bytes": recorded_bytes,
+        "segment_seconds": segment_seconds,
+        "stop_reason": stop_reason,
+        "segment_dir": output_dir,
+        "wall_seconds": round(time.perf_counter() - started, 3),
+    }
+    publisher.publish({"eof": 1, "segments": segments, "stop_reason": stop_reason})
+    return summary
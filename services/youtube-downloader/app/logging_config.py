@@ -0,0 +1,113 @@
+"""日志配置
+
+API和Worker进程启动时调用 configure_logging()：
+
+- 级别由 LOG_LEVEL 控制；LOG_FORMAT=json 输出单行JSON（时间、级别、模块、消息、task_id及附加字段），
+  text 为便于本地阅读的文本格式。
+- LOG_ENQUEUE=true 时经队列由后台线程写出，下载线程只做格式化，不等待终端/文件写入。
+- 每条日志自动附带当前Celery任务ID（也可用 logger.contextualize(task_id=...) 或 bind 指定）。
+
+下载进度回调频率很高（每个数据块一次），通过 ProgressLogSampler 按时间间隔和进度步长采样后再记录。
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Optional
+
+from celery import current_task
+from loguru import logger
+
+# 日志配置
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_ENQUEUE = os.getenv("LOG_ENQUEUE", "true").lower() == "true"
+LOG_PROGRESS_INTERVAL = float(os.getenv("LOG_PROGRESS_INTERVAL", "5"))
+LOG_PROGRESS_STEP = int(os.getenv("LOG_PROGRESS_STEP", "10"))
+
+_TEXT_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "{extra[task_id]} | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
+    "<level>{message}</level>"
+)
+
+
+def _current_task_id() -> Optional[str]:
+    try:
+        return current_task.request.id if current_task else None
+    except Exception:
+        return None
+
+
+def _inject_task_id(record: Dict[str, Any]) -> None:
+    extra = record["extra"]
+    if extra.get("task_id") is None:
+        extra["task_id"] = _current_task_id() or "-"
+
+
+def serialize(record: Dict[str, Any]) -> str:
+    """日志记录转为单行JSON"""
+    extra = {k: v for k, v in record["extra"].items() if not k.startswith("_")}
+    payload = {
+        "ts": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+        "task_id": extra.pop("task_id", None),
+    }
+    if extra:
+        payload["extra"] = extra
+    if record["exception"] is not None:
+        exc_type, exc_value, _ = record["exception"]
+        payload["exception"] = {"type": getattr(exc_type, "__name__", None), "value": str(exc_value)}
+    return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def _json_formatter(record: Dict[str, Any]) -> str:
+    record["extra"]["_json"] = serialize(record)
+    return "{extra[_json]}\n"
+
+
+def configure_logging(
+    level: str = LOG_LEVEL,
+    fmt: str = LOG_FORMAT,
+    enqueue: bool = LOG_ENQUEUE,
+    sink: Any = None,
+) -> int:
+    """替换loguru的默认输出，返回新handler的ID"""
+    logger.remove()
+    logger.configure(patcher=_inject_task_id)
+    return logger.add(
+        sink if sink is not None else sys.stderr,
+        level=level,
+        format=_json_formatter if fmt == "json" else _TEXT_FORMAT,
+        enqueue=enqueue,
+        backtrace=False,
+        diagnose=False,
+        colorize=False if fmt == "json" else None,
+    )
+
+
+class ProgressLogSampler:
+    """下载进度日志采样：距上次记录超过 interval 秒，或进度进入新的 step 区间（含完成）时才记录"""
+
+    __slots__ = ("interval", "step", "_last_at", "_last_bucket")
+
+    def __init__(self, interval: float = LOG_PROGRESS_INTERVAL, step: int = LOG_PROGRESS_STEP):
+        self.interval = interval
+        self.step = max(step, 1)
+        self._last_at: Optional[float] = None
+        self._last_bucket = -1
+
+    def should_log(self, progress: int, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        bucket = progress // self.step
+        # 进度回退说明开始了下一个文件（如分离的音视频流），同样记录
+        if self._last_at is None or bucket != self._last_bucket or now - self._last_at >= self.interval:
+            self._last_at = now
+            self._last_bucket = bucket
+            return True
+        return False
@@ -1,17 +1,54 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from pydantic import HttpUrl
 from loguru import logger
 import os
 import uuid
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timezone
 
-from .models import DownloadRequest, DownloadResponse, TaskStatus, HealthCheck
+from .models import (
+    DownloadRequest,
+    DownloadResponse,
+    TaskStatus,
+    TaskStatusBatchRequest,
+    AsrFeedRequest,
+    AsrFeedResponse,
+    LiveRecordingRequest,
+    LiveRecordingResponse,
+    SubtitleSegment,
+    SubtitleSegmentsResponse,
+    VideoInfo,
+    VideoListResponse,
+    ArtifactEntry,
+    ArtifactListResponse,
+    ChannelSubscribeRequest,
+    ChannelSubscription,
+    WorkflowRequest,
+    WorkflowStatus,
+    HealthCheck,
+)
 from .celery_app import celery_app
-from .tasks import download_video_task
 from .downloader import YouTubeDownloader
+from .task_client import AsyncTaskClient, TaskSnapshot
+from .redis_client import close_async_redis
+from .artifact_files import ArtifactFiles
+from .transcode import PRESETS as TRANSCODE_PRESETS
+from .asr_feed import stream_key as asr_stream_key
+from .live_recording import LIVE_MAX_DURATION, stream_key as live_stream_key
+from .subtitles import SEGMENTS_SUFFIX, SegmentIndex
+from .cache_eviction import CACHE_EVICTION_ENABLED, CacheIndex
+from . import metadata_store
+from . import metrics
+from . import workflow
+from .logging_config import configure_logging
+from .artifact_index import ARTIFACT_KINDS
+from .channels import ChannelRegistry
+from .profiling import profile_path
+from . import tracing
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -20,13 +57,51 @@ app = FastAPI(
     version="1.0.0",
 )
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/downloads", StaticFiles(directory="downloads"), name="downloads")
+# 请求耗时指标
+app.add_middleware(metrics.PrometheusMiddleware)
+# 请求span（最外层，覆盖指标中间件和处理函数）
+app.add_middleware(tracing.TracingMiddleware)
 
 # Initialize downloader
 downloader = YouTubeDownloader(download_path="downloads")
 
+# Mount static files
+app.mount("/static", StaticFiles(directory="static"), name="static")
+# /downloads/<文件名> 经存储布局解析，分片后URL保持不变
+# 同时记录访问时间，供缓存淘汰使用
+app.mount(
+    "/downloads",
+    ArtifactFiles(downloader.layout, cache_index=CacheIndex() if CACHE_EVICTION_ENABLED else None),
+    name="downloads",
+)
+
+# 队列深度和磁盘占用指标在抓取时计算
+if metrics.METRICS_ENABLED:
+    metrics.register_collectors(str(downloader.download_path))
+
+# 非阻塞任务提交/状态查询客户端
+task_client = AsyncTaskClient(celery_app)
+
+
+@app.on_event("startup")
+async def setup_logging():
+    """按 LOG_LEVEL / LOG_FORMAT 配置日志输出"""
+    configure_logging()
+    if tracing.TRACING_ENABLED:
+        tracing.configure()
+
+
+@app.on_event("shutdown")
+async def shutdown_task_client():
+    """关闭任务客户端线程池和异步Redis连接池"""
+    task_client.shutdown()
+    await close_async_redis()
+    # 写出日志队列中剩余的记录
+    await logger.complete()
+    if tracing.TRACING_ENABLED:
+        # 发送剩余的span
+        tracing.configure(enabled=False)
+
 
 @app.get("/health")
 async def health_check():
@@ -39,6 +114,12 @@ async def health_check():
     }
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus指标端点"""
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+
 @app.get("/")
 async def root():
     """前端页面"""
@@ -69,12 +150,17 @@ async def download_video(request: DownloadRequest):
         # 验证URL
         if not downloader.validate_url(str(request.url)):
             raise HTTPException(status_code=400, detail="Invalid YouTube URL")
+        if request.transcode_target and request.transcode_target not in TRANSCODE_PRESETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown transcode target: {request.transcode_target}",
+            )
 
         # 生成任务ID
         task_id = str(uuid.uuid4())
 
-        # 提交异步任务
-        task = celery_app.send_task(
+        # 提交异步任务（在线程池中执行，不阻塞事件循环）
+        await task_client.submit(
             "app.tasks.download_video_task",
             kwargs={
                 "url": str(request.url),
@@ -83,6 +169,8 @@ async def download_video(request: DownloadRequest):
                 "subtitle_langs": request.subtitle_langs,
                 "download_thumbnail": True,
                 "download_description": False,
+                "transcode_target": request.transcode_target,
+                "profile": request.profile,
             },
             task_id=task_id,
         )
@@ -103,76 +191,259 @@ async def download_video(request: DownloadRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/asr-feed", response_model=AsrFeedResponse)
+async def asr_feed(request: AsrFeedRequest):
+    """提交ASR音频供给任务，音频块发布到返回的Redis Stream"""
+    try:
+        if not downloader.validate_url(str(request.url)):
+            raise HTTPException(status_code=400, detail="Invalid YouTube URL")
+
+        task_id = str(uuid.uuid4())
+        await task_client.submit(
+            "app.tasks.asr_feed_task",
+            kwargs={
+                "url": str(request.url),
+                "chunk_seconds": request.chunk_seconds,
+                "chunk_format": request.chunk_format,
+            },
+            task_id=task_id,
+        )
+
+        logger.info(f"ASR feed task submitted: {task_id} for URL: {request.url}")
+
+        return AsrFeedResponse(
+            task_id=task_id,
+            status="pending",
+            stream=asr_stream_key(task_id),
+            message="ASR feed task submitted successfully",
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error submitting ASR feed task: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/live-recordings", response_model=LiveRecordingResponse)
+async def live_recording(request: LiveRecordingRequest):
+    """提交直播分段录制任务，已完成的分段发布到返回的Redis Stream"""
+    try:
+        if not downloader.validate_url(str(request.url)):
+            raise HTTPException(status_code=400, detail="Invalid YouTube URL")
+
+        task_id = str(uuid.uuid4())
+        max_duration = min(request.max_duration or LIVE_MAX_DURATION, LIVE_MAX_DURATION)
+        await task_client.submit(
+            "app.tasks.live_record_task",
+            kwargs={
+                "url": str(request.url),
+                "segment_seconds": request.segment_seconds,
+                "max_duration": max_duration,
+            },
+            task_id=task_id,
+        )
+
+        logger.info(f"Live recording task submitted: {task_id} for URL: {request.url}")
+
+        return LiveRecordingResponse(
+            task_id=task_id,
+            status="pending",
+            stream=live_stream_key(task_id),
+            max_duration=max_duration,
+            message="Live recording task submitted successfully",
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error submitting live recording task: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _build_task_status(task_id: str, task: TaskSnapshot) -> TaskStatus:
+    """根据任务状态快照构建响应"""
+    current_time = datetime.now(timezone.utc)
+
+    if task.state == "PENDING":
+        response = {
+            "task_id": task_id,
+            "status": "pending",
+            "message": "Task is waiting to be processed",
+            "created_at": current_time,
+            "updated_at": current_time,
+        }
+    elif task.state == "PROGRESS":
+        info = task.info if isinstance(task.info, dict) else None
+        progress = info.get("progress", 0) if info else 0
+        current_step = info.get("current_step", "") if info else ""
+        response = {
+            "task_id": task_id,
+            "status": "processing",
+            "message": "Task is being processed",
+            "progress": (
+                int(progress)
+                if isinstance(progress, (int, float, str))
+                and str(progress).isdigit()
+                else None
+            ),
+            "current_step": str(current_step) if current_step else None,
+            "created_at": current_time,
+            "updated_at": current_time,
+        }
+    elif task.state == "SUCCESS":
+        result = task.info if isinstance(task.info, dict) else None
+        response = {
+            "task_id": task_id,
+            "status": "completed",
+            "message": "Task completed successfully",
+            "result": result,
+            "created_at": current_time,
+            "updated_at": current_time,
+        }
+    else:  # FAILURE
+        error_info = str(task.info) if task.info else "Unknown error"
+        response = {
+            "task_id": task_id,
+            "status": "failed",
+            "message": error_info,
+            "error": error_info,
+            "created_at": current_time,
+            "updated_at": current_time,
+        }
+
+    return TaskStatus(**response)
+
+
+@app.post("/workflows", response_model=WorkflowStatus)
+def start_workflow(request: WorkflowRequest):
+    """提交 下载 → 音频 → ASR → 翻译 → TTS → 上传 流水线"""
+    if not downloader.validate_url(str(request.url)):
+        raise HTTPException(status_code=400, detail="Invalid YouTube URL")
+    workflow_id = workflow.submit(request.model_dump(mode="json"))
+    logger.info(f"Workflow submitted: {workflow_id} for URL: {request.url}")
+    return _workflow_status(workflow_id)
+
+
+def _workflow_status(workflow_id: str) -> WorkflowStatus:
+    state = workflow.WorkflowStore().get(workflow_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    for stage in state["stages"].values():
+        for field in ("started_at", "finished_at"):
+            if stage.get(field):
+                stage[field] = datetime.fromtimestamp(stage[field], tz=timezone.utc)
+    return WorkflowStatus(**state)
+
+
+@app.get("/workflows/{workflow_id}", response_model=WorkflowStatus)
+def get_workflow(workflow_id: str):
+    """查询工作流及各阶段的状态和耗时"""
+    return _workflow_status(workflow_id)
+
+
+@app.post("/workflows/{workflow_id}/resume", response_model=WorkflowStatus)
+def resume_workflow(workflow_id: str):
+    """重新提交失败的工作流，从最后完成的阶段之后继续"""
+    state = _workflow_status(workflow_id)
+    if state.status != "failed":
+        raise HTTPException(status_code=409, detail=f"Workflow is {state.status}")
+    # 失败后仍有阶段在执行（如等待重试）时重新提交会让同一阶段并发执行两次
+    running = sorted(name for name, stage in state.stages.items() if stage.status == "running")
+    if running:
+        raise HTTPException(status_code=409, detail=f"Stages still running: {', '.join(running)}")
+    workflow.submit(workflow_id=workflow_id)
+    return _workflow_status(workflow_id)
+
+
+def _channel_subscription(sub: Dict[str, Any]) -> ChannelSubscription:
+    def _ts(value):
+        return datetime.fromtimestamp(value, tz=timezone.utc) if value else None
+
+    return ChannelSubscription(
+        channel_id=sub["channel_id"],
+        options=sub.get("options") or {},
+        interval=sub["interval"],
+        last_published=_ts(sub.get("last_published")),
+        last_polled=_ts(sub.get("last_polled")),
+        next_poll=_ts(sub["next_poll"]),
+    )
+
+
+@app.post("/channels", response_model=ChannelSubscription)
+def subscribe_channel(request: ChannelSubscribeRequest):
+    """订阅频道，之后由 poll_channels_task 自动下载新上传的视频"""
+    if request.transcode_target and request.transcode_target not in TRANSCODE_PRESETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown transcode target: {request.transcode_target}",
+        )
+    options = request.model_dump(mode="json", exclude={"channel_id", "backfill"})
+    sub = ChannelRegistry().subscribe(request.channel_id, options, backfill=request.backfill)
+    logger.info(f"Subscribed to channel {request.channel_id}")
+    return _channel_subscription(sub)
+
+
+@app.get("/channels", response_model=List[ChannelSubscription])
+def list_channels():
+    """列出已订阅的频道及其抓取计划"""
+    return [_channel_subscription(sub) for sub in ChannelRegistry().list()]
+
+
+@app.delete("/channels/{channel_id}")
+def unsubscribe_channel(channel_id: str):
+    """取消频道订阅"""
+    if not ChannelRegistry().unsubscribe(channel_id):
+        raise HTTPException(status_code=404, detail="Channel not subscribed")
+    return {"channel_id": channel_id, "status": "unsubscribed"}
+
+
 @app.get("/status/{task_id}", response_model=TaskStatus)
 async def get_task_status(task_id: str):
     """获取任务状态"""
     try:
-        # 从Celery获取任务状态
-        task = celery_app.AsyncResult(task_id)
-
-        current_time = datetime.now(timezone.utc)
-
-        if task.state == "PENDING":
-            response = {
-                "task_id": task_id,
-                "status": "pending",
-                "message": "Task is waiting to be processed",
-                "created_at": current_time,
-                "updated_at": current_time,
-            }
-        elif task.state == "PROGRESS":
-            progress = task.info.get("progress", 0) if task.info else 0
-            current_step = task.info.get("current_step", "") if task.info else ""
-            response = {
-                "task_id": task_id,
-                "status": "processing",
-                "message": "Task is being processed",
-                "progress": (
-                    int(progress)
-                    if isinstance(progress, (int, float, str))
-                    and str(progress).isdigit()
-                    else None
-                ),
-                "current_step": str(current_step) if current_step else None,
-                "created_at": current_time,
-                "updated_at": current_time,
-            }
-        elif task.state == "SUCCESS":
-            result = task.result if isinstance(task.result, dict) else None
-            response = {
-                "task_id": task_id,
-                "status": "completed",
-                "message": "Task completed successfully",
-                "result": result,
-                "created_at": current_time,
-                "updated_at": current_time,
-            }
-        else:  # FAILURE
-            error_info = str(task.info) if task.info else "Unknown error"
-            response = {
-                "task_id": task_id,
-                "status": "failed",
-                "message": error_info,
-                "error": error_info,
-                "created_at": current_time,
-                "updated_at": current_time,
-            }
-
-        return TaskStatus(**response)
+        task = await task_client.get_state(task_id)
+        return _build_task_status(task_id, task)
 
     except Exception as e:
         logger.error(f"Error getting task status: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/status/batch", response_model=List[TaskStatus])
+async def get_task_status_batch(request: TaskStatusBatchRequest):
+    """批量获取任务状态（一次Redis往返）"""
+    try:
+        tasks = await task_client.get_states(request.task_ids)
+        return [
+            _build_task_status(task_id, task)
+            for task_id, task in zip(request.task_ids, tasks)
+        ]
+
+    except Exception as e:
+        logger.error(f"Error getting task status batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/info")
-async def get_video_info(url: HttpUrl):
-    """获取视频信息（不下载）"""
+async def get_video_info(url: HttpUrl, refresh: bool = False):
+    """获取视频信息（不下载）；元数据库中已有时直接返回，refresh=true 强制重新提取"""
     try:
         if not downloader.validate_url(str(url)):
             raise HTTPException(status_code=400, detail="Invalid YouTube URL")
 
+        store = metadata_store.get_metadata_store()
+        video_id = downloader.video_id_from_url(str(url))
+        if store is not None and video_id and not refresh:
+            cached = await run_in_threadpool(store.get, video_id)
+            if cached:
+                return VideoInfo(**cached)
+
         info = await downloader.get_video_info(str(url))
+        if store is not None and isinstance(info, VideoInfo):
+            await run_in_threadpool(
+                metadata_store.enqueue, [metadata_store.record_from_info(info.model_dump(), str(url))]
+            )
         return info
 
     except HTTPException:
@@ -183,6 +454,151 @@ async def get_video_info(url: HttpUrl):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _require_metadata_store() -> metadata_store.MetadataStore:
+    store = metadata_store.get_metadata_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Metadata store is not configured")
+    return store
+
+
+@app.get("/videos", response_model=VideoListResponse)
+def list_videos(
+    channel_id: Optional[str] = None,
+    channel: Optional[str] = None,
+    tag: Optional[str] = None,
+    uploaded_after: Optional[str] = None,
+    uploaded_before: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+):
+    """按频道、上传日期（YYYYMMDD）、标签查询已入库的视频元数据，游标分页"""
+    store = _require_metadata_store()
+    try:
+        page = store.query(
+            channel_id=channel_id,
+            channel=channel,
+            tag=tag,
+            uploaded_after=uploaded_after,
+            uploaded_before=uploaded_before,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return VideoListResponse(items=[VideoInfo(**item) for item in page["items"]], next_cursor=page["next_cursor"])
+
+
+@app.get("/videos/{video_id}", response_model=VideoInfo)
+def get_stored_video(video_id: str):
+    """从元数据库获取单个视频的信息"""
+    info = _require_metadata_store().get(video_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    return VideoInfo(**info)
+
+
+@app.get("/artifacts", response_model=ArtifactListResponse)
+def list_artifacts(
+    video_id: Optional[str] = None,
+    kind: Optional[str] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    min_age: Optional[float] = None,
+    max_age: Optional[float] = None,
+    sort: str = "mtime",
+    order: str = "desc",
+    limit: int = 50,
+    cursor: Optional[str] = None,
+):
+    """按视频、类型、大小、文件年龄（秒）查询已下载的产物，游标分页
+
+    由产物索引提供，不遍历下载目录；索引中已不存在的文件从本页剔除并移出索引，
+    因此一页可能少于 limit 条，以 next_cursor 是否为空判断是否结束。
+    """
+    if kind is not None and kind not in ARTIFACT_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported kind: {kind}")
+    store = _require_metadata_store()
+    now = datetime.now(timezone.utc).timestamp()
+    try:
+        page = store.query_artifacts(
+            video_id=video_id,
+            kind=kind,
+            min_size=min_size,
+            max_size=max_size,
+            modified_after=now - max_age if max_age is not None else None,
+            modified_before=now - min_age if min_age is not None else None,
+            sort=sort,
+            order=order,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    items = []
+    missing = []
+    for item in page["items"]:
+        if downloader.layout.resolve(item["name"]) is None:
+            missing.append(item["name"])
+            continue
+        items.append(
+            ArtifactEntry(
+                name=item["name"],
+                video_id=item["youtube_id"],
+                kind=item["kind"],
+                lang=item["lang"],
+                size=item["size"],
+                modified_at=datetime.fromtimestamp(item["mtime"], tz=timezone.utc),
+                sha256=item["sha256"],
+                url=downloader.layout.public_url(item["name"]),
+            )
+        )
+    if missing:
+        try:
+            store.delete_artifacts(names=missing)
+        except Exception as e:
+            logger.warning(f"Failed to drop {len(missing)} missing artifacts from index: {str(e)}")
+    return ArtifactListResponse(items=items, next_cursor=page["next_cursor"])
+
+
+@lru_cache(maxsize=64)
+def _load_segment_index(path: str, mtime_ns: int) -> SegmentIndex:
+    """按路径和修改时间缓存已加载的分段索引"""
+    return SegmentIndex.load(path)
+
+
+@app.get("/subtitles/{video_id}/{lang}", response_model=SubtitleSegmentsResponse)
+def get_subtitle_segments(
+    video_id: str, lang: str, start: float = 0, end: Optional[float] = None
+):
+    """按时间范围查询去重后的字幕片段（秒）"""
+    path = downloader.layout.resolve(f"{video_id}.{lang}{SEGMENTS_SUFFIX}")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Subtitle segments not found")
+
+    index = _load_segment_index(str(path), path.stat().st_mtime_ns)
+    end_ms = int(end * 1000) if end is not None else (index.ends[-1] + 1 if len(index) else 0)
+    segments = index.lookup(int(start * 1000), end_ms)
+    return SubtitleSegmentsResponse(
+        video_id=video_id,
+        lang=lang,
+        total=len(index),
+        segments=[
+            SubtitleSegment(start=s.start / 1000, end=s.end / 1000, text=s.text)
+            for s in segments
+        ],
+    )
+
+
+@app.get("/profiles/{task_id}")
+def get_task_profile(task_id: str):
+    """下载任务的采样剖析（折叠栈格式，可用 flamegraph.pl / speedscope 打开）"""
+    path = profile_path(task_id)
+    if path is None or not path.is_file():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=path.name)
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """全局异常处理"""
@@ -0,0 +1,355 @@
+"""Prometheus指标
+
+API进程通过 /metrics 端点暴露指标，Worker进程在启动时开启独立的HTTP导出端口
+（METRICS_PORT）。Worker使用solo pool，单进程内即可完成采集，无需多进程模式。
+
+热路径（进度回调、请求中间件）只做Counter/Histogram的一次加法；
+队列深度和磁盘占用等需要I/O的指标由自定义Collector在被抓取时才计算。
+"""
+
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from loguru import logger
+from prometheus_client import CONTENT_TYPE_LATEST  # noqa: F401  供 main.py 的 /metrics 响应使用
+from prometheus_client import (
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from . import tracing
+
+# 指标配置
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9090"))
+# 为空时统计Celery配置中的全部队列
+METRICS_QUEUES = [q.strip() for q in os.getenv("METRICS_QUEUES", "").split(",") if q.strip()]
+# 下载目录总大小的缓存时间（秒），避免每次抓取都遍历目录
+METRICS_DIR_SIZE_TTL = float(os.getenv("METRICS_DIR_SIZE_TTL", "60"))
+
+# 字节级分桶：1MB ~ 8GB
+_SIZE_BUCKETS = tuple(float(2**n) for n in range(20, 34))
+# 速度分桶：64KB/s ~ 128MB/s
+_SPEED_BUCKETS = tuple(float(2**n) for n in range(16, 28))
+# 内存分桶：16MB ~ 8GB
+_MEMORY_BUCKETS = tuple(float(2**n) for n in range(24, 34))
+# 阶段耗时分桶：10ms ~ 1h
+_PHASE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "ytdl_http_request_duration_seconds",
+    "API请求耗时",
+    ["method", "route", "status"],
+)
+EXTRACT_DURATION = Histogram(
+    "ytdl_extract_duration_seconds",
+    "yt-dlp元数据提取耗时",
+    ["operation"],
+    buckets=_PHASE_BUCKETS,
+)
+DOWNLOAD_BYTES = Counter(
+    "ytdl_download_bytes_total",
+    "已下载字节数",
+)
+DOWNLOAD_SPEED = Histogram(
+    "ytdl_download_speed_bytes_per_second",
+    "单个文件的平均下载速度",
+    buckets=_SPEED_BUCKETS,
+)
+FILE_SIZE = Histogram(
+    "ytdl_file_size_bytes",
+    "下载产物的文件大小",
+    ["kind"],
+    buckets=_SIZE_BUCKETS,
+)
+TASK_PHASE_DURATION = Histogram(
+    "ytdl_task_phase_duration_seconds",
+    "下载任务各阶段耗时",
+    ["phase"],
+    buckets=_PHASE_BUCKETS,
+)
+TASK_RETRIES = Counter(
+    "ytdl_task_retries_total",
+    "任务重试次数",
+    ["task", "error_class"],
+)
+TASK_FAILURES = Counter(
+    "ytdl_task_failures_total",
+    "任务最终失败次数",
+    ["task", "error_class"],
+)
+TASK_PEAK_RSS = Histogram(
+    "ytdl_task_peak_rss_bytes",
+    "任务执行期间Worker进程的峰值RSS",
+    ["task"],
+    buckets=_MEMORY_BUCKETS,
+)
+TASK_RSS_GROWTH = Histogram(
+    "ytdl_task_rss_growth_bytes",
+    "任务结束后相对开始前保留的RSS增量",
+    ["task"],
+    buckets=_MEMORY_BUCKETS,
+)
+WORKER_RECYCLES = Counter(
+    "ytdl_worker_recycles_total",
+    "Worker因内存上限或任务数上限主动退出的次数",
+    ["reason"],
+)
+PROXY_REQUESTS = Counter(
+    "ytdl_proxy_requests_total",
+    "经由出口代理的yt-dlp操作数",
+    ["proxy", "outcome"],
+)
+PROXY_SCORE = Gauge(
+    "ytdl_proxy_health_score",
+    "出口代理最近一次更新后的健康评分",
+    ["proxy"],
+)
+
+
+class PhaseTimer:
+    """记录任务阶段耗时的上下文管理器，开启追踪时同时记录 phase.<阶段> span"""
+
+    __slots__ = ("phase", "started", "_span")
+
+    def __init__(self, phase: str):
+        self.phase = phase
+        self.started = 0.0
+        self._span = tracing.span(f"phase.{phase}")
+
+    def __enter__(self) -> "PhaseTimer":
+        self._span.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        TASK_PHASE_DURATION.labels(phase=self.phase).observe(
+            time.perf_counter() - self.started
+        )
+        self._span.__exit__(*exc_info)
+
+
+class DownloadProgressMeter:
+    """把yt-dlp进度回调转换为字节计数和速度观测
+
+    每次回调只计算与上次的字节差并累加到Counter；文件完成时记录平均速度。
+    """
+
+    def __init__(self):
+        self._seen: Dict[str, int] = {}
+        self._started: Dict[str, float] = {}
+
+    def __call__(self, d: Dict[str, Any]) -> None:
+        filename = d.get("filename") or ""
+        status = d.get("status")
+        if status == "downloading":
+            downloaded = d.get("downloaded_bytes") or 0
+            previous = self._seen.get(filename)
+            if previous is None:
+                self._started[filename] = time.monotonic()
+                previous = 0
+            if downloaded > previous:
+                DOWNLOAD_BYTES.inc(downloaded - previous)
+            self._seen[filename] = downloaded
+        elif status == "finished":
+            total = d.get("total_bytes") or d.get("downloaded_bytes") or 0
+            previous = self._seen.pop(filename, 0)
+            if total > previous:
+                DOWNLOAD_BYTES.inc(total - previous)
+            started = self._started.pop(filename, None)
+            elapsed = d.get("elapsed") or (
+                time.monotonic() - started if started is not None else 0
+            )
+            if total and elapsed:
+                DOWNLOAD_SPEED.observe(total / elapsed)
+
+
+def observe_file_size(kind: str, path: Optional[str]) -> None:
+    """记录产物文件大小"""
+    if not path:
+        return
+    try:
+        FILE_SIZE.labels(kind=kind).observe(os.path.getsize(path))
+    except OSError:
+        pass
+
+
+class QueueDepthCollector(Collector):
+    """抓取时读取各Celery队列在Redis中的长度"""
+
+    def __init__(self, queues: List[str], redis_factory=None):
+        self.queues = queues
+        if redis_factory is None:
+            from .redis_client import get_redis
+
+            redis_factory = get_redis
+        self._redis_factory = redis_factory
+
+    def _families(self) -> GaugeMetricFamily:
+        return GaugeMetricFamily(
+            "ytdl_queue_depth", "Celery队列中等待的消息数", labels=["queue"]
+        )
+
+    def describe(self) -> Iterable[GaugeMetricFamily]:
+        # 注册时只描述指标，不触发Redis访问
+        yield self._families()
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        gauge = self._families()
+        try:
+            pipe = self._redis_factory().pipeline(transaction=False)
+            for queue in self.queues:
+                pipe.llen(queue)
+            for queue, depth in zip(self.queues, pipe.execute()):
+                gauge.add_metric([queue], depth)
+        except Exception as e:
+            logger.debug(f"Queue depth collection failed: {str(e)}")
+        yield gauge
+
+
+class DiskUsageCollector(Collector):
+    """抓取时读取下载目录所在卷的使用情况及目录总大小"""
+
+    def __init__(self, download_path: str):
+        self.download_path = Path(download_path)
+        self._dir_size = 0
+        self._dir_size_at = 0.0
+
+    def _directory_size(self) -> int:
+        now = time.monotonic()
+        if now - self._dir_size_at >= METRICS_DIR_SIZE_TTL:
+            total = 0
+            for root, _dirs, files in os.walk(self.download_path):
+                for name in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        continue
+            self._dir_size = total
+            self._dir_size_at = now
+        return self._dir_size
+
+    def _families(self):
+        volume = GaugeMetricFamily(
+            "ytdl_downloads_volume_bytes",
+            "下载目录所在卷的容量",
+            labels=["state"],
+        )
+        directory = GaugeMetricFamily(
+            "ytdl_downloads_directory_bytes", "下载目录中文件的总大小"
+        )
+        return volume, directory
+
+    def describe(self) -> Iterable[GaugeMetricFamily]:
+        # 注册时只描述指标，不遍历目录
+        yield from self._families()
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        volume, directory = self._families()
+        try:
+            total, used, free = shutil.disk_usage(self.download_path)
+            volume.add_metric(["total"], total)
+            volume.add_metric(["used"], used)
+            volume.add_metric(["free"], free)
+            directory.add_metric([], self._directory_size())
+        except OSError as e:
+            logger.debug(f"Disk usage collection failed: {str(e)}")
+        yield volume
+        yield directory
+
+
+_collectors_registered = False
+
+
+def monitored_queues() -> List[str]:
+    """需要统计深度的队列：显式配置优先，否则取Celery配置的全部队列"""
+    if METRICS_QUEUES:
+        return METRICS_QUEUES
+    from .celery_app import celery_app
+
+    queues = celery_app.conf.task_queues or [celery_app.conf.task_default_queue]
+    return [getattr(queue, "name", queue) for queue in queues]
+
+
+def register_collectors(download_path: str, registry=REGISTRY) -> None:
+    """注册按需计算的Collector（每个进程只注册一次）"""
+    global _collectors_registered
+    if _collectors_registered:
+        return
+    registry.register(QueueDepthCollector(monitored_queues()))
+    registry.register(DiskUsageCollector(download_path))
+    _collectors_registered = True
+
+
+def start_worker_exporter(download_path: str) -> None:
+    """在Worker进程中启动指标导出HTTP服务"""
+    if not METRICS_ENABLED:
+        return
+    register_collectors(download_path)
+    try:
+        start_http_server(METRICS_PORT)
+        logger.info(f"Worker metrics exporter listening on :{METRICS_PORT}")
+    except OSError as e:
+        logger.warning(f"Failed to start metrics exporter: {str(e)}")
+
+
+def render_latest(registry=REGISTRY) -> bytes:
+    """生成Prometheus文本格式"""
+    return generate_latest(registry)
+
+
+class PrometheusMiddleware:
+    """按路由模板记录请求耗时的ASGI中间件
+
+    路由标签取自匹配到的路由模板（如 /status/{task_id}），避免任务ID导致的标签爆炸。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Optional[Dict[int, str]] = None
+
+    def _route_label(self, scope: Dict[str, Any]) -> str:
+        if self._route_paths is None:
+            router_app = scope.get("app")
+            routes = getattr(router_app, "routes", [])
+            self._route_paths = {}
+            for route in routes:
+                target = getattr(route, "endpoint", None) or getattr(route, "app", None)
+                if target is not None:
+                    self._route_paths[id(target)] = route.path
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        return self._route_paths.get(id(endpoint), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_DURATION.labels(
+                method=scope["method"],
+                route=self._route_label(scope),
+                status=str(status_code),
+            ).observe(time.perf_counter() - started)
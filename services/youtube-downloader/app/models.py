@@ -1,5 +1,5 @@
 from pydantic import BaseModel, HttpUrl, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from enum import Enum
 from datetime import datetime
 
@@ -24,6 +24,12 @@ class DownloadRequest(BaseModel):
     subtitle_langs: Optional[List[str]] = Field(
         default=["zh-CN", "en"], description="字幕语言列表"
     )
+    transcode_target: Optional[str] = Field(
+        default=None, description="下载后转换的目标预设，如 mp4、web-720p、audio-m4a"
+    )
+    profile: bool = Field(
+        default=False, description="在采样剖析下执行任务，结果的 profile 字段给出剖析文件地址"
+    )
 
     model_config = {
         "json_schema_extra": {
@@ -37,6 +43,62 @@ class DownloadRequest(BaseModel):
     }
 
 
+class WorkflowRequest(BaseModel):
+    """流水线工作流请求模型"""
+
+    url: HttpUrl = Field(..., description="YouTube视频URL")
+    quality: VideoQuality = Field(default=VideoQuality.BEST, description="视频质量")
+    subtitle_langs: Optional[List[str]] = Field(
+        default=["zh-CN", "en"], description="字幕语言列表"
+    )
+
+
+class WorkflowStageStatus(BaseModel):
+    """流水线阶段状态模型"""
+
+    status: str = Field(..., description="阶段状态：running/completed/failed")
+    attempts: int = Field(default=0, description="执行次数")
+    started_at: Optional[datetime] = Field(default=None, description="开始时间")
+    finished_at: Optional[datetime] = Field(default=None, description="结束时间")
+    duration: Optional[float] = Field(default=None, description="耗时（秒）")
+    output: Optional[Any] = Field(default=None, description="阶段输出")
+    error: Optional[str] = Field(default=None, description="错误信息")
+
+
+class WorkflowStatus(BaseModel):
+    """流水线工作流状态模型"""
+
+    workflow_id: str = Field(..., description="工作流ID")
+    status: str = Field(..., description="工作流状态：running/completed/failed")
+    error: Optional[str] = Field(default=None, description="失败的阶段与原因")
+    params: Dict[str, Any] = Field(default_factory=dict, description="提交参数")
+    stages: Dict[str, WorkflowStageStatus] = Field(default_factory=dict, description="各阶段状态")
+
+
+class ChannelSubscribeRequest(BaseModel):
+    """频道订阅请求模型"""
+
+    channel_id: str = Field(..., pattern=r"^UC[\w-]{22}$", description="YouTube频道ID（UC开头）")
+    quality: VideoQuality = Field(default=VideoQuality.BEST, description="新视频的下载质量")
+    audio_only: bool = Field(default=False, description="仅下载音频")
+    subtitle_langs: Optional[List[str]] = Field(
+        default=["zh-CN", "en"], description="字幕语言列表"
+    )
+    transcode_target: Optional[str] = Field(default=None, description="下载后转换的目标预设")
+    backfill: bool = Field(default=False, description="首次抓取时是否下载频道最近的视频")
+
+
+class ChannelSubscription(BaseModel):
+    """频道订阅状态模型"""
+
+    channel_id: str = Field(..., description="YouTube频道ID")
+    options: Dict[str, Any] = Field(default_factory=dict, description="新视频的下载选项")
+    interval: float = Field(..., description="当前抓取间隔（秒）")
+    last_published: Optional[datetime] = Field(default=None, description="已见过的最新发布时间")
+    last_polled: Optional[datetime] = Field(default=None, description="上次抓取时间")
+    next_poll: datetime = Field(..., description="下次抓取时间")
+
+
 class DownloadResponse(BaseModel):
     """下载响应模型"""
 
@@ -45,6 +107,62 @@ class DownloadResponse(BaseModel):
     message: str = Field(..., description="响应消息")
 
 
+class AsrFeedRequest(BaseModel):
+    """ASR音频供给请求模型"""
+
+    url: HttpUrl = Field(..., description="YouTube视频URL")
+    chunk_seconds: float = Field(default=30, ge=1, le=300, description="每个音频块的时长（秒）")
+    chunk_format: Literal["pcm", "flac"] = Field(
+        default="flac", description="音频块格式：16kHz单声道FLAC或s16le PCM"
+    )
+
+
+class AsrFeedResponse(BaseModel):
+    """ASR音频供给响应模型"""
+
+    task_id: str = Field(..., description="任务ID")
+    status: str = Field(..., description="任务状态")
+    stream: str = Field(..., description="发布音频块的Redis Stream键")
+    message: str = Field(..., description="响应消息")
+
+
+class LiveRecordingRequest(BaseModel):
+    """直播录制请求模型"""
+
+    url: HttpUrl = Field(..., description="直播URL")
+    segment_seconds: float = Field(default=60, ge=2, le=3600, description="每个分段的时长（秒）")
+    max_duration: Optional[int] = Field(
+        default=None, ge=10, description="最长录制时长（秒），不超过服务端上限，默认为服务端上限"
+    )
+
+
+class LiveRecordingResponse(BaseModel):
+    """直播录制响应模型"""
+
+    task_id: str = Field(..., description="任务ID")
+    status: str = Field(..., description="任务状态")
+    stream: str = Field(..., description="发布已完成分段的Redis Stream键")
+    max_duration: int = Field(..., description="实际生效的最长录制时长（秒）")
+    message: str = Field(..., description="响应消息")
+
+
+class SubtitleSegment(BaseModel):
+    """字幕片段模型"""
+
+    start: float = Field(..., description="开始时间（秒）")
+    end: float = Field(..., description="结束时间（秒）")
+    text: str = Field(..., description="文本")
+
+
+class SubtitleSegmentsResponse(BaseModel):
+    """字幕片段查询响应模型"""
+
+    video_id: str = Field(..., description="视频ID")
+    lang: str = Field(..., description="字幕语言")
+    total: int = Field(..., description="该字幕的片段总数")
+    segments: List[SubtitleSegment] = Field(..., description="时间范围内的片段")
+
+
 class TaskStatus(BaseModel):
     """任务状态模型"""
 
@@ -59,6 +177,12 @@ class TaskStatus(BaseModel):
     updated_at: Optional[datetime] = Field(default=None, description="更新时间")
 
 
+class TaskStatusBatchRequest(BaseModel):
+    """批量任务状态查询请求模型"""
+
+    task_ids: List[str] = Field(..., min_length=1, max_length=200, description="任务ID列表")
+
+
 class VideoInfo(BaseModel):
     """视频信息模型"""
 
@@ -78,6 +202,33 @@ class VideoInfo(BaseModel):
     available_subtitles: Optional[List[str]] = Field(default=None, description="可用字幕语言")
 
 
+class VideoListResponse(BaseModel):
+    """元数据库视频列表响应模型"""
+
+    items: List[VideoInfo] = Field(..., description="本页视频信息")
+    next_cursor: Optional[str] = Field(default=None, description="下一页游标，为空表示没有更多")
+
+
+class ArtifactEntry(BaseModel):
+    """下载产物条目模型"""
+
+    name: str = Field(..., description="文件名")
+    video_id: str = Field(..., description="视频ID")
+    kind: str = Field(..., description="产物类别：video/audio/subtitle/thumbnail等")
+    lang: Optional[str] = Field(default=None, description="字幕语言")
+    size: int = Field(..., description="文件大小（字节）")
+    modified_at: datetime = Field(..., description="修改时间")
+    sha256: Optional[str] = Field(default=None, description="SHA-256")
+    url: str = Field(..., description="下载URL")
+
+
+class ArtifactListResponse(BaseModel):
+    """下载产物列表响应模型"""
+
+    items: List[ArtifactEntry] = Field(..., description="本页产物")
+    next_cursor: Optional[str] = Field(default=None, description="下一页游标，为空表示没有更多")
+
+
 class DownloadResult(BaseModel):
     """下载结果模型"""
 
@@ -89,6 +240,9 @@ class DownloadResult(BaseModel):
     metadata: Optional[VideoInfo] = Field(default=None, description="视频元数据")
     file_size: Optional[int] = Field(default=None, description="文件大小（字节）")
     download_time: Optional[float] = Field(default=None, description="下载耗时（秒）")
+    format_info: Optional[Dict[str, Any]] = Field(
+        default=None, description="实际交付的格式（分辨率、编码）与请求质量的对比"
+    )
 
 
 class HealthCheck(BaseModel):
@@ -0,0 +1,395 @@
+"""对象存储上传阶段
+
+把下载完成的产物以并行分片（multipart）方式上传到S3兼容存储（生产环境为MinIO）。
+
+- 内存有界：同时在途的分片数不超过 UPLOAD_CONCURRENCY，
+  因此缓冲上限约为 UPLOAD_CONCURRENCY × UPLOAD_PART_SIZE
+- 每个分片计算SHA-256，随请求提交由服务端校验（ChecksumSHA256）
+- 边下载边上传：progressive/分片下载时yt-dlp顺序追加写 .part 文件，
+  StreamingUpload 跟随文件增长，每凑满一个分片就开始上传；下载结束后只需补传最后一段
+
+OBJECT_STORE_URL 选择后端：
+
+- ``s3://<bucket>``     S3/MinIO（boto3，端点由 S3_ENDPOINT_URL 指定）
+- ``memory://<bucket>`` 进程内替身，用于测试和本地开发
+- 空                    不上传
+"""
+
+import base64
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+# 对象存储配置
+OBJECT_STORE_URL = os.getenv("OBJECT_STORE_URL", "")
+OBJECT_STORE_PREFIX = os.getenv("OBJECT_STORE_PREFIX", "videos").strip("/")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", str(16 * 1024 * 1024)))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+# 跟随增长文件时的轮询间隔（秒）
+UPLOAD_POLL_INTERVAL = float(os.getenv("UPLOAD_POLL_INTERVAL", "0.2"))
+
+# S3要求除最后一个分片外每片至少5MB
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class UploadError(Exception):
+    """上传失败"""
+
+
+def part_checksum(data: bytes) -> str:
+    """分片SHA-256（base64，与S3 ChecksumSHA256格式一致）"""
+    return base64.b64encode(hashlib.sha256(data).digest()).decode("ascii")
+
+
+class MemoryObjectStore:
+    """进程内对象存储替身，接口与 S3ObjectStore 相同"""
+
+    _buckets: Dict[str, "MemoryObjectStore"] = {}
+    min_part_size = 1
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+        self.objects: Dict[str, bytes] = {}
+        self._uploads: Dict[str, Dict[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_bucket(cls, bucket: str) -> "MemoryObjectStore":
+        """同一进程内同名bucket共享同一实例"""
+        if bucket not in cls._buckets:
+            cls._buckets[bucket] = cls(bucket)
+        return cls._buckets[bucket]
+
+    def create_multipart_upload(self, key: str) -> str:
+        upload_id = hashlib.sha1(f"{key}:{time.time_ns()}".encode()).hexdigest()
+        with self._lock:
+            self._uploads[upload_id] = {}
+        return upload_id
+
+    def upload_part(
+        self, key: str, upload_id: str, part_number: int, data: bytes, checksum: str
+    ) -> str:
+        if part_checksum(data) != checksum:
+            raise UploadError(f"Checksum mismatch for {key} part {part_number}")
+        with self._lock:
+            self._uploads[upload_id][part_number] = bytes(data)
+        return hashlib.md5(data).hexdigest()
+
+    def complete_multipart_upload(
+        self, key: str, upload_id: str, parts: List[Dict[str, Any]]
+    ) -> None:
+        with self._lock:
+            stored = self._uploads.pop(upload_id)
+            self.objects[key] = b"".join(stored[p["PartNumber"]] for p in parts)
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+
+
+class S3ObjectStore:
+    """S3兼容存储（MinIO）"""
+
+    min_part_size = MIN_PART_SIZE
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = S3_ENDPOINT_URL):
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = bucket
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=S3_REGION,
+            config=Config(max_pool_connections=max(UPLOAD_CONCURRENCY * 2, 10)),
+        )
+
+    def create_multipart_upload(self, key: str) -> str:
+        response = self._client.create_multipart_upload(
+            Bucket=self.bucket, Key=key, ChecksumAlgorithm="SHA256"
+        )
+        return response["UploadId"]
+
+    def upload_part(
+        self, key: str, upload_id: str, part_number: int, data: bytes, checksum: str
+    ) -> str:
+        response = self._client.upload_part(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data,
+            ChecksumSHA256=checksum,
+        )
+        return response["ETag"]
+
+    def complete_multipart_upload(
+        self, key: str, upload_id: str, parts: List[Dict[str, Any]]
+    ) -> None:
+        self._client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        self._client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+
+
+@lru_cache(maxsize=None)
+def get_object_store(url: str = OBJECT_STORE_URL):
+    """根据URL创建对象存储后端（按URL缓存），未配置时返回None"""
+    if not url:
+        return None
+    scheme, _, bucket = url.partition("://")
+    bucket = bucket.strip("/")
+    if scheme == "memory":
+        return MemoryObjectStore.for_bucket(bucket or "videos")
+    if scheme == "s3":
+        return S3ObjectStore(bucket)
+    raise ValueError(f"Unsupported object store URL: {url}")
+
+
+class StreamingUpload:
+    """跟随文件增长的单对象分片上传
+
+    后台线程读取文件：每当未读数据满一个分片即提交上传；调用 finish() 后
+    读到文件末尾、上传最后一段并完成multipart。文件被截断（下载从头重来）时
+    中止本次上传，由调用方在下载完成后整体重传。
+    """
+
+    def __init__(
+        self,
+        store,
+        key: str,
+        executor: ThreadPoolExecutor,
+        part_size: int = UPLOAD_PART_SIZE,
+        concurrency: int = UPLOAD_CONCURRENCY,
+        poll_interval: float = UPLOAD_POLL_INTERVAL,
+    ):
+        self.store = store
+        self.key = key
+        self.part_size = max(part_size, store.min_part_size)
+        self.poll_interval = poll_interval
+        self._executor = executor
+        self._slots = threading.BoundedSemaphore(max(concurrency, 1))
+        self._finished = threading.Event()
+        self._aborted = threading.Event()
+        self._parts: List[Future] = []
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+        self._upload_id: Optional[str] = None
+        self.bytes_uploaded = 0
+        self.started_at = 0.0
+        self.source_inode: Optional[int] = None
+
+    def start(self, path: str) -> "StreamingUpload":
+        """开始跟随 path 上传（文件可能仍在写入）"""
+        self.source_inode = os.stat(path).st_ino
+        self.started_at = time.perf_counter()
+        self._upload_id = self.store.create_multipart_upload(self.key)
+        self._thread = threading.Thread(
+            target=self._run, args=(path,), name=f"upload-{Path(self.key).name}", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _submit(self, part_number: int, data: bytes) -> None:
+        self._slots.acquire()
+        checksum = part_checksum(data)
+
+        def _upload():
+            try:
+                etag = self.store.upload_part(self.key, self._upload_id, part_number, data, checksum)
+                return {"PartNumber": part_number, "ETag": etag, "ChecksumSHA256": checksum}
+            finally:
+                self._slots.release()
+
+        self._parts.append(self._executor.submit(_upload))
+        self.bytes_uploaded += len(data)
+
+    def _run(self, path: str) -> None:
+        part_number = 1
+        offset = 0
+        try:
+            with open(path, "rb") as f:
+                while not self._aborted.is_set():
+                    finished = self._finished.is_set()
+                    size = os.fstat(f.fileno()).st_size
+                    if size < offset:
+                        raise UploadError(f"{path} was truncated while uploading")
+                    available = size - offset
+                    if available >= self.part_size or (finished and available > 0):
+                        data = f.read(min(available, self.part_size))
+                        self._submit(part_number, data)
+                        part_number += 1
+                        offset += len(data)
+                        continue
+                    if finished:
+                        break
+                    time.sleep(self.poll_interval)
+            if part_number == 1:
+                # 空文件也需要至少一个分片
+                self._submit(part_number, b"")
+        except BaseException as e:  # 在finish()中统一抛出
+            self._error = e
+
+    def mark_finished(self) -> None:
+        """源文件已写完，后台线程读到末尾即结束（不等待）"""
+        self._finished.set()
+
+    def matches(self, path: str) -> bool:
+        """已上传内容是否就是 path 的当前内容（后处理替换过的文件需要重传）"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_ino == self.source_inode and stat.st_size == self.bytes_uploaded
+
+    def finish(self) -> Dict[str, Any]:
+        """标记源文件写入结束，等待全部分片上传并完成对象"""
+        self._finished.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            if self._error is not None:
+                raise self._error
+            parts = [future.result() for future in self._parts]
+            self.store.complete_multipart_upload(self.key, self._upload_id, parts)
+        except BaseException:
+            self.abort()
+            raise
+        return {
+            "key": self.key,
+            "size": self.bytes_uploaded,
+            "parts": len(self._parts),
+            "seconds": round(time.perf_counter() - self.started_at, 3),
+        }
+
+    def abort(self) -> None:
+        """中止multipart上传，丢弃已上传分片"""
+        self._aborted.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        for future in self._parts:
+            future.cancel()
+        if self._upload_id is not None:
+            try:
+                self.store.abort_multipart_upload(self.key, self._upload_id)
+            except Exception as e:
+                logger.warning(f"Failed to abort upload {self.key}: {str(e)}")
+
+
+class ArtifactUploader:
+    """下载任务的上传阶段
+
+    作为yt-dlp进度回调接入时，对无需合并的单文件下载边下边传；
+    下载结束后由 upload_artifacts() 补齐其余产物并返回对象键。
+    """
+
+    def __init__(
+        self,
+        store,
+        prefix: str = OBJECT_STORE_PREFIX,
+        part_size: int = UPLOAD_PART_SIZE,
+        concurrency: int = UPLOAD_CONCURRENCY,
+    ):
+        self.store = store
+        self.prefix = prefix
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(concurrency, 1), thread_name_prefix="upload-part"
+        )
+        # 最终文件名 -> 边下边传的上传
+        self._streaming: Dict[str, StreamingUpload] = {}
+
+    def object_key(self, video_id: str, filename: str) -> str:
+        parts = [self.prefix, video_id, filename] if self.prefix else [video_id, filename]
+        return "/".join(parts)
+
+    def _new_upload(self, key: str) -> StreamingUpload:
+        return StreamingUpload(
+            self.store, key, self._executor, self.part_size, self.concurrency
+        )
+
+    def progress_hook(self, d: Dict[str, Any]) -> None:
+        """yt-dlp进度回调：开始跟随仍在写入的单文件下载"""
+        if d.get("status") == "finished" and d.get("filename") in self._streaming:
+            self._streaming[d["filename"]].mark_finished()
+            return
+        if d.get("status") != "downloading":
+            return
+        info = d.get("info_dict") or {}
+        filename = d.get("filename")
+        tmpfilename = d.get("tmpfilename")
+        # 需要合并的多流下载，最终文件在合并后才产生，不做边下边传
+        if not filename or not tmpfilename or info.get("requested_formats"):
+            return
+        if filename in self._streaming or not os.path.exists(tmpfilename):
+            return
+        video_id = info.get("id") or Path(filename).name.split(".", 1)[0]
+        key = self.object_key(video_id, Path(filename).name)
+        try:
+            self._streaming[filename] = self._new_upload(key).start(tmpfilename)
+        except Exception as e:
+            logger.warning(f"Streaming upload for {filename} not started: {str(e)}")
+
+    def _upload_one(self, video_id: str, path: str) -> Dict[str, Any]:
+        streaming = self._streaming.pop(path, None)
+        if streaming is not None:
+            try:
+                uploaded = streaming.finish()
+                if streaming.matches(path):
+                    return uploaded
+                logger.info(f"{path} changed after streaming upload, uploading again")
+            except Exception as e:
+                logger.warning(f"Streaming upload of {path} failed, retrying whole file: {str(e)}")
+        upload = self._new_upload(self.object_key(video_id, Path(path).name))
+        upload.start(path)
+        return upload.finish()
+
+    def upload_artifacts(self, video_id: str, paths: Dict[str, Any]) -> Dict[str, Any]:
+        """上传全部产物
+
+        paths 为 {产物类型: 路径}，值也可以是 {语言: 路径}（字幕）；
+        返回同结构的对象键以及上传字节数。
+        """
+        uploaded_bytes = 0
+
+        def _upload_tree(tree: Dict[str, Any]) -> Dict[str, Any]:
+            nonlocal uploaded_bytes
+            keys: Dict[str, Any] = {}
+            for kind, path in tree.items():
+                if isinstance(path, dict):
+                    keys[kind] = _upload_tree(path)
+                elif path and os.path.exists(path):
+                    uploaded = self._upload_one(video_id, path)
+                    keys[kind] = uploaded["key"]
+                    uploaded_bytes += uploaded["size"]
+            return keys
+
+        try:
+            object_keys = _upload_tree(paths)
+        finally:
+            for leftover in self._streaming.values():
+                leftover.abort()
+            self._streaming.clear()
+        return {"object_keys": object_keys, "uploaded_bytes": uploaded_bytes}
+
+    def close(self) -> None:
+        """中止未完成的上传并释放线程池"""
+        for leftover in self._streaming.values():
+            leftover.abort()
+        self._streaming.clear()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,131 @@
+"""分离音视频流的并行下载
+
+yt-dlp对 ``bv+ba`` 这类需要合并的格式按顺序逐个下载各路流。这里在正式下载前
+用多个线程同时下载各路流，文件名与yt-dlp合并时使用的中间文件一致
+（``<id>.f<format_id>.<ext>``）；随后的 ``ydl.download()`` 发现中间文件已存在便跳过下载，
+直接用FFmpegMerger以流复制方式合并，字幕、缩略图等仍走原有流程。
+
+合并后yt-dlp会删除中间文件；需要单独的音频时（流水线的音频阶段）用 keep_audio_stream
+为音频流建立硬链接 ``<id>.audio.<ext>``，不必再从源站下载一次。
+"""
+
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+
+def intermediate_filename(merged_filename: str, fmt: Dict[str, Any]) -> str:
+    """yt-dlp合并前各路流的中间文件名"""
+    base = os.path.splitext(merged_filename)[0]
+    return f"{base}.f{fmt['format_id']}.{fmt['ext']}"
+
+
+class CombinedProgress:
+    """把多路流的进度合并为一个文件的进度回调"""
+
+    def __init__(self, callback: Callable[[Dict[str, Any]], None], filename: str, info: Dict[str, Any]):
+        self.callback = callback
+        self.filename = filename
+        self.info = info
+        self._streams: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, d: Dict[str, Any]) -> None:
+        with self._lock:
+            self._streams[d.get("filename") or ""] = d
+            streams = list(self._streams.values())
+            downloaded = sum(s.get("downloaded_bytes") or s.get("total_bytes") or 0 for s in streams)
+            total = sum(s.get("total_bytes") or s.get("total_bytes_estimate") or 0 for s in streams)
+            combined = {
+                "status": "downloading",
+                "filename": self.filename,
+                "tmpfilename": self.filename + ".part",
+                "downloaded_bytes": downloaded,
+                "total_bytes_estimate": total,
+                "speed": sum(s.get("speed") or 0 for s in streams if s.get("status") == "downloading"),
+                "eta": max((s.get("eta") or 0 for s in streams), default=0),
+                "info_dict": self.info,
+            }
+        self.callback(combined)
+
+    def finished(self) -> None:
+        """全部流下载完成"""
+        with self._lock:
+            total = sum(
+                s.get("total_bytes") or s.get("downloaded_bytes") or 0 for s in self._streams.values()
+            )
+        self.callback(
+            {
+                "status": "finished",
+                "filename": self.filename,
+                "total_bytes": total,
+                "downloaded_bytes": total,
+                "info_dict": self.info,
+            }
+        )
+
+
+def prefetch_streams(
+    ydl,
+    info: Dict[str, Any],
+    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> List[str]:
+    """并行下载 info['requested_formats'] 中的各路流，返回已下载的中间文件
+
+    任一路失败时抛出异常并保留已下载部分，后续 ydl.download() 会续传或重新下载。
+    """
+    formats = info.get("requested_formats") or []
+    if len(formats) < 2:
+        return []
+
+    merged_filename = ydl.prepare_filename(info)
+    combined = CombinedProgress(progress_callback, merged_filename, info) if progress_callback else None
+    jobs = []
+    for fmt in formats:
+        new_info = dict(info)
+        del new_info["requested_formats"]
+        new_info.update(fmt)
+        jobs.append((intermediate_filename(merged_filename, fmt), new_info))
+
+    # YoutubeDL.dl 每次调用创建独立的FileDownloader，进度回调取自实例，临时替换为合并回调
+    original_hooks = ydl._progress_hooks
+    ydl._progress_hooks = [combined] if combined else []
+    try:
+        with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="stream") as executor:
+            futures = [executor.submit(ydl.dl, filename, new_info) for filename, new_info in jobs]
+            results = [future.result() for future in futures]
+    finally:
+        ydl._progress_hooks = original_hooks
+
+    if not all(success for success, _real in results):
+        raise RuntimeError(f"Parallel stream download failed for {info.get('id')}")
+    if combined:
+        combined.finished()
+    filenames = [filename for filename, _ in jobs]
+    logger.info(f"Downloaded {len(filenames)} streams in parallel: {filenames}")
+    return filenames
+
+
+def keep_audio_stream(ydl, info: Dict[str, Any], filenames: List[str]) -> Optional[str]:
+    """保留已预下载的音频流（硬链接，跨文件系统时复制），返回保留的路径"""
+    merged_filename = ydl.prepare_filename(info)
+    for fmt in info.get("requested_formats") or []:
+        if fmt.get("vcodec", "none") != "none" or fmt.get("height"):
+            # 只保留纯音频流
+            continue
+        source = intermediate_filename(merged_filename, fmt)
+        if source not in filenames or not os.path.exists(source):
+            continue
+        target = f"{os.path.splitext(merged_filename)[0]}.audio.{fmt['ext']}"
+        if os.path.exists(target):
+            os.remove(target)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+        return target
+    return None
@@ -0,0 +1,140 @@
+"""按需的任务采样剖析
+
+下载请求带 profile=true，或按全局采样率 PROFILE_SAMPLE_RATE（如 0.001 即千分之一）抽中的任务，
+在执行期间由后台线程每 PROFILE_INTERVAL_MS 毫秒采样一次进程内全部线程的调用栈（墙钟时间，
+包括yt-dlp、并行分流下载、上传线程和等待I/O的时间）。未开启时没有任何开销，开启时每次采样
+只遍历各线程的栈帧，默认间隔下开销约在1%以内。
+
+结果按折叠栈格式（``线程;模块:函数;... 次数``）写入 PROFILE_DIR/<任务ID>.folded，
+可直接用 flamegraph.pl、speedscope 或 inferno 打开；任务结果中的 profile 字段给出下载地址
+（/profiles/<任务ID>）、采样数和自身耗时最多的函数。
+"""
+
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 剖析配置
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_DEPTH = int(os.getenv("PROFILE_MAX_DEPTH", "64"))
+PROFILE_TOP = 10
+
+_TASK_ID_RE = re.compile(r"^[\w-]{1,64}$")
+
+
+def should_profile(requested: bool = False, rate: Optional[float] = None) -> bool:
+    """显式请求，或按全局采样率抽中"""
+    rate = PROFILE_SAMPLE_RATE if rate is None else rate
+    return bool(requested) or (rate > 0 and random.random() < rate)
+
+
+def profile_path(task_id: str, directory: Optional[str] = None) -> Optional[Path]:
+    """任务的剖析文件路径；任务ID不合法时返回None"""
+    if not _TASK_ID_RE.match(task_id or ""):
+        return None
+    return Path(directory or PROFILE_DIR) / f"{task_id}.folded"
+
+
+def _frame_label(code: Any) -> str:
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """后台线程定时采样调用栈，按折叠栈聚合"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000, max_depth: int = PROFILE_MAX_DEPTH):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="task-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(exclude=own)
+
+    def sample(self, exclude: Optional[int] = None) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == exclude:
+                continue
+            labels: List[str] = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names.get(ident, str(ident)))
+            self.stacks[";".join(reversed(labels))] += 1
+        self.samples += 1
+
+    def top(self, limit: int = PROFILE_TOP) -> List[Dict[str, Any]]:
+        """自身采样数最多的函数（各线程合计）"""
+        self_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack.rsplit(";", 1)[-1]] += count
+        total = sum(self_counts.values()) or 1
+        return [
+            {"function": name, "samples": count, "share": round(count / total, 4)}
+            for name, count in self_counts.most_common(limit)
+        ]
+
+    def write(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(tmp, path)
+
+
+class TaskProfile:
+    """一次任务的剖析：start() 开始采样，finish() 停止并写出文件，返回任务结果中的摘要"""
+
+    def __init__(self, task_id: str, directory: Optional[str] = None):
+        self.task_id = task_id
+        self.path = profile_path(task_id, directory)
+        self.profiler = SamplingProfiler()
+
+    def start(self) -> "TaskProfile":
+        self.profiler.start()
+        return self
+
+    def finish(self) -> Optional[Dict[str, Any]]:
+        self.profiler.stop()
+        if self.path is None:
+            return None
+        self.profiler.write(self.path)
+        return {
+            "path": str(self.path),
+            "url": f"/profiles/{self.task_id}",
+            "format": "folded",
+            "samples": self.profiler.samples,
+            "interval_ms": round(self.profiler.interval * 1000, 3),
+            "duration": round(self.profiler.duration, 3),
+            "top": self.profiler.top(),
+        }
@@ -0,0 +1,301 @@
+"""出口代理池与健康评分
+
+yt-dlp的请求（提取信息、解析直连地址、下载）经由 PROXY_POOL_URLS 中的代理发出，分摊到多个出口IP，
+总吞吐不再受单个IP的限流约束。代理列表也可以由 PROXY_POOL_FILE 提供（每行一个，``#`` 开头为注释，
+文件修改后自动重新加载），便于由外部的代理供应商或运维脚本维护。
+
+每个代理的健康状态保存在Redis哈希 PROXY_HEALTH_KEY 中，所有Worker和API进程共享：
+
+- 成功率和请求延迟按指数滑动平均（PROXY_EWMA_ALPHA）更新，429次数按 PROXY_THROTTLE_HALF_LIFE 衰减；
+- 评分 = 成功率 × 延迟系数（延迟不超过 PROXY_LATENCY_TARGET 时为1）× 0.5^近期429次数；
+- 收到429或评分低于 PROXY_MIN_SCORE 的代理进入冷却（PROXY_COOLDOWN_SECONDS 起，连续冷却时翻倍，
+  不超过 PROXY_MAX_COOLDOWN_SECONDS），冷却期内不分配请求，之后的一次成功清零冷却计数。
+
+请求按视频ID在未冷却的代理间做加权rendezvous哈希：同一视频的各次请求固定落在同一代理
+（yt-dlp取到的直连地址通常与出口IP绑定），不同视频按评分成比例分散到整个池。
+Redis不可用时按等权重分配，不记录健康状态（fail open）。
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+import urllib.error
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import redis
+from loguru import logger
+
+from . import metrics
+from .redis_client import get_redis
+
+# 代理池配置
+PROXY_POOL_URLS = [p.strip() for p in os.getenv("PROXY_POOL_URLS", "").split(",") if p.strip()]
+PROXY_POOL_FILE = os.getenv("PROXY_POOL_FILE", "")
+PROXY_HEALTH_KEY = os.getenv("PROXY_HEALTH_KEY", "proxy:health")
+PROXY_EWMA_ALPHA = float(os.getenv("PROXY_EWMA_ALPHA", "0.2"))
+# 提取信息的延迟不超过该值（秒）时不扣分
+PROXY_LATENCY_TARGET = float(os.getenv("PROXY_LATENCY_TARGET", "5"))
+PROXY_THROTTLE_HALF_LIFE = float(os.getenv("PROXY_THROTTLE_HALF_LIFE", "600"))
+PROXY_MIN_SCORE = float(os.getenv("PROXY_MIN_SCORE", "0.3"))
+PROXY_COOLDOWN_SECONDS = float(os.getenv("PROXY_COOLDOWN_SECONDS", "120"))
+PROXY_MAX_COOLDOWN_SECONDS = float(os.getenv("PROXY_MAX_COOLDOWN_SECONDS", "1800"))
+
+# 评分为0的代理在冷却结束后仍保留的最小权重，使其有机会恢复
+MIN_WEIGHT = 0.01
+THROTTLE_MARKERS = ("HTTP Error 429", "Too Many Requests")
+
+
+class ProxyThrottled(Exception):
+    """请求被限流（429），由任务换用其他代理重试"""
+
+
+def new_stats() -> Dict[str, float]:
+    return {"success": 1.0, "latency": 0.0, "throttled": 0.0, "cooldown_until": 0.0, "cooldowns": 0, "ts": 0.0}
+
+
+def decayed_throttles(stats: Dict[str, float], now: float, half_life: float = PROXY_THROTTLE_HALF_LIFE) -> float:
+    elapsed = max(now - stats.get("ts", now), 0.0)
+    return stats.get("throttled", 0.0) * 0.5 ** (elapsed / half_life)
+
+
+def score(stats: Dict[str, float], now: float, latency_target: float = PROXY_LATENCY_TARGET) -> float:
+    """健康评分（0~1）"""
+    latency = stats.get("latency", 0.0)
+    latency_factor = latency_target / latency if latency > latency_target else 1.0
+    return stats.get("success", 1.0) * latency_factor * 0.5 ** decayed_throttles(stats, now)
+
+
+def update_stats(
+    stats: Dict[str, float],
+    ok: bool,
+    now: float,
+    latency: Optional[float] = None,
+    throttled: bool = False,
+    alpha: float = PROXY_EWMA_ALPHA,
+) -> Dict[str, float]:
+    """按一次请求的结果更新统计，需要时进入冷却"""
+    stats = dict(stats)
+    stats["throttled"] = decayed_throttles(stats, now) + (1 if throttled else 0)
+    stats["success"] = (1 - alpha) * stats.get("success", 1.0) + alpha * (1.0 if ok else 0.0)
+    if latency is not None:
+        previous = stats.get("latency") or latency
+        stats["latency"] = (1 - alpha) * previous + alpha * latency
+    stats["ts"] = now
+
+    if throttled or score(stats, now) < PROXY_MIN_SCORE:
+        if stats.get("cooldown_until", 0.0) <= now:
+            stats["cooldowns"] = int(stats.get("cooldowns", 0)) + 1
+            duration = min(PROXY_COOLDOWN_SECONDS * 2 ** (stats["cooldowns"] - 1), PROXY_MAX_COOLDOWN_SECONDS)
+            stats["cooldown_until"] = now + duration
+    elif ok:
+        stats["cooldowns"] = 0
+    return stats
+
+
+def _hash_unit(key: str, proxy: str) -> float:
+    """(视频, 代理) 对应的 (0, 1) 区间内的均匀哈希值"""
+    digest = hashlib.sha1(f"{key}|{proxy}".encode("utf-8")).digest()
+    return (int.from_bytes(digest[:8], "big") + 1) / (2 ** 64 + 2)
+
+
+def rendezvous(key: str, weights: Dict[str, float]) -> str:
+    """加权rendezvous哈希：key固定对应一个代理，各代理被选中的概率与权重成正比"""
+    return max(weights, key=lambda proxy: -weights[proxy] / math.log(_hash_unit(key, proxy)))
+
+
+def redact(proxy: str) -> str:
+    """日志和指标中去掉代理地址里的认证信息"""
+    scheme, sep, rest = proxy.rpartition("://")
+    return f"{scheme}{sep}{rest.rpartition('@')[2]}"
+
+
+class FileProxySource:
+    """从文件读取代理列表，文件修改后重新加载"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._proxies: List[str] = []
+
+    def __call__(self) -> List[str]:
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime != self._mtime:
+                with open(self.path, encoding="utf-8") as f:
+                    lines = [line.strip() for line in f]
+                self._proxies = [line for line in lines if line and not line.startswith("#")]
+                self._mtime = mtime
+        except OSError as e:
+            logger.warning(f"Failed to read proxy list {self.path}: {str(e)}")
+        return self._proxies
+
+
+class ProxyPool:
+    """出口代理池
+
+    source 返回当前的代理列表（静态列表或 FileProxySource 等任意可调用对象）。
+    """
+
+    def __init__(
+        self,
+        source: Callable[[], List[str]],
+        redis_factory=get_redis,
+        key: str = PROXY_HEALTH_KEY,
+        clock=time.time,
+    ):
+        self._source = source
+        self._redis_factory = redis_factory
+        self.key = key
+        self._clock = clock
+
+    def proxies(self) -> List[str]:
+        return list(self._source())
+
+    def health(self) -> Dict[str, Dict[str, float]]:
+        """各代理当前的统计（未出现过的代理为初始值）"""
+        raw = self._redis_factory().hgetall(self.key)
+        stored = {
+            (field.decode("utf-8") if isinstance(field, bytes) else field): json.loads(value)
+            for field, value in raw.items()
+        }
+        return {proxy: stored.get(proxy) or new_stats() for proxy in self.proxies()}
+
+    def select(self, key: str) -> Optional[str]:
+        """为视频选择代理，池为空时返回None"""
+        proxies = self.proxies()
+        if not proxies:
+            return None
+        now = self._clock()
+        try:
+            health = self.health()
+        except redis.RedisError as e:
+            logger.warning(f"Proxy health unavailable, spreading requests evenly: {str(e)}")
+            return rendezvous(key, dict.fromkeys(proxies, 1.0))
+
+        weights = {
+            proxy: max(score(stats, now), MIN_WEIGHT)
+            for proxy, stats in health.items()
+            if stats.get("cooldown_until", 0.0) <= now
+        }
+        if not weights:
+            # 全部在冷却中：选最先结束冷却的，不让请求直接失败
+            proxy = min(health, key=lambda p: health[p].get("cooldown_until", 0.0))
+            logger.warning(f"All proxies cooling down, using {redact(proxy)}")
+            return proxy
+        return rendezvous(key, weights)
+
+    def record(self, proxy: str, ok: bool, latency: Optional[float] = None, throttled: bool = False) -> None:
+        """记录一次请求结果（WATCH事务内读改写，多个进程并发更新不会互相覆盖）"""
+        outcome = "throttled" if throttled else ("ok" if ok else "error")
+        metrics.PROXY_REQUESTS.labels(proxy=redact(proxy), outcome=outcome).inc()
+        client = self._redis_factory()
+        updated: Dict[str, float] = {}
+
+        def _update(pipe):
+            nonlocal updated
+            now = self._clock()
+            current = pipe.hget(self.key, proxy)
+            stats = json.loads(current) if current else new_stats()
+            updated = update_stats(stats, ok, now, latency=latency, throttled=throttled)
+            pipe.multi()
+            pipe.hset(self.key, proxy, json.dumps(updated))
+
+        try:
+            client.transaction(_update, self.key)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to record proxy health for {redact(proxy)}: {str(e)}")
+            return
+        metrics.PROXY_SCORE.labels(proxy=redact(proxy)).set(score(updated, updated["ts"]))
+        if updated["cooldown_until"] > updated["ts"] and outcome != "ok":
+            logger.warning(
+                f"Proxy {redact(proxy)} cooling down for {updated['cooldown_until'] - updated['ts']:.0f}s "
+                f"({outcome}, score {score(updated, updated['ts']):.2f})"
+            )
+
+
+class ProxyLease:
+    """一次yt-dlp操作对代理的使用
+
+    作为yt-dlp的 ``logger`` 转发日志，同时从错误和警告中识别429；observe_latency 记录请求延迟。
+    """
+
+    def __init__(self, proxy: str):
+        self.proxy = proxy
+        self.latency: Optional[float] = None
+        self.errors = 0
+        self.throttled = False
+        self._lock = threading.Lock()
+
+    def observe_latency(self, seconds: float) -> None:
+        self.latency = seconds
+
+    def _check(self, msg: str) -> None:
+        if any(marker in msg for marker in THROTTLE_MARKERS):
+            with self._lock:
+                self.throttled = True
+
+    def debug(self, msg: str) -> None:
+        logger.debug(msg)
+
+    def info(self, msg: str) -> None:
+        logger.info(msg)
+
+    def warning(self, msg: str) -> None:
+        self._check(msg)
+        logger.warning(msg)
+
+    def error(self, msg: str) -> None:
+        self._check(msg)
+        with self._lock:
+            self.errors += 1
+        logger.error(msg)
+
+
+def blames_proxy(exc: BaseException) -> bool:
+    """异常是否来自经代理的请求（网络、HTTP、提取错误或限流）；磁盘空间、合并等本地错误不算"""
+    from yt_dlp.networking.exceptions import RequestError
+    from yt_dlp.utils import DownloadError, ExtractorError
+
+    if isinstance(exc, ProxyThrottled) or any(marker in str(exc) for marker in THROTTLE_MARKERS):
+        return True
+    if isinstance(exc, DownloadError):
+        # yt-dlp把底层异常包装为DownloadError；没有底层异常时为提取/HTTP错误的报告
+        cause = exc.exc_info[1] if exc.exc_info else None
+        return cause is None or blames_proxy(cause)
+    return isinstance(exc, (ExtractorError, RequestError, ConnectionError, TimeoutError, urllib.error.URLError))
+
+
+@contextmanager
+def lease(pool: Optional[ProxyPool], key: str, opts: Dict[str, Any]) -> Iterator[Optional[ProxyLease]]:
+    """为一次yt-dlp操作分配代理并写入选项，结束时按结果更新健康状态；未配置代理池时不做任何事"""
+    proxy = pool.select(key) if pool is not None else None
+    if proxy is None:
+        yield None
+        return
+    current = ProxyLease(proxy)
+    opts["proxy"] = proxy
+    opts["logger"] = current
+    try:
+        yield current
+    except Exception as exc:
+        if not blames_proxy(exc):
+            # 本地错误（磁盘空间不足、合并失败等）与出口无关，不影响代理的健康状态
+            raise
+        current._check(str(exc))
+        pool.record(proxy, False, latency=current.latency, throttled=current.throttled)
+        raise
+    ok = not current.errors and not current.throttled
+    pool.record(proxy, ok, latency=current.latency, throttled=current.throttled)
+
+
+def get_proxy_pool() -> Optional[ProxyPool]:
+    """按配置创建代理池，未配置时返回None"""
+    if PROXY_POOL_FILE:
+        return ProxyPool(FileProxySource(PROXY_POOL_FILE))
+    if PROXY_POOL_URLS:
+        return ProxyPool(lambda: PROXY_POOL_URLS)
+    return None
@@ -0,0 +1,113 @@
+"""共享Redis连接池
+
+API进程和Worker进程中所有直接访问Redis的代码都通过这里获取客户端，
+避免每次请求新建连接。同步客户端用于Celery任务等阻塞上下文，
+异步客户端用于FastAPI处理函数，二者各自持有一个进程级连接池。
+开启追踪（TRACING_ENABLED）时使用带span的客户端，每个命令/pipeline一个span。
+"""
+
+import os
+from typing import Any, ContextManager, Optional
+
+import redis
+import redis.asyncio as aioredis
+from redis.asyncio.client import Pipeline as AsyncPipeline
+from redis.client import Pipeline
+
+from . import tracing
+
+# Redis配置
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "20"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", "5"))
+
+
+def _command_span(args: tuple) -> ContextManager[Any]:
+    return tracing.span(f"redis {args[0]}", "client", {"db.system": "redis"})
+
+
+def _pipeline_span(pipe: Pipeline) -> ContextManager[Any]:
+    return tracing.span(
+        "redis pipeline", "client", {"db.system": "redis", "db.redis.commands": len(pipe.command_stack)}
+    )
+
+
+class TracedPipeline(Pipeline):
+    def execute(self, raise_on_error=True):
+        with _pipeline_span(self):
+            return super().execute(raise_on_error)
+
+
+class TracedRedis(redis.Redis):
+    """每个命令一个span的同步客户端"""
+
+    def execute_command(self, *args, **options):
+        with _command_span(args):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return TracedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class TracedAsyncPipeline(AsyncPipeline):
+    async def execute(self, raise_on_error: bool = True):
+        with _pipeline_span(self):
+            return await super().execute(raise_on_error)
+
+
+class TracedAsyncRedis(aioredis.Redis):
+    """每个命令一个span的异步客户端"""
+
+    async def execute_command(self, *args, **options):
+        with _command_span(args):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None):
+        return TracedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+_sync_client: Optional[redis.Redis] = None
+_async_client: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """获取进程共享的同步Redis客户端"""
+    global _sync_client
+    if _sync_client is None:
+        pool = redis.ConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT,
+        )
+        client_class = TracedRedis if tracing.TRACING_ENABLED else redis.Redis
+        _sync_client = client_class(connection_pool=pool)
+    return _sync_client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """获取进程共享的异步Redis客户端
+
+    连接池绑定到首次使用它的事件循环，应用关闭时需调用 close_async_redis()。
+    """
+    global _async_client
+    if _async_client is None:
+        pool = aioredis.ConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT,
+        )
+        client_class = TracedAsyncRedis if tracing.TRACING_ENABLED else aioredis.Redis
+        _async_client = client_class(connection_pool=pool)
+    return _async_client
+
+
+async def close_async_redis() -> None:
+    """关闭异步客户端及其连接池"""
+    global _async_client
+    if _async_client is not None:
+        client, _async_client = _async_client, None
+        await client.close()
+        await client.connection_pool.disconnect()
@@ -0,0 +1,180 @@
+"""下载目录布局与路径解析
+
+两种布局：
+
+- flat:    所有产物直接放在下载根目录，``<root>/<id>.<ext>``（历史布局）
+- sharded: 按视频ID哈希分片，同一视频的所有产物集中在一个目录，
+           ``<root>/ab/cd/<id>/<id>.<ext>``，避免单目录条目过多导致的目录操作变慢
+
+对外URL始终保持 ``/downloads/<文件名>`` 不变，由 resolve() 把文件名映射到实际路径；
+解析时先查当前布局，再回退到旧的平铺路径，因此迁移过程中新旧文件都可访问。
+
+迁移已有的平铺目录：
+
+    python -m app.storage_layout migrate --root downloads [--dry-run]
+"""
+
+import argparse
+import hashlib
+import os
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from loguru import logger
+
+# 布局配置
+STORAGE_LAYOUT = os.getenv("STORAGE_LAYOUT", "flat").lower()
+STORAGE_SHARD_DEPTH = int(os.getenv("STORAGE_SHARD_DEPTH", "2"))
+STORAGE_SHARD_WIDTH = int(os.getenv("STORAGE_SHARD_WIDTH", "2"))
+
+# 下载过程中的临时文件，迁移和统计时跳过
+PARTIAL_SUFFIXES = (".part", ".ytdl", ".temp", ".tmp")
+
+
+def video_id_from_filename(filename: str) -> str:
+    """从产物文件名中取出视频ID（<id>.<ext> / <id>.<lang>.<ext> / <id>.description）"""
+    return filename.split(".", 1)[0]
+
+
+def is_partial(filename: str) -> bool:
+    """是否为下载中的临时文件"""
+    return filename.endswith(PARTIAL_SUFFIXES) or ".part-Frag" in filename
+
+
+class StorageLayout:
+    """下载根目录下的产物路径计算"""
+
+    def __init__(
+        self,
+        root: str,
+        layout: str = STORAGE_LAYOUT,
+        depth: int = STORAGE_SHARD_DEPTH,
+        width: int = STORAGE_SHARD_WIDTH,
+    ):
+        if layout not in ("flat", "sharded"):
+            raise ValueError(f"Unknown storage layout: {layout}")
+        self.root = Path(root)
+        self.layout = layout
+        self.depth = depth
+        self.width = width
+
+    @property
+    def sharded(self) -> bool:
+        return self.layout == "sharded"
+
+    def shard_parts(self, video_id: str) -> Tuple[str, ...]:
+        """视频ID对应的分片目录名，如 ('ab', 'cd')"""
+        digest = hashlib.sha1(video_id.encode("utf-8")).hexdigest()
+        return tuple(
+            digest[i * self.width : (i + 1) * self.width] for i in range(self.depth)
+        )
+
+    def video_dir(self, video_id: str) -> Path:
+        """视频所有产物所在目录"""
+        if not self.sharded:
+            return self.root
+        return self.root.joinpath(*self.shard_parts(video_id), video_id)
+
+    def ensure_video_dir(self, video_id: str) -> Path:
+        path = self.video_dir(video_id)
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def artifact_path(self, video_id: str, filename: str) -> Path:
+        return self.video_dir(video_id) / filename
+
+    def resolve(self, filename: str) -> Optional[Path]:
+        """把 /downloads/ 下的文件名解析为实际存在的路径
+
+        支持稳定URL形式（仅文件名）以及直接的相对路径；拒绝越出根目录的路径。
+        """
+        relative = Path(filename)
+        if relative.is_absolute() or ".." in relative.parts:
+            return None
+
+        candidates = []
+        if len(relative.parts) == 1:
+            video_id = video_id_from_filename(relative.name)
+            if video_id:
+                candidates.append(self.artifact_path(video_id, relative.name))
+            candidates.append(self.root / relative.name)
+        else:
+            candidates.append(self.root / relative)
+
+        for candidate in candidates:
+            if candidate.is_file():
+                return candidate
+        return None
+
+    def public_url(self, path: Optional[str]) -> Optional[str]:
+        """产物路径对应的稳定下载URL"""
+        if not path:
+            return None
+        return f"/downloads/{Path(path).name}"
+
+    def iter_files(self) -> Iterator[Path]:
+        """遍历下载根目录下的全部产物文件（不含临时文件）"""
+        for directory, _dirs, files in os.walk(self.root):
+            for name in files:
+                if not is_partial(name):
+                    yield Path(directory) / name
+
+    def prune_empty_dirs(self, start: Path) -> None:
+        """删除产物目录及其空的上级分片目录"""
+        current = start
+        while current != self.root and self.root in current.parents:
+            try:
+                current.rmdir()
+            except OSError:
+                break
+            current = current.parent
+
+
+def migrate_flat_directory(layout: StorageLayout, dry_run: bool = False) -> dict:
+    """把根目录下平铺的产物移动到分片目录
+
+    同一文件系统内使用 os.replace，单个文件的移动是原子的；可重复执行。
+    """
+    if not layout.sharded:
+        raise ValueError("Target layout must be 'sharded'")
+
+    moved = skipped = 0
+    with os.scandir(layout.root) as entries:
+        for entry in entries:
+            if not entry.is_file() or is_partial(entry.name):
+                if entry.is_file():
+                    skipped += 1
+                continue
+            video_id = video_id_from_filename(entry.name)
+            if not video_id:
+                skipped += 1
+                continue
+            target = layout.artifact_path(video_id, entry.name)
+            if dry_run:
+                logger.info(f"Would move {entry.path} -> {target}")
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(entry.path, target)
+            moved += 1
+
+    logger.info(f"Migration finished: moved={moved} skipped={skipped} dry_run={dry_run}")
+    return {"moved": moved, "skipped": skipped, "dry_run": dry_run}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="下载目录布局工具")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    migrate = subcommands.add_parser("migrate", help="把平铺目录迁移为分片布局")
+    migrate.add_argument("--root", default=os.getenv("DOWNLOAD_PATH", "downloads"))
+    migrate.add_argument("--depth", type=int, default=STORAGE_SHARD_DEPTH)
+    migrate.add_argument("--width", type=int, default=STORAGE_SHARD_WIDTH)
+    migrate.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        layout = StorageLayout(args.root, "sharded", args.depth, args.width)
+        migrate_flat_directory(layout, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""字幕解析与分段索引
+
+单次流式读取VTT/SRT，去掉YouTube自动字幕中滚动重复的行，输出紧凑的列式JSON：
+
+    {"version": 1, "source": "<id>.en.vtt", "lang": "en", "count": N,
+     "start": [毫秒...], "end": [毫秒...], "text": [...]}
+
+文件名为 ``<id>.<lang>.segments.json``，与原字幕放在同一目录。翻译、改写、TTS对齐等
+下游直接读取该文件，不再各自解析原始字幕；SegmentIndex 按时间范围二分查找片段。
+"""
+
+import bisect
+import html
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+SEGMENTS_SUFFIX = ".segments.json"
+SEGMENTS_VERSION = 1
+
+# 时间戳：[时:]分:秒.毫秒（VTT）或 时:分:秒,毫秒（SRT）
+_TIMESTAMP = re.compile(r"(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{1,3})")
+_TIMING = re.compile(r"^\s*(\S+)\s+-->\s+(\S+)")
+_TAG = re.compile(r"<[^>]*>")
+_SPACES = re.compile(r"\s+")
+
+# 与前一片段的间隔在此范围内的重复文本视为同一片段的延续
+_CONTINUATION_GAP_MS = 50
+
+
+class Cue(NamedTuple):
+    """原始字幕条目"""
+
+    start: int
+    end: int
+    lines: Tuple[str, ...]
+
+
+class Segment(NamedTuple):
+    """去重后的片段"""
+
+    start: int
+    end: int
+    text: str
+
+
+def parse_timestamp(value: str) -> Optional[int]:
+    """解析时间戳为毫秒"""
+    match = _TIMESTAMP.fullmatch(value.strip())
+    if not match:
+        return None
+    hours, minutes, seconds, millis = match.groups()
+    return (
+        (int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)) * 1000
+        + int(millis.ljust(3, "0"))
+    )
+
+
+def clean_line(line: str) -> str:
+    """去掉样式/逐词时间标签并解码HTML实体"""
+    if "<" in line:
+        line = _TAG.sub("", line)
+    if "&" in line:
+        line = html.unescape(line)
+    return _SPACES.sub(" ", line).strip()
+
+
+def iter_cues(lines: Iterable[str]) -> Iterator[Cue]:
+    """流式解析VTT/SRT条目
+
+    VTT以空行结束条目（YouTube自动字幕中只含空格的行属于正文）；
+    遇到新的时间行时同样结束上一条，兼容缺少空行分隔的SRT。
+    """
+    start = end = None
+    text: List[str] = []
+
+    def _finish(next_timing: bool = False) -> Optional[Cue]:
+        if start is None:
+            return None
+        # 缺少空行分隔的SRT，下一条的序号行会出现在正文末尾
+        if next_timing and text and text[-1].strip().isdigit():
+            text.pop()
+        cleaned = tuple(filter(None, (clean_line(t) for t in text)))
+        return Cue(start, end, cleaned) if cleaned else None
+
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        if "-->" in line:
+            match = _TIMING.match(line)
+            if match:
+                parsed_start, parsed_end = parse_timestamp(match.group(1)), parse_timestamp(match.group(2))
+                if parsed_start is not None and parsed_end is not None:
+                    cue = _finish(next_timing=True)
+                    if cue:
+                        yield cue
+                    start, end, text = parsed_start, parsed_end, []
+                    continue
+        if line == "" or (start is None and not line.strip()):
+            cue = _finish()
+            if cue:
+                yield cue
+            start = end = None
+            text = []
+            continue
+        if start is not None:
+            text.append(line)
+        # 条目之外的行（WEBVTT头、NOTE/STYLE块、SRT序号）忽略
+
+    cue = _finish()
+    if cue:
+        yield cue
+
+
+def dedupe_rolling(cues: Iterable[Cue]) -> Iterator[Segment]:
+    """去掉滚动字幕中重复显示的行
+
+    自动字幕每个条目先重复上一条的末尾行，再追加新行；只保留新出现的行。
+    完全重复且时间相接的条目并入前一片段（延长结束时间）。
+    """
+    previous_lines: Tuple[str, ...] = ()
+    pending: Optional[Segment] = None
+
+    for cue in cues:
+        lines = cue.lines
+        overlap = 0
+        for k in range(min(len(lines), len(previous_lines)), 0, -1):
+            if lines[:k] == previous_lines[-k:]:
+                overlap = k
+                break
+        new_lines = lines[overlap:]
+
+        if not new_lines:
+            if pending and cue.start <= pending.end + _CONTINUATION_GAP_MS:
+                pending = pending._replace(end=max(pending.end, cue.end))
+            previous_lines = lines
+            continue
+
+        if pending:
+            yield pending
+        pending = Segment(cue.start, cue.end, " ".join(new_lines))
+        previous_lines = lines
+
+    if pending:
+        yield pending
+
+
+def parse_file(path: str) -> Iterator[Segment]:
+    """流式解析字幕文件并去重"""
+    with open(path, encoding="utf-8-sig", errors="replace") as f:
+        yield from dedupe_rolling(iter_cues(f))
+
+
+def segments_path(subtitle_path: str) -> str:
+    """字幕文件对应的分段文件路径（<id>.<lang>.segments.json）"""
+    path = Path(subtitle_path)
+    return str(path.with_name(path.stem + SEGMENTS_SUFFIX))
+
+
+def build_segments(subtitle_path: str, output_path: Optional[str] = None) -> Dict[str, Any]:
+    """解析字幕并写出列式分段文件，返回输出路径与片段数"""
+    output_path = output_path or segments_path(subtitle_path)
+    starts: List[int] = []
+    ends: List[int] = []
+    texts: List[str] = []
+    segments = list(parse_file(subtitle_path))
+    # 规范要求条目按开始时间排序，个别文件不满足时排序以保证二分查找正确
+    if any(a.start > b.start for a, b in zip(segments, segments[1:])):
+        segments.sort(key=lambda segment: segment.start)
+    for segment in segments:
+        starts.append(segment.start)
+        ends.append(segment.end)
+        texts.append(segment.text)
+
+    name = Path(subtitle_path).name
+    parts = name.split(".")
+    document = {
+        "version": SEGMENTS_VERSION,
+        "source": name,
+        "lang": parts[-2] if len(parts) >= 3 else None,
+        "count": len(texts),
+        "start": starts,
+        "end": ends,
+        "text": texts,
+    }
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, output_path)
+    return {"path": output_path, "count": len(texts)}
+
+
+class SegmentIndex:
+    """分段文件的时间范围索引"""
+
+    def __init__(self, starts: List[int], ends: List[int], texts: List[str], lang: Optional[str] = None):
+        self.starts = starts
+        self.ends = ends
+        self.texts = texts
+        self.lang = lang
+        # 结束时间的前缀最大值，片段有重叠时也能二分定位下界
+        self._max_end: List[int] = []
+        running = -1
+        for end in ends:
+            running = max(running, end)
+            self._max_end.append(running)
+
+    @classmethod
+    def load(cls, path: str) -> "SegmentIndex":
+        with open(path, encoding="utf-8") as f:
+            document = json.load(f)
+        return cls(document["start"], document["end"], document["text"], document.get("lang"))
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def lookup(self, start_ms: int, end_ms: int) -> List[Segment]:
+        """返回与 [start_ms, end_ms) 有重叠的片段"""
+        low = bisect.bisect_right(self._max_end, start_ms)
+        high = bisect.bisect_left(self.starts, end_ms)
+        return [
+            Segment(self.starts[i], self.ends[i], self.texts[i])
+            for i in range(low, high)
+            if self.ends[i] > start_ms
+        ]
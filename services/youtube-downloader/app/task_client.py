@@ -0,0 +1,122 @@
+"""非阻塞任务提交与状态查询
+
+FastAPI处理函数运行在事件循环上，直接调用 celery_app.send_task 或
+AsyncResult(...).state 会在每个请求上阻塞一次Redis往返。
+这里把两类操作改造成可 await 的接口：
+
+- 状态查询：结果后端为Redis时，直接用共享的异步Redis连接池读取
+  Celery写入的 celery-task-meta-<id> 键，并复用后端自身的解码逻辑；
+  批量查询使用pipeline，一次往返取回全部状态。
+- 任务提交：kombu生产者是同步实现，放到有界线程池中执行，
+  事件循环只等待结果而不会被阻塞。
+
+其他结果后端（如测试模式下的内存后端）退化为在线程池中调用 AsyncResult。
+"""
+
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from celery import Celery, states
+
+from .redis_client import get_async_redis
+
+# 提交/查询线程池大小
+TASK_CLIENT_MAX_WORKERS = int(os.getenv("TASK_CLIENT_MAX_WORKERS", "16"))
+
+
+class TaskSnapshot(NamedTuple):
+    """任务状态快照，字段含义与 AsyncResult.state / AsyncResult.info 一致"""
+
+    state: str
+    info: Any
+
+
+class AsyncTaskClient:
+    """Celery任务的异步提交与状态查询客户端"""
+
+    def __init__(
+        self,
+        app: Celery,
+        redis_factory: Callable[[], Any] = get_async_redis,
+        max_workers: int = TASK_CLIENT_MAX_WORKERS,
+    ):
+        self._app = app
+        self._redis_factory = redis_factory
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def uses_redis_backend(self) -> bool:
+        """结果后端是否为Redis（决定是否走异步直读路径）"""
+        backend_url = str(self._app.conf.result_backend or "")
+        return backend_url.startswith(("redis://", "rediss://", "unix://"))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="task-client"
+            )
+        return self._executor
+
+    async def _run_blocking(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        # 带上当前上下文（追踪span），提交时才能把 traceparent 写入消息头
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._get_executor(), context.run, func, *args)
+
+    async def submit(self, name: str, kwargs: Dict[str, Any], task_id: str) -> str:
+        """提交任务，返回任务ID"""
+
+        def _send():
+            return self._app.send_task(name, kwargs=kwargs, task_id=task_id)
+
+        await self._run_blocking(_send)
+        return task_id
+
+    async def get_state(self, task_id: str) -> TaskSnapshot:
+        """查询单个任务状态"""
+        if not self.uses_redis_backend:
+            return await self._run_blocking(self._snapshot_from_result, task_id)
+
+        backend = self._app.backend
+        payload = await self._redis_factory().get(backend.get_key_for_task(task_id))
+        return self._snapshot_from_payload(payload)
+
+    async def get_states(self, task_ids: List[str]) -> List[TaskSnapshot]:
+        """批量查询任务状态，Redis后端下只产生一次网络往返"""
+        if not task_ids:
+            return []
+        if not self.uses_redis_backend:
+            return list(
+                await asyncio.gather(*(self.get_state(task_id) for task_id in task_ids))
+            )
+
+        backend = self._app.backend
+        pipe = self._redis_factory().pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.get(backend.get_key_for_task(task_id))
+        payloads = await pipe.execute()
+        return [self._snapshot_from_payload(payload) for payload in payloads]
+
+    def _snapshot_from_payload(self, payload: Optional[bytes]) -> TaskSnapshot:
+        """把Redis中的原始结果转换为快照（不存在即为PENDING）"""
+        if payload is None:
+            return TaskSnapshot(states.PENDING, None)
+        meta = self._app.backend.decode_result(payload)
+        return TaskSnapshot(meta.get("status", states.PENDING), meta.get("result"))
+
+    def _snapshot_from_result(self, task_id: str) -> TaskSnapshot:
+        """通过AsyncResult读取状态（在线程池中执行）"""
+        result = self._app.AsyncResult(task_id)
+        state = result.state
+        info = result.result if state == states.SUCCESS else result.info
+        return TaskSnapshot(state, info)
+
+    def shutdown(self) -> None:
+        """释放线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -1,4 +1,4 @@
-from celery import current_task
+from celery import chain, current_task
 from celery.exceptions import Retry
 from typing import List, Optional, Dict, Any
 import time
@@ -8,9 +8,27 @@ from loguru import logger
 from .celery_app import celery_app
 from .downloader import YouTubeDownloader
 from .models import DownloadResult
+from . import metrics
+from . import object_storage
+from . import transcode
+from . import asr_feed
+from . import subtitles
+from . import disk_budget
+from . import cache_eviction
+from . import checksums
+from . import metadata_store
+from . import artifact_index
+from . import channels
+from . import workflow
+from . import profiling
+from . import bandwidth
+from . import live_recording
+from .logging_config import ProgressLogSampler
 
 # 初始化下载器
 downloader = YouTubeDownloader(download_path="downloads")
+# 缓存访问记录与固定（进程内共享访问记录的节流状态）
+cache_index = cache_eviction.CacheIndex()
 
 
 
@@ -25,9 +43,19 @@ def download_video_task(
     subtitle_langs: Optional[List[str]] = None,
     download_thumbnail: bool = False,
     download_description: bool = False,
+    transcode_target: Optional[str] = None,
+    profile: bool = False,
+    disk_deferrals: int = 0,
+    keep_audio: bool = False,
+    workflow_id: Optional[str] = None,
     **kwargs
 ) -> Dict[str, Any]:
-    """异步视频下载任务"""
+    """异步视频下载任务
+
+    disk_deferrals 为因磁盘空间不足已延后的次数，与失败重试分开计数；keep_audio 为真时
+    结果中同时给出并行预下载的音频流（供流水线的音频阶段复用）。作为流水线的下载阶段执行时
+    （workflow_id），音频流一保留就记录到工作流，音频阶段不必等待合并、校验和上传。
+    """
 
     if subtitle_langs is None:
         subtitle_langs = ["zh-CN", "en"]
@@ -35,9 +63,78 @@ def download_video_task(
     # 获取任务ID
     task_id = self.request.id if self.request else 'unknown-task-id'
     start_time = time.time()
+    progress_meter = metrics.DownloadProgressMeter()
+    object_store = object_storage.get_object_store()
+    uploader = object_storage.ArtifactUploader(object_store) if object_store else None
+    checksum_tracker = checksums.ChecksumTracker() if checksums.CHECKSUM_ENABLED else None
+    reservation = disk_budget.Reservation(
+        disk_budget.DiskBudget(downloader.download_path) if disk_budget.DISK_BUDGET_ENABLED else None,
+        task_id,
+    )
+    # 按节点总带宽和单任务上限限速，未配置时为None
+    shaper = bandwidth.task_shaper(task_id)
+    pinned_ids: List[str] = []
+    progress_log = ProgressLogSampler()
+    # 显式请求或按全局采样率抽中时，整个下载过程在采样剖析下执行
+    task_profile = profiling.TaskProfile(task_id).start() if profiling.should_profile(profile) else None
+    profile_summary = None
+
+    def finish_profile() -> Optional[Dict[str, Any]]:
+        """停止剖析并写出文件（只执行一次）；写出失败只记日志，不掩盖任务本身的结果"""
+        nonlocal task_profile, profile_summary
+        if task_profile is None:
+            return profile_summary
+        running, task_profile = task_profile, None
+        try:
+            profile_summary = running.finish()
+        except Exception as e:
+            logger.warning(f"Task {task_id}: failed to write profile: {str(e)}")
+            return None
+        if profile_summary:
+            logger.info(
+                f"Task {task_id}: profile with {profile_summary['samples']} samples "
+                f"written to {profile_summary['path']}"
+            )
+        return profile_summary
+
+    def failure_meta(exc: Exception) -> Dict[str, Any]:
+        meta = {"error": str(exc), "task_id": task_id, "url": url}
+        summary = finish_profile()
+        if summary:
+            # 失败任务的剖析往往最有价值，状态中直接给出链接
+            meta["profile"] = summary["url"]
+        return meta
+
+    def on_info(info):
+        """提取信息之后、开始传输之前：固定视频产物并预留磁盘空间"""
+        video_id = info.get("id") if isinstance(info, dict) else None
+        if cache_eviction.CACHE_EVICTION_ENABLED and video_id:
+            cache_index.pin(video_id, task_id)
+            pinned_ids.append(video_id)
+        reservation.on_info(info)
+
+    def on_audio(path):
+        """音频流已保留：通知流水线的音频阶段（失败只记日志，音频阶段会在下载完成后再取）"""
+        if workflow_id is None:
+            return
+        try:
+            workflow.WorkflowStore().stream_ready(
+                workflow_id, "audio", {"path": path, "video_id": os.path.basename(path).split(".", 1)[0]}
+            )
+            logger.info(f"Task {task_id}: audio stream for workflow {workflow_id} ready at {path}")
+        except Exception as e:
+            logger.warning(f"Task {task_id}: failed to publish audio stream for workflow {workflow_id}: {str(e)}")
 
     def progress_hook(d):
         """下载进度回调"""
+        progress_meter(d)
+        reservation.progress_hook(d)
+        if shaper is not None:
+            shaper.progress_hook(d)
+        if uploader is not None:
+            uploader.progress_hook(d)
+        if checksum_tracker is not None:
+            checksum_tracker.progress_hook(d)
         if d["status"] == "downloading":
             try:
                 # 计算进度百分比
@@ -65,7 +162,8 @@ def download_video_task(
                     },
                 )
 
-                logger.info(f"Task {task_id}: Download progress {progress}%")
+                if progress_log.should_log(progress):
+                    logger.info(f"Task {task_id}: Download progress {progress}%")
 
             except Exception as e:
                 logger.error(f"Error updating progress: {str(e)}")
@@ -83,8 +181,9 @@ def download_video_task(
         logger.info(f"Starting download task {task_id} for URL: {url}")
 
         # 验证URL
-        if not downloader.validate_url(url):
-            raise ValueError(f"Invalid YouTube URL: {url}")
+        with metrics.PhaseTimer("validate"):
+            if not downloader.validate_url(url):
+                raise ValueError(f"Invalid YouTube URL: {url}")
 
         # 更新状态：开始处理
         self.update_state(
@@ -96,18 +195,78 @@ def download_video_task(
         )
 
         # 执行下载
-        result = downloader.download_video(
-            url=url,
-            quality=quality,
-            audio_only=audio_only,
-            subtitle_langs=subtitle_langs,
-            download_thumbnail=download_thumbnail,
-            download_description=download_description,
-            progress_callback=progress_hook,
+        with metrics.PhaseTimer("download"):
+            result = downloader.download_video(
+                url=url,
+                quality=quality,
+                audio_only=audio_only,
+                subtitle_langs=subtitle_langs,
+                download_thumbnail=download_thumbnail,
+                download_description=download_description,
+                progress_callback=progress_hook,
+                on_info=on_info,
+                rate_limiter=shaper,
+                keep_audio=keep_audio,
+                on_audio=on_audio,
+            )
+        if cache_eviction.CACHE_EVICTION_ENABLED and result.metadata and result.metadata.id:
+            # 新下载或复用已有产物都算一次访问
+            cache_index.touch(result.metadata.id)
+
+        # 字幕解析为去重后的分段文件，供下游直接使用
+        segment_paths = {}
+        with metrics.PhaseTimer("subtitles"):
+            for lang, subtitle_path in (result.subtitle_paths or {}).items():
+                try:
+                    segment_paths[lang] = subtitles.build_segments(subtitle_path)["path"]
+                except Exception as e:
+                    logger.warning(f"Failed to build segments for {subtitle_path}: {str(e)}")
+
+        video_id = (
+            result.metadata.id
+            if result.metadata
+            else os.path.basename(result.video_path or "").split(".", 1)[0]
         )
+        artifacts = {
+            "video": result.video_path,
+            "audio": result.audio_path,
+            "thumbnail": result.thumbnail_path,
+            "description": result.description_path,
+            "subtitles": dict(result.subtitle_paths or {}),
+            "subtitle_segments": segment_paths,
+        }
+
+        # 校验和：单文件下载在下载过程中已增量计算，其余产物补算后写入清单
+        file_checksums = None
+        manifest = None
+        if checksum_tracker is not None and video_id:
+            with metrics.PhaseTimer("checksum"):
+                try:
+                    file_checksums = checksum_tracker.checksum_artifacts(artifacts)
+                    media_path = result.video_path or result.audio_path
+                    if file_checksums and media_path:
+                        manifest = checksums.write_manifest(
+                            checksums.manifest_path(os.path.dirname(media_path), video_id),
+                            video_id,
+                            task_id,
+                            file_checksums,
+                        )
+                except Exception as e:
+                    logger.warning(f"Failed to record checksums for {video_id}: {str(e)}")
+
+        # 上传到对象存储（单文件下载在下载过程中已开始上传）
+        upload_result = None
+        if uploader is not None:
+            self.update_state(
+                state="PROGRESS",
+                meta={"progress": 100, "current_step": "Uploading artifacts"},
+            )
+            with metrics.PhaseTimer("upload"):
+                upload_result = uploader.upload_artifacts(video_id, dict(artifacts, manifest=manifest))
 
         # 计算下载时间
         download_time = time.time() - start_time
+        metrics.TASK_PHASE_DURATION.labels(phase="total").observe(download_time)
 
         # 构建返回结果
         task_result = {
@@ -117,28 +276,316 @@ def download_video_task(
             "video_path": result.video_path,
             "audio_path": result.audio_path,
             "subtitle_paths": result.subtitle_paths,
+            "subtitle_segment_paths": segment_paths,
             "thumbnail_path": result.thumbnail_path,
             "description_path": result.description_path,
             "file_size": result.file_size,
+            "format": result.format_info,
+            "checksums": file_checksums,
+            "manifest_path": manifest,
             "metadata": result.metadata.model_dump() if result.metadata else None,
+            # 稳定的下载URL，与磁盘布局无关
+            "download_urls": {
+                "video": downloader.layout.public_url(result.video_path),
+                "audio": downloader.layout.public_url(result.audio_path),
+                "thumbnail": downloader.layout.public_url(result.thumbnail_path),
+                "subtitles": {
+                    lang: downloader.layout.public_url(path)
+                    for lang, path in (result.subtitle_paths or {}).items()
+                },
+                "subtitle_segments": {
+                    lang: downloader.layout.public_url(path)
+                    for lang, path in segment_paths.items()
+                },
+                "manifest": downloader.layout.public_url(manifest),
+            },
+            "object_keys": upload_result["object_keys"] if upload_result else None,
         }
 
+        # 元数据与产物索引写入待写队列，由 flush_metadata_task 批量入库
+        indexed_artifacts = artifact_index.artifact_records(
+            artifact_index.flatten_paths(dict(artifacts, manifest=manifest)), file_checksums
+        )
+        if metadata_store.get_metadata_store() is not None and (result.metadata or indexed_artifacts):
+            metadata_store.enqueue(
+                [
+                    metadata_store.record_from_info(
+                        result.metadata.model_dump() if result.metadata else None,
+                        url,
+                        status="completed",
+                        artifacts=indexed_artifacts,
+                    )
+                ]
+            )
+
         logger.info(f"Task {task_id} completed successfully in {download_time:.2f}s")
-        return task_result
+
+    except disk_budget.InsufficientDiskSpace as exc:
+        # 磁盘空间不足：尚未开始传输，延后重新排队。延后次数通过 disk_deferrals 单独计数，
+        # self.request.retries 同时包含两类重试，不能用来判断任何一类的上限
+        if disk_deferrals >= disk_budget.DISK_DEFER_MAX_RETRIES:
+            logger.error(f"Task {task_id} gave up after {disk_deferrals} disk deferrals: {str(exc)}")
+            metrics.TASK_FAILURES.labels(
+                task="download_video_task", error_class=type(exc).__name__
+            ).inc()
+            self.update_state(state="FAILURE", meta=failure_meta(exc))
+            raise
+        logger.warning(f"Task {task_id} deferred ({disk_deferrals + 1}): {str(exc)}")
+        metrics.TASK_RETRIES.labels(
+            task="download_video_task", error_class=type(exc).__name__
+        ).inc()
+        self.update_state(
+            state="PROGRESS",
+            meta={"progress": 0, "current_step": "Waiting for disk space"},
+        )
+        raise self.retry(
+            exc=exc,
+            countdown=disk_budget.DISK_DEFER_COUNTDOWN,
+            kwargs={**(self.request.kwargs or {}), "disk_deferrals": disk_deferrals + 1},
+            # 两类上限都由上面自行判断，这里只给Celery一个不会先触发的总上限
+            max_retries=self.max_retries + disk_budget.DISK_DEFER_MAX_RETRIES,
+        )
 
     except Exception as exc:
         logger.error(f"Task {task_id} failed: {str(exc)}")
 
-        # 重试逻辑
-        if self.request.retries < self.max_retries:
-            logger.info(f"Retrying task {task_id} (attempt {self.request.retries + 1})")
-            raise self.retry(exc=exc, countdown=60, max_retries=3)
+        # 重试逻辑（不计磁盘延后）
+        failures = self.request.retries - disk_deferrals
+        if failures < self.max_retries:
+            logger.info(f"Retrying task {task_id} (attempt {failures + 1})")
+            metrics.TASK_RETRIES.labels(
+                task="download_video_task", error_class=type(exc).__name__
+            ).inc()
+            raise self.retry(
+                exc=exc, countdown=60, max_retries=self.max_retries + disk_budget.DISK_DEFER_MAX_RETRIES
+            )
 
         # 最终失败
+        metrics.TASK_FAILURES.labels(
+            task="download_video_task", error_class=type(exc).__name__
+        ).inc()
+        self.update_state(state="FAILURE", meta=failure_meta(exc))
+        raise exc
+
+    finally:
+        reservation.release()
+        if shaper is not None:
+            shaper.release()
+        for pinned_id in pinned_ids:
+            cache_index.unpin(pinned_id, task_id)
+        if checksum_tracker is not None:
+            checksum_tracker.close()
+        if uploader is not None:
+            uploader.close()
+        finish_profile()
+
+    if profile_summary:
+        task_result["profile"] = profile_summary
+
+    if transcode_target:
+        # 由transcode队列上的任务接替，沿用同一个任务ID，状态查询直接得到最终结果
         self.update_state(
-            state="FAILURE", meta={"error": str(exc), "task_id": task_id, "url": url}
+            state="PROGRESS",
+            meta={"progress": 100, "current_step": f"Queued for transcode: {transcode_target}"},
         )
-        raise exc
+        return self.replace(transcode_task.s(task_result, transcode_target))
+    return task_result
+
+
+@celery_app.task(bind=True, name="app.tasks.transcode_task")
+def transcode_task(self, download_result: Dict[str, Any], target: str) -> Dict[str, Any]:
+    """下载后的转封装/转码任务"""
+    task_id = download_result.get("task_id") or self.request.id
+    source = download_result.get("video_path") or download_result.get("audio_path")
+    if not source:
+        raise ValueError(f"Task {task_id} has no media file to transcode")
+
+    self.update_state(
+        state="PROGRESS",
+        meta={"progress": 100, "current_step": f"Transcoding to {target}"},
+    )
+    video_id = os.path.basename(source).split(".", 1)[0]
+    if cache_eviction.CACHE_EVICTION_ENABLED:
+        cache_index.pin(video_id, task_id)
+    try:
+        with metrics.PhaseTimer("transcode"):
+            stage = transcode.transcode_file(source, target)
+    finally:
+        if cache_eviction.CACHE_EVICTION_ENABLED:
+            cache_index.unpin(video_id, task_id)
+    logger.info(
+        f"Task {task_id}: {stage['mode']} to {target} took {stage['wall_seconds']}s "
+        f"({stage['cpu_seconds']} CPU s)"
+    )
+
+    result = dict(download_result)
+    result["transcode"] = stage
+    result["download_urls"] = dict(result.get("download_urls") or {})
+    result["download_urls"]["transcoded"] = downloader.layout.public_url(stage["output_path"])
+
+    output = stage["output_path"]
+    if checksums.CHECKSUM_ENABLED and output != source and os.path.exists(output):
+        with metrics.PhaseTimer("checksum"):
+            entry = {"kind": "transcoded", **checksums.hash_file(output)}
+        entry["mtime_ns"] = os.stat(output).st_mtime_ns
+        name = os.path.basename(output)
+        result["checksums"] = dict(result.get("checksums") or {}, **{name: entry})
+        result["manifest_path"] = checksums.write_manifest(
+            checksums.manifest_path(os.path.dirname(output), video_id), video_id, task_id, {name: entry}
+        )
+
+    if output != source and metadata_store.get_metadata_store() is not None:
+        indexed_artifacts = artifact_index.artifact_records([output], result.get("checksums"))
+        if indexed_artifacts:
+            metadata_store.enqueue([metadata_store.record_from_info(None, artifacts=indexed_artifacts)])
+
+    object_store = object_storage.get_object_store()
+    if object_store and stage["output_path"] != source:
+        uploader = object_storage.ArtifactUploader(object_store)
+        try:
+            uploaded = uploader.upload_artifacts(video_id, {"transcoded": stage["output_path"]})
+        finally:
+            uploader.close()
+        result["object_keys"] = dict(result.get("object_keys") or {}, **uploaded["object_keys"])
+    return result
+
+
+@celery_app.task(bind=True, name="app.tasks.asr_feed_task")
+def asr_feed_task(
+    self,
+    url: str,
+    chunk_seconds: float = asr_feed.ASR_CHUNK_SECONDS,
+    chunk_format: str = asr_feed.ASR_CHUNK_FORMAT,
+) -> Dict[str, Any]:
+    """ASR音频供给任务：边拉流边解码，逐块发布到Redis Stream"""
+    task_id = self.request.id if self.request else "unknown-task-id"
+    key = asr_feed.stream_key(task_id)
+
+    if not downloader.validate_url(url):
+        raise ValueError(f"Invalid YouTube URL: {url}")
+
+    with metrics.PhaseTimer("validate"):
+        stream = downloader.resolve_stream(url, asr_feed.ASR_AUDIO_SELECTOR)
+    logger.info(
+        f"Task {task_id}: ASR feed from format {stream.get('format_id')} "
+        f"({stream.get('acodec')}, {stream.get('abr')} kbps) to {key}"
+    )
+
+    duration = stream.get("duration") or 0
+
+    def on_chunk(chunk):
+        progress = int(min((chunk.start + chunk.duration) / duration, 1) * 100) if duration else 0
+        self.update_state(
+            state="PROGRESS",
+            meta={
+                "progress": progress,
+                "current_step": f"Published audio chunk {chunk.seq + 1}",
+                "stream": key,
+            },
+        )
+
+    with metrics.PhaseTimer("asr_feed"):
+        summary = asr_feed.run_feed(
+            stream,
+            asr_feed.RedisStreamPublisher(key),
+            chunk_seconds=chunk_seconds,
+            chunk_format=chunk_format,
+            on_chunk=on_chunk,
+        )
+
+    return {
+        "task_id": task_id,
+        "status": "completed",
+        "stream": key,
+        "video_id": stream.get("id"),
+        "source_format": {
+            "format_id": stream.get("format_id"),
+            "acodec": stream.get("acodec"),
+            "abr": stream.get("abr"),
+            "filesize": stream.get("filesize"),
+        },
+        **summary,
+    }
+
+
+@celery_app.task(bind=True, name="app.tasks.live_record_task")
+def live_record_task(
+    self,
+    url: str,
+    segment_seconds: float = live_recording.LIVE_SEGMENT_SECONDS,
+    max_duration: int = live_recording.LIVE_MAX_DURATION,
+) -> Dict[str, Any]:
+    """直播录制任务：按固定时长分段录制，每个分段写完即发布到Redis Stream并上传"""
+    task_id = self.request.id if self.request else "unknown-task-id"
+    key = live_recording.stream_key(task_id)
+
+    if not downloader.validate_url(url):
+        raise ValueError(f"Invalid YouTube URL: {url}")
+
+    with metrics.PhaseTimer("validate"):
+        stream = downloader.resolve_stream(url, live_recording.LIVE_FORMAT_SELECTOR)
+    if not stream.get("is_live"):
+        raise live_recording.NotLive(f"{url} is not a live stream, use /download instead")
+
+    video_id = stream.get("id") or task_id
+    output_dir = str(downloader.layout.ensure_video_dir(video_id) / "live" / task_id)
+    logger.info(
+        f"Task {task_id}: recording live stream {video_id} (format {stream.get('format_id')}) "
+        f"in {segment_seconds}s segments, at most {max_duration}s, to {output_dir}"
+    )
+
+    object_store = object_storage.get_object_store()
+    uploader = object_storage.ArtifactUploader(object_store) if object_store else None
+
+    def on_segment(segment):
+        """分段写完：上传并更新进度，返回并入分段消息的字段"""
+        extra = {}
+        if uploader is not None:
+            try:
+                uploaded = uploader.upload_artifacts(f"{video_id}/live/{task_id}", {"segment": segment.path})
+                extra["object_key"] = uploaded["object_keys"]["segment"]
+            except Exception as e:
+                logger.warning(f"Failed to upload live segment {segment.path}: {str(e)}")
+        self.update_state(
+            state="PROGRESS",
+            meta={
+                "progress": int(min(segment.end / max_duration, 1) * 100) if max_duration else 0,
+                "current_step": f"Recorded segment {segment.seq + 1}",
+                "segments": segment.seq + 1,
+                "recorded_seconds": round(segment.end, 3),
+                "stream": key,
+            },
+        )
+        return extra
+
+    # 录制期间分段持续写入视频目录，整段录制固定该视频，避免被缓存淘汰
+    if cache_eviction.CACHE_EVICTION_ENABLED:
+        cache_index.pin(video_id, task_id, ttl=int(max_duration) + cache_eviction.CACHE_PIN_TTL)
+    try:
+        with metrics.PhaseTimer("live_record"):
+            summary = live_recording.run_recording(
+                stream,
+                output_dir,
+                asr_feed.RedisStreamPublisher(key),
+                segment_seconds=segment_seconds,
+                max_duration=max_duration,
+                on_segment=on_segment,
+                name_prefix=live_recording.segment_prefix(video_id, task_id),
+            )
+    finally:
+        if cache_eviction.CACHE_EVICTION_ENABLED:
+            cache_index.unpin(video_id, task_id)
+        if uploader is not None:
+            uploader.close()
+
+    return {
+        "task_id": task_id,
+        "status": "completed",
+        "stream": key,
+        "video_id": stream.get("id"),
+        "format_id": stream.get("format_id"),
+        **summary,
+    }
 
 
 @celery_app.task(name="app.tasks.cleanup_task")
@@ -178,6 +625,196 @@ def cleanup_task(max_age_hours: int = 24) -> Dict[str, Any]:
         raise exc
 
 
+@celery_app.task(name="app.tasks.evict_cache_task")
+def evict_cache_task() -> Dict[str, Any]:
+    """按容量与最近访问时间淘汰下载缓存"""
+    max_bytes = int(cache_eviction.CACHE_MAX_GB * 1024**3)
+    with metrics.PhaseTimer("evict"):
+        summary = cache_eviction.evict(downloader.layout, cache_index, max_bytes)
+    store = metadata_store.get_metadata_store()
+    if store is not None and summary["evicted_ids"]:
+        try:
+            store.delete_artifacts(video_ids=summary["evicted_ids"])
+        except Exception as e:
+            # 残留条目在列表查询时发现文件不存在后移除
+            logger.warning(f"Failed to drop evicted artifacts from index: {str(e)}")
+    if summary["evicted_videos"]:
+        logger.info(f"Cache eviction: {summary}")
+    return {"status": "completed", **summary}
+
+
+@celery_app.task(name="app.tasks.flush_metadata_task")
+def flush_metadata_task() -> Dict[str, Any]:
+    """把待写队列中的视频元数据批量写入元数据库"""
+    store = metadata_store.get_metadata_store()
+    if store is None:
+        return {"status": "disabled", "written": 0}
+    with metrics.PhaseTimer("metadata_flush"):
+        written = metadata_store.flush(store)
+    if written:
+        logger.info(f"Flushed {written} video metadata records")
+    return {"status": "completed", "written": written}
+
+
+@celery_app.task(name="app.tasks.poll_channels_task")
+def poll_channels_task() -> Dict[str, Any]:
+    """抓取已到期的订阅频道，只为新视频提交下载任务"""
+
+    def submit(url: str, options: Dict[str, Any]) -> None:
+        download_video_task.apply_async(
+            kwargs=dict(options, url=url, download_thumbnail=True, download_description=False)
+        )
+        logger.info(f"Queued new upload {url}")
+
+    with metrics.PhaseTimer("channel_poll"):
+        summary = channels.poll_due(channels.ChannelRegistry(), submit)
+    if summary["polled"]:
+        logger.info(f"Channel poll: {summary}")
+    return {"status": "completed", **summary}
+
+
+def _workflow_download(workflow_id: str, params: Dict[str, Any], started: float):
+    """下载阶段：投递到download队列的下载任务（沿用预留、校验、上传及重试倒计时），完成后记录阶段输出"""
+    download = download_video_task.si(
+        url=params["url"],
+        quality=params.get("quality", "best"),
+        subtitle_langs=params.get("subtitle_langs"),
+        download_thumbnail=True,
+        keep_audio=True,
+        workflow_id=workflow_id,
+    ).set(queue="download")
+    download.link_error(workflow_stage_failed.s(workflow_id=workflow_id, stage="download", started=started))
+    return chain(download, workflow_download_finished.s(workflow_id=workflow_id, started=started).set(queue="download"))
+
+
+@celery_app.task(name="app.tasks.workflow_download_finished")
+def workflow_download_finished(result: Dict[str, Any], workflow_id: str, started: float) -> Dict[str, Any]:
+    """记录下载阶段的输出，作为音频阶段的输入"""
+    output = {
+        "video_id": (result.get("metadata") or {}).get("id"),
+        "subtitle_paths": result.get("subtitle_paths"),
+        "object_keys": result.get("object_keys"),
+        "artifacts": {"video": result.get("video_path"), "audio": result.get("audio_path")},
+    }
+    workflow.WorkflowStore().stage_finished(workflow_id, "download", "completed", started, output=output)
+    logger.info(f"Workflow {workflow_id}: stage download completed in {time.time() - started:.2f}s")
+    return output
+
+
+@celery_app.task(name="app.tasks.workflow_stage_failed")
+def workflow_stage_failed(request, exc, traceback, workflow_id: str, stage: str, started: float) -> None:
+    """阶段任务在自身重试用尽后失败时记录失败"""
+    logger.error(f"Workflow {workflow_id}: stage {stage} failed: {str(exc)}")
+    store = workflow.WorkflowStore()
+    store.stage_finished(workflow_id, stage, "failed", started, error=str(exc))
+    store.set_status(workflow_id, "failed", error=f"{stage}: {str(exc)}")
+
+
+def _audio_source(workflow_id: str, store: workflow.WorkflowStore) -> Optional[Dict[str, Any]]:
+    """音频阶段的输入：下载阶段已保留的音频流，或已完成的下载阶段输出；都还没有时返回None"""
+    kept = store.stream(workflow_id, "audio")
+    if kept and os.path.exists(kept["path"]):
+        return {"video_id": kept.get("video_id"), "artifacts": {"audio": kept["path"]}}
+    download = store.stage(workflow_id, "download") or {}
+    if download.get("status") == "completed":
+        return download.get("output") or {}
+    if download.get("status") == "failed":
+        raise RuntimeError(f"Download stage failed: {download.get('error')}")
+    return None
+
+
+def _workflow_audio(workflow_id: str, store: workflow.WorkflowStore) -> Dict[str, Any]:
+    """音频阶段：复用下载阶段保留的音频流；没有单独的音频流时从视频中提取音轨，不再访问源站"""
+    download = _audio_source(workflow_id, store)
+    if download is None:
+        raise RuntimeError("Download stage has not produced an audio stream yet")
+    artifacts = download.get("artifacts") or {}
+    audio = artifacts.get("audio")
+    if not audio:
+        if not artifacts.get("video"):
+            raise ValueError("Download stage produced neither audio nor video")
+        audio = transcode.transcode_file(artifacts["video"], "audio-m4a")["output_path"]
+    return {"video_id": download.get("video_id"), "artifacts": {"audio": audio}}
+
+
+def _workflow_upload(workflow_id: str, store: workflow.WorkflowStore) -> Dict[str, Any]:
+    """上传各阶段新产生、尚未上传的产物"""
+    inputs = [
+        stage["output"] for stage in store.get(workflow_id)["stages"].values() if stage.get("status") == "completed"
+    ]
+    video_id = next((i["video_id"] for i in inputs if isinstance(i, dict) and i.get("video_id")), workflow_id)
+    object_keys: Dict[str, Any] = {}
+    for output in inputs:
+        if isinstance(output, dict):
+            object_keys.update(output.get("object_keys") or {})
+    pending = {
+        kind: path for kind, path in workflow.collect_artifacts(inputs).items() if kind not in object_keys
+    }
+    object_store = object_storage.get_object_store()
+    if object_store is None:
+        return {"status": "skipped", "video_id": video_id, "artifacts": pending}
+    uploader = object_storage.ArtifactUploader(object_store)
+    try:
+        uploaded = uploader.upload_artifacts(video_id, pending) if pending else {"object_keys": {}}
+    finally:
+        uploader.close()
+    return {"status": "completed", "video_id": video_id, "object_keys": dict(object_keys, **uploaded["object_keys"])}
+
+
+@celery_app.task(bind=True, name="app.tasks.workflow_stage_task")
+def workflow_stage_task(self, inputs: Any, workflow_id: str, stage: str, waits: int = 0) -> Any:
+    """执行流水线的一个阶段，记录耗时；阶段已完成时直接返回记录的输出
+
+    waits 为等待上游产物（下载阶段的音频流）已重新排队的次数，与失败重试分开计数。
+    """
+    store = workflow.WorkflowStore()
+    recorded = store.stage(workflow_id, stage)
+    if recorded and recorded.get("status") == "completed":
+        logger.info(f"Workflow {workflow_id}: reusing completed stage {stage}")
+        return recorded["output"]
+
+    max_waits = int(workflow.WORKFLOW_STREAM_WAIT_TIMEOUT / workflow.WORKFLOW_STREAM_POLL_SECONDS)
+    if stage == "audio" and waits < max_waits and _audio_source(workflow_id, store) is None:
+        # 与下载并行：音频流还没保留时重新排队等待，不占用Worker
+        raise self.retry(
+            countdown=workflow.WORKFLOW_STREAM_POLL_SECONDS,
+            kwargs={**self.request.kwargs, "waits": waits + 1},
+            max_retries=workflow.WORKFLOW_STAGE_RETRIES + max_waits,
+        )
+
+    params = store.meta(workflow_id)["params"]
+    started = store.stage_started(workflow_id, stage, self.request.id)
+    if stage == "download":
+        # 下载任务自己重试（按倒计时重新排队），不能在当前任务内同步执行
+        return self.replace(_workflow_download(workflow_id, params, started))
+    try:
+        with metrics.PhaseTimer(f"workflow_{stage}"):
+            if stage == "audio":
+                output = _workflow_audio(workflow_id, store)
+            elif stage == "upload":
+                output = _workflow_upload(workflow_id, store)
+            else:
+                output = workflow.call_service(stage, workflow_id, inputs)
+    except Exception as exc:
+        store.stage_finished(workflow_id, stage, "failed", started, error=str(exc))
+        if self.request.retries - waits < workflow.WORKFLOW_STAGE_RETRIES:
+            logger.warning(f"Workflow {workflow_id}: stage {stage} failed, retrying: {str(exc)}")
+            raise self.retry(
+                exc=exc,
+                countdown=workflow.WORKFLOW_RETRY_COUNTDOWN,
+                max_retries=workflow.WORKFLOW_STAGE_RETRIES + waits,
+            )
+        logger.error(f"Workflow {workflow_id}: stage {stage} failed: {str(exc)}")
+        store.set_status(workflow_id, "failed", error=f"{stage}: {str(exc)}")
+        raise
+
+    store.stage_finished(workflow_id, stage, "completed", started, output=output)
+    logger.info(f"Workflow {workflow_id}: stage {stage} completed in {time.time() - started:.2f}s")
+    if stage == workflow.sink_stage().name:
+        store.set_status(workflow_id, "completed")
+    return output
+
+
 @celery_app.task(name="app.tasks.get_video_info_task")
 def get_video_info_task(url: str) -> Dict[str, Any]:
     """异步获取视频信息任务"""
@@ -205,8 +842,11 @@ def get_video_info_task(url: str) -> Dict[str, Any]:
         else:
             # 在测试环境中，可能直接返回结果
             info = info_result
-            
-        return info.model_dump()
+
+        info_dict = info.model_dump()
+        if metadata_store.get_metadata_store() is not None:
+            metadata_store.enqueue([metadata_store.record_from_info(info_dict, url)])
+        return info_dict
 
     except Exception as exc:
         logger.error(f"Get video info task failed: {str(exc)}")
@@ -231,6 +871,13 @@ def health_check_task() -> Dict[str, Any]:
         if free_gb < 1:  # 少于1GB空间
             logger.warning(f"Low disk space: {free_gb}GB remaining")
 
+        # 进行中下载尚未写入的预留空间
+        try:
+            reserved = disk_budget.DiskBudget(download_path).reserved_bytes()
+        except Exception as e:
+            logger.warning(f"Failed to read disk reservations: {str(e)}")
+            reserved = None
+
         # 获取统计信息
         stats = downloader.get_download_stats()
 
@@ -249,6 +896,7 @@ def health_check_task() -> Dict[str, Any]:
             "disk_usage": {
                 "free_gb": round(free / (1024**3), 1),
                 "used_percent": used_percent,
+                "reserved_gb": round(reserved / (1024**3), 1) if reserved is not None else None,
             },
             "download_stats": stats,
             "warnings": warnings,
@@ -259,20 +907,3 @@ def health_check_task() -> Dict[str, Any]:
         logger.error(f"Health check failed: {str(exc)}")
         return {"status": "unhealthy", "error": str(exc), "timestamp": time.time()}
 
-
-# 定期任务配置
-from celery.schedules import crontab
-
-celery_app.conf.beat_schedule = {
-    # 每天凌晨2点清理旧文件
-    "cleanup-old-files": {
-        "task": "app.tasks.cleanup_task",
-        "schedule": crontab(hour="2", minute="0"),
-        "args": (24,),  # 清理24小时前的文件
-    },
-    # 每5分钟进行健康检查
-    "health-check": {
-        "task": "app.tasks.health_check_task",
-        "schedule": crontab(minute="*/5"),
-    },
-}
@@ -0,0 +1,461 @@
+"""分布式追踪
+
+一次下载经过 FastAPI → Redis broker → Celery Worker → yt-dlp提取 → 传输 → 产物查找，
+这里按OpenTelemetry的数据模型记录span，把各段耗时关联到同一个trace：
+
+- API：TracingMiddleware 为每个请求创建server span（支持传入的W3C ``traceparent`` 头）。
+- 任务提交：before_task_publish 创建producer span，并把 ``traceparent`` 写入Celery消息头；
+  Worker在 task_prerun 中取出，创建consumer span作为任务内各span的父节点。
+- 任务阶段（metrics.PhaseTimer）、YouTubeDownloader 的提取/传输/产物查找、以及共享客户端上的每个Redis命令
+  各自一个span。
+
+导出器由 TRACING_EXPORTER 选择：otlp（OTLP/HTTP JSON，后台线程批量发送到
+OTEL_EXPORTER_OTLP_ENDPOINT/v1/traces，可接OpenTelemetry Collector、Jaeger、Tempo）、
+file（每行一个span的JSON，写入 TRACING_FILE）或 memory（测试用）。
+TRACING_ENABLED=false（默认）时 span() 直接返回空对象，不产生任何开销。
+"""
+
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 追踪配置
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "otlp").lower()
+TRACING_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318").rstrip("/")
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", os.getenv("SERVICE_NAME", "youtube-downloader"))
+TRACING_BATCH_SIZE = int(os.getenv("TRACING_BATCH_SIZE", "256"))
+TRACING_EXPORT_INTERVAL = float(os.getenv("TRACING_EXPORT_INTERVAL", "5"))
+TRACING_EXPORT_TIMEOUT = float(os.getenv("TRACING_EXPORT_TIMEOUT", "10"))
+
+TRACEPARENT = "traceparent"
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+# OTLP的SpanKind取值
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3, "producer": 4, "consumer": 5}
+
+
+class Span:
+    """一个span；trace_id/span_id 为十六进制字符串，时间为Unix纳秒"""
+
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        kind: str = "internal",
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def record_error(self, exc: BaseException) -> None:
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(((self.end_ns or self.start_ns) - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """追踪关闭时返回的空span"""
+
+    __slots__ = ()
+    traceparent = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_error(self, exc: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class InMemoryExporter:
+    """保存在内存中的导出器（测试用）"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def shutdown(self) -> None:
+        pass
+
+
+class FileExporter:
+    """每个span一行JSON，追加写入文件"""
+
+    def __init__(self, path: str = TRACING_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: List[Span], service_name: str = TRACING_SERVICE_NAME) -> Dict[str, Any]:
+    """按OTLP/HTTP JSON格式组织一批span"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": "app.tracing"},
+                "spans": [
+                    {
+                        "traceId": span.trace_id,
+                        "spanId": span.span_id,
+                        "parentSpanId": span.parent_id or "",
+                        "name": span.name,
+                        "kind": SPAN_KINDS.get(span.kind, 1),
+                        "startTimeUnixNano": str(span.start_ns),
+                        "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                        "attributes": [
+                            {"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()
+                        ],
+                        "status": {"code": 2, "message": span.error} if span.error else {"code": 0},
+                    }
+                    for span in spans
+                ],
+            }],
+        }]
+    }
+
+
+class OtlpExporter:
+    """OTLP/HTTP JSON导出器：span进入有界队列，后台线程按批量或时间间隔发送
+
+    队列满时丢弃新span，Collector不可用不会拖慢下载。导出器在Worker主进程的 worker_init 中创建，
+    prefork池的子进程不会继承后台线程，因此线程在每个进程首次导出时才启动。
+    """
+
+    def __init__(
+        self,
+        endpoint: str = TRACING_ENDPOINT,
+        service_name: str = TRACING_SERVICE_NAME,
+        batch_size: int = TRACING_BATCH_SIZE,
+        interval: float = TRACING_EXPORT_INTERVAL,
+        client: Any = None,
+    ):
+        self.url = f"{endpoint}/v1/traces"
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._client = client
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=batch_size * 16)
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_started(self) -> None:
+        """当前进程还没有后台线程时（首次导出或fork之后）启动，fork前排队的span属于父进程"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.batch_size * 16)
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue,), name="trace-exporter", daemon=True
+                )
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def export(self, span: Span) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self, spans: "queue.Queue[Optional[Span]]") -> None:
+        batch: List[Span] = []
+        deadline = time.monotonic() + self.interval
+        while True:
+            try:
+                span = spans.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                span = None
+            else:
+                if span is None:
+                    self._send(batch)
+                    return
+                batch.append(span)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._send(batch)
+                batch = []
+                deadline = time.monotonic() + self.interval
+
+    def _send(self, batch: List[Span]) -> None:
+        if not batch:
+            return
+        import httpx
+        from loguru import logger
+
+        try:
+            client = self._client or httpx.Client(timeout=TRACING_EXPORT_TIMEOUT)
+            try:
+                response = client.post(self.url, json=otlp_payload(batch, self.service_name))
+                response.raise_for_status()
+            finally:
+                if self._client is None:
+                    client.close()
+        except Exception as e:
+            logger.warning(f"Failed to export {len(batch)} spans to {self.url}: {str(e)}")
+
+    def shutdown(self) -> None:
+        """发送剩余的span并停止本进程的后台线程"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=TRACING_EXPORT_TIMEOUT)
+        self._pid = self._thread = None
+
+
+def _build_exporter(name: str) -> Any:
+    if name == "memory":
+        return InMemoryExporter()
+    if name == "file":
+        return FileExporter()
+    if name == "otlp":
+        return OtlpExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER: {name}")
+
+
+_exporter: Optional[Any] = None
+
+
+def configure(exporter: Any = None, enabled: bool = TRACING_ENABLED) -> Optional[Any]:
+    """开启追踪并返回导出器；enabled=False 时关闭追踪"""
+    global _exporter
+    if _exporter is not None:
+        _exporter.shutdown()
+    _exporter = (exporter or _build_exporter(TRACING_EXPORTER)) if enabled else None
+    return _exporter
+
+
+def is_enabled() -> bool:
+    return _exporter is not None
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """解析W3C traceparent，返回 (trace_id, 父span_id)"""
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    return (match.group(1), match.group(2)) if match else None
+
+
+def start_span(
+    name: str,
+    kind: str = "internal",
+    attributes: Optional[Dict[str, Any]] = None,
+    traceparent: Optional[str] = None,
+) -> Optional[Span]:
+    """创建span但不设为当前span（用于跨两个回调的span，如Celery信号）；追踪关闭时返回None"""
+    if _exporter is None:
+        return None
+    remote = parse_traceparent(traceparent)
+    parent = _current_span.get()
+    if remote is not None:
+        trace_id, parent_id = remote
+    elif parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+    return Span(name, trace_id, parent_id, kind, attributes)
+
+
+def activate(span: Span) -> Token:
+    return _current_span.set(span)
+
+
+def end_span(span: Span, token: Optional[Token] = None) -> None:
+    if token is not None:
+        _current_span.reset(token)
+    span.end_ns = time.time_ns()
+    if _exporter is not None:
+        _exporter.export(span)
+
+
+@contextmanager
+def span(
+    name: str,
+    kind: str = "internal",
+    attributes: Optional[Dict[str, Any]] = None,
+    traceparent: Optional[str] = None,
+) -> Iterator[Any]:
+    """在当前span下创建子span并设为当前span；异常记录到span后继续抛出"""
+    new_span = start_span(name, kind, attributes, traceparent)
+    if new_span is None:
+        yield NOOP_SPAN
+        return
+    token = activate(new_span)
+    try:
+        yield new_span
+    except BaseException as exc:
+        new_span.record_error(exc)
+        raise
+    finally:
+        end_span(new_span, token)
+
+
+def inject(carrier: Dict[str, Any]) -> None:
+    """把当前span的 traceparent 写入消息头/HTTP头"""
+    current = _current_span.get()
+    if current is not None:
+        carrier[TRACEPARENT] = current.traceparent
+
+
+# Celery任务的span：{任务ID: (span, token)}
+_task_spans: Dict[str, Tuple[Span, Optional[Token]]] = {}
+
+
+def _on_before_task_publish(sender: Optional[str] = None, headers: Optional[Dict] = None, **kwargs: Any) -> None:
+    if _exporter is None or headers is None:
+        return
+    producer = start_span(f"celery.publish {sender}", "producer", {"celery.task_id": headers.get("id")})
+    headers[TRACEPARENT] = producer.traceparent
+    end_span(producer)
+
+
+def _request_traceparent(request: Any) -> Optional[str]:
+    value = getattr(request, TRACEPARENT, None)
+    if value is None:
+        value = (getattr(request, "headers", None) or {}).get(TRACEPARENT)
+    return value
+
+
+def _on_task_prerun(task_id: Optional[str] = None, task: Any = None, **kwargs: Any) -> None:
+    if _exporter is None or not task_id:
+        return
+    request = getattr(task, "request", None)
+    task_span = start_span(
+        f"celery.task {getattr(task, 'name', 'unknown')}",
+        "consumer",
+        {"celery.task_id": task_id, "celery.retries": getattr(request, "retries", None)},
+        traceparent=_request_traceparent(request),
+    )
+    _task_spans[task_id] = (task_span, activate(task_span))
+
+
+def _on_task_postrun(task_id: Optional[str] = None, state: Optional[str] = None, **kwargs: Any) -> None:
+    entry = _task_spans.pop(task_id or "", None)
+    if entry is None:
+        return
+    task_span, token = entry
+    task_span.set_attribute("celery.state", state)
+    if state == "FAILURE":
+        task_span.error = f"task {state}"
+    try:
+        end_span(task_span, token)
+    except ValueError:
+        # token 属于其他上下文（不应发生），仍然导出span
+        end_span(task_span)
+
+
+def install_celery_signals() -> None:
+    """连接Celery信号：提交时注入 traceparent，执行时创建任务span"""
+    from celery.signals import before_task_publish, task_postrun, task_prerun
+
+    before_task_publish.connect(_on_before_task_publish, weak=False, dispatch_uid="tracing.publish")
+    task_prerun.connect(_on_task_prerun, weak=False, dispatch_uid="tracing.prerun")
+    task_postrun.connect(_on_task_postrun, weak=False, dispatch_uid="tracing.postrun")
+
+
+class TracingMiddleware:
+    """为每个HTTP请求创建server span的ASGI中间件，span名取路由模板（如 GET /status/{task_id}）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _exporter is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        request_span = start_span(
+            f"{scope['method']} {scope['path']}",
+            "server",
+            {"http.method": scope["method"], "http.target": scope["path"]},
+            traceparent=headers.get(TRACEPARENT),
+        )
+        token = activate(request_span)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                request_span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    request_span.error = f"HTTP {message['status']}"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            request_span.record_error(exc)
+            raise
+        finally:
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                request_span.name = f"{scope['method']} {route}"
+                request_span.set_attribute("http.route", route)
+            end_span(request_span, token)
@@ -0,0 +1,209 @@
+"""下载后的转封装/转码阶段
+
+按目标预设把下载产物转换为统一格式。源文件的编码已满足预设时只做流复制（-c copy），
+否则仅对不满足的流重新编码；封装与编码都满足时直接复用源文件。
+
+每个转码任务运行一个ffmpeg，重新编码时由ffmpeg自身按核数多线程执行（TRANSCODE_THREADS 可限制线程数），
+每次执行记录墙钟时间与ffmpeg子进程消耗的CPU秒数。对应的Celery任务运行在 transcode 队列。
+"""
+
+import json
+import os
+import resource
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+# 转码配置
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+# ffmpeg编码线程数，0表示由ffmpeg按核数决定；同一节点并行多个转码任务时可按任务数调低
+TRANSCODE_THREADS = int(os.getenv("TRANSCODE_THREADS", "0"))
+TRANSCODE_TIMEOUT = int(os.getenv("TRANSCODE_TIMEOUT", "3600"))
+
+
+class TranscodeError(Exception):
+    """ffmpeg执行失败"""
+
+
+class TranscodePreset(NamedTuple):
+    """目标预设
+
+    video_codecs/audio_codecs 为可直接流复制的编码；video_codecs 为空表示输出不含视频。
+    """
+
+    container: str
+    video_codecs: Tuple[str, ...]
+    audio_codecs: Tuple[str, ...]
+    video_args: Tuple[str, ...]
+    audio_args: Tuple[str, ...]
+    max_height: Optional[int] = None
+    extra_args: Tuple[str, ...] = ()
+
+
+_H264 = ("-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p")
+_AAC = ("-c:a", "aac", "-b:a", "160k")
+_FASTSTART = ("-movflags", "+faststart")
+
+PRESETS: Dict[str, TranscodePreset] = {
+    # 通用mp4：H.264/HEVC + AAC
+    "mp4": TranscodePreset("mp4", ("h264", "hevc"), ("aac", "mp3"), _H264, _AAC, None, _FASTSTART),
+    # 网页播放：H.264 + AAC，最高720p
+    "web-720p": TranscodePreset("mp4", ("h264",), ("aac",), _H264, _AAC, 720, _FASTSTART),
+    # mkv容纳常见编码，基本都能直接复制
+    "mkv": TranscodePreset(
+        "mkv",
+        ("h264", "hevc", "vp9", "av1"),
+        ("aac", "opus", "vorbis", "mp3", "flac"),
+        _H264,
+        _AAC,
+    ),
+    "audio-m4a": TranscodePreset("m4a", (), ("aac",), (), ("-c:a", "aac", "-b:a", "128k"), None, _FASTSTART),
+    "audio-mp3": TranscodePreset("mp3", (), ("mp3",), (), ("-c:a", "libmp3lame", "-q:a", "2")),
+}
+
+def probe(path: str) -> Dict[str, Any]:
+    """用ffprobe读取流信息"""
+    proc = subprocess.run(
+        [FFPROBE_BIN, "-v", "error", "-print_format", "json", "-show_streams", "-show_format", path],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    if proc.returncode != 0:
+        raise TranscodeError(f"ffprobe failed for {path}: {proc.stderr.strip()[-500:]}")
+    return json.loads(proc.stdout or "{}")
+
+
+def _first_stream(info: Dict[str, Any], codec_type: str) -> Optional[Dict[str, Any]]:
+    for stream in info.get("streams", []):
+        if stream.get("codec_type") == codec_type and not stream.get("disposition", {}).get(
+            "attached_pic"
+        ):
+            return stream
+    return None
+
+
+def plan_streams(preset: TranscodePreset, info: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """决定每路流的处理方式：copy / encode / None（丢弃或不存在）"""
+    video = _first_stream(info, "video")
+    audio = _first_stream(info, "audio")
+
+    video_mode = None
+    if video is not None and preset.video_codecs:
+        fits_height = preset.max_height is None or (video.get("height") or 0) <= preset.max_height
+        copyable = video.get("codec_name") in preset.video_codecs and fits_height
+        video_mode = "copy" if copyable else "encode"
+
+    audio_mode = None
+    if audio is not None:
+        audio_mode = "copy" if audio.get("codec_name") in preset.audio_codecs else "encode"
+
+    return {"video": video_mode, "audio": audio_mode}
+
+
+def build_command(
+    source: str, output: str, preset: TranscodePreset, plan: Dict[str, Optional[str]]
+) -> List[str]:
+    """生成ffmpeg命令"""
+    args = [FFMPEG_BIN, "-hide_banner", "-nostdin", "-y", "-i", source]
+
+    if plan["video"] is None:
+        args.append("-vn")
+    else:
+        args += ["-map", "0:v:0"]
+        if plan["video"] == "copy":
+            args += ["-c:v", "copy"]
+        else:
+            args += list(preset.video_args)
+            if preset.max_height:
+                args += ["-vf", f"scale=-2:'min({preset.max_height},ih)'"]
+
+    if plan["audio"] is None:
+        args.append("-an")
+    else:
+        args += ["-map", "0:a:0"]
+        args += ["-c:a", "copy"] if plan["audio"] == "copy" else list(preset.audio_args)
+
+    if "encode" in plan.values() and TRANSCODE_THREADS:
+        args += ["-threads", str(TRANSCODE_THREADS)]
+    args += ["-sn", "-dn", *preset.extra_args, output]
+    return args
+
+
+def run_ffmpeg(args: List[str], timeout: int = TRANSCODE_TIMEOUT) -> Dict[str, Any]:
+    """执行ffmpeg并统计墙钟时间与子进程CPU秒数"""
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    proc = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+    wall_seconds = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_seconds = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return {
+        "returncode": proc.returncode,
+        "stderr": proc.stderr[-2000:] if proc.returncode else "",
+        "wall_seconds": round(wall_seconds, 3),
+        "cpu_seconds": round(cpu_seconds, 3),
+    }
+
+
+def output_path(source: str, target: str) -> str:
+    """转码输出路径：与源文件同目录，<视频ID>.<预设>.<封装>"""
+    src = Path(source)
+    video_id = src.name.split(".", 1)[0]
+    return str(src.with_name(f"{video_id}.{target}.{PRESETS[target].container}"))
+
+
+def transcode_file(source: str, target: str) -> Dict[str, Any]:
+    """把 source 转换为目标预设，返回输出路径、各流处理方式与耗时"""
+    if target not in PRESETS:
+        raise ValueError(f"Unknown transcode target: {target}")
+    preset = PRESETS[target]
+
+    started = time.perf_counter()
+    info = probe(source)
+    plan = plan_streams(preset, info)
+    if plan["video"] is None and plan["audio"] is None:
+        raise TranscodeError(f"No usable streams in {source} for target {target}")
+
+    source_ext = Path(source).suffix.lstrip(".").lower()
+    container_matches = source_ext == preset.container
+    if container_matches and "encode" not in plan.values() and (
+        plan["video"] is not None or not _first_stream(info, "video")
+    ):
+        # 封装和编码都已满足，无需处理
+        return {
+            "target": target,
+            "mode": "none",
+            "streams": plan,
+            "output_path": source,
+            "wall_seconds": round(time.perf_counter() - started, 3),
+            "cpu_seconds": 0.0,
+        }
+
+    output = output_path(source, target)
+    command = build_command(source, output, preset, plan)
+    mode = "transcode" if "encode" in plan.values() else "remux"
+    logger.info(f"Running {mode} to {target}: {source} -> {output}")
+
+    stats = run_ffmpeg(command)
+    if stats["returncode"] != 0:
+        try:
+            os.remove(output)
+        except OSError:
+            pass
+        raise TranscodeError(f"ffmpeg exited with {stats['returncode']}: {stats['stderr'][-500:]}")
+
+    return {
+        "target": target,
+        "mode": mode,
+        "streams": plan,
+        "output_path": output,
+        "file_size": os.path.getsize(output),
+        "ffmpeg_seconds": stats["wall_seconds"],
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "cpu_seconds": stats["cpu_seconds"],
+    }
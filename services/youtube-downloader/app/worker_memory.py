@@ -0,0 +1,174 @@
+"""Worker内存记账与回收
+
+长时间运行的solo Worker逐任务积累内存（yt-dlp信息字典、分配器碎片），通过 task_prerun / task_postrun 信号：
+
+- 任务开始前采样RSS并重置进程峰值（Linux下写 /proc/self/clear_refs），结束后采样RSS和本任务期间的峰值，
+  记录日志和Prometheus指标（ytdl_task_peak_rss_bytes、ytdl_task_rss_growth_bytes）。
+- 任务结束后RSS超过 WORKER_MAX_MEMORY_MB，或已执行 WORKER_MAX_TASKS_PER_CHILD 个任务时回收Worker：
+  solo/threads pool 下设置Celery的warm shutdown标志，当前任务确认后Worker正常退出（退出码0），
+  由容器的重启策略拉起新进程；prefork pool 下由Celery原生的 worker_max_memory_per_child /
+  worker_max_tasks_per_child 回收子进程。
+"""
+
+import gc
+import os
+import re
+import resource
+import sys
+from multiprocessing import current_process
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+from . import metrics
+
+# Worker内存配置
+WORKER_MEMORY_ACCOUNTING = os.getenv("WORKER_MEMORY_ACCOUNTING", "true").lower() == "true"
+# 任务结束后RSS超过该值（MB）时回收Worker，0为不限制
+WORKER_MAX_MEMORY_MB = int(os.getenv("WORKER_MAX_MEMORY_MB", "0"))
+# 每个Worker进程最多执行的任务数，0为不限制
+WORKER_MAX_TASKS_PER_CHILD = int(os.getenv("WORKER_MAX_TASKS_PER_CHILD", "0"))
+# 任务结束后执行一次完整GC，回收信息字典等循环引用后再采样
+WORKER_GC_AFTER_TASK = os.getenv("WORKER_GC_AFTER_TASK", "true").lower() == "true"
+
+MB = 1024 * 1024
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_HWM_RE = re.compile(rb"VmHWM:\s+(\d+)\s+kB")
+
+
+def current_rss() -> int:
+    """当前进程的RSS（字节）"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        # 非Linux平台只能取进程生命周期内的峰值
+        return _maxrss()
+
+
+def _maxrss() -> int:
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS单位为字节，Linux为KB
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def peak_rss() -> int:
+    """自上次 reset_peak() 以来的峰值RSS（字节）"""
+    try:
+        with open("/proc/self/status", "rb") as f:
+            match = _HWM_RE.search(f.read())
+        if match:
+            return int(match.group(1)) * 1024
+    except OSError:
+        pass
+    return _maxrss()
+
+
+def reset_peak() -> bool:
+    """重置进程的峰值RSS，不支持时返回False（峰值退化为进程生命周期内的最大值）"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class MemoryAccountant:
+    """逐任务采样RSS，按内存上限和任务数上限判断是否需要回收Worker"""
+
+    def __init__(
+        self,
+        max_memory_mb: int = WORKER_MAX_MEMORY_MB,
+        max_tasks: int = WORKER_MAX_TASKS_PER_CHILD,
+        gc_after_task: bool = WORKER_GC_AFTER_TASK,
+    ):
+        self.max_memory = max_memory_mb * MB
+        self.max_tasks = max_tasks
+        self.gc_after_task = gc_after_task
+        self.tasks_done = 0
+        self._started: Dict[str, Tuple[int, bool]] = {}
+
+    def task_started(self, task_id: str) -> None:
+        # 嵌套执行的任务（如工作流阶段内的下载）不重置外层任务的峰值
+        exact = reset_peak() if not self._started else False
+        self._started[task_id] = (current_rss(), exact)
+
+    def task_finished(self, task_id: str, task_name: str) -> Optional[Dict[str, Any]]:
+        """返回本任务的内存统计，未记录开始时返回None"""
+        started = self._started.pop(task_id, None)
+        if started is None:
+            return None
+        rss_before, peak_exact = started
+        if self.gc_after_task:
+            gc.collect()
+        rss_after = current_rss()
+        peak = max(peak_rss(), rss_before, rss_after)
+        self.tasks_done += 1
+
+        metrics.TASK_PEAK_RSS.labels(task=task_name).observe(peak)
+        metrics.TASK_RSS_GROWTH.labels(task=task_name).observe(max(rss_after - rss_before, 0))
+        return {
+            "rss_before": rss_before,
+            "rss_after": rss_after,
+            "peak_rss": peak,
+            # 无法重置峰值时为进程生命周期内的峰值
+            "peak_exact": peak_exact,
+            "tasks_done": self.tasks_done,
+            "recycle": self.recycle_reason(rss_after),
+        }
+
+    def recycle_reason(self, rss: int) -> Optional[str]:
+        if self.max_memory and rss > self.max_memory:
+            return "memory"
+        if self.max_tasks and self.tasks_done >= self.max_tasks:
+            return "max_tasks"
+        return None
+
+
+def request_recycle(reason: str) -> bool:
+    """请求Worker在当前任务确认后warm shutdown；prefork子进程交由Celery原生回收"""
+    if current_process().name != "MainProcess":
+        return False
+    from celery.platforms import EX_OK
+    from celery.worker import state
+
+    if state.should_stop is None:
+        state.should_stop = EX_OK
+        metrics.WORKER_RECYCLES.labels(reason=reason).inc()
+    return True
+
+
+accountant = MemoryAccountant()
+
+
+def _on_task_prerun(task_id: Optional[str] = None, **kwargs: Any) -> None:
+    if task_id:
+        accountant.task_started(task_id)
+
+
+def _on_task_postrun(task_id: Optional[str] = None, task: Any = None, **kwargs: Any) -> None:
+    task_name = getattr(task, "name", None) or "unknown"
+    stats = accountant.task_finished(task_id or "", task_name)
+    if stats is None:
+        return
+    logger.bind(**stats).info(
+        f"Task {task_id} memory: peak {stats['peak_rss'] // MB} MB, "
+        f"RSS {stats['rss_before'] // MB} -> {stats['rss_after'] // MB} MB"
+    )
+    if stats["recycle"] and request_recycle(stats["recycle"]):
+        logger.warning(
+            f"Recycling worker after {stats['tasks_done']} tasks ({stats['recycle']}), "
+            f"RSS {stats['rss_after'] // MB} MB"
+        )
+
+
+def install() -> None:
+    """在Worker进程中连接任务信号（API进程和测试不安装）"""
+    if not WORKER_MEMORY_ACCOUNTING:
+        return
+    from celery.signals import task_postrun, task_prerun
+
+    task_prerun.connect(_on_task_prerun, weak=False)
+    task_postrun.connect(_on_task_postrun, weak=False)
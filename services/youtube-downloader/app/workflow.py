@@ -0,0 +1,242 @@
+"""多阶段处理流水线编排
+
+平台流水线描述为阶段DAG（PIPELINE），编译为Celery canvas：单一依赖用 chain 串接，多个依赖用
+chord 汇合，每个阶段投递到自己的队列。两条分支并行执行，上传阶段在两者都完成后汇总所有产物：
+
+- 下载：并行拉取视频流和音频流，合并、计算校验和、上传对象存储；
+- 音频 → ASR → 翻译 → TTS：下载任务保留音频流后立即在工作流中记录（``stream:audio``），
+  音频阶段随即开始，不等待合并和上传；同一视频不会从源站下载两次。音频流尚未就绪时音频阶段
+  每 WORKFLOW_STREAM_POLL_SECONDS 秒重新排队等待（不占用Worker），下载没有单独的音频流时在下载
+  完成后从视频中提取音轨。
+
+所有阶段都由 workflow_stage_task 执行，阶段状态（开始/结束时间、耗时、输出、错误）记录在
+Redis哈希 ``workflow:<id>`` 中。阶段已完成时直接返回记录的输出，因此失败后重新提交同一个
+工作流（resume）会从最后完成的阶段之后继续，已完成的下载等阶段不会重复执行。
+
+ASR、翻译、TTS由各自的服务提供，通过 WORKFLOW_<阶段>_URL 配置HTTP接口；未配置的阶段记为跳过。
+"""
+
+import json
+import os
+import time
+import uuid
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+from celery import chain, chord, group
+from celery.canvas import Signature
+
+from .redis_client import get_redis
+
+# 工作流配置
+WORKFLOW_KEY_PREFIX = os.getenv("WORKFLOW_KEY_PREFIX", "workflow:")
+WORKFLOW_STATE_TTL = int(os.getenv("WORKFLOW_STATE_TTL", str(7 * 24 * 3600)))
+WORKFLOW_STAGE_RETRIES = int(os.getenv("WORKFLOW_STAGE_RETRIES", "2"))
+WORKFLOW_RETRY_COUNTDOWN = int(os.getenv("WORKFLOW_RETRY_COUNTDOWN", "60"))
+WORKFLOW_SERVICE_TIMEOUT = float(os.getenv("WORKFLOW_SERVICE_TIMEOUT", "3600"))
+# 等待上游阶段产出流（如下载阶段的音频流）的轮询间隔和最长时间
+WORKFLOW_STREAM_POLL_SECONDS = float(os.getenv("WORKFLOW_STREAM_POLL_SECONDS", "5"))
+WORKFLOW_STREAM_WAIT_TIMEOUT = int(os.getenv("WORKFLOW_STREAM_WAIT_TIMEOUT", str(6 * 3600)))
+# 外部服务阶段的HTTP接口，留空则跳过该阶段
+WORKFLOW_SERVICE_URLS = {
+    "asr": os.getenv("WORKFLOW_ASR_URL", ""),
+    "translate": os.getenv("WORKFLOW_TRANSLATE_URL", ""),
+    "tts": os.getenv("WORKFLOW_TTS_URL", ""),
+}
+
+STAGE_TASK = "app.tasks.workflow_stage_task"
+
+
+class Stage(NamedTuple):
+    name: str
+    queue: str
+    after: Tuple[str, ...] = ()
+
+
+# 音频阶段与下载并行，由下载阶段保留的音频流驱动；上传在下载和配音都完成后汇总各阶段产物
+PIPELINE: Tuple[Stage, ...] = (
+    Stage("download", "download"),
+    Stage("audio", "audio"),
+    Stage("asr", "asr", ("audio",)),
+    Stage("translate", "translate", ("asr",)),
+    Stage("tts", "tts", ("translate",)),
+    Stage("upload", "upload", ("download", "tts")),
+)
+
+WORKFLOW_QUEUES = sorted({stage.queue for stage in PIPELINE})
+
+
+def sink_stage(stages: Tuple[Stage, ...] = PIPELINE) -> Stage:
+    """DAG的最终阶段；要求每个阶段至多被一个阶段依赖（汇聚树）"""
+    names = {stage.name for stage in stages}
+    consumers: Dict[str, str] = {}
+    for stage in stages:
+        for dep in stage.after:
+            if dep not in names:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+            if dep in consumers:
+                raise ValueError(f"Stage {dep} feeds both {consumers[dep]} and {stage.name}")
+            consumers[dep] = stage.name
+    sinks = [stage for stage in stages if stage.name not in consumers]
+    if len(sinks) != 1:
+        raise ValueError(f"Pipeline must have exactly one final stage, got {[s.name for s in sinks]}")
+    return sinks[0]
+
+
+def build_canvas(workflow_id: str, stages: Tuple[Stage, ...] = PIPELINE) -> Signature:
+    """把阶段DAG编译为Celery canvas"""
+    # celery_app 在模块级导入本模块的队列列表，这里延迟导入
+    from .celery_app import celery_app
+
+    by_name = {stage.name: stage for stage in stages}
+
+    def _sig(stage: Stage, root: bool) -> Signature:
+        kwargs = {"workflow_id": workflow_id, "stage": stage.name}
+        # 起始阶段没有上游结果，使用不可变签名
+        sig = celery_app.signature(STAGE_TASK, args=(None,) if root else (), kwargs=kwargs, immutable=root)
+        return sig.set(queue=stage.queue)
+
+    def _build(stage: Stage) -> Signature:
+        if not stage.after:
+            return _sig(stage, root=True)
+        if len(stage.after) == 1:
+            return chain(_build(by_name[stage.after[0]]), _sig(stage, root=False))
+        return chord(group(_build(by_name[dep]) for dep in stage.after), _sig(stage, root=False))
+
+    return _build(sink_stage(stages))
+
+
+class WorkflowStore:
+    """Redis中的工作流与阶段状态（每个阶段单独一个字段，并行分支互不覆盖）"""
+
+    def __init__(
+        self,
+        redis_factory: Callable = get_redis,
+        prefix: str = WORKFLOW_KEY_PREFIX,
+        ttl: int = WORKFLOW_STATE_TTL,
+    ):
+        self._redis_factory = redis_factory
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def key(self, workflow_id: str) -> str:
+        return f"{self.prefix}{workflow_id}"
+
+    def _set(self, workflow_id: str, field: str, value: Dict[str, Any]) -> None:
+        pipe = self._redis_factory().pipeline(transaction=True)
+        pipe.hset(self.key(workflow_id), field, json.dumps(value))
+        pipe.expire(self.key(workflow_id), self.ttl)
+        pipe.execute()
+
+    def create(self, params: Dict[str, Any], workflow_id: Optional[str] = None) -> str:
+        workflow_id = workflow_id or str(uuid.uuid4())
+        self._set(workflow_id, "meta", {"params": params, "status": "running", "created_at": time.time()})
+        return workflow_id
+
+    def get(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        raw = self._redis_factory().hgetall(self.key(workflow_id))
+        if not raw:
+            return None
+        fields = {
+            (k.decode("utf-8") if isinstance(k, bytes) else k): json.loads(v) for k, v in raw.items()
+        }
+        state = dict(fields.pop("meta", {}), workflow_id=workflow_id)
+        state["stages"] = {
+            name[len("stage:"):]: value for name, value in fields.items() if name.startswith("stage:")
+        }
+        return state
+
+    def meta(self, workflow_id: str) -> Dict[str, Any]:
+        raw = self._redis_factory().hget(self.key(workflow_id), "meta")
+        if raw is None:
+            raise KeyError(f"Unknown workflow: {workflow_id}")
+        return json.loads(raw)
+
+    def set_status(self, workflow_id: str, status: str, error: Optional[str] = None) -> None:
+        meta = self.meta(workflow_id)
+        meta.update(status=status, error=error, updated_at=time.time())
+        self._set(workflow_id, "meta", meta)
+
+    def stage(self, workflow_id: str, name: str) -> Optional[Dict[str, Any]]:
+        raw = self._redis_factory().hget(self.key(workflow_id), f"stage:{name}")
+        return json.loads(raw) if raw else None
+
+    def stream_ready(self, workflow_id: str, name: str, value: Dict[str, Any]) -> None:
+        """记录阶段执行中途已就绪的产物（如下载阶段保留的音频流），下游阶段可以提前开始"""
+        self._set(workflow_id, f"stream:{name}", dict(value, ready_at=time.time()))
+
+    def stream(self, workflow_id: str, name: str) -> Optional[Dict[str, Any]]:
+        raw = self._redis_factory().hget(self.key(workflow_id), f"stream:{name}")
+        return json.loads(raw) if raw else None
+
+    def stage_started(self, workflow_id: str, name: str, task_id: Optional[str]) -> float:
+        previous = self.stage(workflow_id, name) or {}
+        started = time.time()
+        self._set(workflow_id, f"stage:{name}", {
+            "status": "running",
+            "task_id": task_id,
+            "attempts": previous.get("attempts", 0) + 1,
+            "started_at": started,
+        })
+        return started
+
+    def stage_finished(
+        self,
+        workflow_id: str,
+        name: str,
+        status: str,
+        started: float,
+        output: Any = None,
+        error: Optional[str] = None,
+    ) -> None:
+        record = self.stage(workflow_id, name) or {}
+        finished = time.time()
+        record.update(
+            status=status,
+            finished_at=finished,
+            duration=round(finished - started, 3),
+            output=output,
+            error=error,
+        )
+        self._set(workflow_id, f"stage:{name}", record)
+
+
+def call_service(
+    stage: str, workflow_id: str, inputs: Any, client: Optional[httpx.Client] = None
+) -> Dict[str, Any]:
+    """调用外部服务执行一个阶段（POST JSON，返回JSON）；未配置地址时跳过"""
+    url = WORKFLOW_SERVICE_URLS.get(stage)
+    if not url:
+        return {"status": "skipped"}
+    http = client or httpx.Client(timeout=WORKFLOW_SERVICE_TIMEOUT)
+    try:
+        response = http.post(url, json={"workflow_id": workflow_id, "stage": stage, "input": inputs})
+        response.raise_for_status()
+        return response.json()
+    finally:
+        if client is None:
+            http.close()
+
+
+def collect_artifacts(outputs: List[Any]) -> Dict[str, str]:
+    """汇总上游阶段输出中的 artifacts（{类别: 本地路径}），供上传阶段使用"""
+    artifacts: Dict[str, str] = {}
+    for output in outputs:
+        if isinstance(output, dict):
+            artifacts.update({k: v for k, v in (output.get("artifacts") or {}).items() if v})
+    return artifacts
+
+
+def submit(
+    params: Optional[Dict[str, Any]] = None,
+    workflow_id: Optional[str] = None,
+    store: Optional[WorkflowStore] = None,
+) -> str:
+    """提交新工作流，或重新提交已有工作流（已完成的阶段直接复用输出）"""
+    store = store or WorkflowStore()
+    if workflow_id is None:
+        workflow_id = store.create(params or {})
+    else:
+        store.set_status(workflow_id, "running")
+    build_canvas(workflow_id).apply_async()
+    return workflow_id
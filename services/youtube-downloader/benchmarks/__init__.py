@@ -0,0 +1,8 @@
+"""YouTube Downloader Service Benchmarks
+
+性能基准与负载测试脚本，均以模块方式在服务目录下运行，例如：
+
+    python -m benchmarks.bench_task_client --requests 2000 --concurrency 64
+
+结果以JSON输出，便于在不同提交之间对比。
+"""
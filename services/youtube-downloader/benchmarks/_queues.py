@@ -0,0 +1,42 @@
+"""基准测试产生的任务清理
+
+只删除本次运行提交的任务消息和写入的结果键，不清空队列：基准可能与真实的下载队列共用同一个Redis。
+"""
+
+import json
+from typing import Any, Dict, Iterable, List
+
+import redis
+
+# Redis transport按优先级拆分的队列键：<队列>、<队列>\x06\x16<优先级>
+_PRIORITY_STEPS = (3, 6, 9)
+
+
+def queue_keys(celery_app: Any) -> List[str]:
+    queues = list(celery_app.conf.task_queues or []) or [celery_app.conf.task_default_queue]
+    names = [getattr(queue, "name", queue) for queue in queues]
+    return [key for name in names for key in [name] + [f"{name}\x06\x16{step}" for step in _PRIORITY_STEPS]]
+
+
+def _message_id(raw: bytes) -> str:
+    try:
+        return json.loads(raw).get("headers", {}).get("id") or ""
+    except (ValueError, AttributeError):
+        return ""
+
+
+def discard_tasks(celery_app: Any, task_ids: Iterable[str]) -> Dict[str, int]:
+    """从broker队列中移除指定任务的消息，并删除它们的结果键"""
+    ids = set(task_ids)
+    removed = 0
+    if ids and celery_app.conf.broker_url.startswith("redis"):
+        client = redis.Redis.from_url(celery_app.conf.broker_url)
+        for key in queue_keys(celery_app):
+            if client.type(key) not in (b"list", "list"):
+                continue
+            for raw in client.lrange(key, 0, -1):
+                if _message_id(raw) in ids:
+                    removed += client.lrem(key, 1, raw)
+    for task_id in ids:
+        celery_app.backend.forget(task_id)
+    return {"messages_removed": removed, "results_forgotten": len(ids)}
@@ -0,0 +1,62 @@
+"""基准测试公共工具：计时统计与结果输出"""
+
+import json
+import math
+import platform
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """计算百分位数（最近秩法）"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(latencies: List[float], elapsed: float) -> Dict[str, Any]:
+    """汇总一组请求延迟（秒）为吞吐和百分位（毫秒）"""
+    count = len(latencies)
+    return {
+        "requests": count,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def git_revision() -> Optional[str]:
+    """当前提交哈希，用于跨提交对比"""
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except Exception:
+        return None
+
+
+def write_results(name: str, results: Dict[str, Any], output: Optional[str]) -> None:
+    """打印结果，并在指定路径时写入JSON文件"""
+    document = {
+        "benchmark": name,
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    text = json.dumps(document, indent=2, ensure_ascii=False)
+    print(text)
+    if output:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        Path(output).write_text(text, encoding="utf-8")
@@ -0,0 +1,223 @@
+"""端到端流水线基准：API → Celery → Worker → yt-dlp → 磁盘
+
+启动本地视频源替身（benchmarks.fake_host），通过真实的FastAPI处理函数提交任务，
+由进程内嵌的Celery Worker执行真实的 download_video_task，yt-dlp经generic extractor
+从替身下载到临时目录。客户端轮询 /status 直到完成，统计：
+
+- jobs/min、bytes/sec
+- 端到端延迟 p50/p99（提交到状态变为completed）
+- 每个任务的Redis命令数（INFO commandstats差值，仅Redis模式）
+
+默认使用进程内broker/后端，无需Redis；``--broker redis`` 使用 ``--redis-url`` 指定的Redis（建议单独的db）。
+任务全部路由到专用队列 BENCH_QUEUE，内嵌Worker只消费该队列，不会取走共用Redis上的真实任务；
+不写元数据库、不上传对象存储，结束时只移除本次提交的任务消息和结果键。
+
+    python -m benchmarks.bench_e2e --jobs 40 --concurrency 4 --kind mixed \\
+        --size-mb 8 --bandwidth-mbps 40 --output bench-results/e2e.json
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+BENCH_QUEUE = "bench-e2e"
+
+
+def _configure_environment(broker: str, redis_url: Optional[str] = None) -> None:
+    """在导入应用之前确定broker/后端模式并放行替身URL"""
+    os.environ["TESTING"] = "true" if broker == "memory" else "false"
+    os.environ["CELERY_TASK_ALWAYS_EAGER"] = "false"
+    if redis_url:
+        os.environ["REDIS_URL"] = redis_url
+    # 下载的是替身视频，不写元数据库也不上传对象存储
+    os.environ["METADATA_DB_URL"] = ""
+    os.environ["OBJECT_STORE_URL"] = ""
+    os.environ.setdefault("METRICS_ENABLED", "false")
+    os.environ["EXTRA_URL_PATTERNS"] = r"^http://127\.0\.0\.1:\d+/"
+
+
+def _isolate_queues(celery_app: Any) -> None:
+    """所有任务路由到专用队列，内嵌Worker不会消费共用Redis上的其他队列"""
+    from kombu import Queue
+
+    celery_app.conf.task_queues = (Queue(BENCH_QUEUE),)
+    celery_app.conf.task_default_queue = BENCH_QUEUE
+    celery_app.conf.task_routes = {"*": {"queue": BENCH_QUEUE}}
+
+
+def redis_command_count(client) -> Optional[int]:
+    """Redis累计执行的命令数"""
+    if client is None:
+        return None
+    stats = client.info("commandstats")
+    return sum(entry["calls"] for entry in stats.values())
+
+
+async def run_jobs(
+    api, urls: List[str], concurrency: int, poll_interval: float, submitted: Optional[List[str]] = None
+) -> Dict:
+    """并发提交任务并轮询至完成；submitted 收集提交的任务ID，供结束时清理"""
+    import httpx
+
+    transport = httpx.ASGITransport(app=api)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    total_bytes = 0
+    failures: List[str] = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+
+        async def one_job(url: str):
+            nonlocal total_bytes
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    "/download", json={"url": url, "quality": "best", "subtitle_langs": []}
+                )
+                response.raise_for_status()
+                task_id = response.json()["task_id"]
+                if submitted is not None:
+                    submitted.append(task_id)
+                while True:
+                    await asyncio.sleep(poll_interval)
+                    status = (await client.get(f"/status/{task_id}")).json()
+                    if status["status"] == "completed":
+                        total_bytes += (status.get("result") or {}).get("file_size") or 0
+                        latencies.append(time.perf_counter() - started)
+                        return
+                    if status["status"] == "failed":
+                        failures.append(status.get("error") or "unknown")
+                        return
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_job(url) for url in urls))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "elapsed": elapsed,
+        "latencies": latencies,
+        "total_bytes": total_bytes,
+        "failures": failures,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4, help="客户端同时在途的任务数")
+    parser.add_argument("--worker-concurrency", type=int, default=1)
+    parser.add_argument("--kind", choices=["progressive", "hls", "mixed"], default="mixed")
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--fragments", type=int, default=8)
+    parser.add_argument("--bandwidth-mbps", type=float, default=0, help="每连接限速，0为不限")
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument(
+        "--no-sleep",
+        action="store_true",
+        help="去掉yt-dlp的请求间隔（sleep_interval*），只测流水线本身",
+    )
+    parser.add_argument("--broker", choices=("memory", "redis"), default="memory")
+    parser.add_argument("--redis-url", default=None, help="--broker redis 时使用的Redis（建议单独的db）")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+    if args.broker == "redis" and not args.redis_url:
+        parser.error("--broker redis requires --redis-url")
+
+    _configure_environment(args.broker, args.redis_url)
+
+    from celery.contrib.testing.worker import start_worker
+
+    from app import tasks
+    from app.celery_app import celery_app
+    from app.downloader import YouTubeDownloader
+    from app.main import app as api
+    from benchmarks._queues import discard_tasks
+    from benchmarks._stats import percentile, write_results
+    from benchmarks.fake_host import FakeMediaHost
+
+    _isolate_queues(celery_app)
+
+    download_dir = tempfile.mkdtemp(prefix="bench-e2e-")
+    tasks.downloader = YouTubeDownloader(download_path=download_dir)
+    if args.no_sleep:
+        for key in ("sleep_interval", "sleep_interval_requests"):
+            tasks.downloader.base_opts.pop(key, None)
+
+    redis_client = None
+    if args.broker == "redis":
+        from app.redis_client import get_redis
+
+        redis_client = get_redis()
+
+    bandwidth = int(args.bandwidth_mbps * 1024 * 1024 / 8) or None
+    host = FakeMediaHost(
+        size_bytes=int(args.size_mb * 1024 * 1024),
+        fragments=args.fragments,
+        bandwidth=bandwidth,
+    )
+
+    with host, start_worker(
+        celery_app,
+        pool="threads" if args.worker_concurrency > 1 else "solo",
+        concurrency=args.worker_concurrency,
+        perform_ping_check=False,
+        queues=[BENCH_QUEUE],
+        shutdown_timeout=30,
+    ):
+        urls = []
+        for n in range(args.jobs):
+            video_id = f"bench{os.getpid()}x{n:04d}"
+            use_hls = args.kind == "hls" or (args.kind == "mixed" and n % 2)
+            urls.append(host.hls_url(video_id) if use_hls else host.watch_url(video_id))
+
+        submitted: List[str] = []
+        try:
+            commands_before = redis_command_count(redis_client)
+            outcome = asyncio.run(run_jobs(api, urls, args.concurrency, args.poll_interval, submitted))
+            commands_after = redis_command_count(redis_client)
+        finally:
+            # 只清理本次提交的任务，不清空队列
+            discard_tasks(celery_app, submitted)
+    shutil.rmtree(download_dir, ignore_errors=True)
+
+    elapsed = outcome["elapsed"]
+    latencies = outcome["latencies"]
+    completed = len(latencies)
+    results = {
+        "config": {
+            "jobs": args.jobs,
+            "concurrency": args.concurrency,
+            "worker_concurrency": args.worker_concurrency,
+            "kind": args.kind,
+            "size_mb": args.size_mb,
+            "fragments": args.fragments,
+            "bandwidth_mbps": args.bandwidth_mbps,
+            "no_sleep": args.no_sleep,
+            "broker": args.redis_url if args.broker == "redis" else "memory",
+        },
+        "completed": completed,
+        "failed": len(outcome["failures"]),
+        "failure_samples": outcome["failures"][:5],
+        "elapsed_s": round(elapsed, 2),
+        "jobs_per_min": round(completed / elapsed * 60, 2) if elapsed else 0.0,
+        "bytes_per_sec": round(outcome["total_bytes"] / elapsed) if elapsed else 0,
+        "latency_p50_s": round(percentile(latencies, 50), 3),
+        "latency_p99_s": round(percentile(latencies, 99), 3),
+        "redis_ops_per_job": (
+            round((commands_after - commands_before) / max(args.jobs, 1), 1)
+            if commands_before is not None
+            else None
+        ),
+        "host_requests": dict(host.requests),
+    }
+    write_results("e2e", results, args.output)
+    sys.exit(1 if outcome["failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""API与Worker冷启动导入耗时基准
+
+在全新子进程中以 ``python -X importtime`` 方式导入各入口，统计：
+
+- 导入总耗时（顶层模块cumulative之和）与进程墙钟时间
+- 最慢的顶层导入
+- 是否意外加载了重量级模块（API不应加载yt_dlp，Worker不应加载fastapi）
+
+超出预算时以非零状态码退出，可直接用于CI：
+
+    python -m benchmarks.bench_startup --runs 5 --output bench-results/startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks._stats import write_results
+
+# 入口 -> (导入代码, 不允许出现的模块)
+ENTRY_POINTS = {
+    "api": (
+        "import app.main",
+        ["yt_dlp", "app.tasks"],
+    ),
+    "worker": (
+        "from app.celery_app import celery_app; celery_app.loader.import_default_modules()",
+        ["fastapi", "starlette", "yt_dlp", "app.main"],
+    ),
+}
+
+# 冷启动预算（毫秒），可用环境变量覆盖
+DEFAULT_BUDGETS_MS = {
+    "api": float(os.getenv("STARTUP_BUDGET_API_MS", "900")),
+    "worker": float(os.getenv("STARTUP_BUDGET_WORKER_MS", "600")),
+}
+
+_PROBE = """
+import json, sys
+{code}
+print(json.dumps({{name: name in sys.modules for name in {modules!r}}}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """解析 -X importtime 输出，返回顶层导入列表"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        head, cumulative_us, name = line.split("|", 2)
+        self_us = int(head.split(":", 1)[1])
+        module = name.rstrip()
+        depth = len(module) - len(module.lstrip())
+        entries.append(
+            {
+                "module": module.strip(),
+                "depth": depth,
+                "self_us": self_us,
+                "cumulative_us": int(cumulative_us),
+            }
+        )
+    # importtime以两个空格缩进表示嵌套，顶层为1个空格
+    top_depth = min((e["depth"] for e in entries), default=0)
+    return [e for e in entries if e["depth"] == top_depth]
+
+
+def measure(entry: str) -> Dict:
+    """在子进程中测量一次入口导入"""
+    code, forbidden = ENTRY_POINTS[entry]
+    env = dict(os.environ, TESTING="false", CELERY_TASK_ALWAYS_EAGER="false")
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(code=code, modules=forbidden)],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    top_level = parse_importtime(proc.stderr)
+    loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        "wall_ms": wall_ms,
+        "import_ms": sum(e["cumulative_us"] for e in top_level) / 1000,
+        "slowest": sorted(top_level, key=lambda e: e["cumulative_us"], reverse=True)[:10],
+        "unexpected_modules": [name for name, present in loaded.items() if present],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--api-budget-ms", type=float, default=DEFAULT_BUDGETS_MS["api"])
+    parser.add_argument("--worker-budget-ms", type=float, default=DEFAULT_BUDGETS_MS["worker"])
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    budgets = {"api": args.api_budget_ms, "worker": args.worker_budget_ms}
+    results = {}
+    failed = False
+    for entry in ENTRY_POINTS:
+        runs = [measure(entry) for _ in range(args.runs)]
+        import_ms = statistics.median(r["import_ms"] for r in runs)
+        wall_ms = statistics.median(r["wall_ms"] for r in runs)
+        unexpected = runs[-1]["unexpected_modules"]
+        within_budget = import_ms <= budgets[entry] and not unexpected
+        failed = failed or not within_budget
+        results[entry] = {
+            "import_ms_median": round(import_ms, 1),
+            "wall_ms_median": round(wall_ms, 1),
+            "budget_ms": budgets[entry],
+            "within_budget": within_budget,
+            "unexpected_modules": unexpected,
+            "slowest_imports": [
+                {"module": e["module"], "cumulative_ms": round(e["cumulative_us"] / 1000, 1)}
+                for e in runs[-1]["slowest"]
+            ],
+        }
+
+    write_results("startup", results, args.output)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
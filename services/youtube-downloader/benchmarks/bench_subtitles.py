@@ -0,0 +1,130 @@
+"""字幕解析基准：小时级自动字幕的解析、去重与时间范围查找
+
+生成与YouTube自动字幕结构相同的VTT（滚动重复行、逐词时间标签、10ms过渡条目）
+以及普通SRT，统计：
+
+- 解析+去重+写出分段文件的耗时与吞吐（MB/s）
+- 条目数与去重后片段数、分段文件相对原文件的大小
+- 按随机时间窗口查找的平均延迟
+
+    python -m benchmarks.bench_subtitles --hours 1 --repeat 5 --output bench-results/subtitles.json
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from app import subtitles
+from benchmarks._stats import percentile, write_results
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog while we talk about video pipelines "
+    "and caption alignment for translation rewriting and speech synthesis"
+).split()
+
+
+def _ts(ms: int, sep: str = ".") -> str:
+    hours, rest = divmod(ms, 3_600_000)
+    minutes, rest = divmod(rest, 60_000)
+    seconds, millis = divmod(rest, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{sep}{millis:03d}"
+
+
+def generate_auto_vtt(path: str, seconds: int, line_ms: int = 2500, words_per_line: int = 7) -> int:
+    """写出自动字幕风格的VTT，返回正文行数"""
+    rng = random.Random(42)
+    previous = ""
+    lines_written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("WEBVTT\nKind: captions\nLanguage: en\n\n")
+        for start in range(0, seconds * 1000, line_ms):
+            words = [rng.choice(WORDS) for _ in range(words_per_line)]
+            step = line_ms // (words_per_line + 1)
+            tagged = words[0] + "".join(
+                f"<{_ts(start + step * (i + 1))}><c> {word}</c>" for i, word in enumerate(words[1:])
+            )
+            end = start + line_ms
+            f.write(f"{_ts(start)} --> {_ts(end - 10)} align:start position:0%\n")
+            f.write(f"{previous or ' '}\n{tagged}\n\n")
+            previous = " ".join(words)
+            f.write(f"{_ts(end - 10)} --> {_ts(end)} align:start position:0%\n{previous}\n \n\n")
+            lines_written += 1
+    return lines_written
+
+
+def generate_srt(path: str, seconds: int, line_ms: int = 3000) -> int:
+    """写出普通SRT，返回条目数"""
+    rng = random.Random(7)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for n, start in enumerate(range(0, seconds * 1000, line_ms), 1):
+            text = " ".join(rng.choice(WORDS) for _ in range(9))
+            f.write(f"{n}\n{_ts(start, ',')} --> {_ts(start + line_ms - 200, ',')}\n{text}\n\n")
+            count += 1
+    return count
+
+
+def bench_file(path: str, repeat: int, lookups: int) -> Dict:
+    size = os.path.getsize(path)
+    with open(path, encoding="utf-8") as f:
+        cues = sum(1 for _ in subtitles.iter_cues(f))
+
+    timings: List[float] = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subtitles.build_segments(path)
+        timings.append(time.perf_counter() - started)
+
+    index = subtitles.SegmentIndex.load(result["path"])
+    duration_ms = index.ends[-1] if len(index) else 0
+    rng = random.Random(1)
+    lookup_times: List[float] = []
+    for _ in range(lookups):
+        start = rng.randrange(0, max(duration_ms, 1))
+        started = time.perf_counter()
+        index.lookup(start, start + 30_000)
+        lookup_times.append(time.perf_counter() - started)
+
+    best = min(timings)
+    return {
+        "input_bytes": size,
+        "output_bytes": os.path.getsize(result["path"]),
+        "cues": cues,
+        "segments": result["count"],
+        "build_s_median": round(statistics.median(timings), 4),
+        "build_s_best": round(best, 4),
+        "throughput_mb_s": round(size / best / 1024 / 1024, 1),
+        "lookup_us_mean": round(statistics.mean(lookup_times) * 1e6, 2),
+        "lookup_us_p99": round(percentile(lookup_times, 99) * 1e6, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    seconds = int(args.hours * 3600)
+    with tempfile.TemporaryDirectory(prefix="bench-subtitles-") as workdir:
+        vtt = os.path.join(workdir, "bench.en.vtt")
+        srt = os.path.join(workdir, "bench.zh-CN.srt")
+        generate_auto_vtt(vtt, seconds)
+        generate_srt(srt, seconds)
+        results = {
+            "config": {"hours": args.hours, "repeat": args.repeat, "lookups": args.lookups},
+            "auto_vtt": bench_file(vtt, args.repeat, args.lookups),
+            "srt": bench_file(srt, args.repeat, args.lookups),
+        }
+    write_results("subtitles", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
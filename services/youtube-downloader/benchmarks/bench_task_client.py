@@ -0,0 +1,140 @@
+"""任务提交/状态查询负载测试：阻塞处理函数 vs 异步任务客户端
+
+对比两种实现在同一Redis上的吞吐和尾延迟：
+
+- before: 旧实现，async处理函数中直接调用 send_task / AsyncResult(...).state
+- after:  当前 app.main，经由 AsyncTaskClient 提交和查询
+
+需要可访问的Redis（REDIS_URL），不需要启动Worker——任务只入队不执行。建议使用专用的Redis或db；
+结束时只移除本次提交的任务消息和结果键，不会清空队列，但运行期间真实Worker可能取走这些任务。
+请求通过ASGI直接在进程内驱动，因此事件循环被阻塞时会直接体现在延迟上。
+
+    REDIS_URL=redis://localhost:6379/0 \\
+        python -m benchmarks.bench_task_client --requests 2000 --concurrency 64 \\
+        --output bench-results/task_client.json
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks._queues import discard_tasks
+from benchmarks._stats import summarize_latencies, write_results
+
+DOWNLOAD_BODY = {
+    "url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "quality": "720p",
+    "audio_only": False,
+    "subtitle_langs": ["en"],
+}
+
+
+def _configure_environment() -> None:
+    """必须在导入应用之前关闭测试模式，保证走Redis broker/backend"""
+    os.environ.setdefault("TESTING", "false")
+    os.environ.setdefault("CELERY_TASK_ALWAYS_EAGER", "false")
+
+
+def build_legacy_app() -> FastAPI:
+    """重建旧版处理函数：在事件循环中直接执行阻塞的Redis调用"""
+    from app.celery_app import celery_app
+
+    legacy = FastAPI()
+
+    @legacy.post("/download")
+    async def download(body: Dict):
+        task_id = str(uuid.uuid4())
+        celery_app.send_task(
+            "app.tasks.download_video_task",
+            kwargs={"url": body["url"], "quality": body["quality"]},
+            task_id=task_id,
+        )
+        return {"task_id": task_id, "status": "pending"}
+
+    @legacy.get("/status/{task_id}")
+    async def status(task_id: str):
+        task = celery_app.AsyncResult(task_id)
+        return {"task_id": task_id, "state": task.state}
+
+    return legacy
+
+
+async def drive(
+    app: FastAPI, total: int, concurrency: int, submit_ratio: float
+) -> Tuple[Dict, List[str]]:
+    """以固定并发驱动请求混合，返回汇总结果"""
+    transport = httpx.ASGITransport(app=app)
+    latencies: List[float] = []
+    errors = 0
+    submitted: List[str] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    rng = random.Random(42)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one_request():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                if not submitted or rng.random() < submit_ratio:
+                    response = await client.post("/download", json=DOWNLOAD_BODY)
+                    if response.status_code == 200:
+                        submitted.append(response.json()["task_id"])
+                else:
+                    response = await client.get(f"/status/{rng.choice(submitted)}")
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    summary = summarize_latencies(latencies, elapsed)
+    summary["errors"] = errors
+    return summary, submitted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--submit-ratio", type=float, default=0.2)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    _configure_environment()
+    from app.celery_app import celery_app
+    from app.main import app as async_app
+
+    results = {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "submit_ratio": args.submit_ratio,
+            "redis_url": os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+        }
+    }
+    for name, app in (("before", build_legacy_app()), ("after", async_app)):
+        summary, task_ids = asyncio.run(
+            drive(app, args.requests, args.concurrency, args.submit_ratio)
+        )
+        # 只清理本次提交的任务，不清空队列
+        discard_tasks(celery_app, task_ids)
+        results[name] = summary
+
+    results["speedup_rps"] = round(
+        results["after"]["rps"] / max(results["before"]["rps"], 1e-9), 2
+    )
+    write_results("task_client", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
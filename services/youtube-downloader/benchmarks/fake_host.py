@@ -0,0 +1,196 @@
+"""本地视频源替身
+
+为端到端基准提供确定性的媒体内容，yt-dlp通过generic extractor访问：
+
+- ``/watch/<id>``        HTML5页面，包含多个 <source>（不同分辨率的progressive mp4）
+- ``/v/<id>_<height>.mp4`` progressive文件，支持Range请求
+- ``/hls/<id>.m3u8``      HLS播放列表，分片位于 ``/hls/<id>/seg<n>.ts``
+
+内容由视频ID和偏移量确定性生成，每个连接按 ``bandwidth`` 字节/秒限速，
+可用来复现带宽受限和分片下载场景。
+"""
+
+import hashlib
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+HEIGHTS = (360, 720, 1080)
+
+
+def _block(video_id: str, index: int) -> bytes:
+    """第index个64KB块的确定性内容"""
+    seed = hashlib.sha256(f"{video_id}:{index}".encode()).digest()
+    return (seed * (CHUNK_SIZE // len(seed) + 1))[:CHUNK_SIZE]
+
+
+class FakeMediaHost:
+    """线程化HTTP媒体服务"""
+
+    def __init__(
+        self,
+        size_bytes: int = 8 * 1024 * 1024,
+        fragments: int = 8,
+        bandwidth: Optional[int] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.size_bytes = size_bytes
+        self.fragments = fragments
+        self.bandwidth = bandwidth
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def watch_url(self, video_id: str) -> str:
+        return f"{self.base_url}/watch/{video_id}"
+
+    def hls_url(self, video_id: str) -> str:
+        return f"{self.base_url}/hls/{video_id}.m3u8"
+
+    def media_size(self, height: int) -> int:
+        """不同分辨率的文件大小按高度线性缩放"""
+        return max(CHUNK_SIZE, self.size_bytes * height // max(HEIGHTS))
+
+    def start(self) -> "FakeMediaHost":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-media-host", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeMediaHost":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def _handler_class(self):
+        host = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # noqa: A002 - 覆盖基类签名
+                pass
+
+            def do_HEAD(self):
+                self._dispatch(head=True)
+
+            def do_GET(self):
+                self._dispatch(head=False)
+
+            def _dispatch(self, head: bool):
+                path = self.path.split("?", 1)[0]
+                match = re.fullmatch(r"/watch/([\w-]+)", path)
+                if match:
+                    host._count("page")
+                    return self._send_bytes(self._page(match.group(1)), "text/html", head)
+                match = re.fullmatch(r"/v/([\w-]+)_(\d+)\.mp4", path)
+                if match:
+                    host._count("media")
+                    size = host.media_size(int(match.group(2)))
+                    return self._send_media(match.group(1), size, "video/mp4", head)
+                match = re.fullmatch(r"/hls/([\w-]+)\.m3u8", path)
+                if match:
+                    host._count("playlist")
+                    return self._send_bytes(
+                        self._playlist(match.group(1)), "application/vnd.apple.mpegurl", head
+                    )
+                match = re.fullmatch(r"/hls/([\w-]+)/seg(\d+)\.ts", path)
+                if match:
+                    host._count("fragment")
+                    size = max(CHUNK_SIZE, host.size_bytes // max(host.fragments, 1))
+                    video_id = f"{match.group(1)}-{match.group(2)}"
+                    return self._send_media(video_id, size, "video/mp2t", head)
+                self.send_error(404)
+
+            def _page(self, video_id: str) -> bytes:
+                sources = "\n".join(
+                    f'<source src="/v/{video_id}_{h}.mp4" type="video/mp4" res="{h}" label="{h}p">'
+                    for h in HEIGHTS
+                )
+                return (
+                    f"<!DOCTYPE html><html><head><title>{video_id}</title></head>"
+                    f"<body><video controls>{sources}</video></body></html>"
+                ).encode()
+
+            def _playlist(self, video_id: str) -> bytes:
+                lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:4"]
+                for n in range(host.fragments):
+                    lines += ["#EXTINF:4.0,", f"/hls/{video_id}/seg{n}.ts"]
+                lines.append("#EXT-X-ENDLIST")
+                return ("\n".join(lines) + "\n").encode()
+
+            def _send_bytes(self, body: bytes, content_type: str, head: bool):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if not head:
+                    self.wfile.write(body)
+
+            def _parse_range(self, size: int) -> Tuple[int, int, bool]:
+                header = self.headers.get("Range")
+                match = re.fullmatch(r"bytes=(\d*)-(\d*)", header or "")
+                if not match:
+                    return 0, size - 1, False
+                start = int(match.group(1) or 0)
+                end = int(match.group(2)) if match.group(2) else size - 1
+                return start, min(end, size - 1), True
+
+            def _send_media(self, video_id: str, size: int, content_type: str, head: bool):
+                start, end, partial = self._parse_range(size)
+                if start >= size:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206 if partial else 200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(end - start + 1))
+                if partial:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                self.end_headers()
+                if head:
+                    return
+
+                started = time.monotonic()
+                sent = 0
+                offset = start
+                try:
+                    while offset <= end:
+                        index, inner = divmod(offset, CHUNK_SIZE)
+                        chunk = _block(video_id, index)[inner:]
+                        chunk = chunk[: end - offset + 1]
+                        self.wfile.write(chunk)
+                        offset += len(chunk)
+                        sent += len(chunk)
+                        if host.bandwidth:
+                            ahead = sent / host.bandwidth - (time.monotonic() - started)
+                            if ahead > 0:
+                                time.sleep(ahead)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
@@ -0,0 +1,101 @@
+"""本地出口代理替身
+
+最简单的HTTP正向代理（只处理 ``GET http://...`` / ``HEAD``，不支持CONNECT），配合 FakeMediaHost
+测试和压测代理池：``throttle=True`` 时对所有请求返回429，模拟出口IP被限流；``delay`` 为每个请求
+附加的延迟（秒），模拟慢出口。``requests`` 记录经过该代理的请求数。
+"""
+
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# 转发时不再经过环境变量中的代理
+_OPENER = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+_FORWARD_HEADERS = ("Range", "User-Agent", "Accept", "Accept-Encoding", "Accept-Language")
+
+
+class FakeProxy:
+    """线程化HTTP正向代理"""
+
+    def __init__(self, throttle: bool = False, delay: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.throttle = throttle
+        self.delay = delay
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeProxy":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-proxy", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeProxy":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _handler_class(self):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # noqa: A002 - 覆盖基类签名
+                pass
+
+            def do_HEAD(self):
+                self._forward("HEAD")
+
+            def do_GET(self):
+                self._forward("GET")
+
+            def _forward(self, method: str):
+                with proxy._lock:
+                    proxy.requests += 1
+                if proxy.delay:
+                    time.sleep(proxy.delay)
+                if proxy.throttle:
+                    body = b"Too Many Requests"
+                    self.send_response(429)
+                    self.send_header("Content-Type", "text/plain")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    if method == "GET":
+                        self.wfile.write(body)
+                    return
+
+                headers = {name: self.headers[name] for name in _FORWARD_HEADERS if self.headers.get(name)}
+                request = urllib.request.Request(self.path, method=method, headers=headers)
+                try:
+                    upstream = _OPENER.open(request, timeout=30)
+                except urllib.error.HTTPError as e:
+                    upstream = e
+                with upstream:
+                    self.send_response(upstream.status if hasattr(upstream, "status") else upstream.code)
+                    for name, value in upstream.headers.items():
+                        if name.lower() not in ("connection", "transfer-encoding"):
+                            self.send_header(name, value)
+                    self.end_headers()
+                    if method == "GET":
+                        try:
+                            shutil.copyfileobj(upstream, self.wfile)
+                        except (BrokenPipeError, ConnectionResetError):
+                            pass
+
+        return Handler
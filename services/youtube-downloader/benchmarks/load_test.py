@@ -0,0 +1,316 @@
+"""API负载测试：/download、/status、/info 的吞吐、延迟和错误率
+
+按请求混合比例和一组并发度对API做闭环压测（每个并发连接收到响应后立即发下一个请求），
+每个并发度持续 --duration 秒，报告总体与各端点的 rps、p50/p90/p99、错误率和状态码分布，
+并按延迟目标给出单个API实例可承受的rps和达到目标流量所需的副本数。
+
+- 默认在进程内通过ASGI驱动 app.main（--broker memory：内存broker/结果后端，无需Redis；
+  --broker redis：使用 --redis-url 指定的Redis，建议用单独的db）。/info 的yt-dlp提取替换为
+  固定延迟（--info-latency-ms），只测API本身的开销。元数据存储不启用。
+- --base-url 指向已部署的实例（如 kubectl port-forward 的 Pod）时走真实HTTP；
+  此时 /status 的任务状态需与实例共用 --redis-url 才能预置。/download 会让实例的Worker真实下载，
+  混合比例中包含 download 时必须显式加 --allow-downloads。
+
+结束时只清理本次预置和提交的任务（移除其队列消息、删除结果键），不清空队列。
+
+任务状态分布（--states）决定 /status 查询到的状态：预置 --seed-tasks 个任务结果，
+pending 不写入后端，progress/success/failure 按比例写入（success 为完整的下载结果）。
+
+    python -m benchmarks.load_test --mix download=1,status=8,info=1 --concurrency 8,32,128 \\
+        --duration 10 --states pending=0.1,progress=0.3,success=0.5,failure=0.1 \\
+        --slo-p99-ms 200 --target-rps 1500 --output bench-results/load_test.json
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+ENDPOINTS = ("download", "status", "batch", "info")
+TASK_STATES = ("pending", "progress", "success", "failure")
+BATCH_SIZE = 50
+
+
+def _configure_environment(broker: str, redis_url: Optional[str] = None) -> None:
+    """在导入应用之前确定broker/后端"""
+    os.environ["TESTING"] = "true" if broker == "memory" else "false"
+    os.environ["CELERY_TASK_ALWAYS_EAGER"] = "false"
+    # 提交的任务不会执行，不写元数据库
+    os.environ["METADATA_DB_URL"] = ""
+    if redis_url:
+        os.environ["REDIS_URL"] = redis_url
+
+
+def parse_weights(spec: str, allowed: Tuple[str, ...]) -> Dict[str, float]:
+    """解析 ``name=weight,...``，返回归一化后的比例"""
+    weights: Dict[str, float] = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in allowed:
+            raise ValueError(f"Unknown name {name!r}, expected one of {', '.join(allowed)}")
+        weights[name] = float(value or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError(f"Weights must be positive: {spec}")
+    return {name: weight / total for name, weight in weights.items() if weight > 0}
+
+
+def sample_result(task_id: str, video_id: str) -> Dict[str, Any]:
+    """与 download_video_task 返回结构一致的成功结果"""
+    return {
+        "task_id": task_id,
+        "status": "completed",
+        "download_time": 12.3,
+        "video_path": f"downloads/{video_id}.mp4",
+        "audio_path": None,
+        "subtitle_paths": {"en": f"downloads/{video_id}.en.vtt"},
+        "subtitle_segment_paths": {"en": f"downloads/{video_id}.en.segments.json"},
+        "thumbnail_path": f"downloads/{video_id}.jpg",
+        "description_path": None,
+        "file_size": 48_000_000,
+        "format": {"requested": "720p", "delivered": "720p", "height": 720, "vcodec": "avc1", "ext": "mp4"},
+        "checksums": {f"{video_id}.mp4": {"sha256": "0" * 64, "size": 48_000_000}},
+        "metadata": {"id": video_id, "title": "Load test video", "duration": 212, "tags": ["bench"] * 10},
+        "download_urls": {"video": f"/downloads/{video_id}.mp4", "thumbnail": f"/downloads/{video_id}.jpg"},
+    }
+
+
+def seed_tasks(backend: Any, count: int, states: Dict[str, float], rng: random.Random) -> Dict[str, List[str]]:
+    """按状态分布写入任务结果，返回 {状态: [任务ID]}"""
+    names = list(states)
+    weights = [states[name] for name in names]
+    seeded: Dict[str, List[str]] = defaultdict(list)
+    for state in rng.choices(names, weights, k=count):
+        task_id = str(uuid.uuid4())
+        if state == "progress":
+            backend.store_result(
+                task_id, {"progress": rng.randint(0, 99), "current_step": "Downloading: video.mp4"}, "PROGRESS"
+            )
+        elif state == "success":
+            backend.store_result(task_id, sample_result(task_id, f"{rng.getrandbits(40):011x}"), "SUCCESS")
+        elif state == "failure":
+            backend.store_result(task_id, RuntimeError("HTTP Error 403: Forbidden"), "FAILURE")
+        seeded[state].append(task_id)
+    return seeded
+
+
+def stub_video_info(latency: float) -> None:
+    """/info 的yt-dlp提取替换为固定延迟"""
+    from app import main
+    from app.models import VideoInfo
+
+    async def get_video_info(url: str) -> VideoInfo:
+        if latency:
+            await asyncio.sleep(latency)
+        return VideoInfo(id=url[-11:], title="Load test video", duration=212, available_qualities=["720p"])
+
+    main.downloader.get_video_info = get_video_info
+
+
+class Recorder:
+    """按端点记录延迟和状态码"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, endpoint: str, latency: float, status: str) -> None:
+        self.latencies[endpoint].append(latency)
+        self.statuses[endpoint][status] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        from benchmarks._stats import summarize_latencies
+
+        def _summarize(latencies: List[float], statuses: Counter) -> Dict[str, Any]:
+            result = summarize_latencies(latencies, elapsed)
+            errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+            result["errors"] = errors
+            result["error_rate"] = round(errors / max(len(latencies), 1), 4)
+            result["status_codes"] = dict(sorted(statuses.items()))
+            return result
+
+        all_latencies = [latency for values in self.latencies.values() for latency in values]
+        all_statuses: Counter = sum(self.statuses.values(), Counter())
+        overall = _summarize(all_latencies, all_statuses)
+        overall["endpoints"] = {
+            endpoint: _summarize(self.latencies[endpoint], self.statuses[endpoint])
+            for endpoint in sorted(self.latencies)
+        }
+        return overall
+
+
+async def run_level(
+    client: Any,
+    concurrency: int,
+    duration: float,
+    mix: Dict[str, float],
+    seeded: Dict[str, List[str]],
+    seed: int,
+    submitted: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """以固定并发闭环压测 duration 秒，/download 返回的任务ID追加到 submitted"""
+    rng = random.Random(seed)
+    endpoints = list(mix)
+    weights = [mix[name] for name in endpoints]
+    known_ids = [task_id for ids in seeded.values() for task_id in ids] or [str(uuid.uuid4())]
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    async def request(endpoint: str) -> Any:
+        video_id = f"{rng.getrandbits(40):011x}"
+        if endpoint == "download":
+            return await client.post(
+                "/download",
+                json={
+                    "url": f"https://www.youtube.com/watch?v={video_id}",
+                    "quality": "720p",
+                    "subtitle_langs": ["en"],
+                },
+            )
+        if endpoint == "status":
+            return await client.get(f"/status/{rng.choice(known_ids)}")
+        if endpoint == "batch":
+            return await client.post("/status/batch", json={"task_ids": rng.choices(known_ids, k=BATCH_SIZE)})
+        return await client.get("/info", params={"url": f"https://www.youtube.com/watch?v={video_id}"})
+
+    async def connection() -> None:
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(endpoints, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await request(endpoint)
+                status = str(response.status_code)
+                if endpoint == "download" and submitted is not None and response.status_code == 200:
+                    submitted.append(response.json()["task_id"])
+            except Exception as e:
+                status = type(e).__name__
+            recorder.record(endpoint, time.perf_counter() - started, status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    summary = recorder.summary(time.perf_counter() - started)
+    summary["concurrency"] = concurrency
+    return summary
+
+
+def size_replicas(
+    levels: List[Dict[str, Any]], slo_p99_ms: float, max_error_rate: float, target_rps: Optional[float]
+) -> Dict[str, Any]:
+    """取满足延迟目标和错误率的最高吞吐作为单实例容量，估算副本数"""
+    passing = [
+        level for level in levels
+        if level["p99_ms"] <= slo_p99_ms and level["error_rate"] <= max_error_rate
+    ]
+    if not passing:
+        return {"slo_p99_ms": slo_p99_ms, "max_error_rate": max_error_rate, "capacity_rps": None}
+    best = max(passing, key=lambda level: level["rps"])
+    sizing = {
+        "slo_p99_ms": slo_p99_ms,
+        "max_error_rate": max_error_rate,
+        "capacity_rps": best["rps"],
+        "at_concurrency": best["concurrency"],
+    }
+    if target_rps:
+        sizing["target_rps"] = target_rps
+        sizing["replicas"] = max(1, math.ceil(target_rps / best["rps"])) if best["rps"] else None
+    return sizing
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    import httpx
+
+    from app.celery_app import celery_app
+    from app.logging_config import configure_logging
+
+    mix = parse_weights(args.mix, ENDPOINTS)
+    states = parse_weights(args.states, TASK_STATES)
+    rng = random.Random(args.seed)
+    seeded = seed_tasks(celery_app.backend, args.seed_tasks, states, rng)
+
+    if args.base_url:
+        transport = None
+        base_url = args.base_url
+    else:
+        from app.main import app
+
+        # 与部署一致的日志格式化开销，输出丢弃
+        configure_logging(sink=open(os.devnull, "w"))
+        stub_video_info(args.info_latency_ms / 1000)
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://load-test"
+
+    levels = []
+    submitted: List[str] = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(
+        transport=transport, base_url=base_url, timeout=args.timeout, limits=limits
+    ) as client:
+        for index, concurrency in enumerate(args.concurrency):
+            levels.append(
+                await run_level(client, concurrency, args.duration, mix, seeded, args.seed + index, submitted)
+            )
+
+    if args.broker == "redis":
+        from benchmarks._queues import discard_tasks
+
+        seeded_ids = [task_id for task_ids in seeded.values() for task_id in task_ids]
+        discard_tasks(celery_app, seeded_ids + submitted)
+
+    return {
+        "config": {
+            "target": args.base_url or f"in-process ({args.broker} broker)",
+            "mix": mix,
+            "states": states,
+            "seed_tasks": args.seed_tasks,
+            "duration_s": args.duration,
+            "info_latency_ms": None if args.base_url else args.info_latency_ms,
+            "cpu_count": os.cpu_count(),
+        },
+        "levels": levels,
+        "sizing": size_replicas(levels, args.slo_p99_ms, args.max_error_rate, args.target_rps),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", default="download=1,status=8,info=1", help="请求混合比例（download/status/batch/info）")
+    parser.add_argument("--concurrency", default="8,32,128", help="逗号分隔的并发度，逐级压测")
+    parser.add_argument("--duration", type=float, default=10.0, help="每个并发度的持续时间（秒）")
+    parser.add_argument("--states", default="pending=0.1,progress=0.3,success=0.5,failure=0.1", help="任务状态分布")
+    parser.add_argument("--seed-tasks", type=int, default=1000, help="预置的任务结果数")
+    parser.add_argument("--broker", choices=("memory", "redis"), default="memory")
+    parser.add_argument("--redis-url", default=None, help="--broker redis 时使用的Redis（建议单独的db）")
+    parser.add_argument("--base-url", default=None, help="压测已部署的实例，而不是进程内的应用")
+    parser.add_argument(
+        "--allow-downloads", action="store_true", help="--base-url 模式下允许 download 请求（实例会真实下载）"
+    )
+    parser.add_argument("--info-latency-ms", type=float, default=0.0, help="进程内模式下 /info 提取的模拟延迟")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--slo-p99-ms", type=float, default=200.0, help="容量估算的p99延迟目标")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--target-rps", type=float, default=None, help="估算达到该流量所需的副本数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+    args.concurrency = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    if args.broker == "redis" and not args.redis_url:
+        parser.error("--broker redis requires --redis-url")
+    if args.base_url and not args.allow_downloads and "download" in parse_weights(args.mix, ENDPOINTS):
+        parser.error("--base-url with download in --mix submits real downloads; pass --allow-downloads")
+
+    _configure_environment(args.broker, args.redis_url)
+    from benchmarks._stats import write_results
+
+    write_results("load_test", asyncio.run(run(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
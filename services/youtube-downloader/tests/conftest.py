@@ -15,6 +15,8 @@ from typing import Generator, Dict, Any
 os.environ["TESTING"] = "true"
 os.environ["CELERY_TASK_ALWAYS_EAGER"] = "true"
 os.environ["CELERY_TASK_EAGER_PROPAGATES"] = "true"
+# 元数据库由各测试自行创建，避免在工作目录下生成数据库文件
+os.environ.setdefault("METADATA_DB_URL", "")
 
 from fastapi.testclient import TestClient
 
@@ -149,7 +151,7 @@ def mock_yt_dlp():
         }
         
         # 设置默认的download行为
-        mock_ydl.download.return_value = None
+        mock_ydl.process_ie_result.return_value = None
         
         yield mock_ydl
 
@@ -0,0 +1,107 @@
+import os
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import artifact_index
+from app.main import app
+from app.metadata_store import MetadataStore, record_from_info
+from app.storage_layout import StorageLayout
+from app.tasks import evict_cache_task
+
+
+@pytest.fixture
+def store(temp_dir):
+    store = MetadataStore(f"sqlite:///{Path(temp_dir) / 'metadata.db'}")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def layout(temp_dir):
+    return StorageLayout(str(Path(temp_dir) / "downloads"), "sharded")
+
+
+def write_artifact(layout, name, size, age=0):
+    path = layout.ensure_video_dir(name.split(".", 1)[0]) / name
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+class TestArtifactIndex:
+    """下载产物索引与列表查询测试类"""
+
+    def test_classify(self):
+        """测试按文件名识别产物类别和字幕语言"""
+        assert artifact_index.classify("vid.mp4") == ("video", None)
+        assert artifact_index.classify("vid.web-720p.mp4") == ("video", None)
+        assert artifact_index.classify("vid.m4a") == ("audio", None)
+        assert artifact_index.classify("vid.zh-CN.vtt") == ("subtitle", "zh-CN")
+        assert artifact_index.classify("vid.en.segments.json") == ("subtitle_segments", "en")
+        assert artifact_index.classify("vid.manifest.json") == ("manifest", None)
+        assert artifact_index.classify("vid.webp") == ("thumbnail", None)
+        assert artifact_index.classify("vid.description") == ("description", None)
+
+    def test_query_filters_sorts_and_paginates(self, store, layout):
+        """测试按类型、大小、年龄过滤，按大小/时间排序的游标分页不重复不遗漏"""
+        for i in range(12):
+            write_artifact(layout, f"v{i:02d}.mp4", 100 + i % 4, age=i * 60)
+            write_artifact(layout, f"v{i:02d}.en.vtt", 10)
+        assert artifact_index.reindex(layout, store, batch_size=5) == 24
+
+        seen, cursor = [], None
+        while True:
+            page = store.query_artifacts(kind="video", sort="size", order="asc", limit=5, cursor=cursor)
+            seen.extend((item["size"], item["name"]) for item in page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert seen == sorted((100 + i % 4, f"v{i:02d}.mp4") for i in range(12))
+
+        recent = store.query_artifacts(kind="video", modified_after=time.time() - 150, min_size=101, limit=100)
+        assert [item["name"] for item in recent["items"]] == ["v01.mp4", "v02.mp4"]
+
+        subtitles = store.query_artifacts(video_id="v03", kind="subtitle")
+        assert [(item["name"], item["lang"]) for item in subtitles["items"]] == [("v03.en.vtt", "en")]
+
+    def test_api_drops_missing_files(self, store, layout):
+        """测试/artifacts接口返回下载URL，索引中已删除的文件剔除并移出索引"""
+        kept = write_artifact(layout, "keep0000000.mp4", 50)
+        gone = write_artifact(layout, "gone0000000.mp4", 60)
+        store.upsert_many([record_from_info(None, artifacts=artifact_index.artifact_records([kept, gone]))])
+        gone.unlink()
+        client = TestClient(app)
+
+        with patch("app.main.metadata_store.get_metadata_store", return_value=store), \
+                patch("app.main.downloader.layout", layout):
+            response = client.get("/artifacts", params={"kind": "video", "max_age": 3600})
+            bad_kind = client.get("/artifacts", params={"kind": "executable"})
+            bad_sort = client.get("/artifacts", params={"sort": "title"})
+
+        assert response.status_code == 200
+        assert [item["url"] for item in response.json()["items"]] == ["/downloads/keep0000000.mp4"]
+        assert [item["name"] for item in store.query_artifacts()["items"]] == ["keep0000000.mp4"]
+        assert bad_kind.status_code == 400
+        assert bad_sort.status_code == 400
+
+    def test_eviction_removes_index_entries(self, store, layout):
+        """测试缓存淘汰删除被淘汰视频的索引条目"""
+        write_artifact(layout, "old.mp4", 500, age=7200)
+        write_artifact(layout, "new.mp4", 500, age=3600)
+        artifact_index.reindex(layout, store)
+
+        with patch("app.tasks.downloader.layout", layout), \
+                patch("app.tasks.metadata_store.get_metadata_store", return_value=store), \
+                patch("app.tasks.cache_index.last_access", return_value={}), \
+                patch("app.tasks.cache_index.pinned", return_value=set()), \
+                patch("app.tasks.cache_index.forget"), \
+                patch("app.tasks.cache_eviction.CACHE_MAX_GB", 1000 / 1024**3):
+            result = evict_cache_task.apply().get()
+
+        assert result["evicted_ids"] == ["old"]
+        assert [item["name"] for item in store.query_artifacts()["items"]] == ["new.mp4"]
@@ -0,0 +1,149 @@
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+
+from app import asr_feed
+from app.downloader import YouTubeDownloader
+from app.main import app
+
+SAMPLE_RATE = 16000
+SECOND = SAMPLE_RATE * 2
+
+
+def _producer(script: str):
+    """用Python子进程代替ffmpeg向stdout输出PCM"""
+    return lambda stream, sample_rate: [sys.executable, "-c", script]
+
+
+class TestAsrFeed:
+    """ASR音频供给测试类"""
+
+    @pytest.fixture
+    def redis_client(self):
+        return fakeredis.FakeRedis()
+
+    @pytest.fixture
+    def publisher(self, redis_client):
+        return asr_feed.RedisStreamPublisher("asr:chunks:test", redis_factory=lambda: redis_client)
+
+    def test_decode_command_outputs_16k_mono_pcm(self):
+        """测试ffmpeg命令解码为16kHz单声道PCM并带上请求头"""
+        args = asr_feed.decode_command(
+            {"url": "https://cdn/audio", "http_headers": {"User-Agent": "UA"}, "protocol": "https"}
+        )
+
+        assert args[args.index("-ar") + 1] == "16000"
+        assert args[args.index("-ac") + 1] == "1"
+        assert args[args.index("-f") + 1] == "s16le"
+        assert args[args.index("-headers") + 1] == "User-Agent: UA\r\n"
+        assert "-reconnect" in args
+        assert "-http_proxy" not in args
+
+    def test_decode_command_uses_resolving_proxy(self):
+        """测试拉流沿用解析时的代理，直连地址与出口IP绑定"""
+        args = asr_feed.decode_command({"url": "https://cdn/audio", "proxy": "http://proxy:3128"})
+
+        assert args[args.index("-http_proxy") + 1] == "http://proxy:3128"
+        assert args.index("-http_proxy") < args.index("-i")
+
+    def test_chunks_published_in_order_with_eof(self, publisher, redis_client):
+        """测试按时长切块、尾块不足一块也发布，最后发布eof"""
+        script = f"import sys; sys.stdout.buffer.write(b'\\x01\\x00' * {int(SAMPLE_RATE * 2.5)})"
+        with patch("app.asr_feed.decode_command", _producer(script)):
+            summary = asr_feed.run_feed({"id": "vid"}, publisher, chunk_seconds=1, chunk_format="pcm")
+
+        entries = redis_client.xrange("asr:chunks:test")
+        chunks = [fields for _id, fields in entries if b"seq" in fields]
+        assert [c[b"seq"] for c in chunks] == [b"0", b"1", b"2"]
+        assert [len(c[b"data"]) for c in chunks] == [SECOND, SECOND, SECOND // 2]
+        assert chunks[2][b"start"] == b"2.0" and chunks[2][b"duration"] == b"0.5"
+        assert entries[-1][1][b"eof"] == b"1"
+        assert summary["chunks"] == 3
+        assert summary["audio_seconds"] == 2.5
+        assert 0 < redis_client.ttl("asr:chunks:test") <= asr_feed.ASR_STREAM_TTL
+
+    def test_first_chunk_published_before_stream_ends(self, publisher):
+        """测试第一块就绪即发布，不等待整个流结束"""
+        script = (
+            "import sys, time; out = sys.stdout.buffer; "
+            f"out.write(b'\\x00' * {SECOND}); out.flush(); time.sleep(0.6); "
+            f"out.write(b'\\x00' * {SECOND})"
+        )
+        published = []
+        started = time.perf_counter()
+        with patch("app.asr_feed.decode_command", _producer(script)):
+            asr_feed.run_feed(
+                {"id": "vid"},
+                publisher,
+                chunk_seconds=1,
+                chunk_format="pcm",
+                on_chunk=lambda chunk: published.append(time.perf_counter() - started),
+            )
+
+        assert len(published) == 2
+        assert published[1] - published[0] >= 0.5
+
+    def test_decoder_failure_publishes_error(self, publisher, redis_client):
+        """测试解码失败时发布带错误信息的eof并抛出异常"""
+        script = "import sys; sys.stderr.write('403 Forbidden'); sys.exit(1)"
+        with patch("app.asr_feed.decode_command", _producer(script)):
+            with pytest.raises(RuntimeError, match="403 Forbidden"):
+                asr_feed.run_feed({"id": "vid"}, publisher, chunk_seconds=1)
+
+        last = redis_client.xrange("asr:chunks:test")[-1][1]
+        assert last[b"eof"] == b"1"
+        assert b"403 Forbidden" in last[b"error"]
+
+    def test_stderr_drained_while_decoding(self, publisher):
+        """测试stderr与stdout并行读取：大量警告写满管道时ffmpeg不会阻塞"""
+        script = (
+            "import sys; sys.stderr.write('warning\\n' * 50000); sys.stderr.flush(); "
+            f"sys.stdout.buffer.write(b'\\x00' * {SECOND})"
+        )
+        with patch("app.asr_feed.decode_command", _producer(script)):
+            summary = asr_feed.run_feed({"id": "vid"}, publisher, chunk_seconds=1, chunk_format="pcm")
+
+        assert summary["chunks"] == 1
+
+    @patch("yt_dlp.YoutubeDL")
+    def test_resolve_stream_selects_smallest_audio(self, mock_ytdl, temp_dir):
+        """测试解析音频流地址时使用ASR格式选择器"""
+        ydl = MagicMock()
+        ydl.extract_info.return_value = {
+            "id": "vid",
+            "duration": 60,
+            "url": "https://cdn/audio",
+            "format_id": "249",
+            "acodec": "opus",
+            "abr": 50,
+        }
+        mock_ytdl.return_value.__enter__.return_value = ydl
+
+        stream = YouTubeDownloader(download_path=temp_dir).resolve_stream(
+            "https://www.youtube.com/watch?v=vid", asr_feed.ASR_AUDIO_SELECTOR
+        )
+
+        assert mock_ytdl.call_args[0][0]["format"] == asr_feed.ASR_AUDIO_SELECTOR
+        ydl.extract_info.assert_called_once_with("https://www.youtube.com/watch?v=vid", download=False)
+        assert stream["url"] == "https://cdn/audio"
+        assert stream["format_id"] == "249"
+
+    @patch("app.main.celery_app.send_task")
+    def test_asr_feed_endpoint_returns_stream(self, mock_send):
+        """测试提交ASR供给任务并返回流键"""
+        client = TestClient(app)
+
+        response = client.post(
+            "/asr-feed",
+            json={"url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "chunk_seconds": 10},
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["stream"] == f"asr:chunks:{data['task_id']}"
+        assert mock_send.call_args.args[0] == "app.tasks.asr_feed_task"
+        assert mock_send.call_args.kwargs["kwargs"]["chunk_seconds"] == 10
@@ -0,0 +1,98 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+import redis
+
+from app import bandwidth
+from app.bandwidth import BandwidthPool, TaskShaper, allocate
+
+MBIT = 1_000_000 / 8
+
+
+@pytest.fixture
+def pool():
+    client = fakeredis.FakeRedis()
+    return BandwidthPool(node="node-1", redis_factory=lambda: client)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBandwidth:
+    """带宽限速测试类"""
+
+    def test_allocate_is_max_min_fair(self):
+        """测试受限任务只占实际需求，剩余带宽平分，且不超过单任务上限"""
+        shares = allocate(100, {"a": None, "b": None, "slow": 10})
+        assert shares == {"slow": 10, "a": 45, "b": 45}
+        assert allocate(100, {"a": None, "b": None}, task_cap=30) == {"a": 30, "b": 30}
+        assert allocate(None, {"a": None}, task_cap=30) == {"a": 30}
+        # 全部任务都受需求限制时余量继续平分
+        assert allocate(100, {"a": 20, "b": 40}) == {"a": 40, "b": 60}
+
+        assert bandwidth.in_hours("22-06", 23) and bandwidth.in_hours("22-06", 5)
+        assert not bandwidth.in_hours("22-06", 12) and not bandwidth.in_hours("", 0)
+        with patch.multiple(
+            bandwidth,
+            BANDWIDTH_NODE_LIMIT_MBPS=100,
+            BANDWIDTH_TASK_LIMIT_MBPS=0,
+            BANDWIDTH_OFFPEAK_HOURS="01-07",
+            BANDWIDTH_OFFPEAK_NODE_LIMIT_MBPS=1000,
+        ):
+            assert bandwidth.current_limits(datetime(2024, 1, 1, 12)) == (100 * MBIT, None)
+            assert bandwidth.current_limits(datetime(2024, 1, 1, 3)) == (1000 * MBIT, None)
+
+    def test_shares_rebalance_as_tasks_start_and_finish(self, pool):
+        """测试任务开始和结束后份额随之调整，并直接写入 yt-dlp 的 ratelimit"""
+        clock = FakeClock()
+        first_params, second_params = {}, {}
+        with patch.object(bandwidth, "BANDWIDTH_NODE_LIMIT_MBPS", 80):
+            first = TaskShaper("first", pool, interval=2, clock=clock)
+            first.attach(first_params)
+            assert first_params["ratelimit"] == 80 * MBIT
+
+            second = TaskShaper("second", pool, interval=2, clock=clock)
+            second.attach(second_params)
+            assert second_params["ratelimit"] == 40 * MBIT
+
+            # 下一次进度回调到期时第一个任务让出一半
+            clock.now = 2
+            first.progress_hook({"status": "downloading", "speed": 80 * MBIT})
+            assert first_params["ratelimit"] == 40 * MBIT
+
+            # 并行下载两路流时平分本任务的份额
+            first.set_streams(2)
+            assert first_params["ratelimit"] == 20 * MBIT
+            first.set_streams(1)
+
+            # 第二个任务受源站限制只跑到10Mbit/s，剩余带宽归第一个任务
+            clock.now = 4
+            second.progress_hook({"status": "downloading", "speed": 10 * MBIT})
+            assert second.share == pytest.approx(12.5 * MBIT)
+            first.progress_hook({"status": "downloading", "speed": 40 * MBIT})
+            assert first.share == pytest.approx(67.5 * MBIT)
+
+            second.release()
+            clock.now = 6
+            first.progress_hook({"status": "downloading", "speed": 40 * MBIT})
+            assert first_params["ratelimit"] == 80 * MBIT
+
+    def test_redis_failure_falls_back_to_task_limit(self):
+        """测试Redis不可用时只按单任务上限限速"""
+
+        def broken():
+            raise redis.ConnectionError("down")
+
+        params = {}
+        with patch.multiple(bandwidth, BANDWIDTH_NODE_LIMIT_MBPS=100, BANDWIDTH_TASK_LIMIT_MBPS=20):
+            shaper = TaskShaper("task", BandwidthPool(redis_factory=broken))
+            shaper.attach(params)
+            shaper.release()
+        assert params["ratelimit"] == 20 * MBIT
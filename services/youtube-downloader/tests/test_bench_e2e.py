@@ -0,0 +1,25 @@
+import pytest
+from celery import Celery
+
+from benchmarks import bench_e2e
+from benchmarks._queues import queue_keys
+
+
+class TestBenchE2E:
+    """端到端基准隔离测试类"""
+
+    def test_tasks_routed_to_dedicated_queue(self):
+        """测试所有任务路由到专用队列，清理也只扫描该队列"""
+        bench_app = Celery("bench", broker="memory://")
+        bench_app.conf.task_routes = {"app.tasks.download_video_task": {"queue": "download"}}
+
+        bench_e2e._isolate_queues(bench_app)
+
+        for name in ("app.tasks.download_video_task", "app.tasks.transcode_task", "app.tasks.health_check_task"):
+            assert bench_app.amqp.router.route({}, name)["queue"].name == bench_e2e.BENCH_QUEUE
+        assert {key.split("\x06")[0] for key in queue_keys(bench_app)} == {bench_e2e.BENCH_QUEUE}
+
+    def test_cli_requires_explicit_redis(self):
+        """测试Redis模式必须指定专用的Redis，不回退到REDIS_URL"""
+        with pytest.raises(SystemExit):
+            bench_e2e.main(["--broker", "redis"])
@@ -0,0 +1,121 @@
+import os
+import time
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+from fakeredis import aioredis as fake_aioredis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.artifact_files import ArtifactFiles
+from app.cache_eviction import CacheIndex, evict, scan
+from app.models import DownloadResult, VideoInfo
+from app.storage_layout import StorageLayout
+from app.tasks import download_video_task
+
+
+@pytest.fixture
+def layout(temp_dir):
+    return StorageLayout(temp_dir, "sharded")
+
+
+@pytest.fixture
+def index():
+    client = fakeredis.FakeRedis()
+    return CacheIndex(redis_factory=lambda: client, touch_interval=0)
+
+
+def write_video(layout, video_id, size, age=3600):
+    """写出一个视频的产物，修改时间设为 age 秒之前"""
+    directory = layout.ensure_video_dir(video_id)
+    mtime = time.time() - age
+    for name, length in ((f"{video_id}.mp4", size - 100), (f"{video_id}.en.vtt", 100)):
+        path = directory / name
+        path.write_bytes(b"x" * length)
+        os.utime(path, (mtime, mtime))
+
+
+class TestCacheEviction:
+    """下载缓存LRU淘汰测试类"""
+
+    def test_below_high_watermark_keeps_everything(self, layout, index):
+        """测试未超过高水位时不淘汰"""
+        write_video(layout, "a", 400)
+        write_video(layout, "b", 400)
+
+        summary = evict(layout, index, max_bytes=1000, high_watermark=0.9, low_watermark=0.5)
+
+        assert summary["evicted_videos"] == 0
+        assert set(scan(layout)) == {"a", "b"}
+
+    def test_evicts_least_recently_accessed_to_low_watermark(self, layout, index):
+        """测试按最近访问时间从旧到新淘汰到低水位，无访问记录的按修改时间计"""
+        write_video(layout, "popular", 300, age=7200)
+        write_video(layout, "stale", 300, age=3600)
+        write_video(layout, "never", 300, age=5400)
+        index.touch("popular")
+        index.touch("stale")
+        index._redis_factory().zadd(index.access_key, {"stale": time.time() - 1800})
+
+        summary = evict(layout, index, max_bytes=1000, high_watermark=0.8, low_watermark=0.4, grace_seconds=0)
+
+        assert summary["evicted_videos"] == 2
+        assert summary["freed_bytes"] == 600
+        assert set(scan(layout)) == {"popular"}
+        assert not layout.video_dir("never").exists()
+        assert index.last_access(["stale"]) == {"stale": None}
+
+    def test_pinned_and_recent_videos_are_never_evicted(self, layout, index):
+        """测试进行中任务固定的视频和刚写入的视频不淘汰，过期的固定不再生效"""
+        write_video(layout, "in-flight", 400)
+        write_video(layout, "crashed", 400)
+        write_video(layout, "fresh", 400, age=10)
+        index.pin("in-flight", "task-1")
+        index.pin("crashed", "task-2", ttl=-1)
+
+        summary = evict(layout, index, max_bytes=1000, high_watermark=0.9, low_watermark=0.5, grace_seconds=600)
+
+        assert set(scan(layout)) == {"in-flight", "fresh"}
+        assert summary["skipped_pinned"] == 2
+        assert index.pinned() == {"in-flight"}
+
+    def test_serving_file_records_access(self, layout):
+        """测试/downloads提供文件时记录访问时间"""
+        client = fake_aioredis.FakeRedis()
+        index = CacheIndex(async_redis_factory=lambda: client, touch_interval=0)
+        write_video(layout, "vid", 200)
+        app = FastAPI()
+        app.mount("/downloads", ArtifactFiles(layout, cache_index=index))
+
+        with TestClient(app) as http:
+            assert http.get("/downloads/vid.mp4").status_code == 200
+            assert http.get("/downloads/missing.mp4").status_code == 404
+            score = http.portal.call(client.zscore, index.access_key, "vid")
+            missing = http.portal.call(client.zscore, index.access_key, "missing")
+
+        assert score == pytest.approx(time.time(), abs=5)
+        assert missing is None
+
+    @patch("app.tasks.downloader")
+    def test_download_task_pins_while_running(self, mock_downloader, index, temp_dir):
+        """测试下载任务在传输期间固定视频，结束后解除并记录访问"""
+        mock_downloader.validate_url.return_value = True
+        pinned_during = []
+
+        def fake_download(**kwargs):
+            kwargs["on_info"]({"id": "vid"})
+            pinned_during.append(index.pinned())
+            return DownloadResult(
+                video_path=f"{temp_dir}/vid.mp4",
+                metadata=VideoInfo(id="vid", title="t"),
+            )
+
+        mock_downloader.download_video.side_effect = fake_download
+
+        with patch("app.tasks.cache_index", index), patch("app.tasks.disk_budget.DISK_BUDGET_ENABLED", False):
+            download_video_task.apply(kwargs={"url": "https://www.youtube.com/watch?v=vid"})
+
+        assert pinned_during == [{"vid"}]
+        assert index.pinned() == set()
+        assert index.last_access(["vid"])["vid"] is not None
@@ -0,0 +1,180 @@
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import fakeredis
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import channels
+from app.channels import ChannelRegistry, FeedEntry, FeedUnavailable
+from app.main import app
+
+CHANNEL = "UC" + "a" * 22
+HOUR = 3600.0
+
+
+def feed_xml(entries):
+    """生成频道RSS，entries 为 (视频ID, 发布时间戳) 列表，从新到旧"""
+    items = "".join(
+        f"""<entry><yt:videoId>{video_id}</yt:videoId><title>Video {video_id}</title>
+        <published>{datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()}</published></entry>"""
+        for video_id, ts in entries
+    )
+    return (
+        '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:yt="http://www.youtube.com/xml/schemas/2015">'
+        f"{items}</feed>"
+    ).encode("utf-8")
+
+
+@pytest.fixture
+def registry():
+    client = fakeredis.FakeRedis()
+    return ChannelRegistry(redis_factory=lambda: client)
+
+
+class TestChannels:
+    """频道订阅增量抓取测试类"""
+
+    def test_fetch_feed_uses_conditional_requests(self):
+        """测试RSS解析，带上次的ETag请求时未更新返回None"""
+        body = feed_xml([("new0000000a", 2000.0), ("old0000000a", 1000.0)])
+
+        def handler(request):
+            if request.headers.get("if-none-match") == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(200, content=body, headers={"ETag": '"v1"'})
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        entries, validators = channels.fetch_feed(CHANNEL, client=client)
+        unchanged, _ = channels.fetch_feed(CHANNEL, etag=validators["etag"], client=client)
+
+        assert [(e.video_id, e.published) for e in entries] == [("new0000000a", 2000.0), ("old0000000a", 1000.0)]
+        assert validators["etag"] == '"v1"'
+        assert unchanged is None
+
+    def test_poll_enqueues_only_new_videos(self, registry):
+        """测试首次抓取只建立游标，之后只为新视频提交下载，未更新时不提交"""
+        registry.subscribe(CHANNEL, {"quality": "720p"})
+        feed = [("v2", 3 * HOUR), ("v1", 2 * HOUR), ("v0", HOUR)]
+        submitted = []
+
+        def fetch(channel_id, etag, last_modified):
+            return [FeedEntry(video_id, ts) for video_id, ts in feed], {"etag": None, "last_modified": None}
+
+        def submit(url, options):
+            submitted.append((url, options["quality"]))
+
+        channels.poll_channel(registry, CHANNEL, submit, now=3 * HOUR, fetch=fetch)
+        assert submitted == []
+
+        feed[:0] = [("v4", 5 * HOUR), ("v3", 4 * HOUR)]
+        result = channels.poll_channel(registry, CHANNEL, submit, now=5 * HOUR, fetch=fetch)
+        assert result["new"] == 2
+        assert submitted == [
+            ("https://www.youtube.com/watch?v=v3", "720p"),
+            ("https://www.youtube.com/watch?v=v4", "720p"),
+        ]
+
+        not_modified = channels.poll_channel(
+            registry, CHANNEL, submit, now=6 * HOUR, fetch=lambda *a: (None, {})
+        )
+        assert not_modified["status"] == "not_modified"
+        assert len(submitted) == 2
+        assert registry.get(CHANNEL)["last_published"] == 5 * HOUR
+
+    def test_interval_follows_upload_frequency(self, registry):
+        """测试频繁上传的频道抓取更勤，长期不更新的频道逐步放宽到上限"""
+        day = 24 * HOUR
+        with patch.object(channels, "CHANNEL_MIN_INTERVAL", 60), \
+                patch.object(channels, "CHANNEL_MAX_INTERVAL", 7 * day):
+            busy = {"last_published": None, "gap_ewma": None}
+            assert channels.next_interval(busy, [i * HOUR for i in range(10)], now=10 * HOUR) == HOUR / 4
+
+            quiet = {"last_published": None, "gap_ewma": None}
+            interval = channels.next_interval(quiet, [0, 7 * day], now=7 * day)
+            assert interval == pytest.approx(7 * day / 4)
+            for i in range(10):
+                quiet["interval"] = interval
+                interval = channels.next_interval(quiet, [], now=15 * day + i * day)
+            assert interval == 7 * day
+
+    def test_feed_failure_falls_back_to_flat_listing(self, registry):
+        """测试RSS不可用时回退到平铺列表"""
+        registry.subscribe(CHANNEL, backfill=True)
+        submitted = []
+
+        def fetch(*args):
+            raise FeedUnavailable("HTTP 404")
+
+        summary = channels.poll_due(
+            registry,
+            lambda url, options: submitted.append(url),
+            fetch=fetch,
+            fallback=lambda channel_id: [FeedEntry("flat000000a", None)],
+        )
+
+        assert summary["polled"] == 1
+        assert submitted == ["https://www.youtube.com/watch?v=flat000000a"]
+        assert registry.due(now=registry.get(CHANNEL)["next_poll"] - 1) == []
+
+    def test_poll_does_not_resurrect_or_overwrite_subscription(self, registry):
+        """测试抓取期间退订不会被写回，抓取期间修改的下载选项得到保留"""
+        registry.subscribe(CHANNEL, {"quality": "720p"})
+
+        def fetch_then(change):
+            def fetch(*args):
+                change()
+                return [FeedEntry("v1", HOUR)], {"etag": "e1", "last_modified": None}
+
+            return fetch
+
+        channels.poll_channel(
+            registry, CHANNEL, lambda *a: None, now=HOUR,
+            fetch=fetch_then(lambda: registry.subscribe(CHANNEL, {"quality": "1080p"})),
+        )
+        sub = registry.get(CHANNEL)
+        assert sub["options"] == {"quality": "1080p"} and sub["etag"] == "e1" and sub["seen"] == ["v1"]
+
+        result = channels.poll_channel(
+            registry, CHANNEL, lambda *a: None, now=2 * HOUR,
+            fetch=fetch_then(lambda: registry.unsubscribe(CHANNEL)),
+        )
+        assert result["status"] == "unsubscribed"
+        assert registry.get(CHANNEL) is None and registry.due(now=10 * HOUR) == []
+
+    def test_poll_due_counts_errors_per_channel(self, registry):
+        """测试一个频道抛出异常时同批其余频道照常抓取"""
+        broken = "UC" + "b" * 22
+        registry.subscribe(broken, backfill=True)
+        registry.subscribe(CHANNEL, backfill=True)
+
+        def fetch(channel_id, *args):
+            if channel_id == broken:
+                raise ValueError("malformed feed")
+            return [FeedEntry("v1", HOUR)], {"etag": None, "last_modified": None}
+
+        submitted = []
+        summary = channels.poll_due(registry, lambda url, options: submitted.append(url), fetch=fetch)
+
+        assert summary["errors"] == 1 and summary["polled"] == 1
+        assert submitted == ["https://www.youtube.com/watch?v=v1"]
+        assert registry.lock(broken)
+
+    def test_subscription_api(self, registry):
+        """测试订阅、列出和取消订阅接口"""
+        client = TestClient(app)
+
+        with patch("app.main.ChannelRegistry", return_value=registry):
+            created = client.post("/channels", json={"channel_id": CHANNEL, "audio_only": True})
+            invalid = client.post("/channels", json={"channel_id": "not-a-channel"})
+            listed = client.get("/channels")
+            removed = client.delete(f"/channels/{CHANNEL}")
+            missing = client.delete(f"/channels/{CHANNEL}")
+
+        assert created.status_code == 200
+        assert created.json()["options"]["audio_only"] is True
+        assert invalid.status_code == 422
+        assert [sub["channel_id"] for sub in listed.json()] == [CHANNEL]
+        assert removed.status_code == 200
+        assert missing.status_code == 404
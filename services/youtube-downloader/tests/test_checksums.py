@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import checksums
+from app.artifact_files import ArtifactFiles
+from app.storage_layout import StorageLayout
+
+
+def expected(data: bytes) -> dict:
+    return {
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "crc32": f"{zlib.crc32(data):08x}",
+    }
+
+
+class TestChecksums:
+    """产物校验和与清单测试类"""
+
+    def test_hash_file_with_memory_map(self, temp_dir):
+        """测试内存映射分块计算的结果与一次性计算一致，空文件也能处理"""
+        data = os.urandom(300_000)
+        path = Path(temp_dir) / "vid.mp4"
+        path.write_bytes(data)
+        empty = Path(temp_dir) / "vid.description"
+        empty.write_bytes(b"")
+
+        assert checksums.hash_file(str(path), chunk_size=65536, fast_hash="crc32") == expected(data)
+        assert checksums.hash_file(str(empty), fast_hash="crc32") == expected(b"")
+
+    def test_streaming_hasher_follows_growing_file(self, temp_dir):
+        """测试跟随写入中的文件增量计算，完成后无需重新读取"""
+        path = Path(temp_dir) / "vid.mp4.part"
+        chunks = [os.urandom(50_000) for _ in range(5)]
+        path.write_bytes(b"")
+
+        hasher = checksums.StreamingHasher(poll_interval=0.01, fast_hash="crc32").start(str(path))
+
+        def _write():
+            with open(path, "ab") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    f.flush()
+                    time.sleep(0.02)
+
+        writer = threading.Thread(target=_write)
+        writer.start()
+        writer.join()
+        final = Path(temp_dir) / "vid.mp4"
+        os.replace(path, final)
+
+        assert hasher.finish() == expected(b"".join(chunks))
+        assert hasher.matches(str(final))
+
+    def test_tracker_rehashes_replaced_files(self, temp_dir):
+        """测试下载后被替换的文件（如后处理重写）重新计算"""
+        part = Path(temp_dir) / "vid.mp4.part"
+        part.write_bytes(b"original")
+        tracker = checksums.ChecksumTracker()
+        tracker.progress_hook({"status": "downloading", "filename": str(Path(temp_dir) / "vid.mp4"),
+                               "tmpfilename": str(part), "info_dict": {"id": "vid"}})
+        tracker.progress_hook({"status": "finished", "filename": str(Path(temp_dir) / "vid.mp4")})
+        final = Path(temp_dir) / "vid.mp4"
+        final.write_bytes(b"rewritten by postprocessor")
+        subtitle = Path(temp_dir) / "vid.en.vtt"
+        subtitle.write_bytes(b"WEBVTT")
+
+        result = tracker.checksum_artifacts({"video": str(final), "subtitles": {"en": str(subtitle)}})
+
+        assert result["vid.mp4"]["sha256"] == hashlib.sha256(b"rewritten by postprocessor").hexdigest()
+        assert result["vid.en.vtt"]["kind"] == "subtitles.en"
+        assert result["vid.mp4"]["mtime_ns"] == final.stat().st_mtime_ns
+
+    def test_manifest_sha256_served_as_etag(self, temp_dir):
+        """测试清单中的SHA-256作为ETag，If-None-Match命中返回304，文件变化后不再使用"""
+        layout = StorageLayout(temp_dir, "sharded")
+        path = layout.ensure_video_dir("vid") / "vid.mp4"
+        path.write_bytes(b"video bytes")
+        entry = {"kind": "video", **checksums.hash_file(str(path)), "mtime_ns": path.stat().st_mtime_ns}
+        checksums.write_manifest(checksums.manifest_path(path.parent, "vid"), "vid", "task-1", {"vid.mp4": entry})
+        app = FastAPI()
+        app.mount("/downloads", ArtifactFiles(layout))
+        client = TestClient(app)
+
+        response = client.get("/downloads/vid.mp4")
+        etag = f'"{hashlib.sha256(b"video bytes").hexdigest()}"'
+        assert response.headers["etag"] == etag
+        assert client.get("/downloads/vid.mp4", headers={"If-None-Match": etag}).status_code == 304
+
+        path.write_bytes(b"different bytes")
+        assert client.get("/downloads/vid.mp4").headers["etag"] != etag
+
+    def test_verify_detects_corruption(self, temp_dir):
+        """测试校验命令并行检查清单记录的文件并报告损坏和缺失"""
+        layout = StorageLayout(temp_dir, "sharded")
+        files = {}
+        for video_id in ("a", "b", "c"):
+            path = layout.ensure_video_dir(video_id) / f"{video_id}.mp4"
+            path.write_bytes(os.urandom(10_000))
+            files[video_id] = path
+            entry = {"kind": "video", **checksums.hash_file(str(path)), "mtime_ns": 0}
+            checksums.write_manifest(
+                checksums.manifest_path(path.parent, video_id), video_id, "t", {path.name: entry}
+            )
+        corrupted = bytearray(files["b"].read_bytes())
+        corrupted[0] ^= 0xFF
+        files["b"].write_bytes(bytes(corrupted))
+        files["c"].unlink()
+
+        summary = checksums.verify_tree(temp_dir, workers=2)
+
+        assert summary["files"] == 3
+        assert sorted((Path(f["path"]).name, f["error"]) for f in summary["failures"]) == [
+            ("b.mp4", "sha256 mismatch"),
+            ("c.mp4", "missing"),
+        ]
+        assert checksums.main(["verify", "--root", temp_dir]) == 1
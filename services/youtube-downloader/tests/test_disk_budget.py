@@ -0,0 +1,137 @@
+from collections import namedtuple
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+import redis
+from celery.exceptions import Retry
+
+from app import disk_budget
+from app.disk_budget import MB, DiskBudget, InsufficientDiskSpace, Reservation
+from app.models import DownloadResult
+from app.tasks import download_video_task
+
+Usage = namedtuple("Usage", "total used free")
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def budget(redis_client, temp_dir):
+    """剩余2000MB、保留1000MB，可预留1000MB"""
+    with patch("app.disk_budget.shutil.disk_usage", return_value=Usage(4000 * MB, 2000 * MB, 2000 * MB)):
+        yield DiskBudget(temp_dir, redis_factory=lambda: redis_client, min_free_bytes=1000 * MB)
+
+
+class TestDiskBudget:
+    """磁盘空间预留测试类"""
+
+    def test_estimate_bytes_uses_extracted_sizes(self):
+        """测试按filesize/filesize_approx估算，合并格式按两倍计算，无大小时按码率或默认值"""
+        assert disk_budget.estimate_bytes({"filesize": 1000 * MB}) == 1100 * MB
+        assert disk_budget.estimate_bytes({"filesize": 10 * MB}) == 60 * MB
+        merged = {"requested_formats": [{"filesize": 300 * MB}, {"filesize_approx": 100 * MB}]}
+        assert disk_budget.estimate_bytes(merged) == 880 * MB
+        assert disk_budget.estimate_bytes({"tbr": 8 * 1024 * 1024 / 1000, "duration": 600}) == 660 * MB
+        assert disk_budget.estimate_bytes({}) == 550 * MB
+
+    def test_reserve_refuses_when_budget_exhausted(self, budget):
+        """测试预留总量超过可用容量时拒绝，释放后可再次预留"""
+        assert budget.reserve("a", 600 * MB)
+        assert not budget.reserve("b", 600 * MB)
+        assert budget.reserve("b", 400 * MB)
+        assert budget.reserved_bytes() == 1000 * MB
+
+        budget.release("a")
+        assert budget.reserve("c", 600 * MB)
+
+    def test_expired_reservations_are_dropped(self, budget):
+        """测试Worker异常退出遗留的预留过期后不再占用容量"""
+        budget.ttl = -1
+        assert budget.reserve("crashed", 900 * MB)
+        budget.ttl = 3600
+
+        assert budget.reserve("next", 900 * MB)
+        assert budget.reserved_bytes() == 900 * MB
+
+    def test_written_bytes_consume_reservation(self, budget):
+        """测试下载进度逐步扣减预留，空间不足时抛出InsufficientDiskSpace"""
+        reservation = Reservation(budget, "task-1", step_bytes=100 * MB)
+        reservation.on_info({"id": "vid", "filesize": 800 * MB})
+        assert budget.reserved_bytes() == 880 * MB
+
+        reservation.progress_hook({"status": "downloading", "filename": "v", "downloaded_bytes": 50 * MB})
+        assert budget.reserved_bytes() == 880 * MB
+        reservation.progress_hook({"status": "downloading", "filename": "v", "downloaded_bytes": 300 * MB})
+        assert budget.reserved_bytes() == 580 * MB
+
+        with pytest.raises(InsufficientDiskSpace):
+            Reservation(budget, "task-2").on_info({"id": "other", "filesize": 500 * MB})
+
+        reservation.release()
+        assert budget.reserved_bytes() == 0
+
+    def test_redis_unavailable_fails_open(self, temp_dir):
+        """测试Redis不可用时不阻止下载"""
+        client = MagicMock()
+        client.transaction.side_effect = redis.ConnectionError("down")
+        reservation = Reservation(DiskBudget(temp_dir, redis_factory=lambda: client), "task-1")
+
+        reservation.on_info({"id": "vid", "filesize": MB})
+
+        assert reservation.active is False
+        reservation.release()
+
+    @patch("app.tasks.downloader")
+    def test_task_deferred_until_space_frees(self, mock_downloader, budget, temp_dir):
+        """测试空间不足的任务在传输前延后重试，放得下后正常下载并释放预留"""
+        mock_downloader.validate_url.return_value = True
+        budget.reserve("other-task", 900 * MB)
+
+        def fake_download(**kwargs):
+            kwargs["on_info"]({"id": "vid", "filesize": 500 * MB})
+            return DownloadResult(video_path=f"{temp_dir}/vid.mp4", file_size=500 * MB)
+
+        mock_downloader.download_video.side_effect = fake_download
+        kwargs = {"url": "https://www.youtube.com/watch?v=vid"}
+
+        with patch("app.tasks.disk_budget.DiskBudget", return_value=budget):
+            with pytest.raises(Retry) as deferred:
+                download_video_task.apply(kwargs=kwargs, task_id="defer-task")
+            assert deferred.value.when == disk_budget.DISK_DEFER_COUNTDOWN
+            assert isinstance(deferred.value.exc, InsufficientDiskSpace)
+            assert deferred.value.sig.kwargs["disk_deferrals"] == 1
+            assert budget.reserved_bytes() == 900 * MB
+
+            budget.release("other-task")
+            result = download_video_task.apply(kwargs=kwargs, task_id="defer-task").result
+
+        assert result["status"] == "completed"
+        assert budget.reserved_bytes() == 0
+
+    @patch("app.tasks.downloader")
+    def test_deferrals_counted_apart_from_failure_retries(self, mock_downloader, budget):
+        """测试磁盘延后不占用失败重试次数，延后次数用尽后任务失败"""
+        mock_downloader.validate_url.return_value = True
+        mock_downloader.download_video.side_effect = RuntimeError("network")
+        kwargs = {"url": "https://www.youtube.com/watch?v=vid", "disk_deferrals": 5}
+
+        # 已延后5次、此前没有失败过：仍按失败重试处理
+        with patch("app.tasks.disk_budget.DiskBudget", return_value=budget):
+            with pytest.raises(Retry) as retried:
+                download_video_task.apply(kwargs=kwargs, retries=5)
+        assert retried.value.when == 60
+
+        budget.reserve("other-task", 900 * MB)
+
+        def fake_download(**kwargs):
+            kwargs["on_info"]({"id": "vid", "filesize": 500 * MB})
+
+        mock_downloader.download_video.side_effect = fake_download
+        exhausted = dict(kwargs, disk_deferrals=disk_budget.DISK_DEFER_MAX_RETRIES)
+        with patch("app.tasks.disk_budget.DiskBudget", return_value=budget):
+            with pytest.raises(InsufficientDiskSpace):
+                download_video_task.apply(kwargs=exhausted, retries=disk_budget.DISK_DEFER_MAX_RETRIES)
@@ -138,7 +138,7 @@ class TestYouTubeDownloader:
             mock_ydl = MagicMock()
             mock_ydl_class.return_value.__enter__.return_value = mock_ydl
             mock_ydl.extract_info.return_value = mock_info
-            mock_ydl.download.return_value = None
+            mock_ydl.process_ie_result.return_value = None
             
             url = "https://www.youtube.com/watch?v=test_video"
             result = downloader.download_video(
@@ -171,7 +171,7 @@ class TestYouTubeDownloader:
             mock_ydl = MagicMock()
             mock_ydl_class.return_value.__enter__.return_value = mock_ydl
             mock_ydl.extract_info.return_value = mock_info
-            mock_ydl.download.return_value = None
+            mock_ydl.process_ie_result.return_value = None
             
             url = "https://www.youtube.com/watch?v=test_audio"
             result = downloader.download_video(
@@ -249,7 +249,7 @@ class TestYouTubeDownloader:
             mock_ydl.extract_info.return_value = mock_info
             
             # 模拟下载过程中的进度回调
-            def mock_download(urls):
+            def mock_download(info, download):
                 # 模拟进度更新
                 mock_progress_callback({
                     'status': 'downloading',
@@ -262,7 +262,7 @@ class TestYouTubeDownloader:
                     'filename': 'test.mp4'
                 })
             
-            mock_ydl.download.side_effect = mock_download
+            mock_ydl.process_ie_result.side_effect = mock_download
             
             url = "https://www.youtube.com/watch?v=test_progress"
             downloader.download_video(
@@ -0,0 +1,37 @@
+import pytest
+
+from app.downloader import YouTubeDownloader
+from benchmarks.fake_host import FakeMediaHost
+
+
+@pytest.mark.integration
+@pytest.mark.slow
+class TestFakeMediaHost:
+    """本地视频源替身与真实yt-dlp下载的集成测试类"""
+
+    @pytest.fixture
+    def host(self):
+        with FakeMediaHost(size_bytes=512 * 1024, fragments=4) as host:
+            yield host
+
+    @pytest.fixture
+    def downloader(self, temp_dir):
+        downloader = YouTubeDownloader(download_path=temp_dir)
+        for key in ("sleep_interval", "sleep_interval_requests"):
+            downloader.base_opts.pop(key, None)
+        return downloader
+
+    def test_progressive_download_selects_capped_height(self, host, downloader):
+        """测试从HTML5页面选择不超过1080p的progressive格式"""
+        result = downloader.download_video(host.watch_url("fixture01"), subtitle_langs=[])
+
+        assert result.video_path is not None
+        assert "fixture01" in result.video_path
+        assert result.file_size == host.media_size(1080)
+
+    def test_fragmented_download(self, host, downloader):
+        """测试HLS分片下载"""
+        result = downloader.download_video(host.hls_url("fixture02"), subtitle_langs=[])
+
+        assert result.video_path is not None
+        assert host.requests["fragment"] == 4
@@ -0,0 +1,152 @@
+import os
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+
+from app import asr_feed, live_recording
+from app.cache_eviction import CACHE_PIN_TTL
+from app.main import app
+
+
+def _recorder(segments, delay: float = 0.0, exit_code: int = 0, stderr: str = "", stderr_repeat: int = 1):
+    """用Python子进程代替ffmpeg：逐个写出分段文件并在stdout输出分段列表"""
+
+    def command(stream, output_dir, segment_seconds, max_duration, name_prefix=None):
+        prefix = name_prefix or live_recording.segment_prefix(stream["id"], os.path.basename(output_dir))
+        script = (
+            "import os, sys, time\n"
+            f"for n, (start, end) in enumerate({segments!r}):\n"
+            f"    name = f'{prefix}.{{n:05d}}.ts'\n"
+            f"    open(os.path.join({output_dir!r}, name), 'wb').write(b'\\x47' * 188)\n"
+            "    print(f'{name},{start},{end}', flush=True)\n"
+            f"    time.sleep({delay})\n"
+            f"sys.stderr.write({stderr!r} * {stderr_repeat})\n"
+            f"sys.exit({exit_code})\n"
+        )
+        return [sys.executable, "-c", script]
+
+    return command
+
+
+class TestLiveRecording:
+    """直播分段录制测试类"""
+
+    @pytest.fixture
+    def redis_client(self):
+        return fakeredis.FakeRedis()
+
+    @pytest.fixture
+    def publisher(self, redis_client):
+        return asr_feed.RedisStreamPublisher("live:segments:test", redis_factory=lambda: redis_client)
+
+    def test_record_command_copies_stream_into_segments(self, temp_dir):
+        """测试ffmpeg命令以流复制分段录制、限制时长，并沿用解析时的代理"""
+        stream = {"id": "vid", "url": "https://cdn/live.m3u8", "proxy": "http://proxy:3128"}
+        args = live_recording.record_command(stream, temp_dir, 30, 600, "vid.live.t1")
+
+        assert args[args.index("-t") + 1] == "600"
+        assert args[args.index("-c") + 1] == "copy"
+        assert args[args.index("-segment_time") + 1] == "30"
+        assert args[args.index("-segment_list") + 1] == "pipe:1"
+        assert args[args.index("-http_proxy") + 1] == "http://proxy:3128"
+        assert os.path.basename(args[-1]) == "vid.live.t1.%05d.ts"
+
+    def test_segments_handed_off_as_they_finish(self, publisher, redis_client, temp_dir):
+        """测试每个分段写完即交给下游，直播结束时发布eof"""
+        handed_off = []
+        started = time.perf_counter()
+        segments = [(0.0, 10.0), (10.0, 20.0), (20.0, 24.5)]
+        with patch("app.live_recording.record_command", _recorder(segments, delay=0.3)):
+            summary = live_recording.run_recording(
+                {"id": "vid"},
+                temp_dir,
+                publisher,
+                segment_seconds=10,
+                max_duration=3600,
+                on_segment=lambda seg: handed_off.append(time.perf_counter() - started) or {"object_key": seg.path},
+            )
+
+        assert handed_off[1] - handed_off[0] >= 0.25
+        entries = [fields for _id, fields in redis_client.xrange("live:segments:test")]
+        assert [e[b"seq"] for e in entries[:-1]] == [b"0", b"1", b"2"]
+        assert entries[2][b"end"] == b"24.5" and entries[2][b"object_key"].endswith(b".00002.ts")
+        assert entries[-1][b"eof"] == b"1" and entries[-1][b"stop_reason"] == b"stream_end"
+        assert summary["segments"] == 3 and summary["recorded_seconds"] == 24.5
+        assert summary["recorded_bytes"] == 3 * 188
+
+    def test_max_duration_and_interrupted_stream(self, publisher, redis_client, temp_dir):
+        """测试达到时长上限时记录停止原因；中途断流时保留已录制的分段并区分超时和异常退出，一段都没录到时报错"""
+        with patch("app.live_recording.record_command", _recorder([(0.0, 10.0), (10.0, 20.0)], exit_code=1)):
+            summary = live_recording.run_recording({"id": "vid"}, temp_dir, publisher, 10, 20)
+        assert summary["segments"] == 2 and summary["stop_reason"] == "max_duration"
+
+        # stderr远超管道缓冲区，未并行读取时ffmpeg会阻塞
+        noisy = _recorder([(0.0, 10.0)], exit_code=1, stderr="x" * 100, stderr_repeat=2000)
+        with patch("app.live_recording.record_command", noisy):
+            summary = live_recording.run_recording({"id": "vid"}, temp_dir, publisher, 10, 600)
+        assert summary["segments"] == 1 and summary["stop_reason"] == "interrupted"
+        assert redis_client.xrange("live:segments:test")[-1][1][b"stop_reason"] == b"interrupted"
+
+        timeout = "https://cdn/live.m3u8: Connection timed out\n"
+        with patch("app.live_recording.record_command", _recorder([(0.0, 10.0)], exit_code=1, stderr=timeout)):
+            summary = live_recording.run_recording({"id": "vid"}, temp_dir, publisher, 10, 600)
+        assert summary["stop_reason"] == "stalled"
+
+        with patch("app.live_recording.record_command", _recorder([], exit_code=1)):
+            with pytest.raises(RuntimeError):
+                live_recording.run_recording({"id": "vid"}, temp_dir, publisher, 10, 20)
+        assert b"error" in redis_client.xrange("live:segments:test")[-1][1]
+
+    def test_task_rejects_vod_and_reports_segment_progress(self, redis_client, temp_dir):
+        """测试非直播URL被拒绝，直播录制按分段汇报进度"""
+        from app.tasks import downloader, live_record_task
+
+        url = "https://www.youtube.com/live/dQw4w9WgXcQ"
+        stream = {"id": "dQw4w9WgXcQ", "url": "https://cdn/live.m3u8", "format_id": "95", "is_live": False}
+        with patch.object(downloader, "resolve_stream", return_value=stream):
+            with pytest.raises(live_recording.NotLive):
+                live_record_task.apply(args=[url]).get()
+
+        states = []
+        pins = []
+        publisher = asr_feed.RedisStreamPublisher
+        with patch.object(downloader, "resolve_stream", return_value=dict(stream, is_live=True)), patch.object(
+            downloader.layout, "ensure_video_dir", return_value=Path(temp_dir)
+        ), patch("app.live_recording.record_command", _recorder([(0.0, 5.0), (5.0, 10.0)])), patch(
+            "app.asr_feed.RedisStreamPublisher", lambda key: publisher(key, redis_factory=lambda: redis_client)
+        ), patch.object(live_record_task, "update_state", side_effect=lambda **kw: states.append(kw["meta"])), patch(
+            "app.tasks.cache_index.pin", side_effect=lambda video_id, owner, ttl: pins.append(("pin", video_id, ttl))
+        ), patch("app.tasks.cache_index.unpin", side_effect=lambda video_id, owner: pins.append(("unpin", video_id))):
+            result = live_record_task.apply(args=[url], kwargs={"segment_seconds": 5, "max_duration": 100}).get()
+
+        assert [s["segments"] for s in states] == [1, 2]
+        assert states[-1]["progress"] == 10 and states[-1]["recorded_seconds"] == 10.0
+        assert result["segments"] == 2 and result["stop_reason"] == "stream_end"
+        assert result["segment_dir"] == str(Path(temp_dir) / "live" / result["task_id"])
+        assert sorted(os.listdir(result["segment_dir"])) == [
+            f"dQw4w9WgXcQ.live.{result['task_id']}.{n:05d}.ts" for n in range(2)
+        ]
+        # 整段录制期间固定视频，结束后解除
+        assert pins == [("pin", "dQw4w9WgXcQ", 100 + CACHE_PIN_TTL), ("unpin", "dQw4w9WgXcQ")]
+        assert len(redis_client.xrange(result["stream"])) == 3
+
+    @patch("app.main.celery_app.send_task")
+    def test_live_recording_endpoint_caps_duration(self, mock_send):
+        """测试提交录制任务时最长时长不超过服务端上限"""
+        client = TestClient(app)
+
+        response = client.post(
+            "/live-recordings",
+            json={"url": "https://www.youtube.com/live/dQw4w9WgXcQ", "max_duration": 10**9},
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["stream"] == f"live:segments:{data['task_id']}"
+        assert data["max_duration"] == live_recording.LIVE_MAX_DURATION
+        assert mock_send.call_args.args[0] == "app.tasks.live_record_task"
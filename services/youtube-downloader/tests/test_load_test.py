@@ -0,0 +1,75 @@
+import asyncio
+import random
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.celery_app import celery_app
+from app.main import app
+from benchmarks import load_test
+
+
+class TestLoadTest:
+    """API负载测试工具测试类"""
+
+    def test_weights_and_replica_sizing(self):
+        """测试混合比例解析，以及按延迟目标取单实例容量估算副本数"""
+        assert load_test.parse_weights("download=1,status=3", load_test.ENDPOINTS) == {
+            "download": 0.25, "status": 0.75,
+        }
+        with pytest.raises(ValueError):
+            load_test.parse_weights("upload=1", load_test.ENDPOINTS)
+
+        levels = [
+            {"concurrency": 8, "rps": 400.0, "p99_ms": 40.0, "error_rate": 0.0},
+            {"concurrency": 32, "rps": 650.0, "p99_ms": 150.0, "error_rate": 0.0},
+            {"concurrency": 128, "rps": 700.0, "p99_ms": 600.0, "error_rate": 0.0},
+        ]
+        sizing = load_test.size_replicas(levels, slo_p99_ms=200, max_error_rate=0.01, target_rps=2000)
+        assert sizing["capacity_rps"] == 650.0
+        assert sizing["at_concurrency"] == 32
+        assert sizing["replicas"] == 4
+        assert load_test.size_replicas(levels, 10, 0.01, 2000)["capacity_rps"] is None
+
+    def test_run_level_against_seeded_states(self):
+        """测试按任务状态分布预置结果，压测后各端点都有统计且无错误"""
+        states = load_test.parse_weights("pending=1,progress=1,success=1,failure=1", load_test.TASK_STATES)
+        seeded = load_test.seed_tasks(celery_app.backend, 40, states, random.Random(1))
+        assert set(seeded) == set(load_test.TASK_STATES)
+
+        async def drive():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+                return await load_test.run_level(
+                    client, 4, 0.3, {"status": 0.8, "batch": 0.2}, seeded, seed=1
+                )
+
+        summary = asyncio.run(drive())
+
+        assert summary["requests"] > 0
+        assert summary["errors"] == 0
+        assert set(summary["endpoints"]) == {"status", "batch"}
+
+    @patch("app.main.celery_app.send_task")
+    def test_submitted_downloads_are_collected_for_cleanup(self, mock_send):
+        """测试压测提交的下载任务ID被记录下来，结束时只清理这些任务"""
+        submitted = []
+
+        async def drive():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+                return await load_test.run_level(client, 2, 0.2, {"download": 1.0}, {}, seed=1, submitted=submitted)
+
+        summary = asyncio.run(drive())
+
+        assert summary["errors"] == 0
+        assert len(submitted) == summary["requests"] == mock_send.call_count
+        assert submitted == [call.kwargs["task_id"] for call in mock_send.call_args_list]
+
+    def test_cli_refuses_unsafe_targets(self):
+        """测试压测已部署实例时默认拒绝真实下载，Redis模式必须指定专用的Redis"""
+        with pytest.raises(SystemExit):
+            load_test.main(["--base-url", "http://localhost:8000", "--mix", "download=1,status=9"])
+        with pytest.raises(SystemExit):
+            load_test.main(["--broker", "redis"])
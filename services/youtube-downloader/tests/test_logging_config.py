@@ -0,0 +1,60 @@
+import json
+import sys
+
+import pytest
+from loguru import logger
+
+from app.celery_app import celery_app
+from app.logging_config import ProgressLogSampler, configure_logging
+
+
+@pytest.fixture
+def captured():
+    lines = []
+    yield lines
+    logger.remove()
+    logger.configure(patcher=None)
+    logger.add(sys.stderr)
+
+
+class TestLoggingConfig:
+    """日志配置测试类"""
+
+    def test_progress_sampler(self):
+        """测试进度日志按步长和时间间隔采样，新文件重新开始时也记录"""
+        sampler = ProgressLogSampler(interval=5, step=10)
+        logged = [p for p in range(101) if sampler.should_log(p, now=0)]
+        assert logged == list(range(0, 101, 10))
+
+        assert not sampler.should_log(100, now=1)
+        assert sampler.should_log(100, now=6)
+        assert sampler.should_log(3, now=6.5)
+
+    def test_json_lines_with_task_id_and_level(self, captured):
+        """测试JSON输出带当前任务ID和附加字段，低于LOG_LEVEL的日志不输出"""
+        configure_logging(level="INFO", fmt="json", enqueue=False, sink=captured.append)
+
+        @celery_app.task(name="tests.log_something")
+        def log_something():
+            logger.bind(video_id="vid").info("inside task")
+
+        logger.debug("dropped")
+        log_something.apply(task_id="task-123")
+        logger.info("outside task")
+
+        records = [json.loads(line) for line in captured]
+        assert [r["message"] for r in records] == ["inside task", "outside task"]
+        assert records[0]["task_id"] == "task-123"
+        assert records[0]["extra"] == {"video_id": "vid"}
+        assert records[0]["level"] == "INFO"
+        assert records[1]["task_id"] == "-"
+
+    def test_enqueued_sink_flushes_on_complete(self, captured):
+        """测试后台写出模式在 complete() 后全部写出"""
+        configure_logging(level="INFO", fmt="text", enqueue=True, sink=captured.append)
+        for i in range(100):
+            logger.info(f"line {i}")
+        logger.complete()
+
+        assert len(captured) == 100
+        assert "line 99" in captured[-1]
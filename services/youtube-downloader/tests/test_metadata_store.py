@@ -0,0 +1,157 @@
+import json
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+
+from app import metadata_store
+from app.main import app
+from app.metadata_store import MetadataStore, record_from_info
+
+
+def info(video_id, upload_date, channel_id="UC1", tags=None, **extra):
+    return dict(
+        {
+            "id": video_id,
+            "title": f"Title {video_id}",
+            "channel": f"Channel {channel_id}",
+            "channel_id": channel_id,
+            "upload_date": upload_date,
+            "duration": 60,
+            "tags": tags,
+            "categories": ["Education"],
+        },
+        **extra,
+    )
+
+
+@pytest.fixture
+def store(temp_dir):
+    store = MetadataStore(f"sqlite:///{Path(temp_dir) / 'metadata.db'}")
+    yield store
+    store.close()
+
+
+class TestMetadataStore:
+    """视频元数据存储测试类"""
+
+    def test_upsert_keeps_latest_and_completed_status(self, store):
+        """测试重复写入更新字段、替换标签，仅获取信息不会覆盖已完成状态"""
+        store.upsert_many([record_from_info(info("a" * 11, "20240101", tags=["x", "y"]), status="completed")])
+        store.upsert_many([record_from_info(info("a" * 11, "20240101", tags=["z"], view_count=9))])
+
+        stored = store.get("a" * 11)
+        assert stored["tags"] == ["z"]
+        assert stored["view_count"] == 9
+        assert stored["categories"] == ["Education"]
+        cursor = store.connection().cursor()
+        cursor.execute("SELECT status, id FROM videos")
+        status, video_uuid = cursor.fetchone()
+        assert status == "completed"
+        assert video_uuid == metadata_store.video_uuid("a" * 11)
+
+    def test_query_filters_and_paginates(self, store):
+        """测试按频道、标签、上传日期过滤，游标分页不重复不遗漏"""
+        records = [
+            record_from_info(info(f"vid{i:08d}", f"202401{i % 28 + 1:02d}",
+                                  channel_id="UC1" if i % 2 else "UC2",
+                                  tags=["music"] if i % 3 == 0 else ["news"]))
+            for i in range(30)
+        ]
+        store.upsert_many(records)
+
+        seen = []
+        cursor = None
+        while True:
+            page = store.query(channel_id="UC1", limit=4, cursor=cursor)
+            seen.extend(item["id"] for item in page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        expected = sorted(
+            (r["info"] for r in records if r["info"]["channel_id"] == "UC1"),
+            key=lambda i: (i["upload_date"], i["id"]),
+            reverse=True,
+        )
+        assert seen == [i["id"] for i in expected]
+
+        music = store.query(tag="music", uploaded_after="20240110", uploaded_before="20240120", limit=100)
+        assert {item["id"] for item in music["items"]} == {
+            r["info"]["id"] for r in records
+            if "music" in r["info"]["tags"] and "20240110" <= r["info"]["upload_date"] <= "20240120"
+        }
+        assert all(item["tags"] == ["music"] for item in music["items"])
+
+    def test_flush_batches_queued_records(self, store):
+        """测试从Redis待写队列批量取出并写入，同一视频只写最后一条"""
+        client = fakeredis.FakeRedis()
+        factory = lambda: client  # noqa: E731
+        metadata_store.enqueue([record_from_info(info(f"v{i:010d}", "20240101")) for i in range(5)], factory)
+        metadata_store.enqueue([record_from_info(info("v0000000000", "20240101", view_count=7))], factory)
+
+        written = metadata_store.flush(store, factory, batch_size=4)
+
+        assert written == 6  # 按批计数：4 + 2
+        assert client.llen(metadata_store.METADATA_QUEUE_KEY) == 0
+        assert store.get("v0000000000")["view_count"] == 7
+        assert len(store.query(limit=100)["items"]) == 5
+
+    def test_flush_requeues_on_database_error(self, store):
+        """测试数据库不可用时记录放回队列"""
+        client = fakeredis.FakeRedis()
+        metadata_store.enqueue([record_from_info(info("b" * 11, "20240101"))], lambda: client)
+
+        with patch.object(store, "upsert_many", side_effect=RuntimeError("db down")), patch.object(
+            store, "ping", return_value=False
+        ):
+            with pytest.raises(RuntimeError):
+                metadata_store.flush(store, lambda: client)
+
+        assert json.loads(client.lindex(metadata_store.METADATA_QUEUE_KEY, 0))["info"]["id"] == "b" * 11
+        assert client.llen(metadata_store.METADATA_DEAD_LETTER_KEY) == 0
+
+    def test_flush_moves_poison_records_to_dead_letter(self, store):
+        """测试个别无法写入的记录移到死信队列，同批其余记录照常写入"""
+        client = fakeredis.FakeRedis()
+        records = [record_from_info(info(f"g{i:010d}", "20240101")) for i in range(3)]
+        records.insert(1, record_from_info(info("p" * 11, "20240101")))
+        metadata_store.enqueue(records, lambda: client)
+        client.rpush(metadata_store.METADATA_QUEUE_KEY, b"{not json")
+        upsert_many = store.upsert_many
+
+        def reject_poison(batch):
+            if any(record["info"]["id"] == "p" * 11 for record in batch):
+                raise ValueError("value too long")
+            return upsert_many(batch)
+
+        with patch.object(store, "upsert_many", side_effect=reject_poison):
+            assert metadata_store.flush(store, lambda: client) == 3
+
+        assert client.llen(metadata_store.METADATA_QUEUE_KEY) == 0
+        dead = client.lrange(metadata_store.METADATA_DEAD_LETTER_KEY, 0, -1)
+        assert dead[-1] == b"{not json" and json.loads(dead[0])["info"]["id"] == "p" * 11
+        assert len(store.query(limit=100)["items"]) == 3
+
+    def test_api_serves_stored_metadata(self, store):
+        """测试/videos查询接口，以及/info优先使用已入库的元数据"""
+        store.upsert_many([record_from_info(info("dQw4w9WgXcQ", "20091025", tags=["rick"]))])
+        client = TestClient(app)
+
+        with patch("app.main.metadata_store.get_metadata_store", return_value=store), \
+                patch("app.main.downloader.get_video_info", new_callable=AsyncMock) as mock_info:
+            listed = client.get("/videos", params={"tag": "rick"})
+            single = client.get("/videos/dQw4w9WgXcQ")
+            missing = client.get("/videos/missing0000")
+            cached = client.get("/info", params={"url": "https://youtu.be/dQw4w9WgXcQ"})
+            bad_cursor = client.get("/videos", params={"cursor": "not-a-cursor"})
+
+        assert listed.status_code == 200
+        assert [item["id"] for item in listed.json()["items"]] == ["dQw4w9WgXcQ"]
+        assert listed.json()["next_cursor"] is None
+        assert single.json()["tags"] == ["rick"]
+        assert missing.status_code == 404
+        assert cached.json()["title"] == "Title dQw4w9WgXcQ"
+        mock_info.assert_not_called()
+        assert bad_cursor.status_code == 400
@@ -0,0 +1,87 @@
+import pytest
+from unittest.mock import Mock, patch
+
+import fakeredis
+from fastapi.testclient import TestClient
+from prometheus_client import CollectorRegistry
+
+from app import metrics
+from app.main import app
+
+
+class TestMetrics:
+    """Prometheus指标测试类"""
+
+    @pytest.fixture
+    def client(self):
+        return TestClient(app)
+
+    @patch('app.main.celery_app.AsyncResult')
+    def test_metrics_endpoint_uses_route_templates(self, mock_async_result, client):
+        """测试请求耗时按路由模板而不是原始路径打标签"""
+        mock_result = Mock()
+        mock_result.state = "PENDING"
+        mock_result.info = None
+        mock_async_result.return_value = mock_result
+
+        client.get("/status/some-task-id")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert "text/plain" in response.headers["content-type"]
+
+        body = response.text
+        assert 'route="/status/{task_id}"' in body
+        assert "some-task-id" not in body
+        assert "ytdl_downloads_volume_bytes" in body
+
+    def test_progress_meter_counts_byte_deltas(self):
+        """测试进度回调只累加字节增量"""
+        before = metrics.DOWNLOAD_BYTES._value.get()
+        meter = metrics.DownloadProgressMeter()
+
+        meter({"status": "downloading", "filename": "a.mp4", "downloaded_bytes": 100})
+        meter({"status": "downloading", "filename": "a.mp4", "downloaded_bytes": 250})
+        meter({"status": "finished", "filename": "a.mp4", "total_bytes": 300, "elapsed": 1.5})
+
+        assert metrics.DOWNLOAD_BYTES._value.get() - before == 300
+
+    def test_phase_timer_observes_duration(self):
+        """测试阶段计时"""
+        histogram = metrics.TASK_PHASE_DURATION.labels(phase="unit-test")
+        before = histogram._sum.get()
+        with metrics.PhaseTimer("unit-test"):
+            pass
+        assert histogram._sum.get() >= before
+
+    def test_queue_depth_collector(self):
+        """测试队列深度从Redis列表长度读取"""
+        redis_client = fakeredis.FakeRedis()
+        redis_client.rpush("download", "a", "b", "c")
+
+        registry = CollectorRegistry()
+        registry.register(
+            metrics.QueueDepthCollector(["default", "download"], lambda: redis_client)
+        )
+
+        assert registry.get_sample_value("ytdl_queue_depth", {"queue": "download"}) == 3
+        assert registry.get_sample_value("ytdl_queue_depth", {"queue": "default"}) == 0
+
+    def test_monitored_queues_follow_celery_config(self):
+        """测试未配置 METRICS_QUEUES 时统计Celery配置中的全部队列"""
+        queues = {name: {"routing_key": name} for name in ("default", "download", "live", "transcode", "asr")}
+        celery_app = Mock()
+        celery_app.conf.task_queues = queues
+        with patch.object(metrics, "METRICS_QUEUES", []), patch("app.celery_app.celery_app", celery_app):
+            assert metrics.monitored_queues() == list(queues)
+        with patch.object(metrics, "METRICS_QUEUES", ["download"]):
+            assert metrics.monitored_queues() == ["download"]
+
+    def test_disk_usage_collector(self, temp_dir):
+        """测试下载目录大小统计"""
+        (metrics.Path(temp_dir) / "a.bin").write_bytes(b"x" * 1024)
+
+        registry = CollectorRegistry()
+        registry.register(metrics.DiskUsageCollector(temp_dir))
+
+        assert registry.get_sample_value("ytdl_downloads_directory_bytes") == 1024
+        assert registry.get_sample_value("ytdl_downloads_volume_bytes", {"state": "free"}) > 0
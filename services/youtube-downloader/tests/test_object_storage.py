@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app.models import DownloadResult, VideoInfo
+from app.object_storage import (
+    ArtifactUploader,
+    MemoryObjectStore,
+    StreamingUpload,
+    UploadError,
+    get_object_store,
+)
+from app.tasks import download_video_task
+
+
+class SlowStore(MemoryObjectStore):
+    """记录同时在途分片数的内存存储"""
+
+    def __init__(self, bucket="slow", delay=0.02):
+        super().__init__(bucket)
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.part_times = []
+        self._counter = threading.Lock()
+
+    def upload_part(self, key, upload_id, part_number, data, checksum):
+        with self._counter:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.part_times.append(time.monotonic())
+        time.sleep(self.delay)
+        try:
+            return super().upload_part(key, upload_id, part_number, data, checksum)
+        finally:
+            with self._counter:
+                self.in_flight -= 1
+
+
+class TestObjectStorage:
+    """对象存储上传测试类"""
+
+    @pytest.fixture
+    def executor(self):
+        executor = ThreadPoolExecutor(max_workers=4)
+        yield executor
+        executor.shutdown(wait=True)
+
+    def test_get_object_store_from_url(self):
+        """测试按URL选择后端"""
+        assert get_object_store("") is None
+        store = get_object_store("memory://unit-bucket")
+        assert isinstance(store, MemoryObjectStore)
+        assert store is MemoryObjectStore.for_bucket("unit-bucket")
+        with pytest.raises(ValueError):
+            get_object_store("ftp://bucket")
+
+    def test_multipart_upload_bounded_concurrency(self, temp_dir, executor):
+        """测试分片并行上传且在途分片数不超过并发上限"""
+        path = Path(temp_dir) / "vid.mp4"
+        content = os.urandom(10 * 1000 + 7)
+        path.write_bytes(content)
+        store = SlowStore()
+
+        upload = StreamingUpload(store, "videos/vid/vid.mp4", executor, part_size=1000, concurrency=2)
+        result = upload.start(str(path)).finish()
+
+        assert store.objects["videos/vid/vid.mp4"] == content
+        assert result["parts"] == 11
+        assert result["size"] == len(content)
+        assert store.max_in_flight == 2
+
+    def test_streaming_upload_starts_before_file_complete(self, temp_dir, executor):
+        """测试文件仍在写入时已开始上传完成的分片"""
+        path = Path(temp_dir) / "vid.mp4.part"
+        store = SlowStore(delay=0)
+        chunks = [os.urandom(1000) for _ in range(5)]
+        path.write_bytes(b"")
+
+        upload = StreamingUpload(
+            store, "videos/vid/vid.mp4", executor, part_size=1000, poll_interval=0.01
+        ).start(str(path))
+        with open(path, "ab") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                f.flush()
+                time.sleep(0.05)
+        writes_done = time.monotonic()
+        upload.finish()
+
+        assert store.objects["videos/vid/vid.mp4"] == b"".join(chunks)
+        assert min(store.part_times) < writes_done
+
+    def test_checksum_mismatch_aborts(self, temp_dir, executor):
+        """测试分片校验失败时中止上传"""
+        path = Path(temp_dir) / "vid.mp4"
+        path.write_bytes(b"x" * 2500)
+        store = MemoryObjectStore("corrupt")
+        original = store.upload_part
+        # 模拟传输中第二个分片损坏
+        store.upload_part = lambda key, upload_id, number, data, checksum: original(
+            key, upload_id, number, data[:-1] + b"y" if number == 2 else data, checksum
+        )
+
+        upload = StreamingUpload(store, "videos/vid/vid.mp4", executor, part_size=1000)
+        with pytest.raises(UploadError):
+            upload.start(str(path)).finish()
+
+        assert "videos/vid/vid.mp4" not in store.objects
+        assert store._uploads == {}
+
+    def test_uploader_reuploads_file_replaced_after_download(self, temp_dir):
+        """测试边下边传后文件被后处理替换时重新上传"""
+        store = MemoryObjectStore("replaced")
+        uploader = ArtifactUploader(store, prefix="videos", part_size=1000)
+        final = Path(temp_dir) / "vid.mp4"
+        tmp = Path(temp_dir) / "vid.mp4.part"
+        tmp.write_bytes(b"a" * 1500)
+
+        uploader.progress_hook(
+            {"status": "downloading", "filename": str(final), "tmpfilename": str(tmp),
+             "info_dict": {"id": "vid"}}
+        )
+        os.replace(tmp, final)
+        uploader.progress_hook({"status": "finished", "filename": str(final)})
+        # 模拟修复类后处理器替换了最终文件
+        fixed = Path(temp_dir) / "fixed.tmp"
+        fixed.write_bytes(b"b" * 1200)
+        os.replace(fixed, final)
+        subtitle = Path(temp_dir) / "vid.en.vtt"
+        subtitle.write_text("WEBVTT")
+
+        result = uploader.upload_artifacts(
+            "vid", {"video": str(final), "audio": None, "subtitles": {"en": str(subtitle)}}
+        )
+        uploader.close()
+
+        assert result["object_keys"] == {
+            "video": "videos/vid/vid.mp4",
+            "subtitles": {"en": "videos/vid/vid.en.vtt"},
+        }
+        assert store.objects["videos/vid/vid.mp4"] == b"b" * 1200
+        assert store.objects["videos/vid/vid.en.vtt"] == b"WEBVTT"
+
+    @patch("app.tasks.downloader")
+    def test_download_task_returns_object_keys(self, mock_downloader, temp_dir):
+        """测试下载任务上传产物并在结果中返回对象键"""
+        video = Path(temp_dir) / "test_video.mp4"
+        video.write_bytes(b"v" * 4096)
+        mock_downloader.validate_url.return_value = True
+        mock_downloader.download_video.return_value = DownloadResult(
+            video_path=str(video),
+            subtitle_paths={},
+            file_size=4096,
+            metadata=VideoInfo(id="test_video", title="Test Video", duration=1),
+        )
+        store = MemoryObjectStore("task-bucket")
+
+        with patch("app.tasks.object_storage.get_object_store", return_value=store):
+            result = download_video_task.apply(
+                kwargs={"url": "https://www.youtube.com/watch?v=test_video"}
+            ).result
+
+        assert result["object_keys"] == {
+            "video": "videos/test_video/test_video.mp4",
+            "subtitles": {},
+            "subtitle_segments": {},
+            "manifest": "videos/test_video/test_video.manifest.json",
+        }
+        assert store.objects["videos/test_video/test_video.mp4"] == b"v" * 4096
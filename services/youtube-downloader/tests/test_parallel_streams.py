@@ -0,0 +1,189 @@
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from app.downloader import YouTubeDownloader
+from app.parallel_streams import CombinedProgress, keep_audio_stream, prefetch_streams
+
+MERGED_INFO = {
+    "id": "vid",
+    "ext": "mp4",
+    "height": 1080,
+    "width": 1920,
+    "format_id": "137+140",
+    "vcodec": "avc1.640028",
+    "acodec": "mp4a.40.2",
+    "requested_formats": [
+        {"format_id": "137", "ext": "mp4", "url": "https://cdn/v", "height": 1080},
+        {"format_id": "140", "ext": "m4a", "url": "https://cdn/a"},
+    ],
+}
+
+
+class FakeYDL:
+    """模拟YoutubeDL.dl：分段写文件并回调进度，记录同时运行的下载数"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._progress_hooks = ["original"]
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def prepare_filename(self, info):
+        return str(self.root / f"{info['id']}.{info['ext']}")
+
+    def dl(self, name, info):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        for downloaded in (500, 1000):
+            for hook in self._progress_hooks:
+                hook({"status": "downloading", "filename": name, "downloaded_bytes": downloaded,
+                      "total_bytes": 1000, "speed": 100})
+            time.sleep(0.05)
+        Path(name).write_bytes(b"x" * 1000)
+        with self._lock:
+            self.active -= 1
+        return True, True
+
+
+class TestParallelStreams:
+    """分离音视频流并行下载测试类"""
+
+    def test_format_selector_prefers_separate_streams(self):
+        """测试质量选项映射为bv+ba选择器并保留单文件回退"""
+        assert YouTubeDownloader.format_selector("1080p") == "bv*[height<=1080]+ba/b[height<=1080]"
+        assert YouTubeDownloader.format_selector("best") == "bv*+ba/b"
+        assert YouTubeDownloader.format_sort("1440p")[0] == "res:1440"
+        assert YouTubeDownloader.format_selector("720p", audio_only=True).startswith("bestaudio")
+
+    def test_resolution_wins_over_container_preference(self):
+        """测试高分辨率只有webm时仍按请求的分辨率选择，mp4/h264只在同分辨率下优先"""
+        from yt_dlp import YoutubeDL
+
+        def video(format_id, height, ext, vcodec):
+            return {"format_id": format_id, "url": f"https://cdn/{format_id}", "ext": ext, "height": height,
+                    "width": height * 16 // 9, "vcodec": vcodec, "acodec": "none", "tbr": height}
+
+        formats = [
+            video("136", 720, "mp4", "avc1.4d401f"), video("137", 1080, "mp4", "avc1.640028"),
+            video("248", 1080, "webm", "vp9"), video("271", 1440, "webm", "vp9"), video("313", 2160, "webm", "vp9"),
+            {"format_id": "140", "url": "https://cdn/140", "ext": "m4a", "vcodec": "none", "acodec": "mp4a.40.2"},
+            {"format_id": "251", "url": "https://cdn/251", "ext": "webm", "vcodec": "none", "acodec": "opus"},
+        ]
+
+        def selected(quality):
+            opts = {"format": YouTubeDownloader.format_selector(quality),
+                    "format_sort": YouTubeDownloader.format_sort(quality), "quiet": True, "simulate": True}
+            info = {"id": "vid", "title": "t", "formats": [dict(f) for f in formats], "extractor": "generic",
+                    "extractor_key": "Generic", "webpage_url": "https://example.com/vid"}
+            return YoutubeDL(opts).process_ie_result(info, download=False)["format_id"]
+
+        assert selected("2160p") == "313+140"
+        assert selected("1440p") == "271+140"
+        assert selected("best") == "313+140"
+        assert selected("1080p") == "137+140"
+        assert selected("720p") == "136+140"
+
+    def test_delivered_format_reports_downgrade(self):
+        """测试报告实际交付分辨率并标记低于请求的情况"""
+        info = dict(MERGED_INFO, height=720, width=1280)
+
+        report = YouTubeDownloader.delivered_format(info, "2160p")
+
+        assert report["requested"] == "2160p"
+        assert report["delivered"] == "720p"
+        assert report["merged"] is True
+        assert report["below_requested"] is True
+        assert YouTubeDownloader.delivered_format(MERGED_INFO, "1080p")["below_requested"] is False
+
+    def test_prefetch_downloads_streams_concurrently(self, temp_dir):
+        """测试各路流并行下载到yt-dlp合并使用的中间文件名，进度合并为一个文件"""
+        ydl = FakeYDL(temp_dir)
+        events = []
+
+        files = prefetch_streams(ydl, MERGED_INFO, events.append)
+
+        assert ydl.max_active == 2
+        assert [Path(f).name for f in files] == ["vid.f137.mp4", "vid.f140.m4a"]
+        assert all(Path(f).exists() for f in files)
+        assert ydl._progress_hooks == ["original"]
+        assert {e["filename"] for e in events} == {str(Path(temp_dir) / "vid.mp4")}
+        assert events[-1]["status"] == "finished"
+        assert events[-1]["total_bytes"] == 2000
+        assert max(e["downloaded_bytes"] for e in events[:-1]) == 2000
+
+    def test_keep_audio_stream_survives_merge_cleanup(self, temp_dir):
+        """测试保留的音频流在中间文件被删除后仍然存在"""
+        ydl = FakeYDL(temp_dir)
+        files = prefetch_streams(ydl, MERGED_INFO)
+
+        kept = keep_audio_stream(ydl, MERGED_INFO, files)
+        for name in files:
+            Path(name).unlink()
+
+        assert kept == str(Path(temp_dir) / "vid.audio.m4a")
+        assert Path(kept).read_bytes() == b"x" * 1000
+        assert keep_audio_stream(ydl, MERGED_INFO, []) is None
+
+    def test_prefetch_skips_single_format(self, temp_dir):
+        """测试不需要合并的格式不做预下载"""
+        ydl = FakeYDL(temp_dir)
+        assert prefetch_streams(ydl, {"id": "vid", "ext": "mp4", "url": "u"}) == []
+        assert ydl.max_active == 0
+
+    def test_combined_progress_sums_streams(self):
+        """测试合并进度为各路流之和"""
+        events = []
+        combined = CombinedProgress(events.append, "vid.mp4", MERGED_INFO)
+
+        combined({"status": "downloading", "filename": "a", "downloaded_bytes": 10,
+                  "total_bytes": 100, "speed": 5, "eta": 3})
+        combined({"status": "downloading", "filename": "b", "downloaded_bytes": 20,
+                  "total_bytes_estimate": 50, "speed": 7, "eta": 9})
+
+        assert events[-1]["downloaded_bytes"] == 30
+        assert events[-1]["total_bytes_estimate"] == 150
+        assert events[-1]["speed"] == 12
+        assert events[-1]["eta"] == 9
+        assert events[-1]["info_dict"] is MERGED_INFO
+
+    @patch("yt_dlp.YoutubeDL")
+    def test_download_video_prefetches_and_filters_duplicate_hooks(self, mock_ytdl, temp_dir):
+        """测试需要合并时先并行预下载，保留的音频流在合并之前交给下游，正式下载时过滤中间文件的重复完成回调"""
+        ydl = MagicMock()
+        ydl.extract_info.return_value = dict(MERGED_INFO)
+        ydl.params = {}
+        mock_ytdl.return_value.__enter__.return_value = ydl
+        intermediate = str(Path(temp_dir) / "vid.f137.mp4")
+        events = []
+        order = []
+
+        def fake_download(info, download):
+            order.append("merge")
+            hook = mock_ytdl.call_args[0][0]["progress_hooks"][0]
+            hook({"status": "finished", "filename": intermediate, "total_bytes": 1000})
+            (Path(temp_dir) / "vid.mp4").write_bytes(b"merged")
+
+        ydl.process_ie_result.side_effect = fake_download
+        downloader = YouTubeDownloader(download_path=temp_dir)
+
+        kept = str(Path(temp_dir) / "vid.audio.m4a")
+        with patch("app.downloader.prefetch_streams", return_value=[intermediate]) as mock_prefetch, \
+                patch("app.downloader.keep_audio_stream", return_value=kept):
+            result = downloader.download_video(
+                "https://www.youtube.com/watch?v=vid", quality="1080p",
+                subtitle_langs=[], progress_callback=events.append,
+                keep_audio=True, on_audio=lambda path: order.append(path),
+            )
+
+        mock_prefetch.assert_called_once()
+        opts = mock_ytdl.call_args[0][0]
+        assert opts["merge_output_format"] == "mp4"
+        assert opts["format_sort"][1] == "vcodec:h264"
+        assert events == []
+        assert order == [kept, "merge"]
+        assert result.format_info["delivered"] == "1080p"
+        assert result.video_path == str(Path(temp_dir) / "vid.mp4")
@@ -0,0 +1,101 @@
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+from app import profiling
+from app.main import app
+from app.models import DownloadResult, VideoInfo
+from app.profiling import SamplingProfiler
+from app.tasks import download_video_task
+
+
+def busy_download(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+
+class TestProfiling:
+    """任务采样剖析测试类"""
+
+    def test_sampler_attributes_time_to_busy_thread(self, temp_dir):
+        """测试采样到工作线程中的耗时函数，按折叠栈写出"""
+        profiler = SamplingProfiler(interval=0.001)
+        worker = threading.Thread(target=busy_download, args=(0.2,), name="dl-worker")
+
+        profiler.start()
+        worker.start()
+        worker.join()
+        profiler.stop()
+
+        assert profiler.samples > 10
+        busy = sum(count for stack, count in profiler.stacks.items() if "test_profiling:busy_download" in stack)
+        assert busy > 0
+        assert any(stack.startswith("dl-worker;") for stack in profiler.stacks)
+        assert profiler.top(limit=3)[0]["share"] > 0
+
+        path = Path(temp_dir) / "p.folded"
+        profiler.write(path)
+        stack, count = path.read_text().splitlines()[0].rsplit(" ", 1)
+        assert profiler.stacks[stack] == int(count)
+
+    def test_sample_rate(self):
+        """测试显式请求总是剖析，采样率为0时从不剖析"""
+        assert profiling.should_profile(True, rate=0)
+        assert not any(profiling.should_profile(False, rate=0) for _ in range(1000))
+        assert all(profiling.should_profile(False, rate=1) for _ in range(10))
+        assert profiling.profile_path("../etc/passwd") is None
+
+    @patch("app.tasks.downloader")
+    def test_profiled_task_links_profile(self, mock_downloader, temp_dir):
+        """测试带 profile 标志的任务写出剖析文件，任务结果和接口可以取到"""
+        mock_downloader.validate_url.return_value = True
+
+        def slow_download(**kwargs):
+            busy_download(0.1)
+            return DownloadResult(video_path=None, metadata=VideoInfo(id="vid", title="t"))
+
+        mock_downloader.download_video.side_effect = slow_download
+        with patch.object(profiling, "PROFILE_DIR", temp_dir):
+            result = download_video_task.apply(
+                kwargs={"url": "https://www.youtube.com/watch?v=vid", "profile": True},
+                task_id="profiled-task",
+            ).result
+            response = TestClient(app).get("/profiles/profiled-task")
+            missing = TestClient(app).get("/profiles/other-task")
+
+        assert result["profile"]["url"] == "/profiles/profiled-task"
+        assert result["profile"]["samples"] > 0
+        assert response.status_code == 200
+        assert "test_profiling:slow_download" in response.text
+        assert missing.status_code == 404
+
+    @patch("app.tasks.downloader")
+    def test_failed_task_links_profile_and_survives_write_errors(self, mock_downloader, temp_dir):
+        """测试最终失败时状态中带剖析链接；剖析文件写出失败不影响任务结果"""
+        mock_downloader.validate_url.return_value = True
+        mock_downloader.download_video.side_effect = RuntimeError("extractor broke")
+        states = []
+        kwargs = {"url": "https://www.youtube.com/watch?v=vid", "profile": True}
+
+        with patch.object(profiling, "PROFILE_DIR", temp_dir), patch.object(
+            download_video_task, "update_state", side_effect=lambda **kw: states.append(kw)
+        ):
+            with pytest.raises(RuntimeError):
+                download_video_task.apply(kwargs=kwargs, task_id="failed-task", retries=3)
+        failure = next(state["meta"] for state in states if state["state"] == "FAILURE")
+        assert failure["profile"] == "/profiles/failed-task"
+
+        mock_downloader.download_video.side_effect = lambda **kw: DownloadResult(
+            video_path=None, metadata=VideoInfo(id="vid", title="t")
+        )
+        with patch.object(profiling, "PROFILE_DIR", temp_dir), patch.object(
+            profiling.SamplingProfiler, "write", side_effect=OSError("disk full")
+        ):
+            result = download_video_task.apply(kwargs=kwargs, task_id="unwritable-task").result
+        assert result["status"] == "completed" and "profile" not in result
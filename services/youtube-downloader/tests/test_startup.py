@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SERVICE_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _loaded_modules(code: str, modules: list) -> dict:
+    """在全新解释器中执行导入并返回指定模块是否被加载"""
+    probe = (
+        "import json, sys\n"
+        f"{code}\n"
+        f"print(json.dumps({{name: name in sys.modules for name in {modules!r}}}))\n"
+    )
+    env = dict(os.environ, TESTING="false", CELERY_TASK_ALWAYS_EAGER="false")
+    proc = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=SERVICE_ROOT,
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.slow
+class TestStartupImports:
+    """入口导入范围测试类"""
+
+    def test_api_does_not_load_yt_dlp_or_tasks(self):
+        """测试API入口不加载yt-dlp和任务模块"""
+        loaded = _loaded_modules("import app.main", ["yt_dlp", "app.tasks"])
+        assert loaded == {"yt_dlp": False, "app.tasks": False}
+
+    def test_worker_does_not_load_fastapi_or_yt_dlp(self):
+        """测试Worker入口不加载FastAPI，yt-dlp延迟到首次使用"""
+        loaded = _loaded_modules(
+            "from app.celery_app import celery_app\n"
+            "celery_app.loader.import_default_modules()",
+            ["fastapi", "yt_dlp", "app.tasks"],
+        )
+        assert loaded == {"fastapi": False, "yt_dlp": False, "app.tasks": True}
+
+    def test_package_exports_are_lazy(self):
+        """测试包级导出按需加载"""
+        loaded = _loaded_modules(
+            "import app\nassert app.celery_app is not None",
+            ["fastapi", "app.main"],
+        )
+        assert loaded == {"fastapi": False, "app.main": False}
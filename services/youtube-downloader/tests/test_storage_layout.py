@@ -0,0 +1,112 @@
+import pytest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.artifact_files import ArtifactFiles
+from app.downloader import YouTubeDownloader
+from app.storage_layout import StorageLayout, migrate_flat_directory, main
+
+
+class TestStorageLayout:
+    """下载目录布局测试类"""
+
+    @pytest.fixture
+    def layout(self, temp_dir):
+        return StorageLayout(temp_dir, "sharded")
+
+    def test_flat_layout_uses_root(self, temp_dir):
+        """测试平铺布局直接使用根目录"""
+        layout = StorageLayout(temp_dir, "flat")
+        assert layout.video_dir("dQw4w9WgXcQ") == Path(temp_dir)
+
+    def test_sharded_layout_groups_by_video(self, layout, temp_dir):
+        """测试分片布局按哈希分两级并按视频归组"""
+        video_dir = layout.video_dir("dQw4w9WgXcQ")
+        relative = video_dir.relative_to(temp_dir).parts
+
+        assert len(relative) == 3
+        assert all(len(part) == 2 for part in relative[:2])
+        assert relative[2] == "dQw4w9WgXcQ"
+        assert layout.video_dir("dQw4w9WgXcQ") == video_dir
+
+    def test_unknown_layout_rejected(self, temp_dir):
+        """测试未知布局名称"""
+        with pytest.raises(ValueError):
+            StorageLayout(temp_dir, "nested")
+
+    def test_resolve_stable_name_and_legacy_fallback(self, layout, temp_dir):
+        """测试稳定文件名解析到分片路径，旧的平铺文件仍可访问"""
+        sharded = layout.ensure_video_dir("abc") / "abc.en.vtt"
+        sharded.write_text("WEBVTT")
+        legacy = Path(temp_dir) / "old.mp4"
+        legacy.write_bytes(b"x")
+
+        assert layout.resolve("abc.en.vtt") == sharded
+        assert layout.resolve("old.mp4") == legacy
+        assert layout.resolve("missing.mp4") is None
+        assert layout.resolve("../etc/passwd") is None
+
+    def test_migrate_flat_directory(self, layout, temp_dir):
+        """测试平铺目录迁移，跳过下载中的临时文件"""
+        root = Path(temp_dir)
+        for name in ["vid1.mp4", "vid1.en.vtt", "vid1.jpg", "vid2.m4a", "vid3.mp4.part"]:
+            (root / name).write_bytes(b"data")
+
+        result = migrate_flat_directory(layout)
+
+        assert result["moved"] == 4
+        assert result["skipped"] == 1
+        assert sorted(p.name for p in layout.video_dir("vid1").iterdir()) == [
+            "vid1.en.vtt",
+            "vid1.jpg",
+            "vid1.mp4",
+        ]
+        assert (root / "vid3.mp4.part").exists()
+
+        # 重复执行不会再移动任何文件
+        assert migrate_flat_directory(layout)["moved"] == 0
+
+    def test_migrate_dry_run_cli(self, temp_dir):
+        """测试命令行dry-run不移动文件"""
+        (Path(temp_dir) / "vid1.mp4").write_bytes(b"data")
+        main(["migrate", "--root", temp_dir, "--dry-run"])
+        assert (Path(temp_dir) / "vid1.mp4").exists()
+
+    def test_artifact_files_serves_stable_urls(self, layout):
+        """测试 /downloads/<文件名> 在分片布局下保持可用"""
+        (layout.ensure_video_dir("vid9") / "vid9.mp4").write_bytes(b"video-bytes")
+
+        api = FastAPI()
+        api.mount("/downloads", ArtifactFiles(layout), name="downloads")
+        client = TestClient(api)
+
+        response = client.get("/downloads/vid9.mp4")
+        assert response.status_code == 200
+        assert response.content == b"video-bytes"
+        assert client.get("/downloads/nope.mp4").status_code == 404
+
+    def test_downloader_writes_into_sharded_dir(self, temp_dir):
+        """测试下载器按布局设置输出目录并在其中查找产物"""
+        downloader = YouTubeDownloader(download_path=temp_dir, layout="sharded")
+        video_dir = downloader.layout.video_dir("shard_vid")
+
+        with patch('yt_dlp.YoutubeDL') as mock_ydl_class:
+            mock_ydl = MagicMock()
+            mock_ydl.params = {}
+            mock_ydl_class.return_value.__enter__.return_value = mock_ydl
+            mock_ydl.extract_info.return_value = {"id": "shard_vid", "title": "T"}
+
+            def fake_download(info, download):
+                home = Path(mock_ydl.params["paths"]["home"])
+                (home / "shard_vid.mp4").write_bytes(b"x" * 10)
+
+            mock_ydl.process_ie_result.side_effect = fake_download
+
+            result = downloader.download_video("https://youtu.be/shard_vid", subtitle_langs=[])
+
+        assert result.video_path == str(video_dir / "shard_vid.mp4")
+        assert result.file_size == 10
+        assert downloader.get_download_stats()["total_files"] == 1
@@ -0,0 +1,116 @@
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app import subtitles
+from app.downloader import YouTubeDownloader
+from app.main import app
+from app.subtitles import Segment, SegmentIndex
+
+# YouTube自动字幕：每条先重复上一行，再追加带逐词时间标签的新行，中间夹着10ms的过渡条目；
+# 只含一个空格的行属于条目正文
+AUTO_VTT = """WEBVTT
+Kind: captions
+Language: en
+
+00:00:00.000 --> 00:00:02.350 align:start position:0%
+{blank}
+we're<00:00:00.320><c> no</c><00:00:00.480><c> strangers</c>
+
+00:00:02.350 --> 00:00:02.360 align:start position:0%
+we're no strangers
+{blank}
+
+00:00:02.360 --> 00:00:05.000 align:start position:0%
+we're no strangers
+to<00:00:02.600><c> love</c>
+
+00:00:05.000 --> 00:00:05.010 align:start position:0%
+to love
+{blank}
+
+00:00:05.010 --> 00:00:08.000 align:start position:0%
+to love
+you<00:00:05.300><c> know</c><00:00:05.500><c> the</c><00:00:05.700><c> rules</c>
+""".format(blank=" ")
+
+SRT = """1
+00:00:01,000 --> 00:00:02,500
+<i>Hello</i> &amp; welcome
+
+2
+00:00:03,000 --> 00:00:04,000
+1999
+3
+00:00:04,000 --> 00:00:05,000
+Second line
+continues here
+"""
+
+
+class TestSubtitles:
+    """字幕解析与分段索引测试类"""
+
+    def test_auto_caption_rolling_lines_deduplicated(self):
+        """测试自动字幕滚动重复的行只保留一次"""
+        segments = list(subtitles.dedupe_rolling(subtitles.iter_cues(AUTO_VTT.splitlines(True))))
+
+        assert [s.text for s in segments] == ["we're no strangers", "to love", "you know the rules"]
+        assert segments[0] == Segment(0, 2360, "we're no strangers")
+        assert segments[1].start == 2360 and segments[1].end == 5010
+
+    def test_srt_tags_entities_and_missing_separator(self):
+        """测试SRT去标签、解码实体，并兼容缺少空行分隔的条目"""
+        cues = list(subtitles.iter_cues(SRT.splitlines(True)))
+
+        assert cues[0].lines == ("Hello & welcome",)
+        assert cues[1] == subtitles.Cue(3000, 4000, ("1999",))
+        assert cues[2].lines == ("Second line", "continues here")
+
+    def test_build_segments_writes_columnar_json(self, temp_dir):
+        """测试写出列式分段文件"""
+        source = Path(temp_dir) / "vid.en.vtt"
+        source.write_text(AUTO_VTT, encoding="utf-8")
+
+        result = subtitles.build_segments(str(source))
+
+        assert result["path"] == str(Path(temp_dir) / "vid.en.segments.json")
+        document = json.loads(Path(result["path"]).read_text(encoding="utf-8"))
+        assert document["lang"] == "en"
+        assert document["count"] == 3
+        assert document["start"] == [0, 2360, 5010]
+        assert document["text"][2] == "you know the rules"
+
+    def test_lookup_by_time_range(self):
+        """测试按时间范围查找重叠片段，包括跨越范围边界和相互重叠的片段"""
+        index = SegmentIndex(
+            starts=[0, 1000, 1500, 5000, 9000],
+            ends=[4000, 2000, 2500, 6000, 9500],
+            texts=["long", "a", "b", "c", "d"],
+        )
+
+        assert [s.text for s in index.lookup(3000, 5500)] == ["long", "c"]
+        assert [s.text for s in index.lookup(1800, 1900)] == ["long", "a", "b"]
+        assert index.lookup(6000, 9000) == []
+        assert [s.text for s in index.lookup(0, 100000)] == ["long", "a", "b", "c", "d"]
+
+    def test_segments_endpoint(self, temp_dir):
+        """测试字幕片段查询接口"""
+        local = YouTubeDownloader(download_path=temp_dir, layout="sharded")
+        source = local.layout.ensure_video_dir("vid") / "vid.en.vtt"
+        source.write_text(AUTO_VTT, encoding="utf-8")
+        subtitles.build_segments(str(source))
+
+        with patch("app.main.downloader", local):
+            client = TestClient(app)
+            response = client.get("/subtitles/vid/en", params={"start": 2.5, "end": 5.5})
+            missing = client.get("/subtitles/vid/fr")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 3
+        assert [s["text"] for s in data["segments"]] == ["to love", "you know the rules"]
+        assert data["segments"][0]["start"] == 2.36
+        assert missing.status_code == 404
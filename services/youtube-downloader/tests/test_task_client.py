@@ -0,0 +1,114 @@
+import json
+import pytest
+from unittest.mock import Mock, patch
+
+from celery import Celery
+from fakeredis import aioredis as fake_aioredis
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.task_client import AsyncTaskClient, TaskSnapshot
+
+
+class TestAsyncTaskClient:
+    """异步任务客户端测试类"""
+
+    @pytest.fixture
+    def redis_client(self):
+        """创建内存中的异步Redis"""
+        return fake_aioredis.FakeRedis()
+
+    @pytest.fixture
+    def redis_app(self):
+        """创建使用Redis结果后端的Celery应用（不会真正连接）"""
+        return Celery("test", broker="memory://", backend="redis://localhost:6379/15")
+
+    @pytest.fixture
+    def client(self, redis_app, redis_client):
+        return AsyncTaskClient(redis_app, redis_factory=lambda: redis_client)
+
+    async def _store(self, redis_app, redis_client, task_id, status, result):
+        backend = redis_app.backend
+        payload = json.dumps({"task_id": task_id, "status": status, "result": result})
+        await redis_client.set(backend.get_key_for_task(task_id), payload)
+
+    @pytest.mark.asyncio
+    async def test_missing_task_is_pending(self, client):
+        """测试不存在的任务返回PENDING"""
+        snapshot = await client.get_state("unknown")
+        assert snapshot == TaskSnapshot("PENDING", None)
+
+    @pytest.mark.asyncio
+    async def test_progress_and_success_states(self, client, redis_app, redis_client):
+        """测试直接从Redis读取进度和结果"""
+        await self._store(redis_app, redis_client, "t1", "PROGRESS", {"progress": 42})
+        await self._store(redis_app, redis_client, "t2", "SUCCESS", {"video_path": "a.mp4"})
+
+        progress = await client.get_state("t1")
+        assert progress.state == "PROGRESS"
+        assert progress.info == {"progress": 42}
+
+        success = await client.get_state("t2")
+        assert success.state == "SUCCESS"
+        assert success.info["video_path"] == "a.mp4"
+
+    @pytest.mark.asyncio
+    async def test_failure_state_decodes_exception(self, client, redis_app, redis_client):
+        """测试失败结果被解码为异常对象"""
+        exc = redis_app.backend.prepare_exception(ValueError("Video not available"))
+        await self._store(redis_app, redis_client, "t3", "FAILURE", exc)
+
+        snapshot = await client.get_state("t3")
+        assert snapshot.state == "FAILURE"
+        assert str(snapshot.info) == "Video not available"
+
+    @pytest.mark.asyncio
+    async def test_get_states_uses_single_pipeline(self, client, redis_app, redis_client):
+        """测试批量查询保持输入顺序"""
+        await self._store(redis_app, redis_client, "a", "SUCCESS", {"n": 1})
+        await self._store(redis_app, redis_client, "c", "PROGRESS", {"n": 3})
+
+        snapshots = await client.get_states(["a", "b", "c"])
+        assert [s.state for s in snapshots] == ["SUCCESS", "PENDING", "PROGRESS"]
+
+    @pytest.mark.asyncio
+    async def test_submit_runs_send_task(self, redis_app):
+        """测试提交任务调用send_task"""
+        client = AsyncTaskClient(redis_app)
+        with patch.object(redis_app, "send_task") as mock_send:
+            task_id = await client.submit("app.tasks.x", {"a": 1}, "id-1")
+        assert task_id == "id-1"
+        mock_send.assert_called_once_with("app.tasks.x", kwargs={"a": 1}, task_id="id-1")
+        client.shutdown()
+
+    def test_non_redis_backend_falls_back_to_async_result(self):
+        """测试非Redis后端使用AsyncResult"""
+        celery = Celery("test", broker="memory://", backend="cache+memory://")
+        client = AsyncTaskClient(celery)
+        assert not client.uses_redis_backend
+
+
+class TestStatusBatchEndpoint:
+    """批量状态查询端点测试类"""
+
+    @patch("app.main.celery_app.AsyncResult")
+    def test_status_batch(self, mock_async_result):
+        """测试批量状态查询"""
+        mock_result = Mock()
+        mock_result.state = "PROGRESS"
+        mock_result.info = {"progress": 10, "current_step": "Downloading"}
+        mock_async_result.return_value = mock_result
+
+        client = TestClient(app)
+        response = client.post("/status/batch", json={"task_ids": ["a", "b"]})
+        assert response.status_code == 200
+
+        data = response.json()
+        assert [item["task_id"] for item in data] == ["a", "b"]
+        assert all(item["status"] == "processing" for item in data)
+
+    def test_status_batch_requires_ids(self):
+        """测试空ID列表被拒绝"""
+        client = TestClient(app)
+        response = client.post("/status/batch", json={"task_ids": []})
+        assert response.status_code == 422
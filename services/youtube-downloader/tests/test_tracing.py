@@ -0,0 +1,146 @@
+import json
+import os
+from unittest.mock import patch
+
+import fakeredis
+import httpx
+import pytest
+import redis
+from celery.signals import before_task_publish
+from fastapi.testclient import TestClient
+
+from app import tracing
+from app.main import app
+from app.models import DownloadResult, VideoInfo
+from app.redis_client import TracedRedis
+from app.tasks import download_video_task
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+INCOMING = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+@pytest.fixture
+def exporter():
+    exporter = tracing.configure(tracing.InMemoryExporter(), enabled=True)
+    yield exporter
+    tracing.configure(enabled=False)
+
+
+def by_name(spans):
+    return {span.name: span for span in spans}
+
+
+class TestTracing:
+    """分布式追踪测试类"""
+
+    @patch("app.tasks.downloader")
+    def test_trace_spans_api_broker_and_worker(self, mock_downloader, exporter):
+        """测试一次下载从API请求经消息头到Worker各阶段属于同一个trace"""
+        mock_downloader.validate_url.return_value = True
+        mock_downloader.download_video.return_value = DownloadResult(
+            video_path=None, metadata=VideoInfo(id="dQw4w9WgXcQ", title="t")
+        )
+
+        def send_task(name, kwargs, task_id):
+            # 模拟broker：发布信号写入消息头，Worker按消息头执行
+            headers = {"id": task_id}
+            before_task_publish.send(sender=name, headers=headers, body=None)
+            download_video_task.apply(kwargs=kwargs, task_id=task_id, headers=headers)
+
+        with patch("app.main.downloader.validate_url", return_value=True), \
+                patch("app.main.celery_app.send_task", side_effect=send_task):
+            response = TestClient(app).post("/download", json={"url": URL}, headers={"traceparent": INCOMING})
+
+        assert response.status_code == 200
+        spans = by_name(exporter.spans)
+        request = spans["POST /download"]
+        publish = spans["celery.publish app.tasks.download_video_task"]
+        task = spans["celery.task app.tasks.download_video_task"]
+        assert {span.trace_id for span in exporter.spans} == {"0af7651916cd43dd8448eb211c80319c"}
+        assert request.parent_id == "b7ad6b7169203331"
+        assert request.kind == "server" and request.attributes["http.status_code"] == 200
+        assert publish.parent_id == request.span_id
+        assert task.parent_id == publish.span_id
+        assert task.attributes["celery.state"] == "SUCCESS"
+        assert spans["phase.validate"].parent_id == task.span_id
+        assert spans["phase.download"].parent_id == task.span_id
+
+    def test_spans_record_errors_and_redis_commands(self, exporter):
+        """测试异常记录到span，Redis命令和pipeline各自一个span"""
+        client = TracedRedis(connection_pool=redis.ConnectionPool(
+            connection_class=fakeredis.FakeConnection, server=fakeredis.FakeServer()
+        ))
+
+        with pytest.raises(RuntimeError):
+            with tracing.span("phase.download"):
+                client.set("k", "v")
+                pipe = client.pipeline()
+                pipe.get("k").incr("n")
+                pipe.execute()
+                raise RuntimeError("boom")
+
+        spans = by_name(exporter.spans)
+        parent = spans["phase.download"]
+        assert parent.error == "RuntimeError: boom"
+        assert spans["redis SET"].parent_id == parent.span_id
+        assert spans["redis SET"].kind == "client"
+        assert spans["redis pipeline"].attributes["db.redis.commands"] == 2
+        assert tracing.current_span() is None
+
+    def test_disabled_tracing_is_noop(self):
+        """测试未开启追踪时不创建span，也不写消息头"""
+        headers = {}
+        with tracing.span("phase.download") as span:
+            tracing.inject(headers)
+        assert span is tracing.NOOP_SPAN
+        assert headers == {}
+
+    def test_otlp_and_file_exporters(self, temp_dir):
+        """测试OTLP导出器按批发送JSON、文件导出器逐行写出"""
+        requests = []
+
+        def handler(request):
+            requests.append(json.loads(request.content))
+            return httpx.Response(200, json={})
+
+        otlp = tracing.OtlpExporter(
+            endpoint="http://collector:4318", interval=60, client=httpx.Client(transport=httpx.MockTransport(handler))
+        )
+        file_exporter = tracing.FileExporter(f"{temp_dir}/traces.jsonl")
+        for exporter in (otlp, file_exporter):
+            tracing.configure(exporter, enabled=True)
+            with tracing.span("ytdlp.extract", attributes={"video.id": "vid"}):
+                with tracing.span("redis GET", "client"):
+                    pass
+        tracing.configure(enabled=False)
+
+        spans = requests[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert [(s["name"], s["kind"]) for s in spans] == [("redis GET", 3), ("ytdlp.extract", 1)]
+        assert spans[0]["parentSpanId"] == spans[1]["spanId"]
+        assert spans[1]["attributes"] == [{"key": "video.id", "value": {"stringValue": "vid"}}]
+        lines = [json.loads(line) for line in open(f"{temp_dir}/traces.jsonl")]
+        assert [line["name"] for line in lines] == ["redis GET", "ytdlp.extract"]
+
+    def test_otlp_exporter_starts_thread_in_each_process(self):
+        """测试导出线程在首次导出时启动，fork后的子进程重新启动自己的线程"""
+        requests = []
+
+        def handler(request):
+            requests.append(json.loads(request.content))
+            return httpx.Response(200, json={})
+
+        otlp = tracing.OtlpExporter(interval=60, client=httpx.Client(transport=httpx.MockTransport(handler)))
+        assert otlp._thread is None
+
+        otlp.export(tracing.Span("parent", "a" * 32))
+        parent_thread, parent_queue = otlp._thread, otlp._queue
+        # 模拟prefork：子进程继承导出器对象，但父进程的线程不在子进程中运行
+        with patch("app.tracing.os.getpid", return_value=os.getpid() + 1):
+            otlp.export(tracing.Span("child", "b" * 32))
+            assert otlp._thread is not parent_thread and otlp._thread.is_alive()
+            otlp.shutdown()
+        parent_queue.put(None)
+        parent_thread.join(timeout=5)
+
+        names = [s["name"] for r in requests for s in r["resourceSpans"][0]["scopeSpans"][0]["spans"]]
+        assert names == ["child", "parent"]
@@ -0,0 +1,136 @@
+import subprocess
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app import transcode
+from app.models import DownloadResult, VideoInfo
+from app.tasks import download_video_task
+
+
+def _probe(video_codec="h264", audio_codec="aac", height=1080):
+    streams = []
+    if video_codec:
+        streams.append({"codec_type": "video", "codec_name": video_codec, "height": height})
+    if audio_codec:
+        streams.append({"codec_type": "audio", "codec_name": audio_codec})
+    return {"streams": streams}
+
+
+def _fake_ffmpeg(args, **kwargs):
+    """模拟ffmpeg：把输入内容写到输出路径"""
+    Path(args[-1]).write_bytes(Path(args[args.index("-i") + 1]).read_bytes())
+    return subprocess.CompletedProcess(args, 0, "", "")
+
+
+class TestTranscode:
+    """转封装/转码阶段测试类"""
+
+    def test_plan_copies_compatible_streams(self):
+        """测试编码兼容时流复制，不兼容的流才重新编码"""
+        mp4 = transcode.PRESETS["mp4"]
+
+        assert transcode.plan_streams(mp4, _probe("h264", "aac")) == {"video": "copy", "audio": "copy"}
+        assert transcode.plan_streams(mp4, _probe("vp9", "opus")) == {"video": "encode", "audio": "encode"}
+        assert transcode.plan_streams(mp4, _probe("h264", "opus")) == {"video": "copy", "audio": "encode"}
+
+    def test_plan_respects_max_height_and_audio_presets(self):
+        """测试超出预设高度时重新编码，音频预设丢弃视频流"""
+        web = transcode.PRESETS["web-720p"]
+        m4a = transcode.PRESETS["audio-m4a"]
+
+        assert transcode.plan_streams(web, _probe("h264", "aac", height=1080))["video"] == "encode"
+        assert transcode.plan_streams(web, _probe("h264", "aac", height=720))["video"] == "copy"
+        assert transcode.plan_streams(m4a, _probe("vp9", "opus")) == {"video": None, "audio": "encode"}
+
+    def test_build_command_stream_copy(self):
+        """测试纯转封装命令使用 -c copy 且不启用编码线程参数"""
+        plan = {"video": "copy", "audio": "copy"}
+        args = transcode.build_command("in.mkv", "out.mp4", transcode.PRESETS["mp4"], plan)
+
+        assert args[args.index("-c:v") + 1] == "copy"
+        assert args[args.index("-c:a") + 1] == "copy"
+        assert "-threads" not in args
+        assert args[-1] == "out.mp4"
+
+    def test_build_command_leaves_encoder_threads_to_ffmpeg(self):
+        """测试重新编码默认不限制ffmpeg线程数，配置 TRANSCODE_THREADS 时才传入"""
+        plan = {"video": "encode", "audio": "copy"}
+        args = transcode.build_command("in.webm", "out.mp4", transcode.PRESETS["mp4"], plan)
+        assert "-threads" not in args
+
+        with patch("app.transcode.TRANSCODE_THREADS", 4):
+            args = transcode.build_command("in.webm", "out.mp4", transcode.PRESETS["mp4"], plan)
+        assert args[args.index("-threads") + 1] == "4"
+
+    @patch("app.transcode.probe", return_value=_probe("h264", "aac"))
+    def test_transcode_file_remux_records_timing(self, mock_probe, temp_dir):
+        """测试webm/mkv转mp4时只转封装并记录耗时与CPU秒数"""
+        source = Path(temp_dir) / "vid123.mkv"
+        source.write_bytes(b"media")
+
+        with patch("app.transcode.subprocess.run", side_effect=_fake_ffmpeg):
+            result = transcode.transcode_file(str(source), "mp4")
+
+        assert result["mode"] == "remux"
+        assert result["output_path"] == str(Path(temp_dir) / "vid123.mp4.mp4")
+        assert result["file_size"] == 5
+        assert result["cpu_seconds"] >= 0
+        assert result["wall_seconds"] >= result["ffmpeg_seconds"]
+
+    @patch("app.transcode.probe", return_value=_probe("h264", "aac"))
+    def test_transcode_file_skips_compliant_source(self, mock_probe, temp_dir):
+        """测试源文件已满足预设时不调用ffmpeg"""
+        source = Path(temp_dir) / "vid123.mp4"
+        source.write_bytes(b"media")
+
+        with patch("app.transcode.subprocess.run") as mock_run:
+            result = transcode.transcode_file(str(source), "mp4")
+
+        mock_run.assert_not_called()
+        assert result["mode"] == "none"
+        assert result["output_path"] == str(source)
+
+    @patch("app.transcode.probe", return_value=_probe("vp9", "opus"))
+    def test_transcode_failure_raises(self, mock_probe, temp_dir):
+        """测试ffmpeg失败时抛出TranscodeError"""
+        source = Path(temp_dir) / "vid123.webm"
+        source.write_bytes(b"media")
+        failed = subprocess.CompletedProcess([], 1, "", "Unknown encoder")
+
+        with patch("app.transcode.subprocess.run", return_value=failed):
+            with pytest.raises(transcode.TranscodeError):
+                transcode.transcode_file(str(source), "mp4")
+
+    @patch("app.tasks.downloader")
+    def test_download_task_hands_over_to_transcode(self, mock_downloader, temp_dir):
+        """测试请求转码时下载任务由转码任务接替，结果包含转码信息"""
+        mock_downloader.validate_url.return_value = True
+        mock_downloader.layout.public_url.side_effect = lambda p: p and f"/downloads/{Path(p).name}"
+        mock_downloader.download_video.return_value = DownloadResult(
+            video_path=f"{temp_dir}/vid123.webm",
+            subtitle_paths={},
+            file_size=10,
+            metadata=VideoInfo(id="vid123", title="Test", duration=1),
+        )
+        stage = {
+            "target": "mp4",
+            "mode": "transcode",
+            "output_path": f"{temp_dir}/vid123.mp4.mp4",
+            "wall_seconds": 1.5,
+            "cpu_seconds": 1.2,
+        }
+
+        with patch("app.tasks.transcode.transcode_file", return_value=stage) as mock_transcode:
+            result = download_video_task.apply(
+                kwargs={
+                    "url": "https://www.youtube.com/watch?v=vid123",
+                    "transcode_target": "mp4",
+                }
+            ).result
+
+        mock_transcode.assert_called_once_with(f"{temp_dir}/vid123.webm", "mp4")
+        assert result["transcode"]["cpu_seconds"] == 1.2
+        assert result["download_urls"]["transcoded"] == "/downloads/vid123.mp4.mp4"
+        assert result["video_path"] == f"{temp_dir}/vid123.webm"
@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+import pytest
+from celery.signals import task_postrun, task_prerun
+from celery.worker import state
+
+from app import worker_memory
+from app.celery_app import celery_app
+from app.downloader import trim_info
+from app.worker_memory import MB, MemoryAccountant
+
+
+@pytest.fixture
+def installed():
+    accountant = MemoryAccountant(max_memory_mb=0, max_tasks=2)
+    with patch.object(worker_memory, "accountant", accountant):
+        worker_memory.install()
+        yield accountant
+    task_prerun.disconnect(worker_memory._on_task_prerun)
+    task_postrun.disconnect(worker_memory._on_task_postrun)
+    state.should_stop = None
+
+
+class TestWorkerMemory:
+    """Worker内存记账与回收测试类"""
+
+    def test_trim_info_keeps_used_fields(self):
+        """测试信息字典只保留用到的字段"""
+        info = {
+            "id": "dQw4w9WgXcQ",
+            "title": "t",
+            "duration": 212,
+            "height": 720,
+            "formats": [{"height": h, "url": "https://x/" + "a" * 500} for h in (360, 720, 720, None)],
+            "requested_formats": [{"format_id": "136", "url": "u", "http_headers": {}}, {"format_id": "140"}],
+            "thumbnails": [{"url": "https://i.ytimg.com/" + str(i)} for i in range(40)],
+            "automatic_captions": {"en": [{"url": "u"}], "fr": [{"url": "u"}]},
+            "http_headers": {"User-Agent": "x"},
+        }
+
+        trimmed = trim_info(info)
+
+        assert trimmed == {
+            "id": "dQw4w9WgXcQ",
+            "title": "t",
+            "duration": 212,
+            "height": 720,
+            "formats": [{"height": 360}, {"height": 720}],
+            "requested_formats": [{"format_id": "136"}, {"format_id": "140"}],
+            "automatic_captions": {"en": None, "fr": None},
+        }
+        assert trim_info(None) is None
+
+    def test_recycle_policy(self):
+        """测试超过内存上限或达到任务数上限时要求回收"""
+        accountant = MemoryAccountant(max_memory_mb=100, max_tasks=3, gc_after_task=False)
+
+        accountant.task_started("t1")
+        stats = accountant.task_finished("t1", "app.tasks.download_video_task")
+
+        assert stats["peak_rss"] >= max(stats["rss_before"], stats["rss_after"]) > 0
+        assert accountant.task_finished("unknown", "x") is None
+        assert accountant.recycle_reason(50 * MB) is None
+        assert accountant.recycle_reason(101 * MB) == "memory"
+        accountant.tasks_done = 3
+        assert accountant.recycle_reason(50 * MB) == "max_tasks"
+
+    def test_worker_stops_after_max_tasks(self, installed):
+        """测试任务信号逐任务记账，达到任务数上限后设置warm shutdown标志"""
+
+        @celery_app.task(name="tests.allocate")
+        def allocate():
+            return len(bytearray(8 * MB))
+
+        allocate.apply()
+        assert installed.tasks_done == 1
+        assert state.should_stop is None
+
+        allocate.apply()
+        assert installed.tasks_done == 2
+        assert state.should_stop == 0
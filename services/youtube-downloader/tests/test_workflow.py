@@ -0,0 +1,186 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+from celery.canvas import _chain, chord
+from celery.exceptions import Retry
+from fastapi.testclient import TestClient
+
+from app import workflow
+from app.main import app
+from app.celery_app import celery_app
+from app.models import DownloadResult, VideoInfo
+from app.tasks import _workflow_download, workflow_stage_task
+from app.workflow import Stage, WorkflowStore
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+@pytest.fixture
+def store():
+    client = fakeredis.FakeRedis()
+    store = WorkflowStore(redis_factory=lambda: client)
+    with patch("app.workflow.WorkflowStore", return_value=store), \
+            patch("app.tasks.disk_budget.DISK_BUDGET_ENABLED", False), \
+            patch("app.tasks.cache_eviction.CACHE_EVICTION_ENABLED", False):
+        yield store
+
+
+def fake_download(temp_dir):
+    def _download(**kwargs):
+        return DownloadResult(
+            video_path=f"{temp_dir}/dQw4w9WgXcQ.mp4",
+            audio_path=f"{temp_dir}/dQw4w9WgXcQ.audio.m4a" if kwargs["keep_audio"] else None,
+            metadata=VideoInfo(id="dQw4w9WgXcQ", title="t"),
+        )
+
+    return _download
+
+
+class TestWorkflow:
+    """多阶段流水线编排测试类"""
+
+    def test_pipeline_compiles_to_parallel_branches(self):
+        """测试DAG编译为canvas：下载与音频分支并行，上传汇合两者，各阶段使用自己的队列"""
+        canvas = workflow.build_canvas("wf-1")
+
+        assert isinstance(canvas, chord)
+        download, audio_branch = canvas.tasks
+        assert (download["kwargs"]["stage"], download.options["queue"]) == ("download", "download")
+        assert isinstance(audio_branch, _chain)
+        assert [(t["kwargs"]["stage"], t.options["queue"]) for t in audio_branch.tasks] == [
+            ("audio", "audio"), ("asr", "asr"), ("translate", "translate"), ("tts", "tts"),
+        ]
+        assert (canvas.body["kwargs"]["stage"], canvas.body.options["queue"]) == ("upload", "upload")
+
+        with pytest.raises(ValueError):
+            workflow.sink_stage((Stage("a", "q"), Stage("b", "q", ("a",)), Stage("c", "q", ("a",))))
+
+    @patch("app.tasks.downloader")
+    def test_runs_all_stages_and_records_timing(self, mock_downloader, store, temp_dir):
+        """测试完整执行流水线，记录每个阶段的耗时与输出"""
+        mock_downloader.validate_url.return_value = True
+        mock_downloader.download_video.side_effect = fake_download(temp_dir)
+
+        workflow_id = workflow.submit({"url": URL, "quality": "720p"})
+
+        state = store.get(workflow_id)
+        assert state["status"] == "completed"
+        assert set(state["stages"]) == {"download", "audio", "asr", "translate", "tts", "upload"}
+        assert all(s["status"] == "completed" and s["duration"] >= 0 for s in state["stages"].values())
+        assert state["stages"]["asr"]["output"] == {"status": "skipped"}
+        # 音频阶段复用下载阶段保留的音频流，只下载一次；上传阶段汇总各阶段的产物
+        audio = f"{temp_dir}/dQw4w9WgXcQ.audio.m4a"
+        assert state["stages"]["audio"]["output"]["artifacts"] == {"audio": audio}
+        assert state["stages"]["upload"]["output"]["artifacts"] == {
+            "video": f"{temp_dir}/dQw4w9WgXcQ.mp4", "audio": audio,
+        }
+        assert mock_downloader.download_video.call_count == 1
+        assert mock_downloader.download_video.call_args.kwargs["keep_audio"] is True
+
+    @patch("app.tasks.downloader")
+    def test_audio_stage_starts_before_download_finishes(self, mock_downloader, store, temp_dir):
+        """测试音频流保留后音频阶段立即开始，不等待合并；音频流未就绪时重新排队等待"""
+        audio = Path(temp_dir) / "dQw4w9WgXcQ.audio.m4a"
+        workflow_id = store.create({"url": URL})
+        store.stage_started(workflow_id, "download", "task-1")
+        run_audio = workflow_stage_task.s(None, workflow_id=workflow_id, stage="audio")
+
+        # 音频流还没保留：按轮询间隔重新排队，不执行阶段
+        with patch.object(workflow_stage_task, "retry", side_effect=Retry()) as retry:
+            with pytest.raises(Retry):
+                run_audio.apply(throw=True)
+        assert retry.call_args.kwargs["kwargs"]["waits"] == 1
+        assert store.stage(workflow_id, "audio") is None
+
+        def download_video(**kwargs):
+            # 并行预下载保留音频流后、合并之前，音频阶段已经可以完成
+            audio.write_bytes(b"audio")
+            kwargs["on_audio"](str(audio))
+            assert run_audio.apply().get()["artifacts"] == {"audio": str(audio)}
+            assert store.stage(workflow_id, "download")["status"] == "running"
+            return fake_download(temp_dir)(**kwargs)
+
+        mock_downloader.validate_url.return_value = True
+        mock_downloader.download_video.side_effect = download_video
+        download = _workflow_download(workflow_id, {"url": URL}, started=0.0)
+        download.apply().get()
+
+        stages = store.get(workflow_id)["stages"]
+        assert stages["audio"]["finished_at"] < stages["download"]["finished_at"]
+        assert stages["audio"]["output"]["artifacts"] == {"audio": str(audio)}
+
+    @patch("app.tasks.downloader")
+    def test_audio_extracted_locally_and_download_failure_recorded(self, mock_downloader, store, temp_dir):
+        """测试没有单独音频流时从视频提取音轨；下载任务重试用尽后工作流记为失败"""
+        mock_downloader.validate_url.return_value = True
+        mock_downloader.download_video.side_effect = lambda **kw: fake_download(temp_dir)(**dict(kw, keep_audio=False))
+        extracted = {"output_path": f"{temp_dir}/dQw4w9WgXcQ.audio-m4a.m4a"}
+        with patch("app.tasks.transcode.transcode_file", return_value=extracted) as extract:
+            workflow_id = workflow.submit({"url": URL})
+        extract.assert_called_once_with(f"{temp_dir}/dQw4w9WgXcQ.mp4", "audio-m4a")
+        assert store.get(workflow_id)["stages"]["audio"]["output"]["artifacts"] == {"audio": extracted["output_path"]}
+
+        # 下载任务在download队列上按自身的重试策略执行，最终失败时由errback记录
+        download = _workflow_download("wf-failed", {"url": URL}, started=0.0).tasks[0]
+        assert download.options["queue"] == "download" and download["kwargs"]["keep_audio"] is True
+        errback = download.options["link_error"][0]
+        store.create({"url": URL}, workflow_id="wf-failed")
+        store.stage_started("wf-failed", "download", download.id)
+        celery_app.signature(errback).apply(args=(None, RuntimeError("video unavailable"), None))
+
+        failed = store.get("wf-failed")
+        assert failed["error"] == "download: video unavailable"
+        assert failed["stages"]["download"]["status"] == "failed"
+
+    @patch("app.tasks.downloader")
+    def test_resume_skips_completed_stages(self, mock_downloader, store, temp_dir):
+        """测试阶段失败后重新提交，从失败的阶段继续，已完成的下载不重复执行"""
+        mock_downloader.validate_url.return_value = True
+        mock_downloader.download_video.side_effect = fake_download(temp_dir)
+        real_call = workflow.call_service
+
+        def flaky(stage, workflow_id, inputs):
+            if stage == "translate":
+                raise RuntimeError("translation service down")
+            return real_call(stage, workflow_id, inputs)
+
+        with patch("app.workflow.WORKFLOW_STAGE_RETRIES", 0), \
+                patch("app.tasks.workflow.call_service", side_effect=flaky):
+            with pytest.raises(RuntimeError):
+                workflow.submit({"url": URL})
+        workflow_id = next(iter(store._redis_factory().keys("workflow:*"))).decode().split(":", 1)[1]
+        failed = store.get(workflow_id)
+        assert failed["status"] == "failed"
+        assert failed["error"] == "translate: translation service down"
+        assert failed["stages"]["asr"]["status"] == "completed"
+
+        workflow.submit(workflow_id=workflow_id)
+
+        resumed = store.get(workflow_id)
+        assert resumed["status"] == "completed"
+        assert resumed["stages"]["translate"]["attempts"] == 2
+        assert resumed["stages"]["asr"]["attempts"] == 1
+        assert mock_downloader.download_video.call_count == 1
+
+    def test_workflow_api(self, store):
+        """测试工作流查询接口，未失败或仍有阶段在执行的工作流不能恢复"""
+        workflow_id = store.create({"url": URL})
+        store.set_status(workflow_id, "completed")
+        client = TestClient(app)
+
+        status = client.get(f"/workflows/{workflow_id}")
+        missing = client.get("/workflows/unknown")
+        resume = client.post(f"/workflows/{workflow_id}/resume")
+
+        assert status.status_code == 200
+        assert status.json()["params"]["url"] == URL
+        assert missing.status_code == 404
+        assert resume.status_code == 409
+
+        # 失败后仍有阶段在执行时不能恢复
+        store.set_status(workflow_id, "failed", error="translate: down")
+        store.stage_started(workflow_id, "download", "task-1")
+        running = client.post(f"/workflows/{workflow_id}/resume")
+        assert running.status_code == 409 and "download" in running.json()["detail"]